@@ -0,0 +1,34 @@
+"""Пересчёт материализованных оборотов счетов (AccountRunningBalance).
+
+Использование:
+  python manage.py rebuild_account_balances          # сверка, исправить расхождения
+  python manage.py rebuild_account_balances --all    # пересчитать все счета заново
+"""
+from django.core.management.base import BaseCommand
+
+from accounting.models import Account
+from accounting.services.balance_service import (
+    rebuild_running_balance, reconcile_running_balances,
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт оборотов счетов (AccountRunningBalance) агрегатами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать все счета, включая ещё не построенные',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            count = 0
+            for account in Account.objects.all().iterator():
+                rebuild_running_balance(account)
+                count += 1
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано счетов: {count}'))
+            return
+
+        fixed = reconcile_running_balances()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено расхождений: {fixed}'))
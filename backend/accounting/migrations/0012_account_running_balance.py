@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0011_counterparty_is_public'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountRunningBalance',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='running_balance', serialize=False, to='accounting.account', verbose_name='Счёт')),
+                ('income_total', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Сумма поступлений')),
+                ('expense_total', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Сумма расходов')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Обороты счёта',
+                'verbose_name_plural': 'Обороты счетов',
+            },
+        ),
+    ]
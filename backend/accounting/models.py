@@ -2,7 +2,6 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 from core.models import TimestampedModel
-from django.db.models import Sum, Q
 
 class TaxSystem(TimestampedModel):
     """Справочник систем налогообложения"""
@@ -215,51 +214,21 @@ class Account(TimestampedModel):
 
     def get_current_balance(self) -> Decimal:
         """
-        Рассчитывает текущий баланс на основе новых моделей Invoice и IncomeRecord:
-        Начальный остаток + Сумма доходов (IncomeRecord) - Сумма расходов (Invoice.paid)
+        Текущий баланс: начальный остаток + доходы − расходы.
 
-        Fallback: если новые модели ещё не используются, использует старые Payment.
+        Обороты (IncomeRecord, оплаченные Invoice и LEGACY Payment с
+        balance_date) берутся из AccountRunningBalance — его ведут сигналы
+        payments. Если строки ещё нет, она пересчитывается агрегатами.
         """
-        from payments.models import Invoice, IncomeRecord
-
-        balance = self.initial_balance
-
-        # --- Новая система: Invoice (расходы) + IncomeRecord (доходы) ---
-        invoice_filter = Q(status='paid')
-        income_filter = Q()
-
-        if self.balance_date:
-            invoice_filter &= Q(paid_at__date__gte=self.balance_date)
-            income_filter &= Q(payment_date__gte=self.balance_date)
-
-        # Доходы из IncomeRecord
-        income = IncomeRecord.objects.filter(
-            income_filter,
-            account=self,
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-
-        # Расходы из Invoice (оплаченные)
-        expense = Invoice.objects.filter(
-            invoice_filter,
-            account=self,
-        ).aggregate(total=Sum('amount_gross'))['total'] or Decimal('0')
-
-        # --- Fallback: старая система Payment (для обратной совместимости) ---
-        old_payments_filter = Q(status='paid')
-        if self.balance_date:
-            old_payments_filter &= Q(payment_date__gte=self.balance_date)
-
-        old_income = self.payments.filter(
-            old_payments_filter,
-            payment_type='income'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-
-        old_expense = self.payments.filter(
-            old_payments_filter,
-            payment_type='expense'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-
-        return balance + income + old_income - expense - old_expense
+        totals = AccountRunningBalance.objects.filter(account=self).values_list(
+            'income_total', 'expense_total',
+        ).first()
+        if totals is None:
+            from accounting.services.balance_service import rebuild_running_balance
+            running = rebuild_running_balance(self)
+            totals = (running.income_total, running.expense_total)
+        income, expense = totals
+        return self.initial_balance + income - expense
 
 
 class AccountBalance(models.Model):
@@ -471,3 +440,44 @@ class Counterparty(TimestampedModel):
             raise ValidationError({
                 field_name: 'Контрагент должен быть типа "Исполнитель/Поставщик" или "Заказчик и Исполнитель"'
             })
+
+
+class AccountRunningBalance(models.Model):
+    """
+    Материализованные обороты счёта с balance_date.
+
+    Обновляется в транзакции сохранения/удаления Invoice, IncomeRecord и
+    Payment (payments.signals → accounting.services.balance_service),
+    при смене balance_date пересчитывается целиком.
+    """
+
+    account = models.OneToOneField(
+        Account,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='running_balance',
+        verbose_name='Счёт'
+    )
+    income_total = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        verbose_name='Сумма поступлений'
+    )
+    expense_total = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        verbose_name='Сумма расходов'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Обновлено'
+    )
+
+    class Meta:
+        verbose_name = 'Обороты счёта'
+        verbose_name_plural = 'Обороты счетов'
+
+    def __str__(self):
+        return f"{self.account}: +{self.income_total} / -{self.expense_total}"
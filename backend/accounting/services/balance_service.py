@@ -0,0 +1,170 @@
+"""
+Ведение материализованных оборотов счетов (AccountRunningBalance).
+
+Каждая запись-источник (оплаченный Invoice, IncomeRecord, проведённый
+LEGACY Payment) даёт проводку (account_id, дата, доход, расход). При
+сохранении/удалении источника к строке оборотов применяется разница
+старой и новой проводки — под блокировкой строки счёта. Старая проводка
+читается из БД под FOR UPDATE, запись источника и применение разницы идут
+одной транзакцией (BalanceSourceMixin.save, Collector.delete). Проводка с
+датой раньше balance_date счёта не учитывается (как и в прежнем расчёте
+агрегатами).
+
+Записи в обход сигналов (QuerySet.update, bulk_create, SQL) обороты не
+меняют — их выравнивает reconcile_running_balances (ежедневная задача
+accounting.reconcile_running_balances, команда rebuild_account_balances).
+"""
+import logging
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from accounting.models import Account, AccountRunningBalance
+
+logger = logging.getLogger(__name__)
+
+Entry = namedtuple('Entry', ['account_id', 'date', 'income', 'expense'])
+
+ZERO = Decimal('0')
+
+
+def invoice_entry(account_id, status, paid_at, amount_gross) -> Optional[Entry]:
+    """Проводка оплаченного Invoice (расход по дате оплаты)."""
+    if status != 'paid' or not account_id or not amount_gross:
+        return None
+    paid_date = timezone.localtime(paid_at).date() if paid_at else None
+    return Entry(account_id, paid_date, ZERO, amount_gross)
+
+
+def income_entry(account_id, payment_date, amount) -> Optional[Entry]:
+    """Проводка поступления IncomeRecord."""
+    if not account_id or not amount:
+        return None
+    return Entry(account_id, payment_date, amount, ZERO)
+
+
+def payment_entry(account_id, status, payment_type, payment_date, amount) -> Optional[Entry]:
+    """Проводка LEGACY Payment."""
+    if status != 'paid' or not account_id or not amount:
+        return None
+    if payment_type == 'income':
+        return Entry(account_id, payment_date, amount, ZERO)
+    if payment_type == 'expense':
+        return Entry(account_id, payment_date, ZERO, amount)
+    return None
+
+
+def _counts(entry: Entry, balance_date: Optional[date]) -> bool:
+    if balance_date is None:
+        return True
+    # Без даты оплаты проводка учитывается только при пустом balance_date
+    return entry.date is not None and entry.date >= balance_date
+
+
+def _aggregate_totals(account: Account) -> tuple:
+    """Доходы и расходы счёта агрегатами по всей истории."""
+    from payments.models import IncomeRecord, Invoice, Payment
+
+    invoice_filter = Q(status='paid')
+    income_filter = Q()
+    payments_filter = Q(status='paid')
+    if account.balance_date:
+        invoice_filter &= Q(paid_at__date__gte=account.balance_date)
+        income_filter &= Q(payment_date__gte=account.balance_date)
+        payments_filter &= Q(payment_date__gte=account.balance_date)
+
+    income = IncomeRecord.objects.filter(
+        income_filter, account=account,
+    ).aggregate(total=Sum('amount'))['total'] or ZERO
+    expense = Invoice.objects.filter(
+        invoice_filter, account=account,
+    ).aggregate(total=Sum('amount_gross'))['total'] or ZERO
+
+    # LEGACY Payment
+    old = Payment.objects.filter(payments_filter, account=account).aggregate(
+        income=Sum('amount', filter=Q(payment_type='income')),
+        expense=Sum('amount', filter=Q(payment_type='expense')),
+    )
+    return income + (old['income'] or ZERO), expense + (old['expense'] or ZERO)
+
+
+def rebuild_running_balance(account: Account) -> AccountRunningBalance:
+    """Пересчитать обороты счёта агрегатами и сохранить."""
+    with transaction.atomic():
+        # Блокировка счёта сериализует пересчёт с apply_entries
+        locked = Account.objects.select_for_update().get(pk=account.pk)
+        income, expense = _aggregate_totals(locked)
+        running, _ = AccountRunningBalance.objects.update_or_create(
+            account=locked,
+            defaults={'income_total': income, 'expense_total': expense},
+        )
+    return running
+
+
+def reconcile_running_balances() -> int:
+    """
+    Сверить обороты всех счетов с агрегатами и исправить расхождения.
+
+    Каждый счёт — в своей транзакции под блокировкой строки счёта.
+    Возвращает число исправленных счетов.
+    """
+    fixed = 0
+    account_ids = AccountRunningBalance.objects.values_list('account_id', flat=True)
+    for account_id in list(account_ids):
+        with transaction.atomic():
+            account = Account.objects.select_for_update().filter(pk=account_id).first()
+            if account is None:
+                continue
+            current = AccountRunningBalance.objects.filter(account=account).values_list(
+                'income_total', 'expense_total',
+            ).first()
+            income, expense = _aggregate_totals(account)
+            if current == (income, expense):
+                continue
+            AccountRunningBalance.objects.filter(account=account).update(
+                income_total=income, expense_total=expense, updated_at=timezone.now(),
+            )
+        fixed += 1
+        logger.warning(
+            'Account %s running balance drift: %s → %s',
+            account_id, current, (income, expense),
+        )
+    return fixed
+
+
+def apply_entries(old: Optional[Entry], new: Optional[Entry]) -> None:
+    """
+    Применить замену проводки old → new к оборотам затронутых счетов.
+
+    Вызывается после записи источника в БД: если строки оборотов у счёта
+    ещё нет, она строится агрегатами (и уже содержит новое состояние).
+    """
+    if old == new:
+        return
+    account_ids = {e.account_id for e in (old, new) if e is not None}
+    with transaction.atomic():
+        for account_id in sorted(account_ids):
+            account = Account.objects.select_for_update().filter(pk=account_id).first()
+            if account is None:
+                continue
+            if not AccountRunningBalance.objects.filter(account=account).exists():
+                rebuild_running_balance(account)
+                continue
+            income = expense = ZERO
+            for entry, sign in ((old, -1), (new, 1)):
+                if entry is None or entry.account_id != account_id:
+                    continue
+                if _counts(entry, account.balance_date):
+                    income += sign * entry.income
+                    expense += sign * entry.expense
+            if income or expense:
+                AccountRunningBalance.objects.filter(account=account).update(
+                    income_total=F('income_total') + income,
+                    expense_total=F('expense_total') + expense,
+                    updated_at=timezone.now(),
+                )
@@ -0,0 +1,24 @@
+"""
+Celery-задачи для учёта.
+"""
+
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='accounting.reconcile_running_balances')
+def reconcile_running_balances():
+    """
+    Сверка материализованных оборотов счетов (AccountRunningBalance) с
+    агрегатами по истории — выравнивает записи в обход сигналов.
+
+    Расписание: ежедневно в 04:00.
+    """
+    from accounting.services.balance_service import reconcile_running_balances as reconcile
+
+    fixed = reconcile()
+    logger.info('Running balances reconciled, fixed %s accounts', fixed)
+    return {'fixed': fixed}
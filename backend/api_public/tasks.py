@@ -113,102 +113,171 @@ def process_public_estimate_request(self, request_id: int):
             raise self.retry(exc=exc, countdown=60 * (self.request.retries + 1))
 
 
+# Размер пачки bulk_create для SpecificationItem.
+SPEC_ITEMS_BATCH_SIZE = 500
+
+
 def _parse_all_files(request: EstimateRequest):
     """Парсинг всех файлов запроса. Идемпотентный — пропускает уже обработанные.
 
-    Использует Recognition Service (ADR-0023, E15.01+). Обновление прогресса
-    per-page невозможно (Recognition — один sync HTTP-запрос), pages_total/processed
-    выставляются после завершения парсинга файла.
+    Использует Recognition Service (ADR-0023, E15.01+). Файлы уходят в
+    recognition параллельно (не более PUBLIC_PARSE_CONCURRENCY одновременно):
+    HTTP-запросы — в пуле потоков, работа с БД — только в потоке задачи.
+    Результат файла и прогресс запроса сохраняются по мере готовности файла;
+    pages_total/processed — после завершения парсинга файла (Recognition —
+    один sync HTTP-запрос на файл).
     """
-    from payments.services.recognition_client import (
-        RecognitionClient,
-        RecognitionClientError,
-    )
-    from estimates.models import SpecificationItem
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    from django.conf import settings
+    from payments.services.recognition_client import RecognitionClient
 
     client = RecognitionClient()
+    workers = max(1, int(getattr(settings, 'PUBLIC_PARSE_CONCURRENCY', 4)))
 
-    files = request.files.exclude(
+    files = iter(request.files.exclude(
         parse_status__in=[
             EstimateRequestFile.ParseStatus.DONE,
             EstimateRequestFile.ParseStatus.PARTIAL,
             EstimateRequestFile.ParseStatus.SKIPPED,
         ],
-    )
-
-    for req_file in files:
-        try:
-            req_file.parse_status = EstimateRequestFile.ParseStatus.PARSING
-            req_file.save(update_fields=['parse_status'])
-
-            # Читаем содержимое файла
-            file_content = req_file.file.read()
-            req_file.file.seek(0)
-
-            if not file_content:
-                req_file.parse_status = EstimateRequestFile.ParseStatus.ERROR
-                req_file.parse_error = 'Пустой файл'
-                req_file.save(update_fields=['parse_status', 'parse_error'])
+    ))
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='public-parse')
+
+    def submit_next():
+        # Файл читается только перед отправкой — в памяти не больше
+        # `workers` файлов одновременно.
+        for req_file in files:
+            file_content = _start_file_parse(req_file)
+            if file_content is None:
+                _update_parse_progress(request)
                 continue
+            future = executor.submit(
+                client.parse_spec, file_content, req_file.original_filename,
+            )
+            in_flight[future] = req_file
+            return
 
-            try:
-                response = client.parse_spec(
-                    file_content, req_file.original_filename,
-                )
-            except RecognitionClientError as exc:
-                logger.warning(
-                    'recognition parse_spec failed: file=%s code=%s',
-                    req_file.original_filename, exc.code,
-                )
-                req_file.parse_status = EstimateRequestFile.ParseStatus.ERROR
-                req_file.parse_error = f'Recognition {exc.code}: {exc.detail or ""}'
-                req_file.save(update_fields=['parse_status', 'parse_error'])
-                continue
+    try:
+        for _ in range(workers):
+            submit_next()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                req_file = in_flight.pop(future)
+                _save_file_parse_result(request, req_file, future)
+                _update_parse_progress(request)
+                submit_next()
+    finally:
+        # SoftTimeLimitExceeded не должен ждать HTTP-запросы в пуле.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _start_file_parse(req_file: EstimateRequestFile):
+    """Отметить файл как PARSING и прочитать содержимое.
+
+    None — файл не отправляется (пустой или ошибка чтения, статус ERROR).
+    """
+    try:
+        req_file.parse_status = EstimateRequestFile.ParseStatus.PARSING
+        req_file.save(update_fields=['parse_status'])
 
-            items = response.get('items', []) or []
-            for item_data in items:
-                SpecificationItem.objects.create(
-                    request=request,
-                    source_file=req_file,
-                    name=item_data.get('name', ''),
-                    model_name=item_data.get('model_name', ''),
-                    brand=item_data.get('brand', ''),
-                    unit=item_data.get('unit', 'шт'),
-                    quantity=item_data.get('quantity', 1),
-                    tech_specs_raw=item_data.get('tech_specs', ''),
-                    section_name=item_data.get('section_name', ''),
-                    page_number=item_data.get('page_number', 0),
-                    sort_order=item_data.get('sort_order', 0),
-                )
-
-            stats = response.get('pages_stats') or {}
-            status_map = {
-                'done': EstimateRequestFile.ParseStatus.DONE,
-                'partial': EstimateRequestFile.ParseStatus.PARTIAL,
-                'error': EstimateRequestFile.ParseStatus.ERROR,
-            }
-            req_file.parse_status = status_map.get(
-                response.get('status', 'error'),
-                EstimateRequestFile.ParseStatus.ERROR,
-            )
-            req_file.parsed_data = response
-            req_file.pages_total = stats.get('total', 0)
-            req_file.pages_processed = stats.get('processed', 0)
-            if response.get('errors'):
-                req_file.parse_error = '\n'.join(response['errors'])
-            req_file.save()
+        # Читаем содержимое файла
+        file_content = req_file.file.read()
+        req_file.file.seek(0)
+    except Exception as exc:
+        logger.exception('Error reading file %s', req_file.original_filename)
+        req_file.parse_status = EstimateRequestFile.ParseStatus.ERROR
+        req_file.parse_error = str(exc)[:500]
+        req_file.save(update_fields=['parse_status', 'parse_error'])
+        return None
+
+    if not file_content:
+        req_file.parse_status = EstimateRequestFile.ParseStatus.ERROR
+        req_file.parse_error = 'Пустой файл'
+        req_file.save(update_fields=['parse_status', 'parse_error'])
+        return None
+    return file_content
+
+
+def _save_file_parse_result(request: EstimateRequest, req_file: EstimateRequestFile, future):
+    """Сохранить ответ recognition по файлу: позиции пачками + статус файла."""
+    from django.db import transaction
+    from payments.services.recognition_client import RecognitionClientError
+    from estimates.models import SpecificationItem
 
-        except Exception as exc:
-            logger.exception('Error parsing file %s', req_file.original_filename)
+    try:
+        try:
+            response = future.result()
+        except RecognitionClientError as exc:
+            logger.warning(
+                'recognition parse_spec failed: file=%s code=%s',
+                req_file.original_filename, exc.code,
+            )
             req_file.parse_status = EstimateRequestFile.ParseStatus.ERROR
-            req_file.parse_error = str(exc)[:500]
+            req_file.parse_error = f'Recognition {exc.code}: {exc.detail or ""}'
             req_file.save(update_fields=['parse_status', 'parse_error'])
+            return
+
+        stats = response.get('pages_stats') or {}
+        status_map = {
+            'done': EstimateRequestFile.ParseStatus.DONE,
+            'partial': EstimateRequestFile.ParseStatus.PARTIAL,
+            'error': EstimateRequestFile.ParseStatus.ERROR,
+        }
+        req_file.parse_status = status_map.get(
+            response.get('status', 'error'),
+            EstimateRequestFile.ParseStatus.ERROR,
+        )
+        req_file.parsed_data = response
+        req_file.pages_total = stats.get('total', 0)
+        req_file.pages_processed = stats.get('processed', 0)
+        if response.get('errors'):
+            req_file.parse_error = '\n'.join(response['errors'])
+
+        items = response.get('items', []) or []
+        # Позиции и статус файла — атомарно: при retry задачи файл либо
+        # пропускается целиком, либо парсится заново без дублей.
+        with transaction.atomic():
+            SpecificationItem.objects.filter(source_file=req_file).delete()
+            SpecificationItem.objects.bulk_create(
+                (
+                    SpecificationItem(
+                        request=request,
+                        source_file=req_file,
+                        name=item_data.get('name', ''),
+                        model_name=item_data.get('model_name', ''),
+                        brand=item_data.get('brand', ''),
+                        unit=item_data.get('unit', 'шт'),
+                        quantity=item_data.get('quantity', 1),
+                        tech_specs_raw=item_data.get('tech_specs', ''),
+                        section_name=item_data.get('section_name', ''),
+                        page_number=item_data.get('page_number', 0),
+                        sort_order=item_data.get('sort_order', 0),
+                    )
+                    for item_data in items
+                ),
+                batch_size=SPEC_ITEMS_BATCH_SIZE,
+            )
+            req_file.save()
+
+    except Exception as exc:
+        logger.exception('Error parsing file %s', req_file.original_filename)
+        req_file.parse_status = EstimateRequestFile.ParseStatus.ERROR
+        req_file.parse_error = str(exc)[:500]
+        req_file.save(update_fields=['parse_status', 'parse_error'])
+
 
-        # Обновляем прогресс
-        request.processed_files = request.files.exclude(
-            parse_status=EstimateRequestFile.ParseStatus.PENDING,
-        ).count()
-        request.save(update_fields=['processed_files'])
+def _update_parse_progress(request: EstimateRequest):
+    """Прогресс запроса — число файлов с завершённым парсингом (любой итог)."""
+    request.processed_files = request.files.exclude(
+        parse_status__in=[
+            EstimateRequestFile.ParseStatus.PENDING,
+            EstimateRequestFile.ParseStatus.PARSING,
+        ],
+    ).count()
+    request.save(update_fields=['processed_files'])
 
 
 def _update_request_stats(request: EstimateRequest):
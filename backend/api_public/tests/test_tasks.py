@@ -193,6 +193,118 @@ class TestUpdateRequestStats:
         assert req.unmatched == 1
 
 
+# =========================================================================
+# _parse_all_files
+# =========================================================================
+
+@pytest.fixture
+def portal_storage(tmp_path):
+    from django.core.files.storage import FileSystemStorage
+    storage = FileSystemStorage(location=str(tmp_path))
+    with patch.object(EstimateRequestFile.file.field, 'storage', storage):
+        yield storage
+
+
+def _spec_file(req, name, content=b'%PDF-1.4 spec', **kwargs):
+    from django.core.files.base import ContentFile
+    req_file = EstimateRequestFileFactory(request=req, original_filename=name, **kwargs)
+    req_file.file.save(name, ContentFile(content), save=True)
+    return req_file
+
+
+def _spec_response(filename, count=2):
+    return {
+        'status': 'done',
+        'items': [
+            {'name': f'{filename} #{i}', 'unit': 'шт', 'quantity': i + 1, 'sort_order': i}
+            for i in range(count)
+        ],
+        'pages_stats': {'total': 1, 'processed': 1},
+    }
+
+
+class TestParseAllFiles:
+
+    @patch('payments.services.recognition_client.RecognitionClient.parse_spec')
+    def test_files_parsed_concurrently(self, mock_parse, db, portal_storage, settings):
+        """Файлы запроса уходят в recognition одновременно, позиции — bulk_create."""
+        import threading
+
+        settings.PUBLIC_PARSE_CONCURRENCY = 3
+        barrier = threading.Barrier(3, timeout=5)
+
+        def parse(content, filename):
+            barrier.wait()  # упадёт по timeout, если запросы идут по одному
+            return _spec_response(filename)
+
+        mock_parse.side_effect = parse
+        req = EstimateRequestFactory(total_files=3)
+        files = [_spec_file(req, f'spec_{i}.pdf') for i in range(3)]
+
+        _parse_all_files(req)
+
+        assert mock_parse.call_count == 3
+        for req_file in files:
+            req_file.refresh_from_db()
+            assert req_file.parse_status == EstimateRequestFile.ParseStatus.DONE
+            assert req_file.pages_total == 1
+            assert req_file.spec_items.count() == 2
+        assert SpecificationItem.objects.filter(request=req).count() == 6
+        req.refresh_from_db()
+        assert req.processed_files == 3
+
+    @patch('payments.services.recognition_client.RecognitionClient.parse_spec')
+    def test_errors_are_per_file(self, mock_parse, db, portal_storage):
+        """Пустой файл и ошибка recognition не мешают остальным файлам."""
+        from payments.services.recognition_client import RecognitionClientError
+
+        def parse(content, filename):
+            if filename == 'bad.pdf':
+                raise RecognitionClientError('llm_unavailable', 'down')
+            return _spec_response(filename, count=1)
+
+        mock_parse.side_effect = parse
+        req = EstimateRequestFactory(total_files=3)
+        empty = _spec_file(req, 'empty.pdf', content=b'')
+        bad = _spec_file(req, 'bad.pdf')
+        good = _spec_file(req, 'good.pdf')
+
+        _parse_all_files(req)
+
+        empty.refresh_from_db()
+        bad.refresh_from_db()
+        good.refresh_from_db()
+        assert empty.parse_status == EstimateRequestFile.ParseStatus.ERROR
+        assert empty.parse_error == 'Пустой файл'
+        assert bad.parse_status == EstimateRequestFile.ParseStatus.ERROR
+        assert 'llm_unavailable' in bad.parse_error
+        assert good.parse_status == EstimateRequestFile.ParseStatus.DONE
+        assert list(
+            SpecificationItem.objects.filter(request=req).values_list('source_file_id', flat=True)
+        ) == [good.id]
+        req.refresh_from_db()
+        assert req.processed_files == 3
+
+    @patch('payments.services.recognition_client.RecognitionClient.parse_spec')
+    def test_retry_skips_done_and_replaces_stale_items(self, mock_parse, db, portal_storage):
+        """При retry готовые файлы пропускаются, прерванный — без дублей позиций."""
+        mock_parse.side_effect = lambda content, filename: _spec_response(filename)
+        req = EstimateRequestFactory(total_files=2)
+        _spec_file(req, 'done.pdf', parse_status=EstimateRequestFile.ParseStatus.DONE)
+        interrupted = _spec_file(
+            req, 'interrupted.pdf', parse_status=EstimateRequestFile.ParseStatus.PARSING,
+        )
+        SpecificationItem.objects.create(request=req, source_file=interrupted, name='stale')
+
+        _parse_all_files(req)
+
+        assert [c.args[1] for c in mock_parse.call_args_list] == ['interrupted.pdf']
+        names = set(
+            SpecificationItem.objects.filter(source_file=interrupted).values_list('name', flat=True)
+        )
+        assert names == {'interrupted.pdf #0', 'interrupted.pdf #1'}
+
+
 # =========================================================================
 # generate_and_deliver
 # =========================================================================
@@ -206,15 +206,9 @@ class PublicExportViewSet(viewsets.ViewSet):
         if not estimate:
             return Response({'error': 'Смета не найдена'}, status=status.HTTP_404_NOT_FOUND)
 
-        from django.http import HttpResponse
+        from core.excel_stream import xlsx_response
         from estimates.services.estimate_excel_exporter import EstimateExcelExporter
 
         exporter = EstimateExcelExporter(estimate)
-        buffer = exporter.export_with_column_config(mode='external')
-
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = f'attachment; filename="estimate_{estimate.number}.xlsx"'
-        return response
+        output = exporter.export_with_column_config_to_file(mode='external')
+        return xlsx_response(output, f'estimate_{estimate.number}.xlsx')
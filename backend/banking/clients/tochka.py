@@ -6,7 +6,9 @@
 
 import logging
 import os
+import threading
 from datetime import date, datetime, timedelta
+from types import SimpleNamespace
 from typing import Any, Optional
 
 import httpx
@@ -58,21 +60,63 @@ class TochkaAPIClient:
         'ManageWebhookData',
     ])
 
-    def __init__(self, bank_connection, sandbox: bool = False):
+    def __init__(
+        self,
+        bank_connection,
+        sandbox: bool = False,
+        http_client: Optional[httpx.Client] = None,
+        auto_refresh: bool = True,
+    ):
         """
         Args:
             bank_connection: Экземпляр BankConnection с credentials.
             sandbox: Использовать sandbox-контур.
+            http_client: Общий httpx.Client (пул соединений). Закрывает его
+                владелец, а не этот клиент.
+            auto_refresh: Обновлять токен перед запросом и на 401 (с записью
+                в BankConnection). False — см. with_token.
         """
         self.connection = bank_connection
         self.sandbox = sandbox
         self._base_url = self.SANDBOX_URL if sandbox else self.BASE_URL
         self._token_url = self.SANDBOX_TOKEN_URL if sandbox else self.TOKEN_URL
-        self._client = httpx.Client(timeout=self.TIMEOUT)
+        self._owns_client = http_client is None
+        self._client = http_client or httpx.Client(timeout=self.TIMEOUT)
+        self._auto_refresh = auto_refresh
+        self._token_lock = threading.Lock()
+
+    @classmethod
+    def with_token(
+        cls,
+        bank_connection,
+        http_client: Optional[httpx.Client] = None,
+        sandbox: bool = False,
+    ) -> 'TochkaAPIClient':
+        """
+        Клиент только с текущим access_token подключения — для пула потоков.
+
+        Не обновляет токен и не пишет в БД: токен обновляют заранее в
+        основном потоке (ensure_valid_token), на 401 — TochkaAPIError.
+        Держит копию токена, а не сам BankConnection.
+        """
+        snapshot = SimpleNamespace(
+            name=bank_connection.name,
+            access_token=bank_connection.access_token,
+        )
+        return cls(snapshot, sandbox=sandbox, http_client=http_client, auto_refresh=False)
+
+    @classmethod
+    def create_pool(cls, size: int) -> httpx.Client:
+        """httpx.Client с keep-alive пулом на size одновременных запросов."""
+        return httpx.Client(
+            timeout=cls.TIMEOUT,
+            limits=httpx.Limits(max_connections=size, max_keepalive_connections=size),
+        )
 
     def close(self):
-        """Закрыть HTTP-клиент."""
-        self._client.close()
+        """Закрыть HTTP-клиент (если он не общий)."""
+        if self._owns_client:
+            self._client.close()
 
     def __enter__(self):
         return self
@@ -309,7 +353,9 @@ class TochkaAPIClient:
         Raises:
             TochkaAPIError: При ошибке API.
         """
-        self.ensure_valid_token()
+        if self._auto_refresh:
+            with self._token_lock:
+                self.ensure_valid_token()
 
         url = f'{self._base_url}{path}'
         last_error = None
@@ -324,10 +370,18 @@ class TochkaAPIClient:
                     params=params,
                 )
 
+                if response.status_code == 401 and not self._auto_refresh:
+                    raise TochkaAPIError(
+                        f'Tochka API: токен отклонён (401) для {self.connection.name}',
+                        status_code=401,
+                        response_data=response.text,
+                    )
+
                 if response.status_code == 401:
                     # Токен протух — обновляем и повторяем
                     logger.warning('Tochka: 401, обновляем токен (попытка %d)', attempt)
-                    self.authenticate()
+                    with self._token_lock:
+                        self.authenticate()
                     continue
 
                 if response.status_code >= 400:
@@ -32,10 +32,128 @@ _TOCHKA_PUBLIC_KEY = None
 # =============================================================================
 
 
+def statement_period(
+    bank_account: BankAccount,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> tuple:
+    """
+    Период запроса выписки.
+
+    Курсор — last_statement_date: день последней успешной синхронизации
+    запрашивается повторно (банк досписывает операции в течение дня),
+    дубли отсекаются по external_id.
+    """
+    if date_from is None:
+        date_from = bank_account.last_statement_date or (date.today() - timedelta(days=30))
+    if date_to is None:
+        date_to = date.today()
+    return date_from, date_to
+
+
+def fetch_statement(
+    client: TochkaAPIClient,
+    bank_account: BankAccount,
+    date_from: date,
+    date_to: date,
+) -> list:
+    """
+    Запросить выписку и вернуть список транзакций из ответа.
+
+    Только HTTP, без обращений к БД — безопасно вызывать из пула потоков.
+
+    Raises:
+        TochkaAPIError: При ошибке API.
+    """
+    data = client.get_statement(
+        account_id=bank_account.external_account_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
+    return _parse_statement_transactions(data)
+
+
+def _build_transaction(bank_account: BankAccount, tx_data: dict) -> BankTransaction:
+    """BankTransaction (без сохранения) из элемента выписки."""
+    # Определяем тип транзакции
+    tx_type = BankTransaction.TransactionType.INCOMING
+    if tx_data.get('direction') == 'outgoing':
+        tx_type = BankTransaction.TransactionType.OUTGOING
+
+    # Для входящих — контрагент это отправитель, для исходящих — получатель
+    if tx_type == BankTransaction.TransactionType.INCOMING:
+        cp = tx_data.get('SidePayer', {})
+    else:
+        cp = tx_data.get('SideRecipient', {})
+
+    return BankTransaction(
+        bank_account=bank_account,
+        external_id=tx_data['paymentId'],
+        transaction_type=tx_type,
+        amount=Decimal(str(tx_data.get('amount', '0'))),
+        date=tx_data.get('date', date.today()),
+        purpose=tx_data.get('purpose', ''),
+        counterparty_name=cp.get('name', ''),
+        counterparty_inn=cp.get('inn', ''),
+        counterparty_kpp=cp.get('kpp', ''),
+        counterparty_account=cp.get('account', ''),
+        counterparty_bank_name=cp.get('bankName', ''),
+        counterparty_bik=cp.get('bankCode', ''),
+        counterparty_corr_account=cp.get('bankCorrespondentAccount', ''),
+        document_number=tx_data.get('documentNumber', ''),
+        raw_data=tx_data,
+    )
+
+
+def store_statement(bank_account: BankAccount, transactions: list, date_to: date) -> int:
+    """
+    Сохранить новые транзакции выписки и сдвинуть курсор счёта.
+
+    Уже загруженные external_id отсекаются одним запросом, остальные пишутся
+    bulk_create(ignore_conflicts=True) — параллельная синхронизация того же
+    счёта (ручная из API) не приведёт к IntegrityError.
+
+    Returns:
+        Количество новых транзакций.
+    """
+    by_id = {}
+    for tx_data in transactions:
+        external_id = tx_data.get('paymentId', '')
+        if external_id:
+            by_id.setdefault(external_id, tx_data)
+
+    existing = set(BankTransaction.objects.filter(
+        external_id__in=list(by_id),
+    ).values_list('external_id', flat=True))
+    new_transactions = [
+        _build_transaction(bank_account, tx_data)
+        for external_id, tx_data in by_id.items()
+        if external_id not in existing
+    ]
+
+    with transaction.atomic():
+        BankTransaction.objects.bulk_create(
+            new_transactions, batch_size=500, ignore_conflicts=True,
+        )
+        # Ручная синхронизация за прошлый период не откатывает курсор назад
+        if bank_account.last_statement_date is None or date_to > bank_account.last_statement_date:
+            bank_account.last_statement_date = date_to
+            bank_account.save(update_fields=['last_statement_date'])
+
+    # Обновляем last_sync_at на подключении
+    connection = bank_account.bank_connection
+    connection.last_sync_at = timezone.now()
+    connection.save(update_fields=['last_sync_at'])
+
+    logger.info('Синхронизировано %d новых транзакций для %s', len(new_transactions), bank_account)
+    return len(new_transactions)
+
+
 def sync_statements(
     bank_account: BankAccount,
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
+    client: Optional[TochkaAPIClient] = None,
 ) -> int:
     """
     Синхронизировать выписку по банковскому счёту.
@@ -44,6 +162,7 @@ def sync_statements(
         bank_account: Привязанный банковский счёт.
         date_from: Начало периода (по умолчанию — last_statement_date или -30 дней).
         date_to: Конец периода (по умолчанию — сегодня).
+        client: Открытый TochkaAPIClient подключения (иначе создаётся свой).
 
     Returns:
         Количество новых транзакций.
@@ -54,79 +173,19 @@ def sync_statements(
         logger.warning('Подключение %s неактивно, пропускаем синхронизацию', connection)
         return 0
 
-    if date_from is None:
-        date_from = bank_account.last_statement_date or (date.today() - timedelta(days=30))
-    if date_to is None:
-        date_to = date.today()
-
-    with TochkaAPIClient(connection) as client:
-        try:
-            data = client.get_statement(
-                account_id=bank_account.external_account_id,
-                date_from=date_from,
-                date_to=date_to,
-            )
-        except TochkaAPIError as exc:
-            logger.error('Ошибка получения выписки для %s: %s', bank_account, exc)
-            return 0
-
-    # Парсим транзакции из ответа
-    transactions = _parse_statement_transactions(data)
-    new_count = 0
-
-    for tx_data in transactions:
-        external_id = tx_data.get('paymentId', '')
-        if not external_id:
-            continue
+    date_from, date_to = statement_period(bank_account, date_from, date_to)
 
-        # Пропускаем уже существующие
-        if BankTransaction.objects.filter(external_id=external_id).exists():
-            continue
-
-        # Определяем тип транзакции
-        tx_type = BankTransaction.TransactionType.INCOMING
-        if tx_data.get('direction') == 'outgoing':
-            tx_type = BankTransaction.TransactionType.OUTGOING
-
-        # Извлекаем реквизиты контрагента
-        payer = tx_data.get('SidePayer', {})
-        recipient = tx_data.get('SideRecipient', {})
-
-        # Для входящих — контрагент это отправитель, для исходящих — получатель
-        if tx_type == BankTransaction.TransactionType.INCOMING:
-            cp = payer
+    try:
+        if client is not None:
+            transactions = fetch_statement(client, bank_account, date_from, date_to)
         else:
-            cp = recipient
-
-        BankTransaction.objects.create(
-            bank_account=bank_account,
-            external_id=external_id,
-            transaction_type=tx_type,
-            amount=Decimal(str(tx_data.get('amount', '0'))),
-            date=tx_data.get('date', date.today()),
-            purpose=tx_data.get('purpose', ''),
-            counterparty_name=cp.get('name', ''),
-            counterparty_inn=cp.get('inn', ''),
-            counterparty_kpp=cp.get('kpp', ''),
-            counterparty_account=cp.get('account', ''),
-            counterparty_bank_name=cp.get('bankName', ''),
-            counterparty_bik=cp.get('bankCode', ''),
-            counterparty_corr_account=cp.get('bankCorrespondentAccount', ''),
-            document_number=tx_data.get('documentNumber', ''),
-            raw_data=tx_data,
-        )
-        new_count += 1
-
-    # Обновляем дату последней выписки
-    bank_account.last_statement_date = date_to
-    bank_account.save(update_fields=['last_statement_date'])
-
-    # Обновляем last_sync_at на подключении
-    connection.last_sync_at = timezone.now()
-    connection.save(update_fields=['last_sync_at'])
+            with TochkaAPIClient(connection) as own_client:
+                transactions = fetch_statement(own_client, bank_account, date_from, date_to)
+    except TochkaAPIError as exc:
+        logger.error('Ошибка получения выписки для %s: %s', bank_account, exc)
+        return 0
 
-    logger.info('Синхронизировано %d новых транзакций для %s', new_count, bank_account)
-    return new_count
+    return store_statement(bank_account, transactions, date_to)
 
 
 def _parse_statement_transactions(data: dict) -> list:
@@ -193,43 +252,152 @@ def reconcile_transaction(
     return True
 
 
-def auto_reconcile(bank_account: BankAccount) -> int:
+# Допуски автосверки: банк может провести платёж на пару дней позже
+# плановой даты, сумма — расхождение в копейку на округлении НДС.
+RECONCILE_DATE_TOLERANCE_DAYS = 3
+RECONCILE_AMOUNT_TOLERANCE_KOPECKS = 1
+
+
+def _kopecks(amount: Decimal) -> int:
+    return int((amount * 100).to_integral_value())
+
+
+def _reconcile_candidates(date_from: date, date_to: date) -> dict:
+    """
+    Кандидаты для сверки за окно дат, сгруппированные по сумме в копейках.
+
+    Invoice — оплаченные/отправленные в банк счета; дата сверки — paid_at,
+    иначе дата платёжного поручения, иначе срок оплаты.
+    Payment (LEGACY) — проведённые платежи по payment_date.
+    Уже привязанные к транзакциям кандидаты не загружаются.
+    """
+    from django.db.models import DateField
+    from django.db.models.functions import Coalesce, TruncDate
+    from payments.models import Invoice, Payment
+
+    by_amount = {}
+
+    invoices = Invoice.objects.filter(
+        status__in=[
+            Invoice.Status.APPROVED,
+            Invoice.Status.SENDING,
+            Invoice.Status.PAID,
+        ],
+        amount_gross__isnull=False,
+        matched_bank_transactions__isnull=True,
+    ).annotate(
+        match_date=Coalesce(
+            TruncDate('paid_at'),
+            'bank_payment_order__payment_date',
+            'due_date',
+            output_field=DateField(),
+        ),
+    ).filter(
+        match_date__range=(date_from, date_to),
+    ).values_list('id', 'amount_gross', 'match_date', 'counterparty__inn', 'account_id')
+    for pk, amount, match_date, inn, account_id in invoices:
+        by_amount.setdefault(_kopecks(amount), []).append(
+            ('invoice', pk, match_date, inn or '', account_id)
+        )
+
+    payments = Payment.objects.filter(
+        status='paid',
+        payment_date__range=(date_from, date_to),
+        bank_transactions__isnull=True,
+    ).values_list('id', 'amount', 'payment_date', 'contract__counterparty__inn')
+    for pk, amount, payment_date, inn in payments:
+        by_amount.setdefault(_kopecks(amount), []).append(
+            ('payment', pk, payment_date, inn or '', None)
+        )
+
+    return by_amount
+
+
+def _match_transaction(tx: BankTransaction, by_amount: dict, used: set, account_id) -> Optional[tuple]:
+    """
+    Единственный лучший кандидат для транзакции или None.
+
+    Лучший — с минимальным (расхождение суммы, расхождение даты); Invoice
+    приоритетнее Payment. Если лучших несколько — сверку не делаем.
+    """
+    cents = _kopecks(tx.amount)
+    found = []
+    for delta in range(-RECONCILE_AMOUNT_TOLERANCE_KOPECKS, RECONCILE_AMOUNT_TOLERANCE_KOPECKS + 1):
+        for candidate in by_amount.get(cents + delta, ()):
+            kind, pk, match_date, inn, cand_account_id = candidate
+            if (kind, pk) in used:
+                continue
+            days = abs((match_date - tx.date).days)
+            if days > RECONCILE_DATE_TOLERANCE_DAYS:
+                continue
+            if tx.counterparty_inn and inn != tx.counterparty_inn:
+                continue
+            if kind == 'invoice' and (
+                tx.transaction_type != BankTransaction.TransactionType.OUTGOING
+                or (cand_account_id and cand_account_id != account_id)
+            ):
+                continue
+            found.append(((kind != 'invoice', abs(delta), days), candidate))
+
+    if not found:
+        return None
+    best = min(rank for rank, _ in found)
+    winners = [candidate for rank, candidate in found if rank == best]
+    return winners[0] if len(winners) == 1 else None
+
+
+def auto_reconcile(bank_account: Optional[BankAccount] = None) -> int:
     """
     Автоматическая сверка транзакций по сумме, дате и ИНН контрагента.
 
+    Все несверенные транзакции (одного счёта или всех, если bank_account не
+    задан) и кандидаты Invoice/Payment за их окно дат грузятся разом;
+    сопоставление — в памяти по хэш-таблице сумм с допусками по дате и
+    сумме, запись — одним bulk_update.
+
     Returns:
         Количество автоматически сверенных транзакций.
     """
-    from payments.models import Payment
-
     unreconciled = BankTransaction.objects.filter(
-        bank_account=bank_account,
         reconciled=False,
-    )
+    ).select_related('bank_account').order_by('date', 'id')
+    if bank_account is not None:
+        unreconciled = unreconciled.filter(bank_account=bank_account)
+    transactions = list(unreconciled)
+    if not transactions:
+        return 0
 
-    matched = 0
-    for tx in unreconciled:
-        # Ищем платёж с совпадающей суммой, датой и ИНН контрагента
-        payments = Payment.objects.filter(
-            amount=tx.amount,
-            payment_date=tx.date,
-            status='paid',
-        )
+    tolerance = timedelta(days=RECONCILE_DATE_TOLERANCE_DAYS)
+    by_amount = _reconcile_candidates(
+        min(tx.date for tx in transactions) - tolerance,
+        max(tx.date for tx in transactions) + tolerance,
+    )
 
-        if tx.counterparty_inn:
-            payments = payments.filter(
-                contract__counterparty__inn=tx.counterparty_inn,
-            )
+    used = set()
+    matched = []
+    for tx in transactions:
+        candidate = _match_transaction(tx, by_amount, used, tx.bank_account.account_id)
+        if candidate is None:
+            continue
+        kind, pk = candidate[0], candidate[1]
+        used.add((kind, pk))
+        if kind == 'invoice':
+            tx.invoice_id = pk
+        else:
+            tx.payment_id = pk
+        tx.reconciled = True
+        matched.append(tx)
 
-        if payments.count() == 1:
-            payment = payments.first()
-            tx.payment = payment
-            tx.reconciled = True
-            tx.save(update_fields=['payment', 'reconciled'])
-            matched += 1
+    if matched:
+        BankTransaction.objects.bulk_update(
+            matched, ['invoice', 'payment', 'reconciled'], batch_size=500,
+        )
 
-    logger.info('Автосверка: %d транзакций сопоставлено для %s', matched, bank_account)
-    return matched
+    logger.info(
+        'Автосверка: %d из %d транзакций сопоставлено (%s)',
+        len(matched), len(transactions), bank_account or 'все счета',
+    )
+    return len(matched)
 
 
 # =============================================================================
@@ -13,30 +13,87 @@ logger = logging.getLogger(__name__)
 @shared_task(name='banking.sync_all_statements')
 def sync_all_statements():
     """
-    Синхронизация выписок по всем активным банковским счетам.
+    Синхронизация выписок по всем активным банковским счетам и автосверка.
+
+    Выписки запрашиваются параллельно (BANKING_SYNC_CONCURRENCY) через общий
+    пул HTTP-соединений. Токены подключений обновляются до старта в потоке
+    задачи (запись в BankConnection — только здесь); потоки пула получают
+    token-only клиенты (TochkaAPIClient.with_token) — только HTTP, без ORM.
+    Запись выписок в БД — в потоке задачи по мере готовности ответов.
 
     Расписание: каждые 30 минут.
     """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from django.conf import settings
+
+    from banking.clients.tochka import TochkaAPIClient
     from banking.models import BankAccount
-    from banking.services import sync_statements
+    from banking.services import auto_reconcile
+    from banking.services.statement_sync import (
+        fetch_statement, statement_period, store_statement,
+    )
 
-    active_accounts = BankAccount.objects.filter(
+    active_accounts = list(BankAccount.objects.filter(
         sync_enabled=True,
         bank_connection__is_active=True,
-    ).select_related('bank_connection')
+    ).select_related('bank_connection'))
 
-    total_new = 0
+    workers = max(1, settings.BANKING_SYNC_CONCURRENCY)
+    pool = TochkaAPIClient.create_pool(workers)
+    clients = {}
+    jobs = []
     for bank_account in active_accounts:
-        try:
-            count = sync_statements(bank_account)
-            total_new += count
-        except Exception as exc:
-            logger.error(
-                'Ошибка синхронизации выписки для %s: %s',
-                bank_account, exc, exc_info=True,
-            )
+        connection_id = bank_account.bank_connection_id
+        if connection_id not in clients:
+            connection = bank_account.bank_connection
+            try:
+                with TochkaAPIClient(connection, http_client=pool) as auth_client:
+                    auth_client.ensure_valid_token()
+            except Exception as exc:
+                logger.error(
+                    'Ошибка авторизации подключения %s: %s',
+                    connection, exc, exc_info=True,
+                )
+                clients[connection_id] = None
+            else:
+                clients[connection_id] = TochkaAPIClient.with_token(connection, http_client=pool)
+        client = clients[connection_id]
+        if client is None:
+            continue
+        jobs.append((bank_account, client, *statement_period(bank_account)))
 
-    logger.info('sync_all_statements: %d новых транзакций', total_new)
+    total_new = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bank-sync') as executor:
+            futures = {
+                executor.submit(fetch_statement, client, bank_account, date_from, date_to):
+                    (bank_account, date_to)
+                for bank_account, client, date_from, date_to in jobs
+            }
+            for future in as_completed(futures):
+                bank_account, date_to = futures[future]
+                try:
+                    total_new += store_statement(bank_account, future.result(), date_to)
+                except Exception as exc:
+                    logger.error(
+                        'Ошибка синхронизации выписки для %s: %s',
+                        bank_account, exc, exc_info=True,
+                    )
+    finally:
+        pool.close()
+
+    # Сверка — один проход по всем счетам после загрузки выписок
+    try:
+        reconciled = auto_reconcile()
+    except Exception as exc:
+        reconciled = 0
+        logger.error('Ошибка автосверки: %s', exc, exc_info=True)
+
+    logger.info(
+        'sync_all_statements: %d счетов, %d новых транзакций, %d сверено',
+        len(jobs), total_new, reconciled,
+    )
     return total_new
 
 
@@ -279,6 +279,79 @@ class TestReconcileTransaction:
         assert result is False
 
 
+# ===================================================================
+# auto_reconcile — пакетная сверка
+# ===================================================================
+
+def _make_tx(bank_account, external_id, **overrides):
+    defaults = {
+        'bank_account': bank_account,
+        'external_id': external_id,
+        'transaction_type': BankTransaction.TransactionType.OUTGOING,
+        'amount': Decimal('50000.00'),
+        'date': date(2026, 2, 28),
+        'counterparty_inn': '999999999999',
+    }
+    defaults.update(overrides)
+    return BankTransaction.objects.create(**defaults)
+
+
+@pytest.mark.django_db
+class TestAutoReconcile:
+    """Test banking.services.auto_reconcile (hash-join по сумме/дате/ИНН)."""
+
+    def test_matches_invoice_within_tolerance(self, bank_account, invoice):
+        from banking.services import auto_reconcile
+
+        # due_date 28.02, банк провёл 02.03 с копеечным расхождением
+        tx = _make_tx(bank_account, 'TX-AUTO-001', amount=Decimal('50000.01'), date=date(2026, 3, 2))
+        other = _make_tx(bank_account, 'TX-AUTO-002', amount=Decimal('777.00'))
+
+        assert auto_reconcile() == 1
+
+        tx.refresh_from_db()
+        other.refresh_from_db()
+        assert tx.invoice == invoice
+        assert tx.reconciled is True
+        assert other.reconciled is False
+
+    def test_inn_mismatch_and_incoming_not_matched(self, bank_account, invoice):
+        from banking.services import auto_reconcile
+
+        _make_tx(bank_account, 'TX-AUTO-003', counterparty_inn='123456789012')
+        _make_tx(
+            bank_account, 'TX-AUTO-004',
+            transaction_type=BankTransaction.TransactionType.INCOMING,
+        )
+
+        assert auto_reconcile(bank_account) == 0
+
+    def test_invoice_linked_once_and_ambiguity_skipped(self, bank_account, invoice):
+        from banking.services import auto_reconcile
+
+        first = _make_tx(bank_account, 'TX-AUTO-005')
+        second = _make_tx(bank_account, 'TX-AUTO-006', date=date(2026, 3, 1))
+
+        assert auto_reconcile() == 1
+        first.refresh_from_db()
+        second.refresh_from_db()
+        # Точное совпадение даты выигрывает, счёт не привязывается дважды
+        assert first.invoice == invoice
+        assert second.reconciled is False
+
+    def test_query_count_independent_of_transactions(
+        self, bank_account, invoice, django_assert_max_num_queries,
+    ):
+        from banking.services import auto_reconcile
+
+        for i in range(20):
+            _make_tx(bank_account, f'TX-AUTO-BULK-{i}', amount=Decimal(1000 + i))
+
+        # транзакции + Invoice + Payment + bulk_update
+        with django_assert_max_num_queries(5):
+            assert auto_reconcile() == 0
+
+
 # ===================================================================
 # create_payment_order service with invoice_id
 # ===================================================================
@@ -419,3 +492,131 @@ class TestAccountGetCurrentBalance:
         # Invoice in APPROVED status (not paid) — should not affect balance
         assert invoice.status == Invoice.Status.APPROVED
         assert internal_account.get_current_balance() == Decimal('100000.00')
+
+    def test_running_balance_maintained_incrementally(
+        self, internal_account, invoice, legal_entity, expense_category, counterparty,
+        django_assert_num_queries,
+    ):
+        from accounting.models import AccountRunningBalance
+        from accounting.services.balance_service import _aggregate_totals
+
+        # Первая выборка строит строку оборотов
+        assert internal_account.get_current_balance() == Decimal('100000.00')
+        assert AccountRunningBalance.objects.filter(account=internal_account).exists()
+
+        invoice.status = Invoice.Status.PAID
+        invoice.paid_at = timezone.now()
+        invoice.save(update_fields=['status', 'paid_at'])
+        income = IncomeRecord.objects.create(
+            account=internal_account,
+            category=expense_category,
+            legal_entity=legal_entity,
+            counterparty=counterparty,
+            amount=Decimal('75000.00'),
+            payment_date=date(2026, 2, 12),
+        )
+        assert internal_account.get_current_balance() == Decimal('125000.00')
+
+        income.amount = Decimal('80000.00')
+        income.save()
+        invoice.amount_gross = Decimal('40000.00')
+        invoice.save()
+        assert internal_account.get_current_balance() == Decimal('140000.00')
+
+        income.delete()
+        assert internal_account.get_current_balance() == Decimal('60000.00')
+
+        # Чтение — один запрос, без агрегатов по истории
+        with django_assert_num_queries(1):
+            internal_account.get_current_balance()
+
+        running = AccountRunningBalance.objects.get(account=internal_account)
+        assert (running.income_total, running.expense_total) == _aggregate_totals(internal_account)
+
+    def test_balance_date_change_rebuilds(self, internal_account, legal_entity, expense_category):
+        IncomeRecord.objects.create(
+            account=internal_account,
+            category=expense_category,
+            legal_entity=legal_entity,
+            amount=Decimal('10000.00'),
+            payment_date=date(2026, 1, 10),
+        )
+        assert internal_account.get_current_balance() == Decimal('110000.00')
+
+        internal_account.balance_date = date(2026, 2, 1)
+        internal_account.save()
+        assert internal_account.get_current_balance() == Decimal('100000.00')
+
+        # Поступление до balance_date не учитывается и инкрементально
+        IncomeRecord.objects.create(
+            account=internal_account,
+            category=expense_category,
+            legal_entity=legal_entity,
+            amount=Decimal('5000.00'),
+            payment_date=date(2026, 1, 20),
+        )
+        assert internal_account.get_current_balance() == Decimal('100000.00')
+
+    def test_old_entry_read_under_row_lock(self, internal_account, legal_entity, expense_category):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        income = IncomeRecord.objects.create(
+            account=internal_account,
+            category=expense_category,
+            legal_entity=legal_entity,
+            amount=Decimal('10000.00'),
+            payment_date=date(2026, 2, 10),
+        )
+        income.amount = Decimal('12000.00')
+        with CaptureQueriesContext(connection) as ctx:
+            income.save()
+        table = IncomeRecord._meta.db_table
+        assert any(
+            table in q['sql'] and 'FOR UPDATE' in q['sql'] for q in ctx.captured_queries
+        )
+
+    def test_stale_instance_delete_not_applied_twice(
+        self, internal_account, legal_entity, expense_category,
+    ):
+        income = IncomeRecord.objects.create(
+            account=internal_account,
+            category=expense_category,
+            legal_entity=legal_entity,
+            amount=Decimal('10000.00'),
+            payment_date=date(2026, 2, 10),
+        )
+        stale = IncomeRecord.objects.get(pk=income.pk)
+        assert internal_account.get_current_balance() == Decimal('110000.00')
+
+        income.delete()
+        # Строки уже нет — повторное удаление оборотов не меняет
+        stale.delete()
+        assert internal_account.get_current_balance() == Decimal('100000.00')
+
+    def test_reconcile_fixes_writes_bypassing_signals(
+        self, internal_account, legal_entity, expense_category,
+    ):
+        from django.core.management import call_command
+
+        from accounting.services.balance_service import reconcile_running_balances
+
+        income = IncomeRecord.objects.create(
+            account=internal_account,
+            category=expense_category,
+            legal_entity=legal_entity,
+            amount=Decimal('10000.00'),
+            payment_date=date(2026, 2, 10),
+        )
+        assert internal_account.get_current_balance() == Decimal('110000.00')
+
+        IncomeRecord.objects.filter(pk=income.pk).update(amount=Decimal('15000.00'))
+        assert internal_account.get_current_balance() == Decimal('110000.00')
+
+        assert reconcile_running_balances() == 1
+        assert internal_account.get_current_balance() == Decimal('115000.00')
+        assert reconcile_running_balances() == 0
+
+        IncomeRecord.objects.filter(pk=income.pk).update(amount=Decimal('20000.00'))
+        call_command('rebuild_account_balances', stdout=open(os.devnull, 'w'))
+        assert internal_account.get_current_balance() == Decimal('120000.00')
@@ -270,6 +270,131 @@ class TestParseStatementTransactions:
         assert _parse_statement_transactions({}) == []
 
 
+# ===================================================================
+# store_statement / sync_all_statements
+# ===================================================================
+
+def _statement_tx(payment_id, amount='1000.00', tx_date='2026-03-10'):
+    return {
+        'paymentId': payment_id,
+        'direction': 'incoming',
+        'amount': amount,
+        'date': tx_date,
+        'purpose': 'Оплата',
+        'SidePayer': {'name': 'ООО Плательщик', 'inn': '777777777777'},
+    }
+
+
+@pytest.mark.django_db
+class TestStoreStatement:
+
+    def test_skips_existing_and_duplicates(self, bank_account):
+        from banking.services.statement_sync import store_statement
+
+        BankTransaction.objects.create(
+            bank_account=bank_account, external_id='ST-1',
+            transaction_type=BankTransaction.TransactionType.INCOMING,
+            amount=Decimal('1000.00'), date=date(2026, 3, 10),
+        )
+        transactions = [
+            _statement_tx('ST-1'), _statement_tx('ST-2'),
+            _statement_tx('ST-2'), _statement_tx(''),
+        ]
+
+        assert store_statement(bank_account, transactions, date(2026, 3, 11)) == 1
+
+        tx = BankTransaction.objects.get(external_id='ST-2')
+        assert tx.counterparty_inn == '777777777777'
+        bank_account.refresh_from_db()
+        assert bank_account.last_statement_date == date(2026, 3, 11)
+
+    def test_cursor_not_moved_back(self, bank_account):
+        from banking.services.statement_sync import store_statement
+
+        bank_account.last_statement_date = date(2026, 3, 20)
+        bank_account.save(update_fields=['last_statement_date'])
+
+        store_statement(bank_account, [_statement_tx('ST-3')], date(2026, 3, 1))
+
+        bank_account.refresh_from_db()
+        assert bank_account.last_statement_date == date(2026, 3, 20)
+
+
+@pytest.mark.django_db
+class TestSyncAllStatements:
+
+    @patch('banking.clients.tochka.TochkaAPIClient.ensure_valid_token')
+    @patch('banking.clients.tochka.TochkaAPIClient.get_statement')
+    def test_syncs_accounts_from_cursor(self, mock_statement, mock_token, bank_account, legal_entity):
+        from banking.tasks import sync_all_statements
+
+        second = BankAccount.objects.create(
+            account=Account.objects.create(
+                legal_entity=legal_entity, name='Второй р/с',
+                number='40702810000000000098',
+            ),
+            bank_connection=bank_account.bank_connection,
+            external_account_id='ext-svc-acc-002',
+            last_statement_date=date(2026, 3, 5),
+        )
+        statements = {
+            'ext-svc-acc-001': {'Data': {'Statement': [_statement_tx('SA-1'), _statement_tx('SA-2')]}},
+            'ext-svc-acc-002': {'Data': {'Statement': [_statement_tx('SA-3')]}},
+        }
+        mock_statement.side_effect = lambda account_id, date_from, date_to: statements[account_id]
+
+        assert sync_all_statements() == 3
+
+        # Токен проверяется один раз на подключение
+        assert mock_token.call_count == 1
+        periods = {c.kwargs['account_id']: c.kwargs['date_from'] for c in mock_statement.call_args_list}
+        assert periods['ext-svc-acc-002'] == date(2026, 3, 5)
+        assert BankTransaction.objects.filter(bank_account=second).count() == 1
+
+    @patch('banking.clients.tochka.TochkaAPIClient.ensure_valid_token')
+    @patch('banking.clients.tochka.TochkaAPIClient.get_statement')
+    def test_api_error_does_not_move_cursor(self, mock_statement, mock_token, bank_account):
+        from banking.tasks import sync_all_statements
+
+        mock_statement.side_effect = TochkaAPIError('boom', status_code=500)
+
+        assert sync_all_statements() == 0
+        bank_account.refresh_from_db()
+        assert bank_account.last_statement_date is None
+
+    @patch('banking.clients.tochka.TochkaAPIClient.ensure_valid_token')
+    @patch('banking.clients.tochka.TochkaAPIClient.get_statement')
+    def test_pool_clients_do_not_refresh_tokens(self, mock_statement, mock_token, bank_account):
+        """В потоках пула — token-only клиенты: токен обновляется только до fan-out."""
+        import threading
+
+        from banking.tasks import sync_all_statements
+
+        refresh_threads = []
+        mock_token.side_effect = lambda: refresh_threads.append(threading.current_thread())
+        mock_statement.return_value = {'Data': {'Statement': [_statement_tx('TK-1')]}}
+
+        assert sync_all_statements() == 1
+        assert refresh_threads == [threading.main_thread()]
+
+    def test_token_only_client_raises_on_401_without_db_writes(self):
+        import httpx
+
+        from banking.clients.tochka import TochkaAPIClient
+
+        connection = MagicMock()
+        connection.name = 'Точка'
+        connection.access_token = 'stale'
+        transport = httpx.MockTransport(lambda request: httpx.Response(401, text='expired'))
+        with httpx.Client(transport=transport) as http_client:
+            client = TochkaAPIClient.with_token(connection, http_client=http_client)
+            with pytest.raises(TochkaAPIError) as exc_info:
+                client.get_accounts_list()
+
+        assert exc_info.value.status_code == 401
+        connection.save.assert_not_called()
+
+
 # ===================================================================
 # process_webhook
 # ===================================================================
@@ -1,3 +1,7 @@
-from .product_matcher import ProductMatcher, compare_products_with_llm
+from .product_matcher import (
+    ProductMatcher,
+    compare_products_batch_with_llm,
+    compare_products_with_llm,
+)
 
-__all__ = ['ProductMatcher', 'compare_products_with_llm']
+__all__ = ['ProductMatcher', 'compare_products_batch_with_llm', 'compare_products_with_llm']
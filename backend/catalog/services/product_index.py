@@ -0,0 +1,343 @@
+"""
+Индекс кандидатов для ProductMatcher.
+
+Держит в памяти процесса normalized_name товаров и normalized_alias алиасов
+и инвертированный индекс «n-грамма → позиции записей». Поиск: по n-граммам
+запроса отбираем top-N записей с наибольшим числом общих n-грамм, дальше
+rapidfuzz.process.cdist считает token_set_ratio пачкой только по ним.
+Маленький каталог (до FULL_SCAN_LIMIT записей) сканируется целиком — так
+результат не зависит от отбора.
+
+Актуальность:
+- add_product / add_alias — инкрементальная запись без перестроения
+  (вызывается ProductMatcher сразу после create; применяется on_commit —
+  другие процессы не синкаются раньше, чем строка видна, а откаченные
+  записи в индекс не попадают);
+- товары/алиасы, созданные другими процессами, подтягиваются по версии в
+  Django cache (bump_version) — догрузкой id > watermark;
+- раз в REBUILD_SECONDS — полная перестройка (смена статусов, merge, удаления).
+"""
+import logging
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from rapidfuzz import fuzz, process
+
+from catalog.models import Product, ProductAlias
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (Product.Status.NEW, Product.Status.VERIFIED)
+
+
+def _grams(normalized: str) -> set:
+    """Триграммы слов с границами: ' ab', 'abc', 'bc '. Короткие слова тоже дают n-граммы."""
+    grams = set()
+    for word in normalized.split():
+        padded = f' {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class ProductIndex:
+    """N-граммный индекс товаров и алиасов (один на процесс, см. get_index)."""
+
+    VERSION_KEY = 'product_matcher_index_version'
+    REBUILD_SECONDS = 300       # Полная перестройка (смена статусов, merge)
+    FULL_SCAN_LIMIT = 2000      # До стольких записей — cdist по всем
+    CANDIDATE_LIMIT = 500       # Кандидатов на запрос после n-граммного отбора
+    STOP_GRAM_RATIO = 0.05      # n-грамма в > 5% записей почти не отбирает
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        self._version = None
+        self._reset()
+
+    def _reset(self) -> None:
+        # Параллельные списки: запись = товар или алиас товара.
+        self._product_ids: List[int] = []
+        self._names: List[str] = []
+        self._norms: List[str] = []
+        self._statuses: List[str] = []
+        self._postings: Dict[str, array] = {}
+        self._product_pos: Dict[int, int] = {}
+        self._seen_aliases: set = set()
+        self._product_watermark = 0
+        self._alias_watermark = 0
+
+    def __len__(self) -> int:
+        return len(self._norms)
+
+    # ------------------------------------------------------------------
+    # Наполнение
+    # ------------------------------------------------------------------
+
+    def _add_entry(self, product_id: int, name: str, normalized: str, status: str) -> int:
+        pos = len(self._norms)
+        self._product_ids.append(product_id)
+        self._names.append(name)
+        self._norms.append(normalized)
+        self._statuses.append(status)
+        for gram in _grams(normalized):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('i')
+            postings.append(pos)
+        return pos
+
+    def _load_products(self, rows: Iterable[Tuple]) -> None:
+        for pid, name, normalized, status in rows:
+            self._product_watermark = max(self._product_watermark, pid)
+            if pid not in self._product_pos:
+                self._product_pos[pid] = self._add_entry(pid, name, normalized, status)
+
+    def _load_aliases(self, rows: Iterable[Tuple]) -> None:
+        for alias_id, normalized, pid, name, status in rows:
+            if alias_id in self._seen_aliases:
+                continue
+            self._seen_aliases.add(alias_id)
+            self._alias_watermark = max(self._alias_watermark, alias_id)
+            self._add_entry(pid, name, normalized, status)
+
+    def _product_rows(self, min_id: int = 0):
+        return Product.objects.filter(
+            status__in=ACTIVE_STATUSES, id__gt=min_id,
+        ).values_list('id', 'name', 'normalized_name', 'status').iterator(chunk_size=5000)
+
+    def _alias_rows(self, min_id: int = 0):
+        return ProductAlias.objects.filter(
+            product__status__in=ACTIVE_STATUSES, id__gt=min_id,
+        ).values_list(
+            'id', 'normalized_alias', 'product_id', 'product__name', 'product__status',
+        ).iterator(chunk_size=5000)
+
+    def rebuild(self) -> None:
+        """Полная перестройка из БД."""
+        with self._lock:
+            started = time.monotonic()
+            self._version = cache.get(self.VERSION_KEY)
+            self._reset()
+            self._load_products(self._product_rows())
+            self._load_aliases(self._alias_rows())
+            self._built_at = time.monotonic()
+            logger.info(
+                'ProductIndex rebuilt: %d entries, %d grams in %.2fs',
+                len(self._norms), len(self._postings), self._built_at - started,
+            )
+
+    def sync(self) -> None:
+        """Актуализировать перед поиском: rebuild по TTL, иначе догрузка по версии."""
+        if self._built_at is None or time.monotonic() - self._built_at > self.REBUILD_SECONDS:
+            self.rebuild()
+            return
+        version = cache.get(self.VERSION_KEY)
+        if version == self._version:
+            return
+        if version is None:
+            # Ключ версии пропал (cache сброшен) — догрузке по watermark не верим.
+            self.rebuild()
+            return
+        with self._lock:
+            self._version = version
+            self._load_products(self._product_rows(self._product_watermark))
+            self._load_aliases(self._alias_rows(self._alias_watermark))
+
+    def invalidate(self) -> None:
+        """Сбросить индекс — следующий поиск перестроит его целиком."""
+        with self._lock:
+            self._built_at = None
+            self._reset()
+
+    @classmethod
+    def bump_version(cls) -> None:
+        """Сообщить остальным процессам, что в каталоге появились записи."""
+        try:
+            cache.incr(cls.VERSION_KEY)
+        except ValueError:
+            cache.set(cls.VERSION_KEY, 1, None)
+
+    def add_product(self, product: Product) -> None:
+        """Инкрементально добавить только что созданный товар."""
+        self.add_products([product])
+
+    def add_alias(self, alias: ProductAlias) -> None:
+        """Инкрементально добавить только что созданный алиас."""
+        self.add_aliases([alias])
+
+    def add_products(self, products: Iterable[Product]) -> None:
+        """Инкрементально добавить созданные товары (после коммита транзакции)."""
+        products = list(products)
+        transaction.on_commit(lambda: self._apply_products(products))
+
+    def add_aliases(self, aliases: Iterable[ProductAlias]) -> None:
+        """Инкрементально добавить созданные алиасы (после коммита транзакции)."""
+        aliases = list(aliases)
+        transaction.on_commit(lambda: self._apply_aliases(aliases))
+
+    def _apply_products(self, products: List[Product]) -> None:
+        with self._lock:
+            # Индекс ещё не построен — товары попадут в rebuild.
+            if self._built_at is not None:
+                for product in products:
+                    if product.pk not in self._product_pos and product.status in ACTIVE_STATUSES:
+                        self._product_pos[product.pk] = self._add_entry(
+                            product.pk, product.name, product.normalized_name, product.status,
+                        )
+        self.bump_version()
+
+    def _apply_aliases(self, aliases: List[ProductAlias]) -> None:
+        with self._lock:
+            if self._built_at is not None:
+                for alias in aliases:
+                    product = alias.product
+                    if alias.pk not in self._seen_aliases and product.status in ACTIVE_STATUSES:
+                        self._seen_aliases.add(alias.pk)
+                        self._add_entry(
+                            product.pk, product.name, alias.normalized_alias, product.status,
+                        )
+        self.bump_version()
+
+    # ------------------------------------------------------------------
+    # Поиск
+    # ------------------------------------------------------------------
+
+    def candidates(self, normalized: str) -> np.ndarray:
+        """Позиции записей-кандидатов для запроса."""
+        total = len(self._norms)
+        if total <= self.FULL_SCAN_LIMIT:
+            return np.arange(total)
+        stop = max(1, int(total * self.STOP_GRAM_RATIO))
+        with self._lock:
+            lists = [self._postings[g] for g in _grams(normalized) if g in self._postings]
+            selective = [p for p in lists if len(p) <= stop] or lists
+            if not selective:
+                return np.empty(0, dtype=np.int64)
+            hits = np.concatenate([np.frombuffer(p, dtype=np.int32) for p in selective])
+        counts = np.bincount(hits, minlength=total)
+        matched = np.flatnonzero(counts)
+        if len(matched) > self.CANDIDATE_LIMIT:
+            top = np.argpartition(counts[matched], -self.CANDIDATE_LIMIT)[-self.CANDIDATE_LIMIT:]
+            matched = matched[top]
+        return matched
+
+    def score(
+        self,
+        queries: Sequence[str],
+        positions: np.ndarray,
+        threshold: float,
+    ) -> np.ndarray:
+        """Матрица token_set_ratio (0-100) запросы × записи positions."""
+        choices = [self._norms[i] for i in positions]
+        return process.cdist(
+            queries, choices,
+            scorer=fuzz.token_set_ratio,
+            score_cutoff=threshold * 100,
+            dtype=np.float64,
+        )
+
+    def search(
+        self,
+        normalized: str,
+        threshold: float,
+        limit: int,
+        statuses: Sequence[str] = ACTIVE_STATUSES,
+    ) -> List[Dict]:
+        """Товары, похожие на normalized (лучший score по товару и его алиасам)."""
+        with self._lock:
+            return self._search(normalized, threshold, limit, statuses)
+
+    def search_many(
+        self,
+        queries: Sequence[str],
+        threshold: float,
+        limit: int,
+        statuses: Sequence[str] = ACTIVE_STATUSES,
+    ) -> List[List[Dict]]:
+        """Пакетный search: один проход скоринга на все запросы.
+
+        Маленький каталог — матрица cdist запросы × все записи; большой —
+        cpdist по плоскому списку пар (запрос, его кандидат), без декартова
+        произведения объединённых кандидатов.
+        """
+        if not queries:
+            return []
+        with self._lock:
+            total = len(self._norms)
+            if not total:
+                return [[] for _ in queries]
+            if total <= self.FULL_SCAN_LIMIT:
+                positions = np.arange(total)
+                matrix = self.score(queries, positions, threshold)
+                return [self._collect(positions, row, limit, statuses) for row in matrix]
+            per_query = [self.candidates(q) for q in queries]
+            flat_positions = np.concatenate(per_query)
+            if not len(flat_positions):
+                return [[] for _ in queries]
+            flat_queries = [q for q, pos in zip(queries, per_query) for _ in range(len(pos))]
+            flat_scores = process.cpdist(
+                flat_queries, [self._norms[i] for i in flat_positions],
+                scorer=fuzz.token_set_ratio,
+                score_cutoff=threshold * 100,
+                dtype=np.float64,
+            )
+            offsets = np.cumsum([len(pos) for pos in per_query])[:-1]
+            return [
+                self._collect(pos, scores, limit, statuses)
+                for pos, scores in zip(per_query, np.split(flat_scores, offsets))
+            ]
+
+    def _search(self, normalized, threshold, limit, statuses) -> List[Dict]:
+        positions = self.candidates(normalized)
+        if not len(positions):
+            return []
+        scores = self.score([normalized], positions, threshold)[0]
+        return self._collect(positions, scores, limit, statuses)
+
+    def _collect(self, positions, scores, limit, statuses) -> List[Dict]:
+        """Строка скоров → лучший score по товару, по убыванию, не больше limit."""
+        best: Dict[int, Dict] = {}
+        for idx in np.flatnonzero(scores):
+            pos = positions[idx]
+            if self._statuses[pos] not in statuses:
+                continue
+            product_id = self._product_ids[pos]
+            value = float(scores[idx]) / 100.0
+            current = best.get(product_id)
+            if current is None or value > current['score']:
+                best[product_id] = {
+                    'product_id': product_id,
+                    'product_name': self._names[pos],
+                    'score': value,
+                }
+        results = sorted(best.values(), key=lambda x: x['score'], reverse=True)
+        return results[:limit]
+
+    def products(self, statuses: Sequence[str]) -> List[Tuple[int, str, str]]:
+        """(id, name, normalized) товаров с нужными статусами (без алиасов)."""
+        with self._lock:
+            return [
+                (pid, self._names[pos], self._norms[pos])
+                for pid, pos in self._product_pos.items()
+                if self._statuses[pos] in statuses
+            ]
+
+
+_index: Optional[ProductIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> ProductIndex:
+    """Индекс процесса (создаётся лениво, строится при первом sync)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ProductIndex()
+    return _index
@@ -1,11 +1,11 @@
 import json
 import logging
-from typing import List, Dict, Optional
-from functools import lru_cache
-from django.db.models import Q
-from django.core.cache import cache
-from rapidfuzz import fuzz
+import warnings
+from typing import List, Dict, Optional, Sequence, Tuple
+from django.db import transaction
+from rapidfuzz import fuzz, process
 from catalog.models import Product, ProductAlias
+from catalog.services.product_index import ProductIndex, get_index
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +18,9 @@ class ProductMatcher:
     1. Exact / Alias / Fuzzy (>= 0.95) — автоматическое совпадение
     2. LLM-сравнение (0.60-0.95) — семантическая проверка для top-5 кандидатов
     
-    Оптимизации:
-    - Предварительная фильтрация по первым словам для сокращения выборки
-    - Кэширование списка товаров на уровне instance
-    - Batch-обработка для find_duplicates
+    Кандидаты для fuzzy — из ProductIndex (n-граммный индекс процесса по
+    товарам и алиасам, см. product_index.py), скоринг — rapidfuzz cdist.
+    Созданные товары/алиасы дописываются в индекс инкрементально.
     """
     
     EXACT_THRESHOLD = 0.95     # Точное совпадение (автоматически)
@@ -29,60 +28,17 @@ class ProductMatcher:
     LLM_THRESHOLD = 0.60       # Отправить в LLM для проверки
     LLM_CONFIDENCE_THRESHOLD = 0.8  # Минимальная уверенность LLM для подтверждения
     ALIAS_THRESHOLD = 0.7
-    CACHE_KEY = 'product_matcher_products'
-    CACHE_TIMEOUT = 300  # 5 минут
     
-    def __init__(self):
-        self._products_cache = None
-    
-    def _get_products_list(self, statuses=None, force_refresh: bool = False):
-        """Получает список товаров с кэшированием"""
-        if statuses is None:
-            statuses = [Product.Status.NEW, Product.Status.VERIFIED]
-        
-        # Кэш на уровне instance для одного сеанса работы
-        if self._products_cache is not None and not force_refresh:
-            return self._products_cache
-        
-        # Пытаемся получить из Django cache
-        cache_key = f"{self.CACHE_KEY}_{'-'.join(statuses)}"
-        cached = cache.get(cache_key)
-        
-        if cached is not None and not force_refresh:
-            self._products_cache = cached
-            return cached
-        
-        # Загружаем из БД
-        products = list(Product.objects.filter(
-            status__in=statuses
-        ).values_list('id', 'name', 'normalized_name'))
-        
-        # Сохраняем в кэш
-        cache.set(cache_key, products, self.CACHE_TIMEOUT)
-        self._products_cache = products
-        
-        return products
+    def _get_index(self) -> ProductIndex:
+        """Актуальный индекс кандидатов процесса."""
+        index = get_index()
+        index.sync()
+        return index
     
     def invalidate_cache(self):
-        """Инвалидирует кэш товаров (вызывать после создания/изменения товаров)"""
-        self._products_cache = None
-        # Удаляем известные ключи кэша (delete_pattern есть не везде).
-        # Ключи формируются как f"{CACHE_KEY}_{'-'.join(statuses)}", где statuses — values enum.
-        status_new = Product.Status.NEW
-        status_verified = Product.Status.VERIFIED
-        known_status_sets = [
-            [status_new],
-            [status_verified],
-            [status_new, status_verified],
-            [status_verified, status_new],
-        ]
-        for statuses in known_status_sets:
-            cache.delete(f"{self.CACHE_KEY}_{'-'.join(statuses)}")
-    
-    def _extract_first_word(self, normalized: str) -> str:
-        """Извлекает первое слово для предварительной фильтрации"""
-        words = normalized.split()
-        return words[0] if words else ''
+        """Полный сброс индекса (после массовых изменений каталога: merge, смена статусов)."""
+        get_index().invalidate()
+        ProductIndex.bump_version()
     
     def find_or_create_product(
         self,
@@ -125,14 +81,15 @@ class ProductMatcher:
         # 3. Fuzzy поиск — уверенное совпадение (>= 0.80) → создаём alias и используем существующий товар.
         # Это снижает риск задвоений номенклатуры в снабжении.
         high_similar = self.find_similar(normalized, threshold=self.FUZZY_THRESHOLD, limit=1)
-        if high_similar:
-            product = Product.objects.get(pk=high_similar[0]['product_id'])
-            ProductAlias.objects.create(
+        # Индекс мог пережить удаление товара — проверяем по БД.
+        product = high_similar and Product.objects.filter(pk=high_similar[0]['product_id']).first()
+        if product:
+            alias = ProductAlias.objects.create(
                 product=product,
                 alias_name=name,
                 source_payment=payment,
             )
-            self.invalidate_cache()
+            get_index().add_alias(alias)
             return product, False
         
         # 4. LLM-уровень — средняя точность (0.60-0.95)
@@ -148,9 +105,169 @@ class ProductMatcher:
             status=Product.Status.NEW,
             created_from_payment=payment,
         )
-        self.invalidate_cache()
+        get_index().add_product(product)
         return product, True
     
+    def find_or_create_products(
+        self,
+        items: Sequence[Tuple[str, str]],
+        payment=None,
+        use_llm: bool = True,
+    ) -> List[tuple]:
+        """
+        Пакетный find_or_create_product для всех позиций документа.
+        
+        Те же уровни, что у одиночного метода, но каждый — одним проходом:
+        exact и alias — по одному IN-запросу, fuzzy — один проход скоринга
+        по индексу, неоднозначные — сгруппированным LLM-промптом, новые
+        товары и алиасы — bulk_create. Одинаковые (после нормализации)
+        позиции получают один товар; похожие друг на друга новые позиции
+        не плодят дублей — вторая становится алиасом первой.
+        
+        Args:
+            items: [(name, unit), ...]
+        
+        Returns:
+            [(Product, created: bool), ...] — в порядке items
+        """
+        normalized = [Product.normalize_name(name) for name, _unit in items]
+        resolved: Dict[str, Product] = {}
+        
+        # 1. Точные совпадения по normalized_name
+        for product in Product.objects.filter(
+            normalized_name__in=set(normalized),
+            status__in=[Product.Status.NEW, Product.Status.VERIFIED],
+        ):
+            resolved.setdefault(product.normalized_name, product)
+        
+        # 2. Алиасы
+        pending = {norm for norm in normalized if norm not in resolved}
+        if pending:
+            for alias in ProductAlias.objects.filter(
+                normalized_alias__in=pending,
+                product__status__in=[Product.Status.NEW, Product.Status.VERIFIED],
+            ).select_related('product').order_by('id'):
+                resolved.setdefault(alias.normalized_alias, alias.product)
+        
+        # Первая позиция с данным normalized — представитель группы.
+        first_by_norm: Dict[str, int] = {}
+        for i, norm in enumerate(normalized):
+            if norm not in resolved:
+                first_by_norm.setdefault(norm, i)
+        pending_norms = list(first_by_norm)
+        
+        # 3-4. Fuzzy (>= 0.80) → алиас; 0.60-0.80 → кандидаты для LLM
+        new_aliases: List[ProductAlias] = []
+        to_llm: List[Tuple[str, List[Dict]]] = []
+        if pending_norms:
+            matches = self._get_index().search_many(
+                pending_norms, threshold=self.LLM_THRESHOLD, limit=5,
+            )
+            # Индекс мог пережить удаление товара — проверяем по БД.
+            existing = Product.objects.in_bulk({
+                m['product_id'] for found in matches for m in found
+            })
+            for norm, found in zip(pending_norms, matches):
+                found = [m for m in found if m['product_id'] in existing]
+                name = items[first_by_norm[norm]][0]
+                if found and found[0]['score'] >= self.FUZZY_THRESHOLD:
+                    resolved[norm] = existing[found[0]['product_id']]
+                    new_aliases.append(self._new_alias(resolved[norm], name, payment))
+                elif found and use_llm:
+                    to_llm.append((norm, found))
+        
+        if to_llm:
+            verdicts = compare_products_batch_with_llm([
+                (items[first_by_norm[norm]][0], [c['product_name'] for c in candidates])
+                for norm, candidates in to_llm
+            ])
+            for (norm, candidates), results in zip(to_llm, verdicts):
+                for i, result in enumerate(results[:len(candidates)]):
+                    if (
+                        result.get('is_same', False)
+                        and result.get('confidence', 0) >= self.LLM_CONFIDENCE_THRESHOLD
+                    ):
+                        product = existing[candidates[i]['product_id']]
+                        resolved[norm] = product
+                        new_aliases.append(
+                            self._new_alias(product, items[first_by_norm[norm]][0], payment)
+                        )
+                        logger.info(
+                            'LLM confirmed match: "%s" → "%s" (confidence=%.2f)',
+                            items[first_by_norm[norm]][0], product.name, result['confidence'],
+                        )
+                        break
+        
+        # 5. Новые товары; похожие между собой новые позиции — один товар + алиасы
+        to_create = [norm for norm in pending_norms if norm not in resolved]
+        new_products: List[Product] = []
+        alias_of: Dict[str, int] = {}
+        if to_create:
+            similarity = process.cdist(
+                to_create, to_create,
+                scorer=fuzz.token_set_ratio,
+                score_cutoff=self.FUZZY_THRESHOLD * 100,
+            )
+            owners: List[int] = []
+            for j, norm in enumerate(to_create):
+                owner = next((i for i in owners if similarity[j][i]), None)
+                if owner is None:
+                    owners.append(j)
+                    name, unit = items[first_by_norm[norm]]
+                    new_products.append(Product(
+                        name=name,
+                        normalized_name=norm,  # bulk_create не вызывает save()
+                        default_unit=unit or 'шт',
+                        status=Product.Status.NEW,
+                        created_from_payment=payment,
+                    ))
+                else:
+                    alias_of[norm] = owner
+        
+        with transaction.atomic():
+            if new_products:
+                Product.objects.bulk_create(new_products)
+                by_owner = dict(zip(
+                    [j for j, norm in enumerate(to_create) if norm not in alias_of],
+                    new_products,
+                ))
+                for j, norm in enumerate(to_create):
+                    product = by_owner.get(j) or by_owner[alias_of[norm]]
+                    resolved[norm] = product
+                    if norm in alias_of:
+                        new_aliases.append(
+                            self._new_alias(product, items[first_by_norm[norm]][0], payment)
+                        )
+            if new_aliases:
+                ProductAlias.objects.bulk_create(new_aliases)
+        
+        index = get_index()
+        if new_products:
+            index.add_products(new_products)
+        if new_aliases:
+            index.add_aliases(new_aliases)
+        
+        created_ids = {product.pk for product in new_products}
+        results = []
+        for i, norm in enumerate(normalized):
+            product = resolved[norm]
+            # created=True только у первой позиции, породившей товар
+            created = product.pk in created_ids and first_by_norm.get(norm) == i
+            if created:
+                created_ids.discard(product.pk)
+            results.append((product, created))
+        return results
+    
+    @staticmethod
+    def _new_alias(product: Product, name: str, payment=None) -> ProductAlias:
+        """Несохранённый алиас для bulk_create (normalized_alias — вручную)."""
+        return ProductAlias(
+            product=product,
+            alias_name=name,
+            normalized_alias=Product.normalize_name(name),
+            source_payment=payment,
+        )
+    
     def _try_llm_match(
         self, name: str, normalized: str, payment=None
     ) -> Optional[Product]:
@@ -188,13 +305,16 @@ class ProductMatcher:
                     and result.get('confidence', 0) >= self.LLM_CONFIDENCE_THRESHOLD
                     and i < len(candidates)
                 ):
-                    product = Product.objects.get(pk=candidates[i]['product_id'])
-                    ProductAlias.objects.create(
+                    # Индекс мог пережить удаление товара — проверяем по БД.
+                    product = Product.objects.filter(pk=candidates[i]['product_id']).first()
+                    if product is None:
+                        continue
+                    alias = ProductAlias.objects.create(
                         product=product,
                         alias_name=name,
                         source_payment=payment,
                     )
-                    self.invalidate_cache()
+                    get_index().add_alias(alias)
                     logger.info(
                         'LLM confirmed match: "%s" → "%s" (confidence=%.2f)',
                         name, product.name, result['confidence'],
@@ -211,104 +331,57 @@ class ProductMatcher:
         name: str,
         threshold: float = 0.7,
         limit: int = 10,
-        prefilter: bool = False  # Отключено по умолчанию для надежности
+        prefilter: Optional[bool] = None
     ) -> List[Dict]:
         """
-        Находит похожие товары по названию.
+        Находит похожие товары по названию (с учётом алиасов).
         
         Args:
             name: Название для поиска
             threshold: Минимальный порог схожести (0-1)
             limit: Максимальное количество результатов
-            prefilter: Использовать предварительную фильтрацию по первому слову
+            prefilter: Устарел и игнорируется — отбор кандидатов всегда
+                делает индекс (ProductIndex.candidates)
         """
+        if prefilter is not None:
+            warnings.warn(
+                'ProductMatcher.find_similar(prefilter=...) устарел и игнорируется',
+                DeprecationWarning,
+                stacklevel=2,
+            )
         normalized = Product.normalize_name(name) if not name.islower() else name
-        
-        # Получаем товары из кэша
-        products = self._get_products_list()
-        
-        # Предварительная фильтрация по первому слову (опционально, для больших каталогов)
-        if prefilter and len(products) > 1000 and len(normalized) > 3:
-            first_word = self._extract_first_word(normalized)
-            if len(first_word) >= 3:
-                # Фильтруем только те, что начинаются с той же буквы или содержат первое слово
-                filtered_products = [
-                    (pid, pname, pnorm) for pid, pname, pnorm in products
-                    if pnorm.startswith(first_word[:2]) or first_word in pnorm
-                ]
-                # Если после фильтрации осталось достаточно товаров, используем их
-                if len(filtered_products) >= 10:
-                    products = filtered_products
-        
-        results = []
-        for prod_id, prod_name, prod_normalized in products:
-            # Используем token_set_ratio для лучшего сравнения
-            score = fuzz.token_set_ratio(normalized, prod_normalized) / 100.0
-            
-            if score >= threshold:
-                results.append({
-                    'product_id': prod_id,
-                    'product_name': prod_name,
-                    'score': score
-                })
-        
-        # Сортируем по score и берём limit
-        results.sort(key=lambda x: x['score'], reverse=True)
-        return results[:limit]
+        return self._get_index().search(normalized, threshold=threshold, limit=limit)
     
     def find_duplicates(self, threshold: float = 0.8, limit: int = 50) -> List[Dict]:
         """
-        Находит потенциальные дубликаты среди товаров.
+        Находит потенциальные дубликаты среди товаров со статусом NEW.
         
-        Оптимизации:
-        - Использует кэшированный список товаров
-        - Ранний выход при достижении лимита
-        - Пропуск уже проверенных пар
+        Для каждого товара — кандидаты из индекса (общие n-граммы), а не
+        перебор всех пар; пары учитываются один раз (id2 > id1).
         """
-        products = self._get_products_list(statuses=[Product.Status.NEW])
-        
-        if not products:
-            return []
+        index = self._get_index()
+        statuses = [Product.Status.NEW]
+        products = index.products(statuses)
         
         duplicates = []
         checked = set()
         
-        # Группируем товары по первой букве для оптимизации
-        by_first_letter = {}
-        for prod_id, prod_name, prod_norm in products:
-            first_letter = prod_norm[0] if prod_norm else ''
-            if first_letter not in by_first_letter:
-                by_first_letter[first_letter] = []
-            by_first_letter[first_letter].append((prod_id, prod_name, prod_norm))
-        
-        for i, (id1, name1, norm1) in enumerate(products):
+        for id1, name1, norm1 in products:
             if id1 in checked:
                 continue
             
             if len(duplicates) >= limit:
                 break
             
-            similar = []
-            first_letter = norm1[0] if norm1 else ''
-            
-            # Сначала проверяем товары с той же первой буквой
-            candidates = by_first_letter.get(first_letter, [])
-            
-            for id2, name2, norm2 in candidates:
-                if id2 <= id1 or id2 in checked:
-                    continue
-                
-                score = fuzz.token_set_ratio(norm1, norm2) / 100.0
-                if score >= threshold:
-                    similar.append({
-                        'id': id2,
-                        'name': name2,
-                        'score': score
-                    })
-                    checked.add(id2)
+            similar = [
+                {'id': match['product_id'], 'name': match['product_name'], 'score': match['score']}
+                for match in index.search(norm1, threshold=threshold, limit=len(index), statuses=statuses)
+                if match['product_id'] > id1 and match['product_id'] not in checked
+            ]
             
             if similar:
                 checked.add(id1)
+                checked.update(item['id'] for item in similar)
                 duplicates.append({
                     'product': {'id': id1, 'name': name1},
                     'similar': similar
@@ -321,6 +394,19 @@ class ProductMatcher:
 # LLM-сравнение товаров — вспомогательная функция
 # =============================================================================
 
+_MATCHING_RULES = """Правила:
+- is_same=true только если это ТОЧНО один и тот же товар/услуга
+- confidence — уверенность от 0.0 до 1.0
+- Учитывай: единицы измерения, размеры, бренд, тип
+- "Болт М6х30" и "Болт М6х30 оцинк." — РАЗНЫЕ товары (разное покрытие)
+- "Болт 6мм" и "Болт 6 мм" — ОДИНАКОВЫЕ товары (пробел)
+- Ответь ТОЛЬКО JSON без markdown."""
+
+# Позиций в одном запросе compare_products_batch_with_llm (ответ — до 5 объектов
+# на позицию, больший промпт упирается в лимит output-токенов).
+LLM_BATCH_SIZE = 25
+
+
 def compare_products_with_llm(
     product_name: str,
     candidates: List[str],
@@ -363,13 +449,7 @@ def compare_products_with_llm(
   {{"candidate_index": 1, "is_same": true/false, "confidence": 0.0-1.0, "reason": "краткое пояснение"}}
 ]
 
-Правила:
-- is_same=true только если это ТОЧНО один и тот же товар/услуга
-- confidence — уверенность от 0.0 до 1.0
-- Учитывай: единицы измерения, размеры, бренд, тип
-- "Болт М6х30" и "Болт М6х30 оцинк." — РАЗНЫЕ товары (разное покрытие)
-- "Болт 6мм" и "Болт 6 мм" — ОДИНАКОВЫЕ товары (пробел)
-- Ответь ТОЛЬКО JSON без markdown."""
+{_MATCHING_RULES}"""
 
     try:
         result = provider.chat_completion(system_prompt, user_prompt)
@@ -384,3 +464,76 @@ def compare_products_with_llm(
     except Exception as exc:
         logger.warning('LLM product comparison error: %s', exc)
         return []
+
+
+def compare_products_batch_with_llm(
+    lines: List[Tuple[str, List[str]]],
+) -> List[List[Dict]]:
+    """
+    Сравнивает несколько позиций с их кандидатами сгруппированным промптом.
+
+    Один запрос на LLM_BATCH_SIZE позиций вместо запроса на позицию.
+
+    Args:
+        lines: [(название из счёта, [названия кандидатов (макс 5)]), ...]
+
+    Returns:
+        Для каждой позиции — список результатов по её кандидатам (как у
+        compare_products_with_llm); при ошибке — пустые списки.
+    """
+    from llm_services.models import LLMTaskConfig
+    from llm_services.providers import get_provider
+
+    verdicts: List[List[Dict]] = [[] for _ in lines]
+    if not lines:
+        return verdicts
+    try:
+        provider_model = LLMTaskConfig.get_provider_for_task('product_matching')
+        provider = get_provider(provider_model)
+    except Exception as exc:
+        logger.warning('LLM provider unavailable for product_matching: %s', exc)
+        return verdicts
+
+    system_prompt = 'Ты эксперт по сопоставлению товаров. Отвечай только JSON.'
+    for start in range(0, len(lines), LLM_BATCH_SIZE):
+        chunk = lines[start:start + LLM_BATCH_SIZE]
+        lines_text = '\n'.join(
+            f'{n + 1}. "{name}"\n' + '\n'.join(
+                f'   {i + 1}) "{c}"' for i, c in enumerate(candidates)
+            )
+            for n, (name, candidates) in enumerate(chunk)
+        )
+        user_prompt = f"""Для каждой позиции счёта сравни её с кандидатами из каталога (перечислены под позицией).
+Определи, является ли товар тем же самым (возможно записан немного по-другому).
+
+Позиции и кандидаты:
+{lines_text}
+
+Ответь строго в формате JSON — массив объектов, по одному на каждую пару позиция-кандидат:
+[
+  {{"line_index": 1, "candidate_index": 1, "is_same": true/false, "confidence": 0.0-1.0}}
+]
+
+{_MATCHING_RULES}"""
+
+        try:
+            result = provider.chat_completion(system_prompt, user_prompt)
+        except Exception as exc:
+            logger.warning('LLM batch product comparison error: %s', exc)
+            continue
+        if isinstance(result, dict) and not result.get('text'):
+            result = [result]
+        if not isinstance(result, list):
+            continue
+        for entry in result:
+            try:
+                line = int(entry['line_index']) - 1
+                candidate = int(entry['candidate_index']) - 1
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not (0 <= line < len(chunk) and 0 <= candidate < len(chunk[line][1])):
+                continue
+            row = verdicts[start + line]
+            row.extend({} for _ in range(candidate + 1 - len(row)))
+            row[candidate] = entry
+    return verdicts
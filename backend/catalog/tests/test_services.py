@@ -8,7 +8,12 @@ from django.test import TestCase
 from django.core.cache import cache
 
 from catalog.models import Product, ProductAlias
-from catalog.services import ProductMatcher, compare_products_with_llm
+from catalog.services import (
+    ProductMatcher,
+    compare_products_batch_with_llm,
+    compare_products_with_llm,
+)
+from catalog.services.product_index import ProductIndex
 
 
 class ProductMatcherNormalizeTest(TestCase):
@@ -32,48 +37,78 @@ class ProductMatcherNormalizeTest(TestCase):
         self.assertEqual(Product.normalize_name(""), "")
 
 
-class ProductMatcherExtractFirstWordTest(TestCase):
-    """Тесты _extract_first_word."""
-
-    def setUp(self):
-        self.matcher = ProductMatcher()
-
-    def test_extract_first_word_normal(self):
-        self.assertEqual(self.matcher._extract_first_word("вентилятор канальный"), "вентилятор")
-
-    def test_extract_first_word_single(self):
-        self.assertEqual(self.matcher._extract_first_word("болт"), "болт")
-
-    def test_extract_first_word_empty(self):
-        self.assertEqual(self.matcher._extract_first_word(""), "")
-
-
-class ProductMatcherCacheTest(TestCase):
-    """Тесты кэширования в ProductMatcher."""
+class ProductIndexTest(TestCase):
+    """Тесты n-граммного индекса кандидатов."""
 
     def setUp(self):
         Product.objects.all().delete()
         ProductAlias.objects.all().delete()
         cache.clear()
         self.matcher = ProductMatcher()
+        self.matcher.invalidate_cache()
+
+    def test_created_product_added_without_rebuild(self):
+        """Созданный товар попадает в индекс инкрементально, без перестройки."""
+        Product.objects.create(name="Вентилятор канальный ВКК-125", status=Product.Status.VERIFIED)
+        self.matcher.find_similar("вентилятор", threshold=0.9)
+
+        with patch.object(ProductIndex, 'rebuild') as rebuild_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                product, created = self.matcher.find_or_create_product(
+                    "Кабель силовой ВВГнг 3x2.5", use_llm=False,
+                )
+            similar = self.matcher.find_similar("Кабель ВВГнг 3x2.5 силовой", threshold=0.8)
 
-    def test_invalidate_cache_clears_instance_cache(self):
-        self.matcher._products_cache = [("fake",)]
+        self.assertTrue(created)
+        rebuild_mock.assert_not_called()
+        self.assertEqual(similar[0]['product_id'], product.id)
+
+    def test_index_updated_only_after_commit(self):
+        """Запись в индекс и bump версии — on_commit: откат не оставляет фантомов."""
+        Product.objects.create(name="Вентилятор канальный ВКК-125", status=Product.Status.VERIFIED)
+        self.matcher.find_similar("вентилятор", threshold=0.9)
+
+        with patch.object(ProductIndex, 'bump_version') as bump_mock:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                product, _ = self.matcher.find_or_create_product(
+                    "Кабель силовой ВВГнг 3x2.5", use_llm=False,
+                )
+            bump_mock.assert_not_called()
+            self.assertEqual(
+                self.matcher.find_similar("Кабель ВВГнг 3x2.5 силовой", threshold=0.8), [],
+            )
+            for callback in callbacks:
+                callback()
+            bump_mock.assert_called_once()
+        similar = self.matcher.find_similar("Кабель ВВГнг 3x2.5 силовой", threshold=0.8)
+        self.assertEqual(similar[0]['product_id'], product.id)
+
+    def test_alias_matches_product(self):
+        """Fuzzy-совпадение по алиасу возвращает товар алиаса."""
+        product = Product.objects.create(name="Воздуховод оцинкованный", status=Product.Status.VERIFIED)
+        ProductAlias.objects.create(product=product, alias_name="Труба спиральная D160")
         self.matcher.invalidate_cache()
-        self.assertIsNone(self.matcher._products_cache)
 
-    def test_get_products_list_uses_instance_cache(self):
-        """Повторный вызов не обращается к БД, если instance cache есть."""
-        fake_data = [(1, "Product A", "product a")]
-        self.matcher._products_cache = fake_data
-        result = self.matcher._get_products_list()
-        self.assertEqual(result, fake_data)
+        similar = self.matcher.find_similar("Труба спиральная D 160", threshold=0.8)
+        self.assertEqual(len(similar), 1)
+        self.assertEqual(similar[0]['product_id'], product.id)
+        self.assertEqual(similar[0]['product_name'], product.name)
+
+    def test_candidates_prefilter_large_catalog(self):
+        """На большом каталоге cdist идёт только по кандидатам с общими n-граммами."""
+        index = ProductIndex()
+        for i in range(50):
+            index._add_entry(i, f"item {i}", f"гвозди строительные {i}", Product.Status.NEW)
+        index._add_entry(50, "Болт", "болт м6х30 оцинкованный", Product.Status.NEW)
+        index._built_at = 0
+
+        with patch.object(ProductIndex, 'FULL_SCAN_LIMIT', 10):
+            positions = index.candidates("болт м6х30")
+            results = index.search("болт м6х30", threshold=0.8, limit=5)
 
-    def test_get_products_list_loads_from_db(self):
-        Product.objects.create(name="Тестовый товар", status=Product.Status.NEW)
-        result = self.matcher._get_products_list(force_refresh=True)
-        self.assertEqual(len(result), 1)
-        self.assertEqual(result[0][1], "Тестовый товар")
+        self.assertLess(len(positions), 51)
+        self.assertIn(50, positions)
+        self.assertEqual(results[0]['product_id'], 50)
 
 
 class ProductMatcherFindSimilarTest(TestCase):
@@ -122,15 +157,17 @@ class ProductMatcherFindSimilarTest(TestCase):
         self.assertIn('product_name', item)
         self.assertIn('score', item)
 
-    def test_find_similar_prefilter_option(self):
-        """Prefilter не ломает результат для большого каталога."""
-        similar = self.matcher.find_similar(
-            "Вентилятор канальный ВКК-125",
-            threshold=0.7,
-            prefilter=True,
+    def test_find_similar_prefilter_deprecated(self):
+        """prefilter устарел: предупреждение, результат тот же."""
+        with self.assertWarns(DeprecationWarning):
+            similar = self.matcher.find_similar(
+                "Вентилятор канальный ВКК-125",
+                threshold=0.7,
+                prefilter=True,
+            )
+        self.assertEqual(
+            similar, self.matcher.find_similar("Вентилятор канальный ВКК-125", threshold=0.7),
         )
-        # prefilter активируется только при > 1000 товарах, поэтому результат тот же
-        self.assertTrue(len(similar) >= 0)
 
 
 class ProductMatcherFindOrCreateTest(TestCase):
@@ -181,6 +218,109 @@ class ProductMatcherFindOrCreateTest(TestCase):
         self.assertTrue(created)
 
 
+class ProductMatcherBatchTest(TestCase):
+    """Тесты find_or_create_products."""
+
+    def setUp(self):
+        Product.objects.all().delete()
+        ProductAlias.objects.all().delete()
+        cache.clear()
+        self.matcher = ProductMatcher()
+
+        self.fan = Product.objects.create(name="Вентилятор канальный ВКК-125", status=Product.Status.VERIFIED)
+        self.bolt = Product.objects.create(name="Болт М6х30", status=Product.Status.VERIFIED)
+        ProductAlias.objects.create(product=self.bolt, alias_name="Болт шестигранный 6х30")
+        self.matcher.invalidate_cache()
+
+    def test_resolves_all_levels_in_order(self):
+        items = [
+            ("Вентилятор канальный ВКК-125", "шт"),     # exact
+            ("Болт шестигранный 6х30", "шт"),           # alias
+            ("Канальный вентилятор ВКК 125", "шт"),     # fuzzy → alias
+            ("Кабель силовой ВВГнг 3x2.5", "м"),        # новый
+            ("кабель силовой ВВГнг 3x2.5", "м"),        # тот же после нормализации
+        ]
+        results = self.matcher.find_or_create_products(items, use_llm=False)
+
+        self.assertEqual([p.id for p, _ in results[:3]], [self.fan.id, self.bolt.id, self.fan.id])
+        self.assertEqual([c for _, c in results], [False, False, False, True, False])
+        cable = results[3][0]
+        self.assertEqual(results[4][0].id, cable.id)
+        self.assertEqual(cable.default_unit, "м")
+        self.assertEqual(cable.normalized_name, Product.normalize_name("Кабель силовой ВВГнг 3x2.5"))
+        self.assertTrue(ProductAlias.objects.filter(
+            product=self.fan, alias_name="Канальный вентилятор ВКК 125",
+        ).exists())
+
+    def test_queries_do_not_grow_with_lines(self):
+        """Новые позиции создаются одним bulk_create, без запросов на строку."""
+        self.matcher.find_similar("прогрев индекса")
+        items = [(f"Уникальная позиция {chr(0x430 + i)}{i * 7919}", "шт") for i in range(30)]
+        # exact + alias + (savepoint) bulk_create товаров и алиасов; sync
+        # выключен — версию индекса в общем cache могут сдвинуть другие тесты.
+        with patch.object(ProductIndex, 'sync'), self.assertNumQueries(6):
+            results = self.matcher.find_or_create_products(items, use_llm=False)
+        self.assertEqual(len(results), 30)
+        self.assertTrue(all(p.pk for p, _ in results))
+
+    def test_similar_new_lines_become_aliases(self):
+        """Похожие друг на друга новые позиции не плодят дубли."""
+        results = self.matcher.find_or_create_products(
+            [("Гвозди строительные 50мм", "кг"), ("Гвозди строительные 50 мм", "кг")],
+            use_llm=False,
+        )
+        self.assertEqual(results[0][0].id, results[1][0].id)
+        self.assertEqual([c for _, c in results], [True, False])
+        self.assertTrue(ProductAlias.objects.filter(
+            product=results[0][0], alias_name="Гвозди строительные 50 мм",
+        ).exists())
+
+    @patch('catalog.services.product_matcher.compare_products_batch_with_llm')
+    def test_ambiguous_lines_grouped_into_one_llm_call(self, mock_llm):
+        with patch.object(ProductIndex, 'search_many') as mock_search:
+            mock_search.return_value = [
+                [{'product_id': self.bolt.id, 'product_name': self.bolt.name, 'score': 0.7}],
+                [{'product_id': self.fan.id, 'product_name': self.fan.name, 'score': 0.65}],
+            ]
+            mock_llm.return_value = [
+                [{'is_same': True, 'confidence': 0.9}],
+                [{'is_same': False, 'confidence': 0.9}],
+            ]
+            results = self.matcher.find_or_create_products(
+                [("Болт M6 x 30 din", "шт"), ("Вентилятор осевой", "шт")],
+            )
+
+        mock_llm.assert_called_once_with([
+            ("Болт M6 x 30 din", [self.bolt.name]),
+            ("Вентилятор осевой", [self.fan.name]),
+        ])
+        self.assertEqual(results[0], (self.bolt, False))
+        self.assertTrue(results[1][1])
+
+
+class CompareProductsBatchWithLLMTest(TestCase):
+    """Тесты compare_products_batch_with_llm с мокнутым провайдером."""
+
+    @patch('llm_services.providers.get_provider')
+    @patch('llm_services.models.LLMTaskConfig.get_provider_for_task')
+    def test_maps_answers_to_lines(self, _mock_task, mock_get_provider):
+        provider = mock_get_provider.return_value
+        provider.chat_completion.return_value = [
+            {"line_index": 2, "candidate_index": 2, "is_same": True, "confidence": 0.9},
+            {"line_index": 1, "candidate_index": 1, "is_same": False, "confidence": 0.8},
+            {"line_index": 9, "candidate_index": 1, "is_same": True, "confidence": 1.0},
+        ]
+        verdicts = compare_products_batch_with_llm([
+            ("Болт М6", ["Болт М6х30"]),
+            ("Гайка М8", ["Гайка М10", "Гайка М8 оцинк."]),
+        ])
+
+        provider.chat_completion.assert_called_once()
+        self.assertFalse(verdicts[0][0]['is_same'])
+        self.assertEqual(verdicts[1][0], {})
+        self.assertTrue(verdicts[1][1]['is_same'])
+
+
 class ProductMatcherLLMMatchTest(TestCase):
     """Тесты _try_llm_match с мокнутым LLM."""
 
@@ -249,6 +389,23 @@ class ProductMatcherLLMMatchTest(TestCase):
 
         self.assertIsNone(result)
 
+    @patch('catalog.services.product_matcher.compare_products_with_llm')
+    def test_try_llm_match_skips_stale_index_ids(self, mock_llm):
+        """Товар из индекса удалён в БД — кандидат пропускается, берётся следующий."""
+        mock_llm.return_value = [
+            {'is_same': True, 'confidence': 0.95},
+            {'is_same': True, 'confidence': 0.9},
+        ]
+
+        with patch.object(self.matcher, 'find_similar') as mock_find:
+            mock_find.return_value = [
+                {'product_id': 999_999, 'product_name': 'Удалённый болт', 'score': 0.8},
+                {'product_id': self.product1.id, 'product_name': self.product1.name, 'score': 0.75},
+            ]
+            result = self.matcher._try_llm_match("Болт M6x30", "болт m6x30", None)
+
+        self.assertEqual(result.id, self.product1.id)
+
     def test_try_llm_match_no_candidates(self):
         """Нет кандидатов в диапазоне — LLM не вызывается."""
         with patch.object(self.matcher, 'find_similar', return_value=[]):
@@ -264,6 +421,7 @@ class ProductMatcherFindDuplicatesTest(TestCase):
         ProductAlias.objects.all().delete()
         cache.clear()
         self.matcher = ProductMatcher()
+        self.matcher.invalidate_cache()
 
     def test_find_duplicates_empty(self):
         """Нет товаров — пустой список."""
@@ -28,7 +28,15 @@ class AccumulativeEstimateService:
         - сметные данные (количество, цена)
         - закупленные данные (количество, сумма, поставщики, счета)
         """
-        items = ContractEstimateItem.objects.filter(
+        return [
+            AccumulativeEstimateService._accumulative_row(item)
+            for item in AccumulativeEstimateService._accumulative_queryset(contract_estimate_id)
+        ]
+
+    @staticmethod
+    def _accumulative_queryset(contract_estimate_id: int):
+        """Строки сметы с агрегатами закупок."""
+        return ContractEstimateItem.objects.filter(
             contract_estimate_id=contract_estimate_id,
         ).select_related('section', 'product').annotate(
             purchased_quantity=Coalesce(
@@ -46,28 +54,27 @@ class AccumulativeEstimateService:
             ),
         ).order_by('section__sort_order', 'sort_order', 'item_number')
 
-        result = []
-        for item in items:
-            result.append({
-                'id': item.id,
-                'section_name': item.section.name if item.section else '',
-                'item_number': item.item_number,
-                'name': item.name,
-                'model_name': item.model_name,
-                'unit': item.unit,
-                'estimate_quantity': str(item.quantity),
-                'estimate_material_price': str(item.material_unit_price),
-                'estimate_work_price': str(item.work_unit_price),
-                'estimate_material_total': str(item.material_total),
-                'estimate_work_total': str(item.work_total),
-                'purchased_quantity': str(item.purchased_quantity),
-                'purchased_amount': str(item.purchased_amount),
-                'remaining_quantity': str(item.quantity - item.purchased_quantity),
-                'is_analog': item.is_analog,
-                'item_type': item.item_type,
-            })
-
-        return result
+    @staticmethod
+    def _accumulative_row(item) -> Dict:
+        """Строка накопительной сметы (значения — строки, как в API)."""
+        return {
+            'id': item.id,
+            'section_name': item.section.name if item.section else '',
+            'item_number': item.item_number,
+            'name': item.name,
+            'model_name': item.model_name,
+            'unit': item.unit,
+            'estimate_quantity': str(item.quantity),
+            'estimate_material_price': str(item.material_unit_price),
+            'estimate_work_price': str(item.work_unit_price),
+            'estimate_material_total': str(item.material_total),
+            'estimate_work_total': str(item.work_total),
+            'purchased_quantity': str(item.purchased_quantity),
+            'purchased_amount': str(item.purchased_amount),
+            'remaining_quantity': str(item.quantity - item.purchased_quantity),
+            'is_analog': item.is_analog,
+            'item_type': item.item_type,
+        }
 
     @staticmethod
     def get_remainder(contract_estimate_id: int) -> List[Dict]:
@@ -154,30 +161,30 @@ class AccumulativeEstimateService:
 
     @staticmethod
     def export_to_excel(contract_estimate_id: int):
-        """Экспорт накопительной сметы в Excel (HttpResponse).
+        """Экспорт накопительной сметы в Excel (потоковый ответ).
+
+        Строки читаются курсором и пишутся в write-only книгу.
 
         Returns:
-            django.http.HttpResponse с .xlsx файлом.
+            django.http.FileResponse с .xlsx файлом.
         """
-        import openpyxl
-        from django.http import HttpResponse
+        from core.excel_stream import StreamWorkbook, iter_queryset, xlsx_response
 
         ce = ContractEstimate.objects.select_related('contract').get(
             pk=contract_estimate_id,
         )
-        data = AccumulativeEstimateService.export_accumulative_data(ce.id)
 
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = 'Накопительная смета'
-        headers = [
+        book = StreamWorkbook({})
+        sheet = book.sheet('Накопительная смета')
+        sheet.append([
             '№', 'Раздел', 'Наименование', 'Модель', 'Ед.',
             'Кол-во (смета)', 'Цена мат.', 'Цена работ',
             'Закуплено кол.', 'Закуплено сумма', 'Остаток кол.',
-        ]
-        ws.append(headers)
-        for row in data:
-            ws.append([
+        ])
+        items = AccumulativeEstimateService._accumulative_queryset(ce.id)
+        for item in iter_queryset(items):
+            row = AccumulativeEstimateService._accumulative_row(item)
+            sheet.append([
                 row['item_number'], row['section_name'], row['name'],
                 row['model_name'], row['unit'],
                 row['estimate_quantity'], row['estimate_material_price'],
@@ -185,14 +192,7 @@ class AccumulativeEstimateService:
                 row['purchased_amount'], row['remaining_quantity'],
             ])
 
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = (
-            f'attachment; filename="accumulative_{ce.contract.number}.xlsx"'
-        )
-        wb.save(response)
-        return response
+        return xlsx_response(book.save(), f'accumulative_{ce.contract.number}.xlsx')
 
 
 def models_Q_any_deviation():
@@ -343,6 +343,23 @@ class ExportDataTests(Phase5TestMixin, TestCase):
         result = AccumulativeEstimateService.export_accumulative_data(empty_ce.id)
         self.assertEqual(len(result), 0)
 
+    def test_export_to_excel_streams_rows(self):
+        from io import BytesIO
+        import openpyxl
+
+        self._create_purchase_links()
+        acc = AccumulativeEstimateService.get_accumulative(self.ce.id)
+        response = AccumulativeEstimateService.export_to_excel(self.ce.id)
+
+        self.assertTrue(response.streaming)
+        self.assertIn('accumulative_', response['Content-Disposition'])
+        ws = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(rows[0][0], '№')
+        self.assertEqual(len(rows), len(acc) + 1)
+        self.assertEqual(rows[1][2], acc[0]['name'])
+        self.assertEqual(rows[1][9], acc[0]['purchased_amount'])
+
 
 class AccumulativeEstimateAPITests(Phase5TestMixin, TestCase):
     """Тесты API-эндпоинтов накопительной сметы"""
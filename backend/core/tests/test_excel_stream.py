@@ -0,0 +1,51 @@
+"""Тесты core.excel_stream — write-only книга с именованными стилями."""
+from io import BytesIO
+
+import openpyxl
+from django.test import SimpleTestCase
+from openpyxl.styles import Font
+
+from core.excel_stream import (
+    CENTER, NUM_FMT, XLSX_CONTENT_TYPE, StreamWorkbook, iter_queryset, to_bytesio,
+    xlsx_response,
+)
+
+
+class StreamWorkbookTests(SimpleTestCase):
+
+    def _book(self):
+        book = StreamWorkbook({
+            'title': {'font': Font(bold=True, size=14), 'alignment': CENTER},
+            'num': {'number_format': NUM_FMT},
+        })
+        sheet = book.sheet('Лист', widths=[12, 30])
+        sheet.append(['Заголовок'], 'title', merge_to=3)
+        sheet.skip()
+        sheet.append(['Итого', sheet.cell(1234.5, 'num')])
+        return book, sheet
+
+    def test_rows_styles_and_merges(self):
+        book, sheet = self._book()
+        self.assertEqual(sheet.row, 3)
+
+        ws = openpyxl.load_workbook(to_bytesio(book.save())).active
+        self.assertEqual(ws['A1'].value, 'Заголовок')
+        self.assertTrue(ws['A1'].font.b)
+        self.assertEqual(ws['A1'].style, 'title')
+        self.assertEqual(ws['B3'].value, 1234.5)
+        self.assertEqual(ws['B3'].number_format, NUM_FMT)
+        self.assertEqual({str(r) for r in ws.merged_cells.ranges}, {'A1:C1'})
+        self.assertEqual(ws.column_dimensions['B'].width, 30)
+
+    def test_xlsx_response_streams_file(self):
+        book, _ = self._book()
+        response = xlsx_response(book.save(), 'Смета_1.xlsx')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+        self.assertIn('attachment', response['Content-Disposition'])
+        ws = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(ws['A3'].value, 'Итого')
+
+    def test_iter_queryset_accepts_plain_iterables(self):
+        self.assertEqual(list(iter_queryset([1, 2])), [1, 2])
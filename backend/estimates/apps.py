@@ -6,4 +6,5 @@ class EstimatesConfig(AppConfig):
     name = 'estimates'
 
     def ready(self):
+        import estimates.signals  # noqa: F401
         import estimates.tasks_work_matching  # noqa: F401 — register Celery tasks
@@ -1,6 +1,8 @@
 """
 Безопасный вычислитель формул для настраиваемых столбцов сметы.
-Реализация: токенизатор + рекурсивный спуск (без eval/exec).
+Реализация: токенизатор + рекурсивный спуск (без eval/exec). Формула
+компилируется в замыкание один раз (кэш по строке), column_config —
+в CompiledColumns (кэш по канонической JSON-строке конфигурации).
 
 Поддерживает: +, -, *, /, (), числовые литералы, ссылки на столбцы,
 функции round(), max(), min(), abs().
@@ -8,9 +10,12 @@
 
 from __future__ import annotations
 
+import json
 import re
+from collections.abc import Callable
 from decimal import Decimal, InvalidOperation, DivisionByZero
 from enum import Enum, auto
+from functools import lru_cache
 from typing import NamedTuple
 
 
@@ -97,15 +102,21 @@ def tokenize(formula: str) -> list[Token]:
     return tokens
 
 
+# Скомпилированная формула: variables → значение
+CompiledFormula = Callable[[dict[str, Decimal]], Decimal]
+
+
 class _Parser:
     """Рекурсивный спуск: expr → term ((+|-) term)*
        term → unary ((*|/) unary)*
        unary → (-) unary | atom
-       atom → NUMBER | IDENT | func(args) | (expr)"""
+       atom → NUMBER | IDENT | func(args) | (expr)
 
-    def __init__(self, tokens: list[Token], variables: dict[str, Decimal]):
+    Строит дерево замыканий один раз; вычисление — вызов замыкания
+    с dict переменных (без повторного разбора строки)."""
+
+    def __init__(self, tokens: list[Token]):
         self.tokens = tokens
-        self.variables = variables
         self.pos = 0
 
     def _peek(self) -> Token:
@@ -122,49 +133,69 @@ class _Parser:
             raise FormulaError(f'Ожидался {tt.name}, получен {t.type.name} ({t.value!r})')
         return t
 
-    def parse(self) -> Decimal:
+    def parse(self) -> CompiledFormula:
         result = self._expr()
         if self._peek().type != TokenType.EOF:
             raise FormulaError(f'Неожиданный токен: {self._peek().value!r}')
         return result
 
-    def _expr(self) -> Decimal:
-        left = self._term()
+    def _expr(self) -> CompiledFormula:
+        first = self._term()
+        rest: list[tuple[bool, CompiledFormula]] = []
         while self._peek().type in (TokenType.PLUS, TokenType.MINUS):
             op = self._advance()
-            right = self._term()
-            if op.type == TokenType.PLUS:
-                left = left + right
-            else:
-                left = left - right
-        return left
-
-    def _term(self) -> Decimal:
-        left = self._unary()
+            rest.append((op.type == TokenType.PLUS, self._term()))
+        if not rest:
+            return first
+
+        def run(variables: dict[str, Decimal]) -> Decimal:
+            left = first(variables)
+            for is_add, fn in rest:
+                left = left + fn(variables) if is_add else left - fn(variables)
+            return left
+        return run
+
+    def _term(self) -> CompiledFormula:
+        first = self._unary()
+        rest: list[tuple[bool, CompiledFormula, str]] = []
         while self._peek().type in (TokenType.MUL, TokenType.DIV):
             op = self._advance()
-            right = self._unary()
-            if op.type == TokenType.MUL:
-                left = left * right
-            else:
+            rest.append((op.type == TokenType.MUL, self._unary(), op.value))
+        if not rest:
+            return first
+
+        def run(variables: dict[str, Decimal]) -> Decimal:
+            left = first(variables)
+            for idx, (is_mul, fn, _) in enumerate(rest):
+                right = fn(variables)
+                if is_mul:
+                    left = left * right
+                    continue
                 try:
                     left = left / right
                 except (DivisionByZero, InvalidOperation):
+                    # Деление на ноль обнуляет терм; если за ним идут ещё
+                    # * или / — формула невалидна (как при разборе на лету).
+                    if idx + 1 < len(rest):
+                        raise FormulaError(f'Неожиданный токен: {rest[idx + 1][2]!r}')
                     return Decimal('0')
-        return left
+            return left
+        return run
 
-    def _unary(self) -> Decimal:
+    def _unary(self) -> CompiledFormula:
         if self._peek().type == TokenType.MINUS:
             self._advance()
-            return -self._unary()
+            operand = self._unary()
+            return lambda variables: -operand(variables)
         return self._atom()
 
-    def _atom(self) -> Decimal:
+    def _atom(self) -> CompiledFormula:
         t = self._peek()
 
         if t.type == TokenType.NUMBER:
             self._advance()
-            return Decimal(t.value)
+            const = Decimal(t.value)
+            return lambda variables: const
 
         if t.type == TokenType.IDENT:
             self._advance()
@@ -175,9 +206,12 @@ class _Parser:
                 return self._call_function(name)
 
             # Variable reference
-            if name not in self.variables:
-                raise FormulaError(f'Неизвестная переменная: {name}')
-            return self.variables[name]
+            def load(variables: dict[str, Decimal]) -> Decimal:
+                try:
+                    return variables[name]
+                except KeyError:
+                    raise FormulaError(f'Неизвестная переменная: {name}') from None
+            return load
 
         if t.type == TokenType.LPAREN:
             self._advance()
@@ -187,9 +221,9 @@ class _Parser:
 
         raise FormulaError(f'Неожиданный токен: {t.value!r} ({t.type.name})')
 
-    def _call_function(self, name: str) -> Decimal:
+    def _call_function(self, name: str) -> CompiledFormula:
         self._expect(TokenType.LPAREN)
-        args: list[Decimal] = [self._expr()]
+        args: list[CompiledFormula] = [self._expr()]
         while self._peek().type == TokenType.COMMA:
             self._advance()
             args.append(self._expr())
@@ -197,32 +231,49 @@ class _Parser:
 
         if name == 'round':
             if len(args) == 1:
-                return args[0].quantize(Decimal('1'))
+                value = args[0]
+                return lambda variables: value(variables).quantize(Decimal('1'))
             elif len(args) == 2:
-                places = int(args[1])
-                return args[0].quantize(Decimal(10) ** -places)
+                value, places = args
+
+                def run_round(variables: dict[str, Decimal]) -> Decimal:
+                    v = value(variables)
+                    return v.quantize(Decimal(10) ** -int(places(variables)))
+                return run_round
             raise FormulaError('round() принимает 1 или 2 аргумента')
         elif name == 'max':
-            if not args:
-                raise FormulaError('max() требует хотя бы 1 аргумент')
-            return max(args)
+            return lambda variables: max(fn(variables) for fn in args)
         elif name == 'min':
-            if not args:
-                raise FormulaError('min() требует хотя бы 1 аргумент')
-            return min(args)
+            return lambda variables: min(fn(variables) for fn in args)
         elif name == 'abs':
             if len(args) != 1:
                 raise FormulaError('abs() принимает ровно 1 аргумент')
-            return abs(args[0])
+            value = args[0]
+            return lambda variables: abs(value(variables))
 
         raise FormulaError(f'Неизвестная функция: {name}')
 
 
+@lru_cache(maxsize=2048)
+def _compile_cached(formula: str) -> tuple[CompiledFormula | None, str | None]:
+    try:
+        return _Parser(tokenize(formula)).parse(), None
+    except FormulaError as e:
+        # Кэшируем и ошибку — битая формула не разбирается заново на каждой строке
+        return None, str(e)
+
+
+def compile_formula(formula: str) -> CompiledFormula:
+    """Скомпилировать формулу (кэш по строке). Бросает FormulaError."""
+    fn, error = _compile_cached(formula)
+    if error is not None:
+        raise FormulaError(error)
+    return fn
+
+
 def evaluate_formula(formula: str, variables: dict[str, Decimal]) -> Decimal:
     """Вычислить формулу с заданными переменными. Бросает FormulaError."""
-    tokens = tokenize(formula)
-    parser = _Parser(tokens, variables)
-    return parser.parse()
+    return compile_formula(formula)(variables)
 
 
 def get_formula_dependencies(formula: str) -> set[str]:
@@ -296,13 +347,77 @@ def validate_formula(formula: str, available_keys: set[str]) -> list[str]:
     # Try to parse (catch syntax errors)
     try:
         dummy_vars = {k: Decimal('1') for k in available_keys}
-        _Parser(tokens, dummy_vars).parse()
+        _Parser(tokens).parse()(dummy_vars)
     except FormulaError as e:
         errors.append(str(e))
 
     return errors
 
 
+class CompiledColumns:
+    """column_config, скомпилированный один раз: formula-столбцы в порядке
+    вычисления (топологическая сортировка) + замыкания формул."""
+
+    def __init__(self, columns: list[dict]):
+        self.custom_number_keys = [
+            c['key'] for c in columns if c.get('type') == 'custom_number'
+        ]
+        # (key, формула | None если не компилируется, quantum | None)
+        self.formulas: list[tuple[str, CompiledFormula | None, Decimal | None]] = []
+        for col in topological_sort(columns):
+            if col.get('type') != 'formula' or not col.get('formula'):
+                continue
+            try:
+                fn = compile_formula(col['formula'])
+            except FormulaError:
+                fn = None
+            dp = col.get('decimal_places')
+            quantum = Decimal(10) ** -dp if dp is not None else None
+            self.formulas.append((col['key'], fn, quantum))
+
+    def compute(
+        self,
+        builtin_values: dict[str, Decimal],
+        custom_data: dict[str, str],
+    ) -> dict[str, Decimal | None]:
+        """Все formula-столбцы одной строки: { key: Decimal | None }."""
+        variables: dict[str, Decimal] = dict(builtin_values)
+        for key in self.custom_number_keys:
+            if key in custom_data:
+                try:
+                    variables[key] = Decimal(str(custom_data[key]))
+                except (InvalidOperation, ValueError):
+                    variables[key] = Decimal('0')
+
+        results: dict[str, Decimal | None] = {}
+        for key, fn, quantum in self.formulas:
+            if fn is None:
+                results[key] = None
+                continue
+            try:
+                value = fn(variables)
+                if quantum is not None:
+                    value = value.quantize(quantum)
+            except (FormulaError, ArithmeticError, ValueError):
+                results[key] = None
+                continue
+            results[key] = value
+            variables[key] = value
+        return results
+
+
+@lru_cache(maxsize=256)
+def _compile_columns_cached(config_json: str) -> CompiledColumns:
+    return CompiledColumns(json.loads(config_json))
+
+
+def compile_column_config(columns: list[dict]) -> CompiledColumns:
+    """CompiledColumns для column_config (кэш по канонической JSON-строке).
+    Бросает CycleError при циклических зависимостях."""
+    config_json = json.dumps(columns, sort_keys=True, ensure_ascii=False, default=str)
+    return _compile_columns_cached(config_json)
+
+
 def compute_all_formulas(
     columns: list[dict],
     builtin_values: dict[str, Decimal],
@@ -310,29 +425,4 @@ def compute_all_formulas(
 ) -> dict[str, Decimal | None]:
     """Вычислить все formula-столбцы для одной строки.
     Возвращает dict { key: Decimal | None }."""
-    sorted_cols = topological_sort(columns)
-    variables: dict[str, Decimal] = dict(builtin_values)
-
-    # Add custom data as variables
-    for col in columns:
-        if col.get('type') == 'custom_number' and col['key'] in custom_data:
-            try:
-                variables[col['key']] = Decimal(str(custom_data[col['key']]))
-            except (InvalidOperation, ValueError):
-                variables[col['key']] = Decimal('0')
-
-    results: dict[str, Decimal | None] = {}
-    for col in sorted_cols:
-        if col.get('type') != 'formula' or not col.get('formula'):
-            continue
-        try:
-            value = evaluate_formula(col['formula'], variables)
-            dp = col.get('decimal_places')
-            if dp is not None:
-                value = value.quantize(Decimal(10) ** -dp)
-            results[col['key']] = value
-            variables[col['key']] = value
-        except FormulaError:
-            results[col['key']] = None
-
-    return results
+    return compile_column_config(columns).compute(builtin_values, custom_data)
@@ -0,0 +1,98 @@
+"""Бенчмарк fuzzy-подбора работ: триграммный индекс vs полный перебор.
+
+Сравнивает кандидатов Tier5Fuzzy (score ≥ 35, top-N) для строк сметы,
+полученных через WorkItemFuzzyIndex, с эталонным полным перебором каталога.
+Результаты обязаны совпадать: при любом расхождении команда выводит примеры
+и завершается ошибкой.
+
+Использование:
+  python manage.py benchmark_work_matching --estimate-id 42
+  python manage.py benchmark_work_matching --limit 500   # последние строки всех смет
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.models import Product
+from estimates.models import EstimateItem
+from estimates.services.work_matching.fuzzy_index import WorkItemFuzzyIndex
+from pricelists.models import WorkItem
+
+TOP_N = 15
+SCORE_CUTOFF = 35
+# Сколько примеров расхождения выводить
+MISMATCH_EXAMPLES = 10
+
+
+class Command(BaseCommand):
+    help = 'Сравнить индексный fuzzy-подбор работ с полным перебором каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--estimate-id', type=int, default=None,
+            help='Строки какой сметы использовать как запросы',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=500,
+            help='Максимум строк сметы в бенчмарке',
+        )
+
+    def handle(self, *args, **options):
+        items = EstimateItem.objects.order_by('-id')
+        if options['estimate_id'] is not None:
+            items = items.filter(estimate_id=options['estimate_id'])
+        queries = [
+            Product.normalize_name(name)
+            for name in items.values_list('name', flat=True)[:options['limit']]
+        ]
+        if not queries:
+            raise CommandError('Нет строк сметы для бенчмарка')
+
+        entries = [
+            (wi.id, wi.name, Product.normalize_name(wi.name), wi)
+            for wi in WorkItem.objects.filter(is_current=True).only('id', 'name')
+        ]
+        started = time.perf_counter()
+        index = WorkItemFuzzyIndex(entries)
+        build_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        indexed = [index.search(q, score_cutoff=SCORE_CUTOFF, limit=TOP_N) for q in queries]
+        index_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        brute = [
+            index.brute_force_search(q, score_cutoff=SCORE_CUTOFF, limit=TOP_N)
+            for q in queries
+        ]
+        brute_time = time.perf_counter() - started
+
+        mismatches = [
+            (query, a, b) for query, a, b in zip(queries, indexed, brute) if a != b
+        ]
+
+        self.stdout.write(f'Каталог: {len(entries)} WorkItem, строк сметы: {len(queries)}')
+        self.stdout.write(f'Построение индекса: {build_time * 1000:.0f} мс')
+        self.stdout.write(
+            f'Индекс: {index_time:.2f} с ({index_time / len(queries) * 1000:.2f} мс/строка)'
+        )
+        self.stdout.write(
+            f'Полный перебор: {brute_time:.2f} с ({brute_time / len(queries) * 1000:.2f} мс/строка)'
+        )
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f'Top-{TOP_N} совпадает с полным перебором'))
+            return
+
+        def describe(results):
+            if not results:
+                return '—'
+            score, idx = results[0]
+            return f'{entries[idx][1]!r} ({score:.0f})'
+
+        for query, a, b in mismatches[:MISMATCH_EXAMPLES]:
+            self.stdout.write(
+                f'  {query!r}: индекс {describe(a)}, перебор {describe(b)}'
+            )
+        raise CommandError(
+            f'Расхождений top-{TOP_N} с полным перебором: {len(mismatches)}'
+        )
@@ -10,6 +10,12 @@ from django.db.models import Sum
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from core.models import TimestampedModel
+from core.cached import CachedPropertyMixin
+from objects.models import Object
+from accounting.models import LegalEntity, Counterparty
+from pricelists.models import PriceList
+
 
 # ---------------------------------------------------------------------------
 # Подавление сигналов при batch-операциях
@@ -31,11 +37,55 @@ def suppress_item_signals():
     finally:
         _signal_suppression.active = False
 
-from core.models import TimestampedModel
-from core.cached import CachedPropertyMixin
-from objects.models import Object
-from accounting.models import LegalEntity, Counterparty
-from pricelists.models import PriceList
+
+_deferred_totals = threading.local()
+
+
+@contextmanager
+def deferred_subsection_totals():
+    """Отложить пересчёт агрегатов подразделов до выхода из блока.
+
+    Сигналы EstimateItem внутри блока только запоминают затронутые подразделы;
+    на выходе каждый пересчитывается один раз (recalculate_subsections) —
+    N сохранений/удалений строк стоят O(N), а не O(N²). Вложенные блоки
+    сливаются во внешний. При исключении пересчёт не выполняется.
+    """
+    if getattr(_deferred_totals, 'pending', None) is not None:
+        yield
+        return
+    pending = _deferred_totals.pending = set()
+    try:
+        yield
+    finally:
+        _deferred_totals.pending = None
+    if pending:
+        from estimates.services.markup_service import recalculate_subsections
+        recalculate_subsections(pending)
+
+
+_characteristics_pending = threading.local()
+
+
+def _refresh_characteristics_on_commit(estimate_id):
+    """Обновить автохарактеристики сметы один раз после коммита транзакции.
+
+    Сохранения строк внутри одной транзакции только копят id смет;
+    первый сработавший колбэк обновляет все накопленные сметы.
+    """
+    pending = getattr(_characteristics_pending, 'ids', None)
+    if pending is None:
+        pending = _characteristics_pending.ids = set()
+    pending.add(estimate_id)
+    transaction.on_commit(_flush_pending_characteristics)
+
+
+def _flush_pending_characteristics():
+    pending = getattr(_characteristics_pending, 'ids', None)
+    if not pending:
+        return
+    _characteristics_pending.ids = set()
+    for estimate in Estimate.objects.filter(id__in=pending):
+        estimate.update_auto_characteristics()
 
 
 def project_file_path(instance, filename):
@@ -1099,6 +1149,13 @@ class EstimateItem(TimestampedModel):
     def __str__(self):
         return f"#{self.item_number} {self.name[:80]}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Подраздел на момент загрузки — при переносе строки пересчитать оба
+        instance._loaded_subsection_id = instance.__dict__.get('subsection_id')
+        return instance
+
     def clean(self):
         if self.is_analog and not self.analog_reason:
             raise ValidationError({
@@ -1201,34 +1258,29 @@ class EstimateItem(TimestampedModel):
 @receiver(post_save, sender=EstimateItem)
 @receiver(post_delete, sender=EstimateItem)
 def update_subsection_from_items(sender, instance, **kwargs):
-    """При изменении строки сметы пересчитываем агрегаты подраздела (закупка + продажа)"""
+    """При изменении строки сметы пересчитываем агрегаты подраздела (закупка + продажа).
+
+    Внутри deferred_subsection_totals() только запоминаем подраздел — пересчёт
+    один раз на выходе из блока. Автохарактеристики сметы обновляются
+    после коммита, а не на каждое сохранение.
+    """
     if getattr(_signal_suppression, 'active', False):
         return
-    subsection = instance.subsection
-    if not subsection:
+    subsection_ids = {
+        instance.subsection_id, getattr(instance, '_loaded_subsection_id', None),
+    } - {None}
+    instance._loaded_subsection_id = instance.subsection_id
+    if not subsection_ids:
+        return
+
+    pending = getattr(_deferred_totals, 'pending', None)
+    if pending is not None:
+        pending.update(subsection_ids)
         return
 
-    items = EstimateItem.objects.filter(
-        subsection=subsection
-    ).select_related('section', 'estimate')
-
-    mat_purchase = mat_sale = work_purchase = work_sale = Decimal('0')
-
-    for item in items:
-        qty = item.quantity or Decimal('0')
-        mat_purchase += qty * (item.material_unit_price or Decimal('0'))
-        work_purchase += qty * (item.work_unit_price or Decimal('0'))
-        mat_sale += qty * item.material_sale_unit_price
-        work_sale += qty * item.work_sale_unit_price
-
-    subsection.materials_purchase = mat_purchase.quantize(Decimal('0.01'))
-    subsection.works_purchase = work_purchase.quantize(Decimal('0.01'))
-    subsection.materials_sale = mat_sale.quantize(Decimal('0.01'))
-    subsection.works_sale = work_sale.quantize(Decimal('0.01'))
-    subsection.save(update_fields=[
-        'materials_purchase', 'works_purchase',
-        'materials_sale', 'works_sale',
-    ])
+    from estimates.services.markup_service import recalculate_subsections
+    recalculate_subsections(subsection_ids, refresh_characteristics=False)
+    _refresh_characteristics_on_commit(instance.estimate_id)
 
 
 class EstimateCharacteristic(TimestampedModel):
@@ -11,7 +11,7 @@ from .models import (
 )
 from .column_defaults import DEFAULT_COLUMN_CONFIG
 from .formula_engine import (
-    compute_all_formulas, evaluate_formula, topological_sort,
+    compile_column_config, topological_sort,
 )
 from .validators import validate_column_config as _validate_column_config
 from accounting.serializers import CounterpartySerializer
@@ -315,34 +315,10 @@ class EstimateItemSerializer(serializers.ModelSerializer):
         }
         custom_data = obj.custom_data or {}
 
-        # Use pre-sorted columns from context if available (avoids topological_sort per row)
-        sorted_cols = self.context.get('sorted_columns')
-        if sorted_cols is not None:
-            from decimal import InvalidOperation
-            variables = dict(builtin_values)
-            for col in column_config:
-                if col.get('type') == 'custom_number' and col['key'] in custom_data:
-                    try:
-                        variables[col['key']] = Decimal(str(custom_data[col['key']]))
-                    except (InvalidOperation, ValueError):
-                        variables[col['key']] = Decimal('0')
-            results = {}
-            for col in sorted_cols:
-                if col.get('type') != 'formula' or not col.get('formula'):
-                    continue
-                try:
-                    value = evaluate_formula(col['formula'], variables)
-                    dp = col.get('decimal_places')
-                    if dp is not None:
-                        value = value.quantize(Decimal(10) ** -dp)
-                    results[col['key']] = value
-                    variables[col['key']] = value
-                except Exception:
-                    results[col['key']] = None
-            return {k: str(v) if v is not None else None for k, v in results.items()}
-
-        # Fallback: compute with topological sort (for non-ViewSet usage)
-        results = compute_all_formulas(column_config, builtin_values, custom_data)
+        # column_config компилируется один раз (ViewSet кладёт в context;
+        # иначе — кэш по конфигурации)
+        compiled = self.context.get('compiled_columns') or compile_column_config(column_config)
+        results = compiled.compute(builtin_values, custom_data)
         return {k: str(v) if v is not None else None for k, v in results.items()}
 
     class Meta:
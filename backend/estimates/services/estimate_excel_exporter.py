@@ -6,19 +6,71 @@ Excel-экспорт сметы.
 2. export_with_column_config() — экспорт с учётом column_config (формулы, custom-столбцы).
 
 При export_public=True — применяет наценку из PublicPricingConfig.
+
+Книга пишется потоково (core.excel_stream): позиции читаются пачками через
+server-side cursor, итоги считаются по ходу записи. Методы *_to_file
+возвращают временный файл для потоковой отдачи из view.
 """
 import logging
 from decimal import Decimal
 from io import BytesIO
-from typing import Optional
 
-import openpyxl
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from django.db.models import Q
+from openpyxl.styles import Font, PatternFill
 
+from core.excel_stream import (
+    CENTER, NUM_FMT, THIN_BORDER, StreamWorkbook, iter_queryset, to_bytesio,
+)
 from estimates.models import Estimate, EstimateItem, EstimateSection
 
 logger = logging.getLogger(__name__)
 
+# Позиция без товара и без цены — «Требует уточнения».
+_UNKNOWN_Q = Q(product__isnull=True, material_unit_price=0)
+
+_PUBLIC_STYLES = {
+    'title': {'font': Font(bold=True, size=14), 'alignment': CENTER},
+    'section': {'font': Font(bold=True, size=12, color='1F4E79')},
+    'header': {'font': Font(bold=True, size=10), 'alignment': CENTER, 'border': THIN_BORDER},
+    'cell': {'border': THIN_BORDER},
+    'num': {'border': THIN_BORDER, 'number_format': NUM_FMT},
+    'analog': {
+        'border': THIN_BORDER,
+        'fill': PatternFill(start_color='FFF2CC', end_color='FFF2CC', fill_type='solid'),
+    },
+    'analog_num': {
+        'border': THIN_BORDER, 'number_format': NUM_FMT,
+        'fill': PatternFill(start_color='FFF2CC', end_color='FFF2CC', fill_type='solid'),
+    },
+    'unknown': {
+        'border': THIN_BORDER,
+        'fill': PatternFill(start_color='FCE4EC', end_color='FCE4EC', fill_type='solid'),
+    },
+    'bold': {'font': Font(bold=True)},
+    'bold_num': {'font': Font(bold=True), 'number_format': NUM_FMT},
+    'plain_num': {'number_format': NUM_FMT},
+    'grand': {'font': Font(bold=True, size=12)},
+    'grand_num': {'font': Font(bold=True, size=12), 'number_format': NUM_FMT},
+}
+
+_COLUMN_CONFIG_STYLES = {
+    'title': {'font': Font(bold=True, size=14), 'alignment': CENTER},
+    'header': {'font': Font(bold=True), 'alignment': CENTER, 'border': THIN_BORDER},
+    'section': {
+        'font': Font(bold=True, size=11, color='1F4E79'),
+        'fill': PatternFill(start_color='D6E4F0', end_color='D6E4F0', fill_type='solid'),
+    },
+    'cell': {'border': THIN_BORDER},
+    'num': {'border': THIN_BORDER, 'number_format': NUM_FMT},
+    'subtotal': {'font': Font(bold=True, size=10, color='333333'), 'border': THIN_BORDER},
+    'subtotal_num': {
+        'font': Font(bold=True, size=10, color='333333'), 'border': THIN_BORDER,
+        'number_format': NUM_FMT,
+    },
+    'total': {'font': Font(bold=True), 'border': THIN_BORDER},
+    'total_num': {'font': Font(bold=True), 'border': THIN_BORDER, 'number_format': NUM_FMT},
+}
+
 
 def get_sale_price(purchase_price: Decimal, category=None) -> Decimal:
     """Рассчитывает продажную цену: закупочная × (1 + наценка/100).
@@ -33,6 +85,8 @@ def get_sale_price(purchase_price: Decimal, category=None) -> Decimal:
     return (purchase_price * (Decimal('1') + markup / Decimal('100'))).quantize(Decimal('0.01'))
 
 
+
+
 class EstimateExcelExporter:
     """Генерация Excel-файла сметы.
 
@@ -40,6 +94,7 @@ class EstimateExcelExporter:
         exporter = EstimateExcelExporter(estimate)
         buffer = exporter.export()           # закупочные цены
         buffer = exporter.export_public()    # с наценкой для клиента
+        output = exporter.export_with_column_config_to_file(mode)  # для view
     """
 
     def __init__(self, estimate: Estimate):
@@ -54,135 +109,82 @@ class EstimateExcelExporter:
         Returns:
             BytesIO с .xlsx файлом.
         """
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = 'Смета — Материалы и Работы'
-
-        # Стили
-        title_font = Font(bold=True, size=14)
-        section_font = Font(bold=True, size=12, color='1F4E79')
-        header_font = Font(bold=True, size=10)
-        bold_font = Font(bold=True)
-        center = Alignment(horizontal='center', vertical='center')
-        wrap = Alignment(wrap_text=True, vertical='top')
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin'),
-        )
-        num_fmt = '#,##0.00'
-        yellow_fill = PatternFill(start_color='FFF2CC', end_color='FFF2CC', fill_type='solid')
-        red_fill = PatternFill(start_color='FCE4EC', end_color='FCE4EC', fill_type='solid')
+        return to_bytesio(self.export_to_file(apply_markup))
 
-        # Заголовок
-        ws.merge_cells('A1:I1')
-        ws['A1'] = f'СМЕТА'
-        ws['A1'].font = title_font
-        ws['A1'].alignment = center
+    def export_to_file(self, apply_markup: bool = False):
+        """Как export(), но возвращает временный файл (позиция — в начале)."""
+        book = StreamWorkbook(_PUBLIC_STYLES)
+        sheet = book.sheet('Смета — Материалы и Работы', widths=[5, 30, 15, 6, 8, 14, 14, 14, 14])
 
-        ws['A2'] = f'Проект: {self.estimate.name}'
-        ws['A3'] = f'Дата: {self.estimate.created_at.strftime("%d.%m.%Y")}'
+        # Заголовок
+        sheet.append(['СМЕТА'], 'title', merge_to=9)
+        sheet.append([f'Проект: {self.estimate.name}'])
+        sheet.append([f'Дата: {self.estimate.created_at.strftime("%d.%m.%Y")}'])
+        sheet.skip()
 
-        # Получаем все позиции
+        # Позиции — три выборки по классам, каждая читается курсором
         items = EstimateItem.objects.filter(
             estimate=self.estimate,
         ).select_related(
             'section', 'product', 'product__category',
         ).order_by('section__sort_order', 'sort_order', 'item_number')
-
-        # Классификация позиций
-        exact_items = []
-        analog_items = []
-        unknown_items = []
-
-        for item in items:
-            if not item.product_id and item.material_unit_price == 0:
-                unknown_items.append(item)
-            elif item.is_analog:
-                analog_items.append(item)
-            else:
-                exact_items.append(item)
-
-        row = 5
-        total_materials = Decimal('0')
-        total_works = Decimal('0')
+        totals = {'materials': Decimal('0'), 'works': Decimal('0')}
 
         # Секция 1: Основное оборудование
-        if exact_items:
-            row = self._write_main_section(
-                ws, row, 'РАЗДЕЛ 1: ОСНОВНОЕ ОБОРУДОВАНИЕ',
-                exact_items, apply_markup,
-                section_font, header_font, bold_font, center, wrap,
-                thin_border, num_fmt,
-            )
-            subtotals = self._calc_subtotals(exact_items, apply_markup)
-            total_materials += subtotals['materials']
-            total_works += subtotals['works']
-            row += 1
+        self._write_section(
+            sheet, 'РАЗДЕЛ 1: ОСНОВНОЕ ОБОРУДОВАНИЕ',
+            ['#', 'Наименование', 'Модель', 'Ед.', 'Кол.',
+             'Материал, ₽', 'Работа, ₽', 'Мат. итого', 'Раб. итого'],
+            items.exclude(_UNKNOWN_Q).filter(is_analog=False),
+            lambda idx, item: self._main_values(idx, item, apply_markup, totals),
+            'cell', 'num',
+        )
 
         # Секция 2: Аналоги
-        if analog_items:
-            row = self._write_analog_section(
-                ws, row, 'РАЗДЕЛ 2: АНАЛОГИ',
-                analog_items, apply_markup,
-                section_font, header_font, bold_font, center, wrap,
-                thin_border, num_fmt, yellow_fill,
-            )
-            subtotals = self._calc_subtotals(analog_items, apply_markup)
-            total_materials += subtotals['materials']
-            total_works += subtotals['works']
-            row += 1
+        self._write_section(
+            sheet, 'РАЗДЕЛ 2: АНАЛОГИ',
+            ['#', 'Запрошено', 'Предложено', 'Обоснование', 'Ед.', 'Кол.',
+             'Материал, ₽', 'Работа, ₽', 'Итого, ₽'],
+            items.exclude(_UNKNOWN_Q).filter(is_analog=True),
+            lambda idx, item: self._analog_values(idx, item, apply_markup, totals),
+            'analog', 'analog_num',
+        )
 
         # Секция 3: Требует уточнения
-        if unknown_items:
-            row = self._write_unknown_section(
-                ws, row, 'РАЗДЕЛ 3: ТРЕБУЕТ УТОЧНЕНИЯ',
-                unknown_items,
-                section_font, header_font, center, wrap,
-                thin_border, red_fill,
-            )
-            row += 1
+        self._write_section(
+            sheet, 'РАЗДЕЛ 3: ТРЕБУЕТ УТОЧНЕНИЯ',
+            ['#', 'Наименование', 'Модель', 'Ед.', 'Кол.', '', '', '', 'Примечание'],
+            items.filter(_UNKNOWN_Q),
+            self._unknown_values,
+            'unknown', 'unknown',
+        )
 
         # Итоги
-        row += 1
-        ws.cell(row=row, column=1, value='Итого материалы:').font = bold_font
-        ws.cell(row=row, column=8, value=float(total_materials)).number_format = num_fmt
-        ws.cell(row=row, column=8).font = bold_font
-        row += 1
-
-        ws.cell(row=row, column=1, value='Итого работы:').font = bold_font
-        ws.cell(row=row, column=9, value=float(total_works)).number_format = num_fmt
-        ws.cell(row=row, column=9).font = bold_font
-        row += 1
+        sheet.skip()
+        total_materials = totals['materials']
+        total_works = totals['works']
+        sheet.append(['Итого материалы:', None, None, None, None, None, None,
+                      sheet.cell(float(total_materials), 'bold_num')], 'bold')
+        sheet.append(['Итого работы:', None, None, None, None, None, None, None,
+                      sheet.cell(float(total_works), 'bold_num')], 'bold')
 
         grand_total = total_materials + total_works
-        ws.cell(row=row, column=1, value='ИТОГО (без НДС):').font = bold_font
-        ws.cell(row=row, column=9, value=float(grand_total)).number_format = num_fmt
-        ws.cell(row=row, column=9).font = bold_font
+        sheet.append(['ИТОГО (без НДС):', None, None, None, None, None, None, None,
+                      sheet.cell(float(grand_total), 'bold_num')], 'bold')
 
         if self.estimate.with_vat:
-            row += 1
             vat_rate = Decimal(str(self.estimate.vat_rate))
             vat_amount = (grand_total * vat_rate / Decimal('100')).quantize(Decimal('0.01'))
-            ws.cell(row=row, column=1, value=f'НДС {self.estimate.vat_rate}%:').font = bold_font
-            ws.cell(row=row, column=9, value=float(vat_amount)).number_format = num_fmt
-            row += 1
-            ws.cell(row=row, column=1, value='ИТОГО С НДС:').font = Font(bold=True, size=12)
-            ws.cell(row=row, column=9, value=float(grand_total + vat_amount)).number_format = num_fmt
-            ws.cell(row=row, column=9).font = Font(bold=True, size=12)
-
-        row += 2
-        ws.cell(row=row, column=1, value='* Позиции раздела "Требует уточнения" не включены в итоговую сумму')
-        ws.cell(row=row + 1, column=1, value='* Цены актуальны на дату составления сметы')
-
-        # Ширина колонок
-        col_widths = [5, 30, 15, 6, 8, 14, 14, 14, 14]
-        for i, w in enumerate(col_widths, 1):
-            ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = w
-
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        return buffer
+            sheet.append([f'НДС {self.estimate.vat_rate}%:', None, None, None, None, None, None, None,
+                          sheet.cell(float(vat_amount), 'plain_num')], 'bold')
+            sheet.append(['ИТОГО С НДС:', None, None, None, None, None, None, None,
+                          sheet.cell(float(grand_total + vat_amount), 'grand_num')], 'grand')
+
+        sheet.skip()
+        sheet.append(['* Позиции раздела "Требует уточнения" не включены в итоговую сумму'])
+        sheet.append(['* Цены актуальны на дату составления сметы'])
+
+        return book.save()
 
     def export_public(self) -> BytesIO:
         """Экспорт с наценкой для публичного портала."""
@@ -196,129 +198,62 @@ class EstimateExcelExporter:
             return get_sale_price(price, category)
         return price
 
-    def _write_main_section(self, ws, row, title, items, apply_markup,
-                            section_font, header_font, bold_font, center, wrap,
-                            thin_border, num_fmt):
-        """Записывает секцию основного оборудования."""
-        # Заголовок секции
-        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=9)
-        ws.cell(row=row, column=1, value=title).font = section_font
-        row += 1
-
-        # Шапка таблицы
-        headers = ['#', 'Наименование', 'Модель', 'Ед.', 'Кол.',
-                   'Материал, ₽', 'Работа, ₽', 'Мат. итого', 'Раб. итого']
-        for col, h in enumerate(headers, 1):
-            cell = ws.cell(row=row, column=col, value=h)
-            cell.font = header_font
-            cell.alignment = center
-            cell.border = thin_border
-        row += 1
-
-        for i, item in enumerate(items, 1):
-            mat_price = self._get_price(item, apply_markup)
-            work_price = item.work_unit_price or Decimal('0')
-            qty = item.quantity or Decimal('0')
-
-            values = [
-                i, item.name, item.model_name or '', item.unit,
-                float(qty), float(mat_price), float(work_price),
-                float(mat_price * qty), float(work_price * qty),
-            ]
-            for col, val in enumerate(values, 1):
-                cell = ws.cell(row=row, column=col, value=val)
-                cell.border = thin_border
-                if isinstance(val, float):
-                    cell.number_format = num_fmt
-            row += 1
-
-        return row
-
-    def _write_analog_section(self, ws, row, title, items, apply_markup,
-                              section_font, header_font, bold_font, center, wrap,
-                              thin_border, num_fmt, fill):
-        """Записывает секцию аналогов."""
-        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=9)
-        ws.cell(row=row, column=1, value=title).font = section_font
-        row += 1
-
-        headers = ['#', 'Запрошено', 'Предложено', 'Обоснование', 'Ед.', 'Кол.',
-                   'Материал, ₽', 'Работа, ₽', 'Итого, ₽']
-        for col, h in enumerate(headers, 1):
-            cell = ws.cell(row=row, column=col, value=h)
-            cell.font = header_font
-            cell.alignment = center
-            cell.border = thin_border
-        row += 1
-
-        for i, item in enumerate(items, 1):
-            mat_price = self._get_price(item, apply_markup)
-            work_price = item.work_unit_price or Decimal('0')
-            qty = item.quantity or Decimal('0')
-            line_total = (mat_price + work_price) * qty
-
-            values = [
-                i,
-                item.original_name or item.name,
-                item.name,
-                item.analog_reason or '',
-                item.unit,
-                float(qty),
-                float(mat_price * qty),
-                float(work_price * qty),
-                float(line_total),
-            ]
-            for col, val in enumerate(values, 1):
-                cell = ws.cell(row=row, column=col, value=val)
-                cell.border = thin_border
-                cell.fill = fill
-                if isinstance(val, float):
-                    cell.number_format = num_fmt
-            row += 1
-
-        return row
-
-    def _write_unknown_section(self, ws, row, title, items,
-                               section_font, header_font, center, wrap,
-                               thin_border, fill):
-        """Записывает секцию 'Требует уточнения'."""
-        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=9)
-        ws.cell(row=row, column=1, value=title).font = section_font
-        row += 1
-
-        headers = ['#', 'Наименование', 'Модель', 'Ед.', 'Кол.', '', '', '', 'Примечание']
-        for col, h in enumerate(headers, 1):
-            cell = ws.cell(row=row, column=col, value=h)
-            cell.font = header_font
-            cell.alignment = center
-            cell.border = thin_border
-        row += 1
-
-        for i, item in enumerate(items, 1):
-            values = [
-                i, item.name, item.model_name or '', item.unit,
-                float(item.quantity or 0), '', '', '',
-                'Нет в каталоге, цена по запросу',
-            ]
-            for col, val in enumerate(values, 1):
-                cell = ws.cell(row=row, column=col, value=val)
-                cell.border = thin_border
-                cell.fill = fill
-            row += 1
-
-        return row
-
-    def _calc_subtotals(self, items, apply_markup: bool) -> dict:
-        """Считает итоги по секции."""
-        materials = Decimal('0')
-        works = Decimal('0')
-        for item in items:
-            qty = item.quantity or Decimal('0')
-            mat_price = self._get_price(item, apply_markup)
-            work_price = item.work_unit_price or Decimal('0')
-            materials += mat_price * qty
-            works += work_price * qty
-        return {'materials': materials, 'works': works}
+    @staticmethod
+    def _write_section(sheet, title, headers, items, build_values, style, num_style):
+        """Секция: заголовок и шапка пишутся только если есть позиции."""
+        written = False
+        for idx, item in enumerate(iter_queryset(items), 1):
+            if not written:
+                sheet.append([title], 'section', merge_to=9)
+                sheet.append(headers, 'header')
+                written = True
+            sheet.append([
+                sheet.cell(val, num_style if isinstance(val, float) else style)
+                for val in build_values(idx, item)
+            ])
+        if written:
+            sheet.skip()
+
+    def _main_values(self, idx, item, apply_markup, totals) -> list:
+        """Строка основного оборудования; суммы копятся в totals."""
+        mat_price = self._get_price(item, apply_markup)
+        work_price = item.work_unit_price or Decimal('0')
+        qty = item.quantity or Decimal('0')
+        totals['materials'] += mat_price * qty
+        totals['works'] += work_price * qty
+        return [
+            idx, item.name, item.model_name or '', item.unit,
+            float(qty), float(mat_price), float(work_price),
+            float(mat_price * qty), float(work_price * qty),
+        ]
+
+    def _analog_values(self, idx, item, apply_markup, totals) -> list:
+        """Строка аналога; суммы копятся в totals."""
+        mat_price = self._get_price(item, apply_markup)
+        work_price = item.work_unit_price or Decimal('0')
+        qty = item.quantity or Decimal('0')
+        totals['materials'] += mat_price * qty
+        totals['works'] += work_price * qty
+        return [
+            idx,
+            item.original_name or item.name,
+            item.name,
+            item.analog_reason or '',
+            item.unit,
+            float(qty),
+            float(mat_price * qty),
+            float(work_price * qty),
+            float((mat_price + work_price) * qty),
+        ]
+
+    @staticmethod
+    def _unknown_values(idx, item) -> list:
+        """Строка 'Требует уточнения' — без цен."""
+        return [
+            idx, item.name, item.model_name or '', item.unit,
+            float(item.quantity or 0), '', '', '',
+            'Нет в каталоге, цена по запросу',
+        ]
 
     # ── Экспорт с column_config ─────────────────────────────────────
 
@@ -340,176 +275,165 @@ class EstimateExcelExporter:
         Returns:
             BytesIO с .xlsx файлом.
         """
+        return to_bytesio(self.export_with_column_config_to_file(mode))
+
+    def export_with_column_config_to_file(self, mode: str = 'internal'):
+        """Как export_with_column_config(), но возвращает временный файл."""
         from estimates.column_defaults import DEFAULT_COLUMN_CONFIG
-        from estimates.formula_engine import compute_all_formulas
+        from estimates.formula_engine import compile_column_config
 
         estimate = self.estimate
         config = estimate.column_config or DEFAULT_COLUMN_CONFIG
+        compiled = compile_column_config(config)
         visible_cols = [c for c in config if c.get('visible', True)]
 
         if mode == 'external':
             visible_cols = [c for c in visible_cols if c['key'] not in self._INTERNAL_ONLY_KEYS]
 
-        items = list(EstimateItem.objects.filter(
+        # Позиции идут в порядке разделов — сливаются с разделами за один проход
+        items = iter_queryset(EstimateItem.objects.filter(
             estimate=estimate,
         ).select_related('section', 'estimate', 'work_item').order_by(
-            'section__sort_order', 'sort_order', 'item_number',
+            'section__sort_order', 'section_id', 'sort_order', 'item_number',
         ))
-
         sections = EstimateSection.objects.filter(
             estimate=estimate,
-        ).order_by('sort_order')
-
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = 'Смета'
-
-        bold = Font(bold=True)
-        header_font = Font(bold=True, size=14)
-        section_font = Font(bold=True, size=11, color='1F4E79')
-        center = Alignment(horizontal='center', vertical='center')
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin'),
-        )
-        num_fmt = '#,##0.00'
+        ).order_by('sort_order', 'id')
 
-        # Title
         num_cols = len(visible_cols)
-        last_col_letter = openpyxl.utils.get_column_letter(max(num_cols, 1))
-        ws.merge_cells(f'A1:{last_col_letter}1')
-        ws['A1'] = f'Смета №{estimate.number} — {estimate.name}'
-        ws['A1'].font = header_font
-        ws['A1'].alignment = center
+        book = StreamWorkbook(_COLUMN_CONFIG_STYLES)
+        sheet = book.sheet('Смета', widths=[
+            max(col_def.get('width', 100) / 8, 8) for col_def in visible_cols
+        ])
+
+        # Title
+        sheet.append([f'Смета №{estimate.number} — {estimate.name}'], 'title', merge_to=num_cols)
+        sheet.skip()
 
         # Column headers (row 3)
-        for col_idx, col_def in enumerate(visible_cols, 1):
+        labels = []
+        for col_def in visible_cols:
             label = col_def.get('label', col_def['key'])
             # В external-режиме "продажные" колонки отображаются как просто "Цена мат." и т.д.
             if mode == 'external':
                 label = label.replace('Продажа ', 'Цена ').replace('Итого продажа ', 'Итого ')
-            cell = ws.cell(row=3, column=col_idx, value=label)
-            cell.font = bold
-            cell.alignment = center
-            cell.border = thin_border
-            ws.column_dimensions[openpyxl.utils.get_column_letter(col_idx)].width = max(
-                col_def.get('width', 100) / 8, 8,
-            )
-
-        row_num = 4
-        agg_sums = {c['key']: Decimal('0') for c in visible_cols if c.get('aggregatable')}
+            labels.append(label)
+        sheet.append(labels, 'header')
 
-        section_fill = PatternFill(start_color='D6E4F0', end_color='D6E4F0', fill_type='solid')
-        subtotal_font = Font(bold=True, size=10, color='333333')
+        agg_sums = {c['key']: Decimal('0') for c in visible_cols if c.get('aggregatable')}
+        section_ids = set(sections.values_list('id', flat=True))
+        pending = next(items, None)
 
         for section in sections:
             # Section header
-            ws.merge_cells(start_row=row_num, start_column=1, end_row=row_num, end_column=num_cols)
-            cell = ws.cell(row=row_num, column=1, value=section.name)
-            cell.font = section_font
-            cell.fill = section_fill
-            row_num += 1
+            sheet.append([section.name], 'section', merge_to=num_cols)
 
-            section_items = [i for i in items if i.section_id == section.id]
             section_sums = {c['key']: Decimal('0') for c in visible_cols if c.get('aggregatable')}
-
-            for item in section_items:
-                builtin_values = {
-                    'item_number': Decimal(str(item.item_number or 0)),
-                    'quantity': item.quantity or Decimal('0'),
-                    'material_unit_price': item.material_unit_price or Decimal('0'),
-                    'work_unit_price': item.work_unit_price or Decimal('0'),
-                    'material_total': item.material_total or Decimal('0'),
-                    'work_total': item.work_total or Decimal('0'),
-                    'line_total': item.line_total or Decimal('0'),
-                    # Новые builtin-поля для наценок
-                    'material_sale_unit_price': item.material_sale_unit_price or Decimal('0'),
-                    'work_sale_unit_price': item.work_sale_unit_price or Decimal('0'),
-                    'material_purchase_total': item.material_purchase_total or Decimal('0'),
-                    'work_purchase_total': item.work_purchase_total or Decimal('0'),
-                    'material_sale_total': item.material_sale_total or Decimal('0'),
-                    'work_sale_total': item.work_sale_total or Decimal('0'),
-                    'effective_material_markup_percent': item.effective_material_markup_percent or Decimal('0'),
-                    'effective_work_markup_percent': item.effective_work_markup_percent or Decimal('0'),
-                }
-                custom_data = item.custom_data or {}
-                computed = compute_all_formulas(config, builtin_values, custom_data)
-
-                for col_idx, col_def in enumerate(visible_cols, 1):
-                    key = col_def['key']
-                    col_type = col_def.get('type', 'builtin')
-                    value = None
-
-                    if col_type == 'builtin':
-                        field = col_def.get('builtin_field', key)
-                        if field == 'work_item_name':
-                            value = item.work_item.name if item.work_item else ''
-                        elif key in builtin_values:
-                            value = builtin_values[key]
-                        else:
-                            value = getattr(item, field, None)
-                    elif col_type == 'formula':
-                        value = computed.get(key)
-                    elif col_type.startswith('custom_'):
-                        value = custom_data.get(key, '')
-
-                    cell = ws.cell(row=row_num, column=col_idx)
-                    cell.border = thin_border
-
-                    if isinstance(value, Decimal):
-                        cell.value = float(value)
-                        cell.number_format = num_fmt
-                    elif value is not None:
-                        try:
-                            cell.value = float(value)
-                            cell.number_format = num_fmt
-                        except (ValueError, TypeError):
-                            cell.value = str(value) if value else ''
-                    else:
-                        cell.value = ''
-
-                    # Accumulate aggregatables
-                    if value is not None:
-                        try:
-                            dec_val = Decimal(str(value))
-                            if key in agg_sums:
-                                agg_sums[key] += dec_val
-                            if key in section_sums:
-                                section_sums[key] += dec_val
-                        except Exception:
-                            pass
-
-                row_num += 1
+            has_items = False
+
+            while pending is not None and (
+                pending.section_id == section.id or pending.section_id not in section_ids
+            ):
+                item = pending
+                pending = next(items, None)
+                if item.section_id != section.id:
+                    continue
+                has_items = True
+                sheet.append(self._column_config_row(
+                    sheet, item, visible_cols, compiled, agg_sums, section_sums,
+                ))
 
             # Section subtotals
-            if section_items and any(v > 0 for v in section_sums.values()):
+            if has_items and any(v > 0 for v in section_sums.values()):
+                row = []
                 for col_idx, col_def in enumerate(visible_cols, 1):
                     key = col_def['key']
-                    cell = ws.cell(row=row_num, column=col_idx)
-                    cell.font = subtotal_font
-                    cell.border = thin_border
                     if key in section_sums and section_sums[key] > 0:
-                        cell.value = float(section_sums[key])
-                        cell.number_format = num_fmt
+                        row.append(sheet.cell(float(section_sums[key]), 'subtotal_num'))
                     elif col_idx == 1:
-                        cell.value = f'Итого: {section.name}'
-                row_num += 1
+                        row.append(sheet.cell(f'Итого: {section.name}', 'subtotal'))
+                    else:
+                        row.append(sheet.cell(None, 'subtotal'))
+                sheet.append(row)
 
         # Footer totals
         if agg_sums:
-            row_num += 1
+            sheet.skip()
+            row = []
             for col_idx, col_def in enumerate(visible_cols, 1):
                 key = col_def['key']
-                cell = ws.cell(row=row_num, column=col_idx)
-                cell.font = bold
-                cell.border = thin_border
                 if key in agg_sums:
-                    cell.value = float(agg_sums[key])
-                    cell.number_format = num_fmt
+                    row.append(sheet.cell(float(agg_sums[key]), 'total_num'))
                 elif col_idx == 1:
-                    cell.value = 'ИТОГО'
-
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        return buffer
+                    row.append(sheet.cell('ИТОГО', 'total'))
+                else:
+                    row.append(sheet.cell(None, 'total'))
+            sheet.append(row)
+
+        return book.save()
+
+    @staticmethod
+    def _column_config_row(sheet, item, visible_cols, compiled, agg_sums, section_sums) -> list:
+        """Ячейки строки позиции по column_config; суммы копятся в agg/section_sums."""
+        builtin_values = {
+            'item_number': Decimal(str(item.item_number or 0)),
+            'quantity': item.quantity or Decimal('0'),
+            'material_unit_price': item.material_unit_price or Decimal('0'),
+            'work_unit_price': item.work_unit_price or Decimal('0'),
+            'material_total': item.material_total or Decimal('0'),
+            'work_total': item.work_total or Decimal('0'),
+            'line_total': item.line_total or Decimal('0'),
+            # Новые builtin-поля для наценок
+            'material_sale_unit_price': item.material_sale_unit_price or Decimal('0'),
+            'work_sale_unit_price': item.work_sale_unit_price or Decimal('0'),
+            'material_purchase_total': item.material_purchase_total or Decimal('0'),
+            'work_purchase_total': item.work_purchase_total or Decimal('0'),
+            'material_sale_total': item.material_sale_total or Decimal('0'),
+            'work_sale_total': item.work_sale_total or Decimal('0'),
+            'effective_material_markup_percent': item.effective_material_markup_percent or Decimal('0'),
+            'effective_work_markup_percent': item.effective_work_markup_percent or Decimal('0'),
+        }
+        custom_data = item.custom_data or {}
+        computed = compiled.compute(builtin_values, custom_data)
+
+        cells = []
+        for col_def in visible_cols:
+            key = col_def['key']
+            col_type = col_def.get('type', 'builtin')
+            value = None
+
+            if col_type == 'builtin':
+                field = col_def.get('builtin_field', key)
+                if field == 'work_item_name':
+                    value = item.work_item.name if item.work_item else ''
+                elif key in builtin_values:
+                    value = builtin_values[key]
+                else:
+                    value = getattr(item, field, None)
+            elif col_type == 'formula':
+                value = computed.get(key)
+            elif col_type.startswith('custom_'):
+                value = custom_data.get(key, '')
+
+            if isinstance(value, Decimal):
+                cells.append(sheet.cell(float(value), 'num'))
+            elif value is not None:
+                try:
+                    cells.append(sheet.cell(float(value), 'num'))
+                except (ValueError, TypeError):
+                    cells.append(sheet.cell(str(value) if value else '', 'cell'))
+            else:
+                cells.append(sheet.cell('', 'cell'))
+
+            # Accumulate aggregatables
+            if value is not None:
+                try:
+                    dec_val = Decimal(str(value))
+                    if key in agg_sums:
+                        agg_sums[key] += dec_val
+                    if key in section_sums:
+                        section_sums[key] += dec_val
+                except Exception:
+                    pass
+
+        return cells
@@ -168,40 +168,71 @@ def recalculate_section_subsections(section_id: int):
     estimate.update_auto_characteristics()
 
 
-def recalculate_subsections_for_items(item_ids):
-    """Пересчитать подразделы для всех подразделов, содержащих указанные строки."""
-    affected_subsection_ids = set(
-        EstimateItem.objects.filter(id__in=item_ids)
-        .values_list('subsection_id', flat=True)
-        .distinct()
-    )
-    affected_subsection_ids.discard(None)
+_SUBSECTION_TOTAL_FIELDS = [
+    'materials_purchase', 'works_purchase', 'materials_sale', 'works_sale',
+]
+
+# Поля строки, нужные для агрегатов (остальные не грузим)
+_ITEM_TOTAL_FIELDS = (
+    'id', 'subsection_id', 'quantity', 'material_unit_price', 'work_unit_price',
+    'material_markup_type', 'material_markup_value',
+    'work_markup_type', 'work_markup_value',
+)
+
 
-    if not affected_subsection_ids:
+def recalculate_subsections(subsection_ids, refresh_characteristics=True):
+    """Пересчитать агрегаты указанных подразделов.
+
+    Один запрос строк на все подразделы, наценки раздела/сметы берутся один
+    раз на подраздел, запись — одним bulk_update; автохарактеристики —
+    один раз на смету (refresh_characteristics=False — не обновлять).
+    """
+    subsection_ids = {sid for sid in subsection_ids if sid}
+    if not subsection_ids:
+        return
+
+    subsections = list(
+        EstimateSubsection.objects.filter(id__in=subsection_ids)
+        .select_related('section__estimate')
+    )
+    if not subsections:
         return
 
-    affected_estimate_ids = set()
-    for sub in EstimateSubsection.objects.filter(
-        id__in=affected_subsection_ids
-    ).select_related('section__estimate'):
+    by_subsection = defaultdict(list)
+    items = EstimateItem.objects.filter(
+        subsection_id__in=[sub.id for sub in subsections]
+    ).only(*_ITEM_TOTAL_FIELDS)
+    for item in items.iterator(chunk_size=2000):
+        by_subsection[item.subsection_id].append(item)
+
+    estimates = {}
+    for sub in subsections:
         section = sub.section
         estimate = section.estimate
-        affected_estimate_ids.add(estimate.id)
-
-        sub_items = list(EstimateItem.objects.filter(subsection=sub))
-        mat_p, work_p, mat_s, work_s = _compute_subsection_totals(sub_items, section, estimate)
+        estimates[estimate.id] = estimate
+        mat_p, work_p, mat_s, work_s = _compute_subsection_totals(
+            by_subsection.get(sub.id, []), section, estimate,
+        )
         sub.materials_purchase = mat_p
         sub.works_purchase = work_p
         sub.materials_sale = mat_s
         sub.works_sale = work_s
-        sub.save(update_fields=[
-            'materials_purchase', 'works_purchase', 'materials_sale', 'works_sale',
-        ])
-
-    for est_id in affected_estimate_ids:
-        est = Estimate.objects.get(pk=est_id)
-        est.refresh_from_db()
-        est.update_auto_characteristics()
+
+    EstimateSubsection.objects.bulk_update(subsections, _SUBSECTION_TOTAL_FIELDS)
+
+    if not refresh_characteristics:
+        return
+    for estimate in estimates.values():
+        estimate.update_auto_characteristics()
+
+
+def recalculate_subsections_for_items(item_ids):
+    """Пересчитать подразделы для всех подразделов, содержащих указанные строки."""
+    recalculate_subsections(
+        EstimateItem.objects.filter(id__in=item_ids)
+        .values_list('subsection_id', flat=True)
+        .distinct()
+    )
 
 
 def bulk_set_item_markup(item_ids, material_markup_type=None, material_markup_value=None,
@@ -17,10 +17,13 @@ logger = logging.getLogger(__name__)
 DEFAULT_SESSION_TTL = 3600  # 1 час
 
 
-def get_redis():
-    """Подключение к Redis (общее для всех сессий)."""
+def get_redis(decode_responses: bool = True):
+    """Подключение к Redis (общее для всех сессий).
+
+    decode_responses=False — для бинарных блобов (снапшот подбора работ).
+    """
     try:
-        return redis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+        return redis.from_url(settings.CELERY_BROKER_URL, decode_responses=decode_responses)
     except redis.ConnectionError as e:
         logger.error('Redis connection failed: %s', e)
         raise RuntimeError(f'Redis unavailable: {e}') from e
@@ -11,7 +11,7 @@ from django.db import transaction
 
 from estimates.models import (
     Estimate, EstimateSection, EstimateSubsection, EstimateItem,
-    SpecificationItem,
+    SpecificationItem, deferred_subsection_totals,
 )
 from objects.models import Object
 from accounting.models import LegalEntity
@@ -106,41 +106,43 @@ def create_estimate_from_spec_items(
     sections = {}
     item_number = 0
 
-    for spec_item in spec_items:
-        section_key = spec_item.section_name or 'Общее'
-
-        if section_key not in sections:
-            section = EstimateSection.objects.create(
+    # Агрегаты подразделов — один пересчёт на выходе, а не на каждую строку
+    with deferred_subsection_totals():
+        for spec_item in spec_items:
+            section_key = spec_item.section_name or 'Общее'
+
+            if section_key not in sections:
+                section = EstimateSection.objects.create(
+                    estimate=estimate,
+                    name=section_key,
+                    sort_order=len(sections),
+                )
+                subsection = EstimateSubsection.objects.create(
+                    section=section,
+                    name='Оборудование и материалы',
+                    sort_order=0,
+                )
+                sections[section_key] = (section, subsection)
+
+            section, subsection = sections[section_key]
+            item_number += 1
+
+            EstimateItem.objects.create(
                 estimate=estimate,
-                name=section_key,
-                sort_order=len(sections),
-            )
-            subsection = EstimateSubsection.objects.create(
                 section=section,
-                name='Оборудование и материалы',
-                sort_order=0,
+                subsection=subsection,
+                item_number=str(item_number),
+                name=spec_item.name,
+                model_name=spec_item.model_name,
+                unit=spec_item.unit,
+                quantity=spec_item.quantity,
+                original_name=spec_item.name,
+                custom_data={
+                    'brand': spec_item.brand,
+                    'tech_specs': spec_item.tech_specs_raw,
+                    'source_spec_item_id': spec_item.pk,
+                },
             )
-            sections[section_key] = (section, subsection)
-
-        section, subsection = sections[section_key]
-        item_number += 1
-
-        EstimateItem.objects.create(
-            estimate=estimate,
-            section=section,
-            subsection=subsection,
-            item_number=str(item_number),
-            name=spec_item.name,
-            model_name=spec_item.model_name,
-            unit=spec_item.unit,
-            quantity=spec_item.quantity,
-            original_name=spec_item.name,
-            custom_data={
-                'brand': spec_item.brand,
-                'tech_specs': spec_item.tech_specs_raw,
-                'source_spec_item_id': spec_item.pk,
-            },
-        )
 
     logger.info(
         'create_estimate_from_spec_items: создана смета %s с %d позициями в %d секциях',
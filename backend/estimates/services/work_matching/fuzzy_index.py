@@ -0,0 +1,161 @@
+"""Инвертированный триграммный индекс по каталогу WorkItem для fuzzy-уровней.
+
+Полный перебор `fuzz.token_set_ratio` по всему каталогу на каждую строку сметы
+стоит O(строк × каталог) Python-итераций. Индекс строится один раз на
+MatchingContext и отдаёт тот же результат, что полный перебор, оценивая
+батчем через `rapidfuzz.process.extract` (цикл на C) только записи, которые
+могут пройти порог:
+
+- записи с общими триграммами оцениваются все;
+- у записи без общих триграмм нет общих токенов, и token_set_ratio равен
+  indel-сходству отсортированных строк токенов: не больше
+  200·min(la, lb)/(la + lb) по их длинам. Такие записи берутся из окна
+  длин, где эта граница не ниже порога (score_cutoff или, при limit,
+  score последнего кандидата из записей с общими триграммами).
+"""
+import bisect
+import logging
+from collections import defaultdict
+from typing import Dict, List, Sequence, Set, Tuple
+
+from rapidfuzz import fuzz, process
+
+logger = logging.getLogger(__name__)
+
+# Запас на погрешность float: батч-скоринг rapidfuzz (через расстояние) на
+# границе может дать score на ulp ниже прямого вызова scorer'а
+_BOUND_EPS = 1e-9
+_CUTOFF_EPS = 0.5
+
+
+def _trigrams(normalized: str) -> set:
+    """Триграммы каждого токена с паддингом (короткие токены тоже дают граммы)."""
+    grams = set()
+    for token in normalized.split():
+        padded = f' {token} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def _token_set_length(normalized: str) -> int:
+    """Длина строки уникальных токенов, которую сравнивает token_set_ratio."""
+    tokens = set(normalized.split())
+    return len(' '.join(tokens))
+
+
+class WorkItemFuzzyIndex:
+    """Триграммный индекс над записями `(id, name, normalized_name, obj, ...)`.
+
+    Хранит postings: триграмма → список позиций записей в исходном списке,
+    и позиции, отсортированные по длине строки токенов. При равных score
+    результат упорядочен по позиции в каталоге — как у полного перебора.
+    """
+
+    def __init__(self, entries: Sequence[Tuple]):
+        self.entries = entries
+        self._normalized: List[str] = [entry[2] for entry in entries]
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for idx, normalized in enumerate(self._normalized):
+            for gram in _trigrams(normalized):
+                postings[gram].append(idx)
+        self._postings = dict(postings)
+        by_length = sorted(
+            (_token_set_length(normalized), idx)
+            for idx, normalized in enumerate(self._normalized)
+        )
+        self._lengths = [length for length, _ in by_length]
+        self._by_length = [idx for _, idx in by_length]
+        logger.info(
+            'Built WorkItem fuzzy index: %d entries, %d trigrams',
+            len(entries), len(self._postings),
+        )
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _sharing_trigrams(self, query_normalized: str) -> Set[int]:
+        shared: Set[int] = set()
+        for gram in _trigrams(query_normalized):
+            postings = self._postings.get(gram)
+            if postings:
+                shared.update(postings)
+        return shared
+
+    def _length_window(self, query_length: int, cutoff: float) -> List[int]:
+        """Позиции записей, у которых граница по длинам ≥ cutoff."""
+        if cutoff <= 0:
+            return self._by_length
+        if cutoff > 100:
+            return []
+        low = cutoff * query_length / (200 - cutoff) - _BOUND_EPS
+        high = query_length * (200 - cutoff) / cutoff + _BOUND_EPS
+        start = bisect.bisect_left(self._lengths, low)
+        end = bisect.bisect_right(self._lengths, high)
+        return self._by_length[start:end]
+
+    def _score(self, query_normalized: str, candidates: List[int],
+               score_cutoff: float) -> List[Tuple[float, int]]:
+        if not candidates:
+            return []
+        matches = process.extract(
+            query_normalized,
+            [self._normalized[idx] for idx in candidates],
+            scorer=fuzz.token_set_ratio,
+            score_cutoff=max(score_cutoff - _CUTOFF_EPS, 0),
+            limit=None,
+        )
+        # Прошедшие батч-фильтр пересчитываются прямым вызовом — score
+        # бит-в-бит как у полного перебора (важно для порядка и cutoff)
+        scored = []
+        for _, _, pos in matches:
+            idx = candidates[pos]
+            score = fuzz.token_set_ratio(query_normalized, self._normalized[idx])
+            if score >= score_cutoff:
+                scored.append((score, idx))
+        return scored
+
+    def search(self, query_normalized: str, score_cutoff: float = 0.0,
+               limit: int = None) -> List[Tuple[float, int]]:
+        """Top записей по `fuzz.token_set_ratio` — как `brute_force_search`.
+
+        Args:
+            query_normalized: нормализованное название строки сметы.
+            score_cutoff: нижняя граница score (0..100, включительно).
+            limit: максимум результатов (None — все прошедшие cutoff).
+
+        Returns:
+            [(score, entry_index), ...] — по убыванию score, при равенстве —
+            в порядке каталога.
+        """
+        shared = self._sharing_trigrams(query_normalized)
+        scored = sorted(
+            self._score(query_normalized, sorted(shared), score_cutoff),
+            key=lambda x: (-x[0], x[1]),
+        )
+        cutoff = score_cutoff
+        if limit is not None and len(scored) >= limit > 0:
+            # Запись без общих токенов попадёт в top, только набрав не меньше
+            cutoff = max(cutoff, scored[limit - 1][0])
+        others = [
+            idx
+            for idx in self._length_window(_token_set_length(query_normalized), cutoff)
+            if idx not in shared
+        ]
+        if others:
+            scored = sorted(
+                scored + self._score(query_normalized, others, cutoff),
+                key=lambda x: (-x[0], x[1]),
+            )
+        return scored[:limit] if limit is not None else scored
+
+    def brute_force_search(self, query_normalized: str, score_cutoff: float = 0.0,
+                           limit: int = None) -> List[Tuple[float, int]]:
+        """Эталонный полный перебор (для бенчмарка и регрессионных тестов)."""
+        scored = []
+        for idx, normalized in enumerate(self._normalized):
+            score = fuzz.token_set_ratio(query_normalized, normalized)
+            if score >= score_cutoff:
+                scored.append((score, idx))
+        scored.sort(key=lambda x: -x[0])
+        return scored[:limit] if limit is not None else scored
@@ -9,6 +9,8 @@ from django.utils import timezone
 from catalog.models import Product, ProductKnowledge
 from pricelists.models import WorkItem
 
+from .snapshot import invalidate_knowledge_snapshot
+
 logger = logging.getLogger(__name__)
 
 KNOWLEDGE_DIR = os.path.join(settings.BASE_DIR, '..', 'data', 'knowledge', 'products')
@@ -37,6 +39,7 @@ def save_knowledge(item_name: str, work_item: WorkItem, source: str,
             usage_count=knowledge.usage_count + 1,
             last_used_at=timezone.now(),
         )
+        invalidate_knowledge_snapshot()
 
     # Обновить .md файл
     try:
@@ -56,6 +59,7 @@ def verify_knowledge(item_name_pattern: str, work_item_id: int, user=None):
         status=ProductKnowledge.Status.VERIFIED,
         verified_by=user,
     )
+    invalidate_knowledge_snapshot()
 
 
 def reject_knowledge(item_name_pattern: str, work_item_id: int, user=None):
@@ -64,6 +68,7 @@ def reject_knowledge(item_name_pattern: str, work_item_id: int, user=None):
         item_name_pattern=item_name_pattern[:500],
         work_item_id=work_item_id,
     ).update(status=ProductKnowledge.Status.REJECTED)
+    invalidate_knowledge_snapshot()
 
 
 def _update_md_file(normalized_name: str, knowledge: ProductKnowledge):
@@ -1,11 +1,14 @@
 """Pipeline подбора работ: контекст + оркестратор для всех уровней."""
 import logging
-from decimal import Decimal
 from typing import Dict, List, Optional, Tuple
 
-from catalog.models import Product, ProductKnowledge, ProductWorkMapping
-from pricelists.models import PriceList, PriceListItem, WorkItem
+from catalog.models import ProductWorkMapping
+from pricelists.models import PriceList
 
+from .fuzzy_index import WorkItemFuzzyIndex
+from .snapshot import (
+    SnapshotKnowledge, SnapshotWorkItem, load_catalog_snapshot, load_knowledge_snapshot,
+)
 from .tiers import ALL_TIERS, FAST_TIERS, MatchResult, _wi_grade_str
 
 logger = logging.getLogger(__name__)
@@ -15,55 +18,33 @@ class MatchingContext:
     """Кэшированный контекст для pipeline. Создаётся один раз при старте задачи.
 
     Содержит pre-computed данные чтобы избежать N+1 запросов:
-    - Все WorkItems с normalized names
+    - Все WorkItems с normalized names (+ триграммный индекс для fuzzy-уровней)
     - Все PriceListItems для прайс-листа сметы
     - History cache (ProductWorkMapping по product_id)
     - Knowledge cache (ProductKnowledge по normalized name)
     - Ставки прайс-листа (для расчёта calculated_cost)
+
+    Каталог и знания берутся из общего снапшота (snapshot.py), поэтому
+    объекты в кэшах — SnapshotWorkItem/SnapshotKnowledge, а не модели.
     """
 
     def __init__(self, estimate, items=None):
         self.estimate = estimate
         self.price_list: Optional[PriceList] = estimate.price_list
 
-        # Pre-compute WorkItems cache: (id, name, normalized_name, obj)
-        self.work_items_cache: List[Tuple[int, str, str, WorkItem]] = []
-        for wi in WorkItem.objects.filter(is_current=True).select_related('section', 'grade'):
-            self.work_items_cache.append((
-                wi.id, wi.name, Product.normalize_name(wi.name), wi
-            ))
+        # Каталог WorkItem + PriceListItem с normalized names и стоимостью —
+        # из версионированного снапшота (см. snapshot.py)
+        self._catalog = load_catalog_snapshot(self.price_list)
+        # (id, name, normalized_name, obj)
+        self.work_items_cache: List[Tuple[int, str, str, SnapshotWorkItem]] = self._catalog.work_items_cache
         logger.info('Loaded %d WorkItems into cache', len(self.work_items_cache))
 
-        # Pre-compute PriceListItems: (wi_id, wi_name, wi_normalized, wi_obj, cost_str)
-        self.pricelist_items_cache: List[Tuple[int, str, str, WorkItem, Optional[str]]] = []
-        self._pli_cost_map: Dict[int, str] = {}  # work_item_id → cost string
-
+        # (wi_id, wi_name, wi_normalized, wi_obj, cost_str)
+        self.pricelist_items_cache: List[
+            Tuple[int, str, str, SnapshotWorkItem, Optional[str]]
+        ] = self._catalog.pricelist_items_cache
+        self._pli_cost_map: Dict[int, str] = self._catalog.pli_cost_map  # work_item_id → cost string
         if self.price_list:
-            plis = (
-                PriceListItem.objects.filter(
-                    price_list=self.price_list,
-                    is_included=True,
-                )
-                .select_related('work_item', 'work_item__section', 'work_item__grade')
-            )
-            for pli in plis:
-                wi = pli.work_item
-                # Вычисляем cost вручную чтобы избежать N+1 на property
-                try:
-                    effective_hours = pli.hours_override if pli.hours_override is not None else (wi.hours or Decimal('0'))
-                    effective_coeff = pli.coefficient_override if pli.coefficient_override is not None else wi.coefficient
-                    effective_grade = pli.grade_override if pli.grade_override is not None else (wi.required_grade or Decimal('1'))
-                    rate = self.price_list.get_rate_for_grade(effective_grade)
-                    cost = effective_hours * effective_coeff * rate
-                    cost_str = str(cost.quantize(Decimal('0.01')))
-                except Exception:
-                    cost_str = None
-
-                wi_normalized = Product.normalize_name(wi.name)
-                self.pricelist_items_cache.append((wi.id, wi.name, wi_normalized, wi, cost_str))
-                if cost_str:
-                    self._pli_cost_map[wi.id] = cost_str
-
             logger.info('Loaded %d PriceListItems into cache', len(self.pricelist_items_cache))
 
         # Prefetch history: product_id → best ProductWorkMapping
@@ -84,19 +65,8 @@ class MatchingContext:
                         self.history_cache[m.product_id] = m
                 logger.info('Loaded %d ProductWorkMappings into history cache', len(self.history_cache))
 
-        # Prefetch knowledge: normalized_name → best ProductKnowledge
-        self.knowledge_cache: Dict[str, ProductKnowledge] = {}
-        knowledge_qs = (
-            ProductKnowledge.objects.filter(
-                status__in=[ProductKnowledge.Status.VERIFIED, ProductKnowledge.Status.PENDING],
-                confidence__gte=0.5,
-            )
-            .select_related('work_item', 'work_item__section')
-            .order_by('-confidence', '-usage_count')
-        )
-        for k in knowledge_qs:
-            if k.item_name_pattern not in self.knowledge_cache:
-                self.knowledge_cache[k.item_name_pattern] = k
+        # Prefetch knowledge: normalized_name → best ProductKnowledge (из снапшота)
+        self.knowledge_cache: Dict[str, SnapshotKnowledge] = load_knowledge_snapshot()
         logger.info('Loaded %d ProductKnowledge into knowledge cache', len(self.knowledge_cache))
 
         # Отложенные обновления usage_count для knowledge
@@ -105,7 +75,12 @@ class MatchingContext:
         # Shared state: fuzzy candidates from Tier 5 → Tier 6
         self.fuzzy_candidates: Dict[int, list] = {}
 
-    def get_cost_for_work_item(self, wi: WorkItem) -> Optional[str]:
+    @property
+    def work_items_index(self) -> WorkItemFuzzyIndex:
+        """Индекс по work_items_cache. Строится лениво — один раз на снапшот каталога."""
+        return self._catalog.work_items_index
+
+    def get_cost_for_work_item(self, wi) -> Optional[str]:
         """Получить стоимость работы из кэша PriceListItem."""
         return self._pli_cost_map.get(wi.id)
 
@@ -0,0 +1,373 @@
+"""Версионированный снапшот каталога работ для MatchingContext.
+
+Сборка контекста с нуля — секунды DB-времени: все актуальные WorkItem, все
+PriceListItem прайс-листа с расчётом стоимости, вся ProductKnowledge и
+normalize_name на каждое имя. Снапшот собирается один раз на версию каталога
+и кладётся в Redis компактным блобом (JSON + zlib); воркеры читают его за
+миллисекунды, а внутри процесса держат последние загруженные версии в памяти.
+
+Версии — токены в Redis, их меняют сигналы (см. estimates/signals.py):
+- каталог: WorkItem / WorkSection / WorkerGrade / PriceList / PriceListItem;
+- знания: ProductKnowledge — отдельно, т.к. пополняются во время самого
+  подбора и не должны сбрасывать тяжёлую часть с каталогом.
+
+Если Redis недоступен или WORK_MATCHING_SNAPSHOT_CACHE=False — контекст
+строится из БД как раньше (fail-open).
+"""
+import json
+import logging
+import time
+import uuid
+import zlib
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from catalog.models import Product, ProductKnowledge
+from pricelists.models import PriceListItem, WorkItem
+
+from .tiers import _wi_grade_str
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = 'work_match_snapshot'
+CATALOG_VERSION_KEY = f'{SNAPSHOT_PREFIX}:catalog_version'
+KNOWLEDGE_VERSION_KEY = f'{SNAPSHOT_PREFIX}:knowledge_version'
+SNAPSHOT_TTL = 6 * 3600  # страховка от изменений в обход сигналов (queryset.update)
+BUILD_LOCK_TTL = 120
+BUILD_WAIT_SECONDS = 30
+
+# Блобы, уже распакованные в этом процессе: redis key → снапшот
+_process_cache: Dict[str, object] = {}
+_PROCESS_CACHE_MAX = 8
+
+
+class SnapshotSection:
+    """Раздел работ в снапшоте (только поля, которые читают тиры)."""
+
+    __slots__ = ('id', 'name', 'code')
+
+    def __init__(self, id: int, name: str, code: str):
+        self.id = id
+        self.name = name
+        self.code = code
+
+
+class SnapshotWorkItem:
+    """Лёгкая замена WorkItem в кэшах pipeline.
+
+    Разряд хранится готовой строкой (`grade_str`) — `_wi_grade_str` отдаёт его
+    без обращения к связанной модели WorkerGrade.
+    """
+
+    __slots__ = ('id', 'name', 'article', 'hours', 'unit', 'section', 'grade_str')
+
+    def __init__(self, id, name, article, hours, unit, section, grade_str):
+        self.id = id
+        self.name = name
+        self.article = article
+        self.hours = hours
+        self.unit = unit
+        self.section = section
+        self.grade_str = grade_str
+
+
+class SnapshotKnowledge:
+    """Запись ProductKnowledge в снапшоте (поля, которые читает Tier3Knowledge)."""
+
+    __slots__ = ('pk', 'work_item', 'confidence', 'status')
+
+    def __init__(self, pk, work_item, confidence, status):
+        self.pk = pk
+        self.work_item = work_item
+        self.confidence = confidence
+        self.status = status
+
+
+class CatalogSnapshot:
+    """Каталог работ + позиции прайс-листа в форме кэшей MatchingContext."""
+
+    def __init__(self, work_items_cache, pricelist_items_cache, pli_cost_map):
+        self.work_items_cache: List[Tuple[int, str, str, SnapshotWorkItem]] = work_items_cache
+        self.pricelist_items_cache: List[
+            Tuple[int, str, str, SnapshotWorkItem, Optional[str]]
+        ] = pricelist_items_cache
+        self.pli_cost_map: Dict[int, str] = pli_cost_map
+        self._work_items_index = None
+
+    @property
+    def work_items_index(self):
+        """Триграммный индекс по work_items_cache — один на снапшот в процессе."""
+        if self._work_items_index is None:
+            from .fuzzy_index import WorkItemFuzzyIndex
+            self._work_items_index = WorkItemFuzzyIndex(self.work_items_cache)
+        return self._work_items_index
+
+
+# ---------------------------------------------------------------------------
+# Версии и инвалидация
+# ---------------------------------------------------------------------------
+
+def _get_redis():
+    from estimates.services.redis_session import get_redis
+    return get_redis(decode_responses=False)
+
+
+def _bump_version(key: str):
+    try:
+        _get_redis().set(key, uuid.uuid4().hex)
+    except Exception as e:
+        logger.warning('Failed to bump %s: %s', key, e)
+
+
+def _bump_on_commit(key: str):
+    transaction.on_commit(lambda: _bump_version(key))
+
+
+def invalidate_catalog_snapshot():
+    """Сбросить снапшот каталога после коммита текущей транзакции.
+
+    Для изменений WorkItem/PriceListItem в обход сигналов (bulk_create,
+    bulk_update, queryset.update) вызывать явно.
+    """
+    _bump_on_commit(CATALOG_VERSION_KEY)
+
+
+def invalidate_knowledge_snapshot():
+    """Сбросить снапшот базы знаний после коммита текущей транзакции.
+
+    Для ProductKnowledge.objects...update() (usage_count, verify) вызывать явно.
+    """
+    _bump_on_commit(KNOWLEDGE_VERSION_KEY)
+
+
+def _current_version(r, key: str) -> str:
+    version = r.get(key)
+    if version is None:
+        r.set(key, uuid.uuid4().hex, nx=True)
+        version = r.get(key)
+    return version.decode()
+
+
+# ---------------------------------------------------------------------------
+# Сборка payload из БД
+# ---------------------------------------------------------------------------
+
+def _work_item_row(wi: WorkItem, sections: Dict[int, list]) -> list:
+    section = wi.section
+    if section is not None and section.id not in sections:
+        sections[section.id] = [section.id, section.name, section.code]
+    return [
+        wi.id,
+        wi.name,
+        Product.normalize_name(wi.name),
+        wi.article,
+        str(wi.hours) if wi.hours is not None else None,
+        wi.unit,
+        section.id if section is not None else None,
+        _wi_grade_str(wi),
+    ]
+
+
+def _build_catalog_payload(price_list) -> dict:
+    sections: Dict[int, list] = {}
+    work_items: Dict[int, list] = {}
+
+    current_ids = []
+    for wi in WorkItem.objects.filter(is_current=True).select_related('section', 'grade'):
+        work_items[wi.id] = _work_item_row(wi, sections)
+        current_ids.append(wi.id)
+
+    pricelist = []
+    if price_list:
+        plis = (
+            PriceListItem.objects.filter(
+                price_list=price_list,
+                is_included=True,
+            )
+            .select_related('work_item', 'work_item__section', 'work_item__grade')
+        )
+        for pli in plis:
+            wi = pli.work_item
+            # Вычисляем cost вручную чтобы избежать N+1 на property
+            try:
+                effective_hours = pli.hours_override if pli.hours_override is not None else (wi.hours or Decimal('0'))
+                effective_coeff = pli.coefficient_override if pli.coefficient_override is not None else wi.coefficient
+                effective_grade = pli.grade_override if pli.grade_override is not None else (wi.required_grade or Decimal('1'))
+                rate = price_list.get_rate_for_grade(effective_grade)
+                cost = effective_hours * effective_coeff * rate
+                cost_str = str(cost.quantize(Decimal('0.01')))
+            except Exception:
+                cost_str = None
+
+            if wi.id not in work_items:
+                work_items[wi.id] = _work_item_row(wi, sections)
+            pricelist.append([wi.id, cost_str])
+
+    return {
+        'sections': list(sections.values()),
+        'work_items': list(work_items.values()),
+        'current': current_ids,
+        'pricelist': pricelist,
+    }
+
+
+def _build_knowledge_payload() -> dict:
+    sections: Dict[int, list] = {}
+    work_items: Dict[int, list] = {}
+    knowledge = []
+    seen_patterns = set()
+
+    knowledge_qs = (
+        ProductKnowledge.objects.filter(
+            status__in=[ProductKnowledge.Status.VERIFIED, ProductKnowledge.Status.PENDING],
+            confidence__gte=0.5,
+        )
+        .select_related('work_item', 'work_item__section', 'work_item__grade')
+        .order_by('-confidence', '-usage_count')
+    )
+    for k in knowledge_qs:
+        if k.item_name_pattern in seen_patterns:
+            continue
+        seen_patterns.add(k.item_name_pattern)
+        wi = k.work_item
+        if wi.id not in work_items:
+            work_items[wi.id] = _work_item_row(wi, sections)
+        knowledge.append([k.item_name_pattern, k.pk, wi.id, k.confidence, k.status])
+
+    return {
+        'sections': list(sections.values()),
+        'work_items': list(work_items.values()),
+        'knowledge': knowledge,
+    }
+
+
+# ---------------------------------------------------------------------------
+# payload → объекты
+# ---------------------------------------------------------------------------
+
+def _work_items_from_payload(payload: dict) -> Dict[int, Tuple[str, SnapshotWorkItem]]:
+    """{wi_id: (normalized_name, SnapshotWorkItem)}."""
+    sections = {
+        section_id: SnapshotSection(section_id, name, code)
+        for section_id, name, code in payload['sections']
+    }
+    work_items = {}
+    for wi_id, name, normalized, article, hours, unit, section_id, grade_str in payload['work_items']:
+        work_items[wi_id] = (normalized, SnapshotWorkItem(
+            wi_id, name, article,
+            Decimal(hours) if hours is not None else None,
+            unit, sections.get(section_id), grade_str,
+        ))
+    return work_items
+
+
+def _catalog_from_payload(payload: dict) -> CatalogSnapshot:
+    work_items = _work_items_from_payload(payload)
+
+    work_items_cache = []
+    for wi_id in payload['current']:
+        normalized, wi = work_items[wi_id]
+        work_items_cache.append((wi_id, wi.name, normalized, wi))
+
+    pricelist_items_cache = []
+    pli_cost_map = {}
+    for wi_id, cost_str in payload['pricelist']:
+        normalized, wi = work_items[wi_id]
+        pricelist_items_cache.append((wi_id, wi.name, normalized, wi, cost_str))
+        if cost_str:
+            pli_cost_map[wi_id] = cost_str
+
+    return CatalogSnapshot(work_items_cache, pricelist_items_cache, pli_cost_map)
+
+
+def _knowledge_from_payload(payload: dict) -> Dict[str, SnapshotKnowledge]:
+    work_items = _work_items_from_payload(payload)
+    return {
+        pattern: SnapshotKnowledge(pk, work_items[wi_id][1], confidence, status)
+        for pattern, pk, wi_id, confidence, status in payload['knowledge']
+    }
+
+
+# ---------------------------------------------------------------------------
+# Загрузка с кэшированием
+# ---------------------------------------------------------------------------
+
+def _encode(payload: dict) -> bytes:
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode())
+
+
+def _decode(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob))
+
+
+def _remember(key: str, value):
+    if len(_process_cache) >= _PROCESS_CACHE_MAX:
+        _process_cache.clear()
+    _process_cache[key] = value
+    return value
+
+
+def _load(version_key: str, blob_prefix: str,
+          build: Callable[[], dict], convert: Callable[[dict], object]):
+    """Снапшот текущей версии: память процесса → Redis → сборка из БД."""
+    if not getattr(settings, 'WORK_MATCHING_SNAPSHOT_CACHE', True):
+        return convert(build())
+    try:
+        return _load_cached(version_key, blob_prefix, build, convert)
+    except (redis.RedisError, RuntimeError) as e:
+        logger.warning('Matching snapshot cache unavailable (%s), building from DB', e)
+        return convert(build())
+
+
+def _load_cached(version_key: str, blob_prefix: str,
+                 build: Callable[[], dict], convert: Callable[[dict], object]):
+    """Сборку выполняет один воркер (lock NX), остальные ждут готовый блоб."""
+    r = _get_redis()
+    blob_key = f'{blob_prefix}:{_current_version(r, version_key)}'
+    cached = _process_cache.get(blob_key)
+    if cached is not None:
+        return cached
+
+    lock_key = f'{blob_key}:build_lock'
+    deadline = time.monotonic() + BUILD_WAIT_SECONDS
+    while True:
+        blob = r.get(blob_key)
+        if blob is not None:
+            return _remember(blob_key, convert(_decode(blob)))
+        if r.set(lock_key, '1', nx=True, ex=BUILD_LOCK_TTL) or time.monotonic() > deadline:
+            break
+        time.sleep(0.2)
+
+    started = time.monotonic()
+    try:
+        payload = build()
+        r.set(blob_key, _encode(payload), ex=SNAPSHOT_TTL)
+    finally:
+        r.delete(lock_key)
+    logger.info('Built matching snapshot %s in %.2fs', blob_key, time.monotonic() - started)
+    return _remember(blob_key, convert(payload))
+
+
+def load_catalog_snapshot(price_list) -> CatalogSnapshot:
+    """Каталог WorkItem + позиции прайс-листа для (price_list_id, версия каталога)."""
+    price_list_id = price_list.pk if price_list else 0
+    return _load(
+        CATALOG_VERSION_KEY,
+        f'{SNAPSHOT_PREFIX}:catalog:{price_list_id}',
+        lambda: _build_catalog_payload(price_list),
+        _catalog_from_payload,
+    )
+
+
+def load_knowledge_snapshot() -> Dict[str, SnapshotKnowledge]:
+    """Лучшая ProductKnowledge по нормализованному имени для версии базы знаний."""
+    return _load(
+        KNOWLEDGE_VERSION_KEY,
+        f'{SNAPSHOT_PREFIX}:knowledge',
+        _build_knowledge_payload,
+        _knowledge_from_payload,
+    )
@@ -6,6 +6,7 @@
 """
 import logging
 import math
+import time
 from dataclasses import dataclass, field
 from decimal import Decimal
 from typing import Dict, List, Optional
@@ -15,6 +16,7 @@ from rapidfuzz import fuzz
 from catalog.models import Product, ProductKnowledge, ProductWorkMapping
 from llm_services.models import LLMTaskConfig
 from llm_services.providers import get_provider
+from llm_services.services.exceptions import RateLimitError
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +42,9 @@ class MatchResult:
 
 def _wi_grade_str(wi) -> str:
     """Безопасное извлечение номера разряда из WorkItem."""
+    grade_str = getattr(wi, 'grade_str', None)
+    if grade_str is not None:
+        return grade_str  # SnapshotWorkItem: посчитан при сборке снапшота
     if wi.required_grade is not None:
         return str(wi.required_grade)
     if wi.grade_id:
@@ -290,23 +295,26 @@ class Tier4Category:
 # ====================== Tier 5: Full Catalog Fuzzy ======================
 
 class Tier5Fuzzy:
-    """Fuzzy match по ВСЕМУ каталогу WorkItem."""
+    """Fuzzy match по ВСЕМУ каталогу WorkItem (через индекс MatchingContext.work_items_index)."""
 
     THRESHOLD = 0.45
 
     def match(self, item, ctx) -> Optional[MatchResult]:
         item_normalized = Product.normalize_name(item.name)
-        scored = []
 
-        for wi_id, wi_name, wi_normalized, wi_obj in ctx.work_items_cache:
-            score = fuzz.token_set_ratio(item_normalized, wi_normalized) / 100.0
-            if score > 0.35:
-                scored.append((score, wi_obj))
+        # Триграммный индекс + батч-скоринг, результат = полный перебор
+        # (см. fuzzy_index); дальше используются только top-15
+        scored = [
+            (score / 100.0, ctx.work_items_cache[idx][3])
+            for score, idx in ctx.work_items_index.search(
+                item_normalized, score_cutoff=35, limit=15,
+            )
+            if score / 100.0 > 0.35
+        ]
 
         if not scored:
             return None
 
-        scored.sort(key=lambda x: -x[0])
         best_score, best_wi = scored[0]
 
         if best_score < self.THRESHOLD:
@@ -372,12 +380,10 @@ class Tier6LLM:
         for item, candidates in items_with_candidates:
             if not candidates:
                 item_normalized = Product.normalize_name(item.name)
-                scored = []
-                for _, _, wi_normalized, wi_obj in ctx.work_items_cache:
-                    score = fuzz.token_set_ratio(item_normalized, wi_normalized) / 100.0
-                    scored.append((score, wi_obj))
-                scored.sort(key=lambda x: -x[0])
-                candidates = scored[:10]
+                candidates = [
+                    (score / 100.0, ctx.work_items_cache[idx][3])
+                    for score, idx in ctx.work_items_index.search(item_normalized, limit=10)
+                ]
             if candidates:
                 batch_items.append(item)
                 all_candidates_map[item.id] = candidates
@@ -423,7 +429,9 @@ class Tier6LLM:
         )
 
         try:
-            llm_result = provider.chat_completion(system_prompt, user_prompt)
+            llm_result = _call_with_rate_limit_retry(
+                provider.chat_completion, system_prompt, user_prompt,
+            )
         except Exception:
             logger.exception('LLM batch failed')
             return {item.id: None for item in batch_items}
@@ -489,9 +497,10 @@ class Tier7WebSearch:
 
         try:
             if provider_model.supports_web_search:
-                result = provider.chat_completion_with_search(system_prompt, user_prompt)
+                call = provider.chat_completion_with_search
             else:
-                result = provider.chat_completion(system_prompt, user_prompt)
+                call = provider.chat_completion
+            result = _call_with_rate_limit_retry(call, system_prompt, user_prompt)
         except Exception:
             logger.exception('Web search LLM failed for item %s', item.id)
             return None
@@ -506,11 +515,11 @@ class Tier7WebSearch:
         best_score = 0.0
         best_wi = None
 
-        for wi_id, wi_name, wi_normalized, wi_obj in ctx.work_items_cache:
-            score = fuzz.token_set_ratio(work_type_normalized, wi_normalized) / 100.0
-            if score > best_score:
-                best_score = score
-                best_wi = wi_obj
+        top = ctx.work_items_index.search(work_type_normalized, limit=1)
+        if top and top[0][0] > 0:
+            score, idx = top[0]
+            best_score = score / 100.0
+            best_wi = ctx.work_items_cache[idx][3]
 
         if not best_wi or best_score < 0.35:
             return None
@@ -538,6 +547,24 @@ class Tier7WebSearch:
 
 # ====================== Helpers ======================
 
+# Pass 2 выполняет LLM-запросы параллельно, поэтому 429 от провайдера —
+# штатная ситуация: пауза с нарастанием и повтор, затем сдаёмся.
+RATE_LIMIT_RETRIES = 2
+RATE_LIMIT_BACKOFF = 2.0  # сек, удваивается на каждой попытке
+
+
+def _call_with_rate_limit_retry(call, *args):
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            return call(*args)
+        except RateLimitError:
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            delay = RATE_LIMIT_BACKOFF * (2 ** attempt)
+            logger.warning('LLM rate limit, retry %d in %.0fs', attempt + 1, delay)
+            time.sleep(delay)
+
+
 def _format_candidates(candidates: List[Dict]) -> str:
     lines = []
     for c in candidates:
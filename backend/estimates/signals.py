@@ -0,0 +1,41 @@
+"""Инвалидация снапшота подбора работ (work_matching/snapshot.py).
+
+Любое сохранение/удаление каталога работ, прайс-листа или базы знаний меняет
+версию соответствующей части снапшота после коммита транзакции.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from estimates.services.work_matching.snapshot import (
+    invalidate_catalog_snapshot,
+    invalidate_knowledge_snapshot,
+)
+
+CATALOG_SENDERS = (
+    'pricelists.WorkItem',
+    'pricelists.WorkSection',
+    'pricelists.WorkerGrade',
+    'pricelists.PriceList',
+    'pricelists.PriceListItem',
+)
+
+
+def _on_catalog_change(sender, **kwargs):
+    invalidate_catalog_snapshot()
+
+
+def _on_knowledge_change(sender, **kwargs):
+    invalidate_knowledge_snapshot()
+
+
+for _sender in CATALOG_SENDERS:
+    for _signal in (post_save, post_delete):
+        _signal.connect(
+            _on_catalog_change, sender=_sender,
+            dispatch_uid=f'estimates.snapshot.{_sender}.{_signal is post_save}',
+        )
+
+for _signal in (post_save, post_delete):
+    _signal.connect(
+        _on_knowledge_change, sender='catalog.ProductKnowledge',
+        dispatch_uid=f'estimates.snapshot.knowledge.{_signal is post_save}',
+    )
@@ -2,16 +2,20 @@
 
 Двухпроходная архитектура:
   Pass 1: быстрые тиры 0-5 (CPU/memory) — все строки
-  Pass 2: LLM-батчинг (тир 6) + Web Search (тир 7) — только unmatched
+  Pass 2: LLM-батчинг (тир 6) + Web Search (тир 7) — только unmatched,
+          батчи параллельно в пуле потоков (WORK_MATCHING_LLM_CONCURRENCY)
 
 Использует общий RedisSessionManager из redis_session.py.
 """
 import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from celery import shared_task
 from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.db import connection
 
 from estimates.services.redis_session import RedisSessionManager
 from estimates.services.work_matching.knowledge import save_knowledge
@@ -55,7 +59,8 @@ def _run_matching(session_id: str, estimate_id: int):
     """Двухпроходный подбор работ.
 
     Pass 1: быстрые тиры 0-5 (CPU/memory, ~0.01 сек/строка)
-    Pass 2: LLM batch (тир 6, по 5 штук) + Web Search (тир 7, по 1)
+    Pass 2: LLM batch (тир 6, по 5 штук) + Web Search (тир 7, по 1),
+            несколько батчей одновременно
     """
     from estimates.models import Estimate, EstimateItem
 
@@ -165,53 +170,48 @@ def _run_matching(session_id: str, estimate_id: int):
         # Номер текущей строки в общем списке (для прогресс-бара)
         base_item_num = total - len(unmatched_items)
 
-        # Батчинг LLM: по batch_size штук
-        for batch_start in range(0, len(unmatched_items), batch_size):
-            if session_mgr.is_cancelled(session_id):
-                break
-
-            batch = unmatched_items[batch_start:batch_start + batch_size]
-            item_num = base_item_num + batch_start + len(batch)
+        batches = [
+            unmatched_items[batch_start:batch_start + batch_size]
+            for batch_start in range(0, len(unmatched_items), batch_size)
+        ]
 
-            session_mgr.update(session_id, {
-                'current_item': str(item_num),
-                'current_tier': 'pass2_llm',
-                'current_item_name': batch[0].name[:100],
-            })
+        # Индекс строится лениво — построить до запуска потоков
+        ctx.work_items_index
 
-            # LLM batch
-            items_with_candidates = [
-                (item, ctx.fuzzy_candidates.get(item.id, []))
-                for item in batch
+        # LLM/Web — I/O-bound: батчи идут параллельно, результаты
+        # забираются строго в порядке батчей (порядок в Redis LIST сохраняется)
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, settings.WORK_MATCHING_LLM_CONCURRENCY),
+            thread_name_prefix='work-matching-llm',
+        )
+        try:
+            futures = [
+                pool.submit(_match_llm_batch, session_id, batch, ctx, tier6, tier7)
+                for batch in batches
             ]
-            try:
-                batch_results = tier6.match_batch(items_with_candidates, ctx)
-            except Exception:
-                logger.exception('LLM batch failed for %d items', len(batch))
-                batch_results = {}
-
-            for item in batch:
+            item_num = base_item_num
+            for batch, future in zip(batches, futures):
                 if session_mgr.is_cancelled(session_id):
                     break
 
-                llm_result = batch_results.get(item.id)
+                session_mgr.update(session_id, {
+                    'current_item': str(item_num + len(batch)),
+                    'current_tier': 'pass2_llm',
+                    'current_item_name': batch[0].name[:100],
+                })
 
-                if llm_result and llm_result.confidence >= tier6.THRESHOLD:
-                    result = _result_to_dict(item, llm_result, ctx)
-                else:
-                    # Fallback: Tier 7 Web Search (per-item)
-                    session_mgr.update(session_id, {
-                        'current_tier': 'pass2_web',
-                        'current_item_name': item.name[:100],
-                    })
-                    try:
-                        web_match = tier7.match(item, ctx)
-                    except Exception:
-                        logger.exception('Web search failed for item %d', item.id)
-                        web_match = None
-
-                    if web_match and web_match.confidence >= tier7.THRESHOLD:
-                        result = _result_to_dict(item, web_match, ctx)
+                try:
+                    matches = future.result()
+                except Exception:
+                    logger.exception('LLM batch failed for %d items', len(batch))
+                    matches = [(item, None) for item in batch]
+
+                for item, match in matches:
+                    if session_mgr.is_cancelled(session_id):
+                        break
+
+                    if match:
+                        result = _result_to_dict(item, match, ctx)
                     else:
                         result = {
                             'item_id': item.id, 'item_name': item.name,
@@ -221,18 +221,22 @@ def _run_matching(session_id: str, estimate_id: int):
                             'llm_reasoning': '',
                         }
 
-                source = result.get('source', 'unmatched')
-                stats[source] = stats.get(source, 0) + 1
+                    source = result.get('source', 'unmatched')
+                    stats[source] = stats.get(source, 0) + 1
 
-                # Сохранить знания для LLM и Web результатов
-                if source in ('llm', 'web') and result.get('matched_work'):
-                    _save_knowledge_safe(item, result, source)
+                    # Сохранить знания для LLM и Web результатов
+                    if source in ('llm', 'web') and result.get('matched_work'):
+                        _save_knowledge_safe(item, result, source)
 
-                session_mgr.append_result(session_id, result)
-                session_mgr.update(session_id, {
-                    'stats': json.dumps(stats),
-                    'current_tier': source,
-                })
+                    session_mgr.append_result(session_id, result)
+                    session_mgr.update(session_id, {
+                        'stats': json.dumps(stats),
+                        'current_tier': source,
+                    })
+
+                item_num += len(batch)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
 
     # Восстановить оригинальные имена после Pass 2
     for item_id, orig in originals_pass2.items():
@@ -245,9 +249,12 @@ def _run_matching(session_id: str, estimate_id: int):
     if ctx.knowledge_usage_updates:
         from catalog.models import ProductKnowledge
         from django.db.models import F
+        from estimates.services.work_matching.snapshot import invalidate_knowledge_snapshot
         ProductKnowledge.objects.filter(pk__in=set(ctx.knowledge_usage_updates)).update(
             usage_count=F('usage_count') + 1,
         )
+        # queryset.update не шлёт сигналов, а снапшот сортирует по usage_count
+        invalidate_knowledge_snapshot()
 
     # Завершение
     if not session_mgr.is_cancelled(session_id):
@@ -256,6 +263,57 @@ def _run_matching(session_id: str, estimate_id: int):
     logger.info('Work matching %s completed: %s', session_id, json.dumps(stats))
 
 
+def _match_llm_batch(session_id: str, batch: list, ctx, tier6, tier7) -> list:
+    """Pass 2 для одного батча (в пуле потоков): LLM batch + Web Search fallback.
+
+    Returns:
+        [(item, MatchResult | None), ...] в порядке батча; при отмене — усечённый.
+    """
+    try:
+        if session_mgr.is_cancelled(session_id):
+            return []
+
+        items_with_candidates = [
+            (item, ctx.fuzzy_candidates.get(item.id, []))
+            for item in batch
+        ]
+        try:
+            batch_results = tier6.match_batch(items_with_candidates, ctx)
+        except Exception:
+            logger.exception('LLM batch failed for %d items', len(batch))
+            batch_results = {}
+
+        matches = []
+        for item in batch:
+            llm_result = batch_results.get(item.id)
+            if llm_result and llm_result.confidence >= tier6.THRESHOLD:
+                matches.append((item, llm_result))
+                continue
+
+            if session_mgr.is_cancelled(session_id):
+                break
+
+            # Fallback: Tier 7 Web Search (per-item)
+            session_mgr.update(session_id, {
+                'current_tier': 'pass2_web',
+                'current_item_name': item.name[:100],
+            })
+            try:
+                web_match = tier7.match(item, ctx)
+            except Exception:
+                logger.exception('Web search failed for item %d', item.id)
+                web_match = None
+
+            if web_match and web_match.confidence >= tier7.THRESHOLD:
+                matches.append((item, web_match))
+            else:
+                matches.append((item, None))
+        return matches
+    finally:
+        # Поток пула открывает собственное соединение (LLMTaskConfig и т.п.)
+        connection.close()
+
+
 def _save_knowledge_safe(item, result: dict, source: str):
     """Сохранить знания для LLM/Web результатов. Не бросает исключений."""
     try:
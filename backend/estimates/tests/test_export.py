@@ -66,7 +66,7 @@ class TestEstimateExport(TestCase):
             response['Content-Type'],
             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         )
-        wb = openpyxl.load_workbook(BytesIO(response.content))
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
         ws = wb.active
         # Row 3 = headers, should have 10 columns for default config
         headers = [ws.cell(row=3, column=i).value for i in range(1, 11)]
@@ -102,7 +102,7 @@ class TestEstimateExport(TestCase):
         ]
         estimate, _ = _make_estimate_with_items(self.user, column_config=config)
         response = self._export(estimate)
-        wb = openpyxl.load_workbook(BytesIO(response.content))
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
         ws = wb.active
         headers = [ws.cell(row=3, column=i).value for i in range(1, 4)]
         self.assertEqual(headers, ['Наименование', 'Кол-во', 'Примечание'])
@@ -119,7 +119,7 @@ class TestEstimateExport(TestCase):
         ]
         estimate, _ = _make_estimate_with_items(self.user, column_config=config)
         response = self._export(estimate)
-        wb = openpyxl.load_workbook(BytesIO(response.content))
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
         ws = wb.active
         headers = [ws.cell(row=3, column=i).value for i in range(1, 3)]
         self.assertEqual(headers[0], 'Наименование')
@@ -129,7 +129,7 @@ class TestEstimateExport(TestCase):
         """Секции отображаются как merged rows."""
         estimate, _ = _make_estimate_with_items(self.user)
         response = self._export(estimate)
-        wb = openpyxl.load_workbook(BytesIO(response.content))
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
         ws = wb.active
         # Row 4 should be section name "Раздел 1"
         self.assertEqual(ws.cell(row=4, column=1).value, 'Раздел 1')
@@ -149,7 +149,7 @@ class TestEstimateExport(TestCase):
         ]
         estimate, _ = _make_estimate_with_items(self.user, column_config=config)
         response = self._export(estimate)
-        wb = openpyxl.load_workbook(BytesIO(response.content))
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
         ws = wb.active
         # Row 5 = first item (row 4 is section header)
         # Col 3 = mat_total = 100 * 50 = 5000
@@ -185,7 +185,7 @@ class TestEstimateExport(TestCase):
         ]
         estimate, _ = _make_estimate_with_items(self.user, column_config=config)
         response = self._export(estimate)
-        wb = openpyxl.load_workbook(BytesIO(response.content))
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
         ws = wb.active
 
         # Find footer row (after items)
@@ -204,3 +204,24 @@ class TestEstimateExport(TestCase):
 
         self.assertIsNotNone(footer_val)
         self.assertAlmostEqual(footer_val, 9000.0, places=0)
+
+    def test_items_grouped_under_sections(self):
+        """Позиции (читаются курсором) попадают под свои разделы, merge заголовка сохраняется."""
+        estimate, section = _make_estimate_with_items(self.user)
+        first = EstimateSection.objects.create(estimate=estimate, name='Раздел 0', sort_order=0)
+        EstimateItem.objects.create(
+            estimate=estimate, section=first, name='Щит ЩР-1',
+            quantity=Decimal('1'), material_unit_price=Decimal('10'), sort_order=1, item_number=3,
+        )
+        response = self._export(estimate)
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        ws = wb.active
+
+        col_a = [ws.cell(row=r, column=1).value for r in range(4, ws.max_row + 1)]
+        names_col = [h.value for h in ws[3]].index('Наименование') + 1
+        names = [ws.cell(row=r, column=names_col).value for r in range(4, ws.max_row + 1)]
+        self.assertLess(col_a.index('Раздел 0'), names.index('Щит ЩР-1'))
+        self.assertLess(names.index('Щит ЩР-1'), col_a.index('Раздел 1'))
+        self.assertLess(col_a.index('Раздел 1'), names.index('Кабель ВВГнг'))
+        last_col = openpyxl.utils.get_column_letter(ws.max_column)
+        self.assertIn(f'A1:{last_col}1', {str(r) for r in ws.merged_cells.ranges})
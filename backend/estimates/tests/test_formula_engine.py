@@ -11,6 +11,8 @@ from estimates.formula_engine import (
     topological_sort,
     validate_formula,
     compute_all_formulas,
+    compile_column_config,
+    compile_formula,
     FormulaError,
     CycleError,
 )
@@ -177,3 +179,31 @@ class TestComputeAllFormulas(TestCase):
         ]
         results = compute_all_formulas(columns, {}, {})
         self.assertIsNone(results['bad'])
+
+
+class TestCompiledFormulas(TestCase):
+
+    def test_compile_formula_cached(self):
+        fn = compile_formula('quantity * 2')
+        self.assertIs(compile_formula('quantity * 2'), fn)
+        self.assertEqual(fn({'quantity': Decimal('3')}), Decimal('6'))
+        self.assertEqual(fn({'quantity': Decimal('5')}), Decimal('10'))
+
+    def test_compile_formula_error_cached(self):
+        with self.assertRaises(FormulaError):
+            compile_formula('2 + + 3')
+        with self.assertRaises(FormulaError):
+            compile_formula('2 + + 3')
+
+    def test_division_by_zero_inside_term(self):
+        self.assertEqual(evaluate_formula('10 / 0 + 1', {}), Decimal('1'))
+        with self.assertRaises(FormulaError):
+            evaluate_formula('10 / 0 * 5', {})
+
+    def test_compile_column_config_cached(self):
+        columns = [
+            {'key': 'quantity', 'type': 'builtin'},
+            {'key': 'total', 'type': 'formula', 'formula': 'quantity * 2'},
+        ]
+        compiled = compile_column_config(columns)
+        self.assertIs(compile_column_config([dict(c) for c in columns]), compiled)
@@ -4,10 +4,13 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 import uuid
 
+from unittest.mock import patch
+
 from estimates.models import (
     Estimate, EstimateSection, EstimateSubsection, EstimateItem,
-    EstimateMarkupDefaults,
+    EstimateMarkupDefaults, deferred_subsection_totals,
 )
+from estimates.services import markup_service
 from estimates.services.markup_service import (
     recalculate_estimate_subsections,
     recalculate_section_subsections,
@@ -186,6 +189,84 @@ class MarkupTotalsTests(MarkupTestBase):
         self.assertEqual(item.effective_material_markup_percent, Decimal('50.00'))
 
 
+class DeferredSubsectionTotalsTests(MarkupTestBase):
+    """Отложенный пересчёт агрегатов подразделов."""
+
+    def test_deferred_block_recalculates_once(self):
+        est = self._create_estimate()
+        sec = self._create_section(est)
+        sub = self._create_subsection(sec)
+
+        with patch(
+            'estimates.services.markup_service.recalculate_subsections',
+            wraps=markup_service.recalculate_subsections,
+        ) as recalc:
+            with deferred_subsection_totals():
+                for _ in range(5):
+                    self._create_item(est, sec, sub, quantity=Decimal('1'))
+                with deferred_subsection_totals():
+                    self._create_item(est, sec, sub, quantity=Decimal('1'))
+            self.assertEqual(recalc.call_count, 1)
+
+        sub.refresh_from_db()
+        self.assertEqual(sub.materials_purchase, Decimal('6000.00'))
+        self.assertEqual(sub.materials_sale, Decimal('7800.00'))
+        self.assertEqual(sub.works_sale, Decimal('12000.00'))
+
+    def test_delete_in_deferred_block(self):
+        est = self._create_estimate()
+        sec = self._create_section(est)
+        sub = self._create_subsection(sec)
+        items = [self._create_item(est, sec, sub, quantity=Decimal('1')) for _ in range(3)]
+
+        with deferred_subsection_totals():
+            EstimateItem.objects.filter(pk__in=[items[0].pk, items[1].pk]).delete()
+
+        sub.refresh_from_db()
+        self.assertEqual(sub.materials_purchase, Decimal('1000.00'))
+
+    def test_move_item_updates_both_subsections(self):
+        est = self._create_estimate()
+        sec = self._create_section(est)
+        sub_a = self._create_subsection(sec)
+        sub_b = self._create_subsection(sec)
+        item = self._create_item(est, sec, sub_a, quantity=Decimal('1'))
+
+        item = EstimateItem.objects.get(pk=item.pk)
+        item.subsection = sub_b
+        item.save()
+
+        sub_a.refresh_from_db()
+        sub_b.refresh_from_db()
+        self.assertEqual(sub_a.materials_purchase, Decimal('0.00'))
+        self.assertEqual(sub_b.materials_purchase, Decimal('1000.00'))
+
+    def test_auto_characteristics_follow_items(self):
+        est = self._create_estimate()
+        est.create_initial_characteristics()
+        sec = self._create_section(est)
+        sub = self._create_subsection(sec)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_item(est, sec, sub, quantity=Decimal('1'))
+            self._create_item(est, sec, sub, quantity=Decimal('1'))
+
+        char = est.characteristics.get(name='Материалы')
+        self.assertEqual(char.purchase_amount, Decimal('2000.00'))
+        self.assertEqual(char.sale_amount, Decimal('2600.00'))
+
+    def test_auto_characteristics_refreshed_once_per_transaction(self):
+        est = self._create_estimate()
+        sec = self._create_section(est)
+        sub = self._create_subsection(sec)
+
+        with patch.object(Estimate, 'update_auto_characteristics') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(3):
+                    self._create_item(est, sec, sub, quantity=Decimal('1'))
+                self.assertEqual(refresh.call_count, 0)
+            self.assertEqual(refresh.call_count, 1)
+
+
 class MarkupRecalculationTests(MarkupTestBase):
     """Тесты пересчёта при изменении наценки на смете/разделе."""
 
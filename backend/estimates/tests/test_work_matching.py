@@ -129,6 +129,35 @@ class WorkMatchingTestBase(TestCase):
             section=cls.est_section, name='Подсекция 1', sort_order=1,
         )
 
+    def setUp(self):
+        super().setUp()
+        # Снапшот каталога — через Redis, но изолированно: свой префикс ключей
+        # на тест (данные TestCase у каждого xdist-воркера свои) и сброс версии
+        # сразу, а не on_commit (TestCase не коммитит).
+        from estimates.services.work_matching import snapshot
+        prefix = f'test_{snapshot.SNAPSHOT_PREFIX}_{uuid.uuid4().hex[:8]}'
+        for name, value in (
+            ('SNAPSHOT_PREFIX', prefix),
+            ('CATALOG_VERSION_KEY', f'{prefix}:catalog_version'),
+            ('KNOWLEDGE_VERSION_KEY', f'{prefix}:knowledge_version'),
+            ('_bump_on_commit', snapshot._bump_version),
+        ):
+            patcher = patch.object(snapshot, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        snapshot._process_cache.clear()
+        self.addCleanup(self._drop_snapshot_keys, prefix)
+
+    @staticmethod
+    def _drop_snapshot_keys(prefix):
+        from estimates.services.redis_session import get_redis
+        try:
+            r = get_redis()
+            for key in r.scan_iter(f'{prefix}:*'):
+                r.delete(key)
+        except Exception:
+            pass
+
 
 # ====================== Regression Tests (8 bugs) ======================
 
@@ -335,6 +364,53 @@ class TestTier5Fuzzy(WorkMatchingTestBase):
         self.assertEqual(result.source, 'fuzzy')
 
 
+class TestWorkItemFuzzyIndex(unittest.TestCase):
+    """Триграммный индекс для fuzzy-уровней: результаты = полный перебор."""
+
+    VERBS = ['монтаж', 'демонтаж', 'прокладка', 'подключение', 'изоляция']
+    OBJECTS = ['кондиционера', 'воздуховода', 'вентилятора', 'клапана', 'кабеля', 'трубы']
+    ADJECTIVES = ['настенного', 'канального', 'круглого', 'медной', 'приточной']
+
+    def _catalog(self):
+        names = [
+            f'{verb} {adj} {obj} {size} мм'
+            for verb in self.VERBS
+            for adj in self.ADJECTIVES
+            for obj in self.OBJECTS
+            for size in (100, 250)
+        ]
+        return [(i, n, Product.normalize_name(n), None) for i, n in enumerate(names)]
+
+    QUERIES = [
+        'Монтаж кондиционера настенного', 'кабель медный', 'изоляция трубы 250',
+        'Воздуховод круглый d100', 'приточная установка', 'заглушка', 'qwerty', '',
+    ]
+
+    def test_search_matches_brute_force(self):
+        from estimates.services.work_matching.fuzzy_index import WorkItemFuzzyIndex
+
+        index = WorkItemFuzzyIndex(self._catalog())
+        for query in self.QUERIES:
+            normalized = Product.normalize_name(query)
+            for score_cutoff, limit in ((35, 15), (35, None), (0, 1), (0, 10), (60, 3)):
+                with self.subTest(query=query, score_cutoff=score_cutoff, limit=limit):
+                    self.assertEqual(
+                        index.search(normalized, score_cutoff=score_cutoff, limit=limit),
+                        index.brute_force_search(
+                            normalized, score_cutoff=score_cutoff, limit=limit,
+                        ),
+                    )
+
+    def test_candidates_without_shared_trigrams_are_scored(self):
+        from estimates.services.work_matching.fuzzy_index import WorkItemFuzzyIndex
+
+        # Общих токенов (и триграмм) нет, но token_set_ratio выше порога
+        catalog = [(0, 'ав бг', 'ав бг', None), (1, 'монтаж', 'монтаж', None)]
+        index = WorkItemFuzzyIndex(catalog)
+        self.assertEqual(index.search('аб вг', score_cutoff=35), [(60.0, 0)])
+        self.assertEqual(len(index.search('qwerty', limit=10)), 2)
+
+
 class TestTierEscalation(WorkMatchingTestBase):
     """Тест порядка эскалации уровней."""
 
@@ -533,10 +609,11 @@ class TestTier6Batch(WorkMatchingTestBase):
         mock_provider.chat_completion.assert_called_once()
         self.assertIn(items[0].id, results)
 
+    @patch('estimates.services.work_matching.tiers.time.sleep')
     @patch('estimates.services.work_matching.tiers.LLMTaskConfig')
     @patch('estimates.services.work_matching.tiers.get_provider')
-    def test_tier6_llm_rate_limit_graceful(self, mock_get_provider, mock_config):
-        """Tier 6: rate limit → graceful None, не crash."""
+    def test_tier6_llm_rate_limit_graceful(self, mock_get_provider, mock_config, mock_sleep):
+        """Tier 6: rate limit → повторы с паузой, затем graceful None, не crash."""
         from llm_services.services.exceptions import RateLimitError
         mock_provider = MagicMock()
         mock_provider.chat_completion.side_effect = RateLimitError('429')
@@ -551,6 +628,8 @@ class TestTier6Batch(WorkMatchingTestBase):
         ctx = MatchingContext(self.estimate)
         result = tier.match(item, ctx)
         self.assertIsNone(result)
+        self.assertEqual(mock_provider.chat_completion.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
 
     @patch('estimates.services.work_matching.tiers.LLMTaskConfig')
     @patch('estimates.services.work_matching.tiers.get_provider')
@@ -924,6 +1003,82 @@ class TestMatchingContextPrefetch(WorkMatchingTestBase):
         self.assertEqual(result.source, 'history')
 
 
+# ====================== Matching Snapshot ======================
+
+class TestMatchingSnapshot(WorkMatchingTestBase):
+    """Общий версионированный снапшот каталога для MatchingContext."""
+
+    def setUp(self):
+        super().setUp()
+        from estimates.services.work_matching import snapshot
+        self.snapshot = snapshot
+
+    def test_roundtrip_matches_models(self):
+        """payload → JSON+zlib → объекты: поля совпадают с моделями."""
+        payload = self.snapshot._build_catalog_payload(self.price_list)
+        catalog = self.snapshot._catalog_from_payload(
+            self.snapshot._decode(self.snapshot._encode(payload)),
+        )
+        ids = [entry[0] for entry in catalog.work_items_cache]
+        self.assertEqual(
+            ids, list(WorkItem.objects.filter(is_current=True).values_list('id', flat=True)),
+        )
+        cached = {entry[0]: entry[3] for entry in catalog.work_items_cache}
+        wi = cached[self.wi_mount_vent.id]
+        self.assertEqual(wi.name, self.wi_mount_vent.name)
+        self.assertEqual(wi.section.name, 'Вентиляция')
+        from estimates.services.work_matching.tiers import _wi_grade_str
+        db_wi = WorkItem.objects.get(pk=self.wi_mount_vent.pk)
+        self.assertEqual(str(wi.hours or 0), str(db_wi.hours))
+        self.assertEqual(wi.grade_str, _wi_grade_str(db_wi))
+        self.assertEqual(
+            catalog.pli_cost_map[self.wi_mount_cond.id],
+            str(self.pli_cond.calculated_cost.quantize(Decimal('0.01'))),
+        )
+
+    def test_cached_until_catalog_changes(self):
+        """Повторная загрузка берёт готовый снапшот, сохранение WorkItem его сбрасывает."""
+        build = self.snapshot._build_catalog_payload
+        with patch.object(self.snapshot, '_build_catalog_payload', side_effect=build) as mock_build:
+            first = self.snapshot.load_catalog_snapshot(self.price_list)
+            self.snapshot._process_cache.clear()  # как будто другой воркер
+            second = self.snapshot.load_catalog_snapshot(self.price_list)
+            self.assertEqual(mock_build.call_count, 1)
+            self.assertEqual(
+                [e[0] for e in first.work_items_cache], [e[0] for e in second.work_items_cache],
+            )
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.wi_mount_duct.hours = Decimal('0.75')
+                self.wi_mount_duct.save()
+            third = self.snapshot.load_catalog_snapshot(self.price_list)
+            self.assertEqual(mock_build.call_count, 2)
+            duct = {e[0]: e[3] for e in third.work_items_cache}[self.wi_mount_duct.id]
+            self.assertEqual(duct.hours, Decimal('0.75'))
+
+    def test_knowledge_verify_invalidates(self):
+        """verify_knowledge (queryset.update) тоже сбрасывает снапшот знаний."""
+        from estimates.services.work_matching.knowledge import verify_knowledge
+        self.snapshot.load_knowledge_snapshot()
+        r = self.snapshot._get_redis()
+        before = r.get(self.snapshot.KNOWLEDGE_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            verify_knowledge('кондиционер', self.wi_mount_cond.id)
+        self.assertNotEqual(r.get(self.snapshot.KNOWLEDGE_VERSION_KEY), before)
+
+    def test_knowledge_usage_count_invalidates(self):
+        """Рост usage_count (queryset.update) сбрасывает снапшот знаний:
+        снапшот упорядочен по -usage_count."""
+        from estimates.services.work_matching import knowledge
+        with patch.object(knowledge, '_update_md_file'):
+            knowledge.save_knowledge('кондиционер usage', self.wi_mount_cond, 'llm', 0.9)
+            self.snapshot.load_knowledge_snapshot()
+            r = self.snapshot._get_redis()
+            before = r.get(self.snapshot.KNOWLEDGE_VERSION_KEY)
+            knowledge.save_knowledge('кондиционер usage', self.wi_mount_cond, 'llm', 0.9)
+        self.assertNotEqual(r.get(self.snapshot.KNOWLEDGE_VERSION_KEY), before)
+
+
 # ====================== Fast Pipeline ======================
 
 class TestFastPipeline(WorkMatchingTestBase):
@@ -1191,6 +1346,63 @@ class TestTwoPassPipeline(WorkMatchingTestBase):
         for item in items:
             self.assertIn(item.id, batch_results)
 
+    @override_settings(WORK_MATCHING_LLM_CONCURRENCY=3)
+    @patch('estimates.tasks_work_matching._save_knowledge_safe')
+    @patch('estimates.services.work_matching.tiers.Tier7WebSearch.match', return_value=None)
+    @patch('estimates.services.work_matching.tiers.Tier6LLM.match_batch')
+    def test_pass2_parallel_batches_keep_order(self, mock_batch, mock_web, mock_save):
+        """Pass 2: батчи LLM идут параллельно, но результаты в Redis — в порядке строк."""
+        import time as time_mod
+        from estimates.services.redis_session import get_redis
+        from estimates.services.work_matching.tiers import MatchResult
+        from estimates.tasks_work_matching import _run_matching, session_mgr
+
+        items = [
+            EstimateItem.objects.create(
+                estimate=self.estimate, section=self.est_section, subsection=self.subsection,
+                name=f'Совершенно неизвестный товар QWERTY{i}', quantity=Decimal('1'),
+                sort_order=i + 1,
+            )
+            for i in range(12)
+        ]
+        matched_ids = {item.id for item in items[::2]}
+
+        def fake_batch(items_with_candidates, ctx):
+            # Первый батч — самый медленный: без упорядочивания он пришёл бы последним
+            if items_with_candidates[0][0].id == items[0].id:
+                time_mod.sleep(0.2)
+            return {
+                item.id: MatchResult(
+                    work_item_id=self.wi_mount_cond.id,
+                    work_item_name=self.wi_mount_cond.name,
+                    work_item_article=self.wi_mount_cond.article,
+                    section_name='', hours='4.0', required_grade='3', unit='шт',
+                    calculated_cost=None, confidence=0.8, source='llm',
+                ) if item.id in matched_ids else None
+                for item, _ in items_with_candidates
+            }
+
+        mock_batch.side_effect = fake_batch
+
+        sid = session_mgr.create({
+            'status': 'processing', 'estimate_id': str(self.estimate.id),
+            'stats': '{}', 'errors': '[]',
+        })
+        try:
+            _run_matching(sid, self.estimate.id)
+
+            results = session_mgr.get_all_results(sid)
+            self.assertEqual([r['item_id'] for r in results], [item.id for item in items])
+            self.assertEqual(
+                [r['source'] for r in results],
+                ['llm' if item.id in matched_ids else 'unmatched' for item in items],
+            )
+            self.assertEqual(mock_batch.call_count, 3)
+            self.assertEqual(mock_web.call_count, 6)
+            self.assertEqual(session_mgr.get(sid)['status'], 'completed')
+        finally:
+            get_redis().delete(f'work_match:{sid}', f'work_match:{sid}:results')
+
 
 # ====================== View Endpoint Tests ======================
 
@@ -1198,6 +1410,7 @@ class TestWorkMatchingViews(WorkMatchingTestBase):
     """Тесты view endpoints подбора работ."""
 
     def setUp(self):
+        super().setUp()
         self.client.force_login(self.user)
 
     def test_start_returns_404_for_invalid_estimate(self):
@@ -7,7 +7,6 @@ from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from django.db import transaction
 from django.db.models import F, ExpressionWrapper, DecimalField, Sum
-from django.http import HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 
 logger = logging.getLogger(__name__)
@@ -27,7 +26,7 @@ ALLOWED_PDF_CONTENT_TYPES = {
 }
 
 from core.version_mixin import VersioningMixin
-from estimates.formula_engine import topological_sort
+from estimates.formula_engine import compile_column_config
 from estimates.models import (
     Estimate, EstimateSection, EstimateSubsection,
     EstimateCharacteristic, EstimateItem,
@@ -124,21 +123,16 @@ class EstimateViewSet(VersioningMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='export')
     def export(self, request, pk=None):
         """Экспорт сметы в Excel. mode=internal|external (по умолчанию internal)."""
+        from core.excel_stream import xlsx_response
         from estimates.services.estimate_excel_exporter import EstimateExcelExporter
 
         estimate = self.get_object()
         mode = request.query_params.get('mode', 'internal')
         exporter = EstimateExcelExporter(estimate)
-        buffer = exporter.export_with_column_config(mode=mode)
+        output = exporter.export_with_column_config_to_file(mode=mode)
 
         suffix = 'внутр' if mode == 'internal' else 'клиент'
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        filename = f'Смета_{estimate.number}_{suffix}.xlsx'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return xlsx_response(output, f'Смета_{estimate.number}_{suffix}.xlsx')
 
 
 class EstimateSectionViewSet(viewsets.ModelViewSet):
@@ -237,8 +231,8 @@ class EstimateItemViewSet(viewsets.ModelViewSet):
                 estimate = Estimate.objects.only('column_config').get(pk=estimate_id)
                 column_config = estimate.column_config or []
                 ctx['column_config'] = column_config
-                # Pre-compute topological sort once for all items
-                ctx['sorted_columns'] = topological_sort(column_config)
+                # Формулы компилируются один раз на запрос (и кэшируются по config)
+                ctx['compiled_columns'] = compile_column_config(column_config)
             except Estimate.DoesNotExist:
                 pass
         return ctx
@@ -482,27 +476,13 @@ class EstimateItemViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        from estimates.models import suppress_item_signals
-        with suppress_item_signals():
+        # Пересчёт затронутых подразделов — один раз на выходе из блока
+        from estimates.models import deferred_subsection_totals
+        with deferred_subsection_totals():
             qs = EstimateItem.objects.filter(pk__in=item_ids)
-            # Запомнить subsections для пересчёта
-            subsection_ids = set(qs.values_list('subsection_id', flat=True))
             deleted_count = qs.count()
             qs.delete()
 
-        # Пересчёт подсекций после удаления
-        if subsection_ids:
-            from estimates.services.markup_service import recalculate_estimate_subsections
-            for sub_id in subsection_ids:
-                if sub_id:
-                    try:
-                        from estimates.models import EstimateSubsection
-                        sub = EstimateSubsection.objects.get(pk=sub_id)
-                        recalculate_estimate_subsections(sub.section.estimate_id)
-                        break  # Один пересчёт на всю смету достаточно
-                    except Exception:
-                        pass
-
         return Response({'deleted': deleted_count})
 
     @action(detail=False, methods=['post'], url_path='auto-match')
@@ -11,7 +11,7 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from catalog.models import Product, ProductWorkMapping
-from estimates.models import EstimateItem, suppress_item_signals
+from estimates.models import EstimateItem, deferred_subsection_totals
 
 
 class EstimateItemLearningMixin:
@@ -54,7 +54,7 @@ class EstimateItemBulkMixin:
         if not item_ids:
             return Response({'error': 'item_ids обязателен'}, status=status.HTTP_400_BAD_REQUEST)
 
-        with suppress_item_signals():
+        with deferred_subsection_totals():
             qs = self.get_queryset().filter(pk__in=item_ids)
             deleted_count = qs.count()
             qs.delete()
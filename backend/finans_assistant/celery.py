@@ -40,6 +40,11 @@ app.conf.beat_schedule = {
         'task': 'banking.check_pending_payments',
         'schedule': 300.0,  # Каждые 5 минут
     },
+    # --- Accounting ---
+    'accounting-reconcile-running-balances': {
+        'task': 'accounting.reconcile_running_balances',
+        'schedule': crontab(hour=4, minute=0),  # Каждый день в 04:00
+    },
     # --- Supply ---
     'generate-recurring-invoices': {
         'task': 'supply.tasks.generate_recurring_invoices',
@@ -49,6 +54,11 @@ app.conf.beat_schedule = {
         'task': 'supply.tasks.recover_stuck_recognition',
         'schedule': 300.0,  # Каждые 5 минут
     },
+    # --- HVAC ISMeta ---
+    'recover-stuck-ismeta-jobs': {
+        'task': 'hvac_ismeta.recover_stuck_ismeta_jobs',
+        'schedule': 300.0,  # Каждые 5 минут
+    },
     # --- Kanban ---
     'scan-overdue-object-tasks': {
         'task': 'kanban_object_tasks.tasks.scan_overdue_tasks',
@@ -443,6 +443,10 @@ CELERY_TASK_EAGER_PROPAGATES = CELERY_TASK_ALWAYS_EAGER
 ESTIMATE_SESSION_TTL = int(os.environ.get('ESTIMATE_SESSION_TTL', '3600'))
 ESTIMATE_IMPORT_PAGE_DPI = int(os.environ.get('ESTIMATE_IMPORT_PAGE_DPI', '100'))
 ESTIMATE_IMPORT_MAX_FILE_SIZE = int(os.environ.get('ESTIMATE_IMPORT_MAX_FILE_SIZE', str(50 * 1024 * 1024)))
+# Общий снапшот каталога для подбора работ (estimates/services/work_matching/snapshot.py)
+WORK_MATCHING_SNAPSHOT_CACHE = os.environ.get('WORK_MATCHING_SNAPSHOT_CACHE', 'true').lower() in ('1', 'true', 'yes')
+# Сколько LLM-батчей Pass 2 подбора работ выполняется одновременно (лимиты провайдера)
+WORK_MATCHING_LLM_CONCURRENCY = int(os.environ.get('WORK_MATCHING_LLM_CONCURRENCY', '4'))
 
 # Celery Beat — расписание задач определено в finans_assistant/celery.py (единый источник)
 
@@ -684,6 +688,18 @@ ISMETA_JWT_EXPIRY_SECONDS = int(os.environ.get('ISMETA_JWT_EXPIRY_SECONDS', '360
 # =============================================================================
 RECOGNITION_URL = os.environ.get('RECOGNITION_URL', 'http://recognition:8003')
 RECOGNITION_API_KEY = os.environ.get('RECOGNITION_API_KEY', '')
+# Сколько файлов одного публичного запроса парсится одновременно
+# (api_public.tasks._parse_all_files). Суммарный LLM-параллелизм ограничивает
+# сам recognition — здесь только fan-out HTTP-запросов из Celery-задачи.
+PUBLIC_PARSE_CONCURRENCY = int(os.environ.get('PUBLIC_PARSE_CONCURRENCY', '4'))
+
+# Сколько файлов одной сессии массового импорта счетов распознаётся
+# одновременно (supply.tasks.start_bulk_recognition — число цепочек в chord).
+BULK_IMPORT_RECOGNITION_CONCURRENCY = int(os.environ.get('BULK_IMPORT_RECOGNITION_CONCURRENCY', '4'))
+
+# Сколько выписок Точки запрашивается одновременно (banking.sync_all_statements);
+# столько же keep-alive соединений в общем HTTP-пуле.
+BANKING_SYNC_CONCURRENCY = int(os.environ.get('BANKING_SYNC_CONCURRENCY', '8'))
 
 # =============================================================================
 # Public ISMeta (F8-03) — публичные endpoints под /api/hvac/ismeta/
@@ -694,6 +710,9 @@ RECOGNITION_API_KEY = os.environ.get('RECOGNITION_API_KEY', '')
 # RECOGNITION_URL.
 RECOGNITION_PUBLIC_URL = os.environ.get('RECOGNITION_PUBLIC_URL', 'http://recognition-public:8003')
 RECOGNITION_MAIN_URL = os.environ.get('RECOGNITION_MAIN_URL', RECOGNITION_URL)
+# Куда recognition POST'ит callbacks async-протокола (hvac_ismeta.tasks).
+# Внутри docker network = http://backend:8000.
+BACKEND_INTERNAL_URL = os.environ.get('BACKEND_INTERNAL_URL', 'http://backend:8000')
 # Прямое подключение к ismeta-postgres для чтения LLMProfile (раз psycopg2,
 # Django ORM не подключен — кросс-БД). См. memory feedback_no_wrappers.
 ISMETA_DATABASE_URL = os.environ.get('ISMETA_DATABASE_URL', '')
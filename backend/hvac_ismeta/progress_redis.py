@@ -1,4 +1,4 @@
-"""F8-Sprint4: чтение live-progress recognition'а из Redis.
+"""F8-Sprint4: live-progress recognition'а в Redis.
 
 Recognition пишет state по ключу `recognition:progress:<job_id>` (raw redis-py,
 без django KEY_PREFIX). Backend `/progress` endpoint мерджит БД (job.status,
@@ -7,11 +7,16 @@ Recognition пишет state по ключу `recognition:progress:<job_id>` (ra
 Fail-open: если Redis недоступен / redis package не установлен — возвращаем
 None и поверх БД ничего не добавляем (фронт продолжает poll'ить, увидит
 финал из БД).
+
+merge_live_progress — писатель со стороны backend: callback page_done
+досчитывает pages_processed/items_count в тот же ключ (recognition пишет его
+только на границах фаз и только если у него настроен Redis).
 """
 from __future__ import annotations
 
 import json
 import logging
+from datetime import datetime, timezone
 from typing import Any
 
 from django.conf import settings
@@ -19,6 +24,23 @@ from django.conf import settings
 logger = logging.getLogger(__name__)
 
 LIVE_KEY_TEMPLATE = "recognition:progress:{job_id}"
+# Тот же TTL, что у recognition ProgressEmitter — ключ zombie-job'а истекает сам.
+LIVE_TTL_SECONDS = 60 * 60
+
+
+def _client():
+    """redis client на RECOGNITION_PROGRESS_REDIS_URL или None (Redis не настроен)."""
+    url = getattr(settings, "RECOGNITION_PROGRESS_REDIS_URL", "") or ""
+    if not url:
+        return None
+    import redis  # type: ignore[import-not-found]
+
+    return redis.Redis.from_url(
+        url,
+        socket_connect_timeout=1,
+        socket_timeout=1,
+        decode_responses=True,
+    )
 
 
 def read_live_progress(job_id: str) -> dict[str, Any] | None:
@@ -30,18 +52,10 @@ def read_live_progress(job_id: str) -> dict[str, Any] | None:
     """
     if not job_id:
         return None
-    url = getattr(settings, "RECOGNITION_PROGRESS_REDIS_URL", "") or ""
-    if not url:
-        return None
     try:
-        import redis  # type: ignore[import-not-found]
-
-        client = redis.Redis.from_url(
-            url,
-            socket_connect_timeout=1,
-            socket_timeout=1,
-            decode_responses=True,
-        )
+        client = _client()
+        if client is None:
+            return None
         raw = client.get(LIVE_KEY_TEMPLATE.format(job_id=job_id))
     except Exception as exc:
         logger.debug(
@@ -59,3 +73,45 @@ def read_live_progress(job_id: str) -> dict[str, Any] | None:
             extra={"job_id": job_id, "error": str(exc)},
         )
         return None
+
+
+def merge_live_progress(
+    job_id: str,
+    *,
+    pages_processed: int,
+    items_count: int,
+    pages_total: int = 0,
+) -> None:
+    """Слить счётчики из callback'а в live-state. Best-effort, ошибки — в лог.
+
+    Счётчики только растут (max): snapshot recognition'а и callback'и
+    приходят вперемешку, поздний из них не должен откатить прогресс назад.
+    """
+    if not job_id:
+        return
+    key = LIVE_KEY_TEMPLATE.format(job_id=job_id)
+    try:
+        client = _client()
+        if client is None:
+            return
+        raw = client.get(key)
+        state: dict[str, Any] = json.loads(raw) if raw else {}
+        for field, value in (
+            ("pages_processed", pages_processed),
+            ("items_count", items_count),
+            ("pages_total", pages_total),
+        ):
+            current = state.get(field)
+            state[field] = max(int(value), current if isinstance(current, int) else 0)
+        state.setdefault("phase", "llm_normalize")
+        if state["pages_total"]:
+            state["current_page_label"] = (
+                f"Страница {state['pages_processed']} из {state['pages_total']}"
+            )
+        state["last_event_ts"] = datetime.now(timezone.utc).isoformat()
+        client.setex(key, LIVE_TTL_SECONDS, json.dumps(state))
+    except Exception as exc:
+        logger.debug(
+            "live progress redis write failed",
+            extra={"job_id": job_id, "error": str(exc)},
+        )
@@ -6,6 +6,7 @@
     GET  /api/hvac/ismeta/jobs/<id>/progress
     GET  /api/hvac/ismeta/jobs/<id>/result
     GET  /api/hvac/ismeta/jobs/<id>/excel
+    POST /api/hvac/ismeta/jobs/<id>/callback
     POST /api/hvac/ismeta/feedback
 
 DRF DefaultRouter сделал бы /<id>/progress/ — нам нужно /jobs/<id>/progress/.
@@ -20,6 +21,7 @@ parse_view = IsmetaPublicViewSet.as_view({"post": "parse"})
 progress_view = IsmetaPublicViewSet.as_view({"get": "progress"})
 result_view = IsmetaPublicViewSet.as_view({"get": "result"})
 excel_view = IsmetaPublicViewSet.as_view({"get": "excel"})
+callback_view = IsmetaPublicViewSet.as_view({"post": "callback"})
 feedback_view = IsmetaPublicViewSet.as_view({"post": "feedback"})
 
 
@@ -29,5 +31,6 @@ urlpatterns = [
     path("jobs/<uuid:pk>/progress", progress_view, name="ismeta-public-progress"),
     path("jobs/<uuid:pk>/result", result_view, name="ismeta-public-result"),
     path("jobs/<uuid:pk>/excel", excel_view, name="ismeta-public-excel"),
+    path("jobs/<uuid:pk>/callback", callback_view, name="ismeta-public-callback"),
     path("feedback", feedback_view, name="ismeta-public-feedback"),
 ]
@@ -9,6 +9,7 @@ Endpoints:
     GET  /api/hvac/ismeta/jobs/<id>/progress
     GET  /api/hvac/ismeta/jobs/<id>/result
     GET  /api/hvac/ismeta/jobs/<id>/excel
+    POST /api/hvac/ismeta/jobs/<id>/callback  (recognition → backend)
     POST /api/hvac/ismeta/feedback
 """
 from __future__ import annotations
@@ -17,10 +18,11 @@ import logging
 import os
 import re
 import secrets
+from hmac import compare_digest
 from datetime import datetime, timezone as _tz
 from urllib.parse import quote
 
-from django.db.models import Q
+from django.db.models import F, Q
 from django.http import HttpResponse
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
@@ -34,9 +36,9 @@ from .excel import build_workbook
 from .llm_profile_client import list_llm_profiles
 from .logging import log_concurrency_block, log_rate_limit_hit
 from .models import HvacIsmetaSettings, IsmetaFeedback, IsmetaJob
-from .progress_redis import read_live_progress
+from .progress_redis import merge_live_progress, read_live_progress
 from .ratelimit import check_daily_ip, check_hourly_ip, check_hourly_session
-from .tasks import process_ismeta_job
+from .tasks import callback_token, fail_job, finalize_job, process_ismeta_job
 
 logger = logging.getLogger(__name__)
 
@@ -339,8 +341,8 @@ class IsmetaPublicViewSet(viewsets.ViewSet):
 
         live = read_live_progress(str(job.id))
         if live:
-            # Live source выигрывает у БД для активных полей. БД pages_*/items_*
-            # обновляются только в финале task'а — тут они нули.
+            # Live source выигрывает у БД для активных полей: recognition
+            # пишет Redis и между страницами (фазы), БД — только по page_done.
             for key in (
                 "phase",
                 "current_page_label",
@@ -358,6 +360,59 @@ class IsmetaPublicViewSet(viewsets.ViewSet):
                     base[key] = live[key]
         return Response(base)
 
+    @action(detail=True, methods=["post"], url_path="callback")
+    def callback(self, request: Request, pk: str | None = None) -> Response:
+        """Recognition присылает события: started / page_done / finished / failed / cancelled.
+
+        Auth: X-Callback-Token (constant-time сравнение с callback_token(job.id)).
+        Поздние callbacks по job в финальном статусе игнорируются.
+        """
+        job = self._get_job(pk or "")
+        if job is None:
+            return Response({"error": "Не найдено"}, status=status.HTTP_404_NOT_FOUND)
+        token = request.headers.get("X-Callback-Token", "")
+        if not compare_digest(token, callback_token(job.id)):
+            logger.warning("ismeta callback forbidden", extra={"job_id": str(job.id)})
+            return Response({"error": "forbidden"}, status=status.HTTP_403_FORBIDDEN)
+
+        event = request.data.get("event")
+        if job.status not in IsmetaJob.ACTIVE_STATUSES:
+            return Response({"ok": True, "ignored": "already_terminal"})
+
+        if event == "started":
+            try:
+                pages_total = int(request.data.get("pages_total") or 0)
+            except (TypeError, ValueError):
+                pages_total = 0
+            if pages_total:
+                IsmetaJob.objects.filter(id=job.id).update(pages_total=pages_total)
+        elif event == "page_done":
+            page_items = request.data.get("items") or []
+            # page_done приходят параллельно — инкремент на стороне БД.
+            IsmetaJob.objects.filter(id=job.id).update(
+                pages_processed=F("pages_processed") + 1,
+                items_count=F("items_count") + len(page_items),
+            )
+            job.refresh_from_db(fields=["pages_total", "pages_processed", "items_count"])
+            merge_live_progress(
+                str(job.id),
+                pages_processed=job.pages_processed,
+                items_count=job.items_count,
+                pages_total=job.pages_total,
+            )
+        elif event == "finished":
+            finalize_job(job, request.data)
+        elif event == "failed":
+            fail_job(job, str(request.data.get("error", "")) or "recognition failed")
+        elif event == "cancelled":
+            fail_job(job, "recognition job cancelled", status=IsmetaJob.STATUS_CANCELLED)
+        else:
+            return Response(
+                {"error": f"unknown event {event!r}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({"ok": True})
+
     @action(detail=True, methods=["get"], url_path="result")
     def result(self, request: Request, pk: str | None = None) -> Response:
         job = self._get_job(pk or "")
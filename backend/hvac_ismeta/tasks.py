@@ -1,18 +1,27 @@
-"""Celery task для async обработки IsmetaJob.
+"""Celery tasks для async обработки IsmetaJob.
 
-Sync POST к recognition (/v1/parse/spec) с X-LLM-* headers per-request override.
-Прогресс в текущей версии обновляется только в финальном статусе (pages_processed
-заполняется из ответа recognition). Future: переход на /v1/parse/spec/async с
-callback endpoint для инкрементального progress.
+process_ismeta_job — только handshake: POST PDF на recognition
+/v1/parse/spec/async (202 сразу), worker-слот освобождается. Дальше
+recognition шлёт callbacks на /api/hvac/ismeta/jobs/<id>/callback
+(started / page_done / finished / failed / cancelled) — тот же протокол, что
+у ISMeta recognition_jobs. page_done обновляет счётчики в БД и live-state в
+Redis (progress_redis), finished — финальный результат (finalize_job).
+
+recover_stuck_ismeta_jobs (Celery Beat) закрывает job'ы, по которым
+финальный callback так и не пришёл (recognition callbacks не ретраит).
 """
 from __future__ import annotations
 
+import hashlib
+import hmac
 import logging
 from decimal import Decimal
+from typing import Any
 
 import requests
 from celery import shared_task
 from django.conf import settings
+from django.urls import reverse
 from django.utils import timezone
 
 from .llm_profile_client import LLMProfileLookupError, fetch_llm_credentials
@@ -21,7 +30,9 @@ from .models import IsmetaJob
 
 logger = logging.getLogger(__name__)
 
-# /v1/parse/spec — sync endpoint, ждём финальный SpecParseResponse.
+# Handshake /v1/parse/spec/async: recognition сохраняет PDF и отвечает 202.
+SUBMIT_TIMEOUT_SECONDS = 60
+# Сколько job может ждать финальный callback, прежде чем sweep пометит её error.
 RECOGNITION_TIMEOUT_SECONDS = 60 * 60  # 1 час хватает для самой большой спеки.
 
 
@@ -32,8 +43,26 @@ def _resolve_recognition_url(pipeline: str) -> str:
     return settings.RECOGNITION_MAIN_URL
 
 
+def callback_token(job_id: Any) -> str:
+    """Shared-token для X-Callback-Token: HMAC(SECRET_KEY, job_id).
+
+    Не хранится в БД — view пересчитывает и сравнивает constant-time.
+    """
+    return hmac.new(
+        settings.SECRET_KEY.encode("utf-8"),
+        f"hvac_ismeta.callback:{job_id}".encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+
+
+def _callback_url(job: IsmetaJob) -> str:
+    path = reverse("ismeta-public-callback", kwargs={"pk": job.id})
+    return f"{settings.BACKEND_INTERNAL_URL.rstrip('/')}{path}"
+
+
 def _build_headers(job: IsmetaJob) -> dict[str, str]:
-    """Собирает headers для recognition: X-API-Key + X-LLM-* override + X-Job-Id.
+    """Собирает headers для recognition: X-API-Key + X-LLM-* override + X-Job-Id
+    + X-Callback-URL/X-Callback-Token async-протокола.
 
     Если llm_profile_id не задан — recognition использует свой default
     (settings.llm_api_key), что для public endpoint обычно не желательно.
@@ -46,6 +75,8 @@ def _build_headers(job: IsmetaJob) -> dict[str, str]:
     headers: dict[str, str] = {
         "X-API-Key": settings.RECOGNITION_API_KEY,
         "X-Job-Id": str(job.id),
+        "X-Callback-URL": _callback_url(job),
+        "X-Callback-Token": callback_token(job.id),
     }
 
     if job.llm_profile_id is None:
@@ -64,16 +95,47 @@ def _build_headers(job: IsmetaJob) -> dict[str, str]:
     return headers
 
 
-@shared_task(
-    name="hvac_ismeta.process_ismeta_job",
-    bind=True,
-    # Глобальный CELERY_TASK_TIME_LIMIT=300s — мало для recognition (3-30 мин).
-    # Hard limit = 1h, soft = 55 мин — даём task'е шанс корректно сохранить error.
-    time_limit=60 * 60,
-    soft_time_limit=55 * 60,
-)
+def finalize_job(job: IsmetaJob, data: dict[str, Any]) -> None:
+    """Финальный snapshot recognition (callback finished) → job done."""
+    items = data.get("items", []) or []
+    pages_stats = data.get("pages_stats", {}) or {}
+    llm_costs = data.get("llm_costs", {}) or {}
+    cost_total = llm_costs.get("total_usd") or 0.0
+
+    job.result_json = {
+        key: data.get(key)
+        for key in ("status", "items", "errors", "pages_stats", "pages_summary", "llm_costs")
+        if key in data
+    }
+    job.items_count = len(items)
+    job.pages_total = pages_stats.get("total", 0) or job.pages_total or 0
+    job.pages_processed = pages_stats.get("processed", 0) or job.pages_processed or 0
+    job.cost_usd = Decimal(str(cost_total))
+    job.status = IsmetaJob.STATUS_DONE
+    job.error_message = ""
+    job.completed_at = timezone.now()
+    job.save()
+    duration = (job.completed_at - job.started_at).total_seconds() if job.started_at else None
+    log_job_completed(job, duration_seconds=duration)
+
+
+def fail_job(job: IsmetaJob, error: str, status: str = IsmetaJob.STATUS_ERROR) -> None:
+    """Перевести job в error/cancelled с сообщением."""
+    job.status = status
+    job.error_message = error[:2000]
+    job.completed_at = timezone.now()
+    job.save(update_fields=["status", "error_message", "completed_at"])
+    log_job_failed(job, error=error)
+
+
+@shared_task(name="hvac_ismeta.process_ismeta_job", bind=True)
 def process_ismeta_job(self, job_id: str) -> str:
-    """Обработка одного IsmetaJob: POST PDF в recognition, сохранение результата."""
+    """Отправка IsmetaJob в recognition /v1/parse/spec/async.
+
+    Не ждёт парсинга: результат придёт callback'ами. Ошибка handshake
+    (transport / ≠202) сразу переводит job в error — иначе callback не придёт
+    и job повиснет в processing до sweep'а.
+    """
     try:
         job = IsmetaJob.objects.get(id=job_id)
     except IsmetaJob.DoesNotExist:
@@ -95,40 +157,42 @@ def process_ismeta_job(self, job_id: str) -> str:
         with open(job.pdf_storage_path, "rb") as fh:
             files = {"file": (job.pdf_filename, fh, "application/pdf")}
             response = requests.post(
-                f"{recognition_url}/v1/parse/spec",
+                f"{recognition_url}/v1/parse/spec/async",
                 files=files,
                 headers=headers,
-                timeout=RECOGNITION_TIMEOUT_SECONDS,
+                timeout=SUBMIT_TIMEOUT_SECONDS,
             )
 
-        if response.status_code != 200:
+        if response.status_code != 202:
             raise RuntimeError(
                 f"recognition HTTP {response.status_code}: {response.text[:500]}"
             )
-
-        data = response.json()
-        items = data.get("items", []) or []
-        pages_stats = data.get("pages_stats", {}) or {}
-        llm_costs = data.get("llm_costs", {}) or {}
-        cost_total = llm_costs.get("total_usd") or 0.0
-
-        job.result_json = data
-        job.items_count = len(items)
-        job.pages_total = pages_stats.get("total", 0) or 0
-        job.pages_processed = pages_stats.get("processed", 0) or 0
-        job.cost_usd = Decimal(str(cost_total))
-        job.status = IsmetaJob.STATUS_DONE
-        job.completed_at = timezone.now()
-        job.save()
-        duration = (job.completed_at - job.started_at).total_seconds() if job.started_at else None
-        log_job_completed(job, duration_seconds=duration)
-        return "done"
+        return "submitted"
 
     except Exception as exc:  # noqa: BLE001 — фиксируем любую ошибку в job
         logger.exception("process_ismeta_job failed for %s", job_id)
-        job.status = IsmetaJob.STATUS_ERROR
-        job.error_message = str(exc)[:2000]
-        job.completed_at = timezone.now()
-        job.save(update_fields=["status", "error_message", "completed_at"])
-        log_job_failed(job, error=str(exc))
+        job.refresh_from_db(fields=["status"])
+        if job.status == IsmetaJob.STATUS_PROCESSING:
+            fail_job(job, str(exc))
         return "error"
+
+
+@shared_task(name="hvac_ismeta.recover_stuck_ismeta_jobs")
+def recover_stuck_ismeta_jobs() -> int:
+    """Job'ы в processing дольше RECOGNITION_TIMEOUT_SECONDS → error.
+
+    Recognition не ретраит callbacks: потерянный finished/failed оставил бы
+    job активной навсегда (и держал бы concurrency-лимит сессии).
+    """
+    threshold = timezone.now() - timezone.timedelta(seconds=RECOGNITION_TIMEOUT_SECONDS)
+    stuck = IsmetaJob.objects.filter(
+        status=IsmetaJob.STATUS_PROCESSING,
+        started_at__lt=threshold,
+    )
+    count = 0
+    for job in stuck:
+        fail_job(job, "recognition не прислал результат вовремя")
+        count += 1
+    if count:
+        logger.info("recover_stuck_ismeta_jobs: %d jobs → error", count)
+    return count
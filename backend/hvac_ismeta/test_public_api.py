@@ -7,12 +7,14 @@ from __future__ import annotations
 
 import io
 import tempfile
+from datetime import timedelta
 from decimal import Decimal
 from unittest import mock
 
 import pytest
 from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
@@ -485,7 +487,8 @@ def _build_recognition_response(items_count: int = 3, total_usd: float = 0.05) -
     }
 
 
-def test_process_ismeta_job_success(db, pdf_on_disk):
+def test_process_ismeta_job_submits_async(db, pdf_on_disk):
+    """Task только отправляет PDF на /v1/parse/spec/async и освобождает worker."""
     job = _make_job(
         status=IsmetaJob.STATUS_QUEUED,
         result_json=None,
@@ -495,8 +498,7 @@ def test_process_ismeta_job_success(db, pdf_on_disk):
         cost_usd=Decimal("0"),
         pdf_storage_path=pdf_on_disk,
     )
-    fake_response = mock.MagicMock(status_code=200)
-    fake_response.json.return_value = _build_recognition_response(items_count=3, total_usd=0.0421)
+    fake_response = mock.MagicMock(status_code=202)
 
     creds = {
         "id": 1,
@@ -511,22 +513,24 @@ def test_process_ismeta_job_success(db, pdf_on_disk):
     with (
         mock.patch.object(tasks_module, "fetch_llm_credentials", return_value=creds),
         mock.patch.object(tasks_module.requests, "post", return_value=fake_response) as post_mock,
+        override_settings(BACKEND_INTERNAL_URL="http://backend:8000"),
     ):
         result = tasks_module.process_ismeta_job(str(job.id))
 
-    assert result == "done"
+    assert result == "submitted"
     job.refresh_from_db()
-    assert job.status == IsmetaJob.STATUS_DONE
-    assert job.items_count == 3
-    assert job.pages_total == 2
-    assert job.pages_processed == 2
-    assert job.cost_usd == Decimal("0.0421")
-    # Headers
-    call_kwargs = post_mock.call_args.kwargs
-    headers = call_kwargs["headers"]
+    assert job.status == IsmetaJob.STATUS_PROCESSING
+    assert job.started_at is not None
+    assert post_mock.call_args.args[0].endswith("/v1/parse/spec/async")
+    headers = post_mock.call_args.kwargs["headers"]
     assert headers["X-LLM-API-Key"] == "sk-test"
     assert headers["X-LLM-Base-URL"] == "https://api.test"
     assert headers["X-LLM-Multimodal-Model"] == "vision-m"
+    assert headers["X-Job-Id"] == str(job.id)
+    assert headers["X-Callback-URL"] == (
+        f"http://backend:8000/api/hvac/ismeta/jobs/{job.id}/callback"
+    )
+    assert headers["X-Callback-Token"] == tasks_module.callback_token(job.id)
 
 
 def test_process_ismeta_job_recognition_error(db, pdf_on_disk):
@@ -566,8 +570,7 @@ def test_process_ismeta_job_pipeline_routing(db, pdf_on_disk):
         pipeline="main",
         llm_profile_id=None,
     )
-    fake_response = mock.MagicMock(status_code=200)
-    fake_response.json.return_value = _build_recognition_response()
+    fake_response = mock.MagicMock(status_code=202)
 
     with (
         mock.patch.object(tasks_module, "fetch_llm_credentials") as fetch_mock,
@@ -579,7 +582,7 @@ def test_process_ismeta_job_pipeline_routing(db, pdf_on_disk):
     ):
         result = tasks_module.process_ismeta_job(str(job.id))
 
-    assert result == "done"
+    assert result == "submitted"
     fetch_mock.assert_not_called()  # llm_profile_id=None → fetch skip
     url_called = post_mock.call_args.args[0]
     assert url_called.startswith("http://ismeta-recognition:8003")
@@ -589,3 +592,104 @@ def test_process_ismeta_job_missing(db):
     """job_id с несуществующим UUID → no crash, возврат missing."""
     result = tasks_module.process_ismeta_job("00000000-0000-0000-0000-000000000000")
     assert result == "missing"
+
+
+def test_recover_stuck_ismeta_jobs(db):
+    stale = _make_job(
+        status=IsmetaJob.STATUS_PROCESSING,
+        started_at=timezone.now() - timedelta(seconds=tasks_module.RECOGNITION_TIMEOUT_SECONDS + 60),
+    )
+    fresh = _make_job(status=IsmetaJob.STATUS_PROCESSING, started_at=timezone.now())
+
+    assert tasks_module.recover_stuck_ismeta_jobs() == 1
+    stale.refresh_from_db()
+    fresh.refresh_from_db()
+    assert stale.status == IsmetaJob.STATUS_ERROR
+    assert fresh.status == IsmetaJob.STATUS_PROCESSING
+
+
+# ---------------------------------------------------------------------------
+# /jobs/<id>/callback — события recognition async-протокола
+# ---------------------------------------------------------------------------
+
+
+def _post_callback(client, job, payload, token=None):
+    return client.post(
+        reverse("ismeta-public-callback", kwargs={"pk": str(job.id)}),
+        {"job_id": str(job.id), **payload},
+        format="json",
+        HTTP_X_CALLBACK_TOKEN=token if token is not None else tasks_module.callback_token(job.id),
+    )
+
+
+def _processing_job():
+    return _make_job(
+        status=IsmetaJob.STATUS_PROCESSING,
+        started_at=timezone.now(),
+        result_json=None,
+        pages_total=0,
+        pages_processed=0,
+        items_count=0,
+        cost_usd=Decimal("0"),
+    )
+
+
+def test_callback_rejects_bad_token(db, client):
+    job = _processing_job()
+    resp = _post_callback(client, job, {"event": "started", "pages_total": 3}, token="nope")
+    assert resp.status_code == status.HTTP_403_FORBIDDEN
+    job.refresh_from_db()
+    assert job.pages_total == 0
+
+
+def test_callback_page_progress_feeds_db_and_live_state(db, client, monkeypatch):
+    job = _processing_job()
+    merged = []
+    monkeypatch.setattr(
+        "hvac_ismeta.public_views.merge_live_progress",
+        lambda job_id, **fields: merged.append((job_id, fields)),
+    )
+
+    assert _post_callback(client, job, {"event": "started", "pages_total": 2}).status_code == 200
+    page_items = _build_recognition_response(items_count=3)["items"]
+    resp = _post_callback(client, job, {"event": "page_done", "page": 1, "items": page_items})
+    assert resp.status_code == status.HTTP_200_OK
+
+    job.refresh_from_db()
+    assert job.pages_total == 2
+    assert job.pages_processed == 1
+    assert job.items_count == 3
+    assert merged == [
+        (str(job.id), {"pages_processed": 1, "items_count": 3, "pages_total": 2}),
+    ]
+
+
+def test_callback_finished_stores_result(db, client):
+    job = _processing_job()
+    payload = {"event": "finished", **_build_recognition_response(items_count=3, total_usd=0.0421)}
+    resp = _post_callback(client, job, payload)
+    assert resp.status_code == status.HTTP_200_OK
+
+    job.refresh_from_db()
+    assert job.status == IsmetaJob.STATUS_DONE
+    assert job.items_count == 3
+    assert job.pages_total == 2
+    assert job.pages_processed == 2
+    assert job.cost_usd == Decimal("0.0421")
+    assert len(job.result_json["items"]) == 3
+    assert "event" not in job.result_json
+    assert job.completed_at is not None
+
+
+def test_callback_failed_and_late_events_ignored(db, client):
+    job = _processing_job()
+    resp = _post_callback(client, job, {"event": "failed", "error": "boom", "code": "x"})
+    assert resp.status_code == status.HTTP_200_OK
+    job.refresh_from_db()
+    assert job.status == IsmetaJob.STATUS_ERROR
+    assert job.error_message == "boom"
+
+    late = _post_callback(client, job, {"event": "finished", **_build_recognition_response()})
+    assert late.json()["ignored"] == "already_terminal"
+    job.refresh_from_db()
+    assert job.status == IsmetaJob.STATUS_ERROR
@@ -1,6 +1,6 @@
 from decimal import Decimal
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Sum
 from django.core.exceptions import ValidationError
 from core.models import TimestampedModel
@@ -22,6 +22,19 @@ def invoice_file_path(instance, filename):
     return f'invoices/{year}/{month}/{filename}'
 
 
+class BalanceSourceMixin:
+    """
+    Источник проводок для AccountRunningBalance (см. payments.signals).
+
+    save() атомарен: чтение старой проводки под FOR UPDATE (pre_save),
+    запись и применение разницы к оборотам (post_save) — одна транзакция.
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
 # =============================================================================
 # ExpenseCategory — Внутренний план счетов
 # =============================================================================
@@ -152,7 +165,7 @@ class ExpenseCategory(TimestampedModel):
 # Payment — фактический платёж (LEGACY — будет удалён на Этапе 10)
 # =============================================================================
 
-class Payment(TimestampedModel):
+class Payment(BalanceSourceMixin, TimestampedModel):
     """Фактический платёж (по договору или операционный) — LEGACY"""
 
     class PaymentType(models.TextChoices):
@@ -461,7 +474,7 @@ class BulkImportSession(TimestampedModel):
 # Invoice — единый счёт на оплату (НОВОЕ — центральная сущность для расходов)
 # =============================================================================
 
-class Invoice(TimestampedModel):
+class Invoice(BalanceSourceMixin, TimestampedModel):
     """
     Единый Счёт на оплату — центральная сущность для всех расходов.
 
@@ -997,7 +1010,7 @@ class RecurringPayment(TimestampedModel):
 # IncomeRecord — поступление (доход) — упрощённая модель
 # =============================================================================
 
-class IncomeRecord(TimestampedModel):
+class IncomeRecord(BalanceSourceMixin, TimestampedModel):
     """Поступление (доход) — упрощённая модель без workflow согласования."""
 
     class IncomeType(models.TextChoices):
@@ -1,13 +1,26 @@
 """
 Сервисный слой для аналитического дашборда счетов на оплату.
+
+Результат кешируется (DASHBOARD_CACHE_KEY) и сбрасывается сигналами
+payments при изменении счетов, поступлений, платежей и остатков.
 """
 from datetime import date, timedelta
 from decimal import Decimal
 
-from django.db.models import Count, Sum
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
 
 from payments.models import Invoice
 
+DASHBOARD_CACHE_KEY = 'payments:invoice_dashboard'
+# Страховка на изменения в обход сигналов (queryset.update, правки в БД)
+DASHBOARD_CACHE_TIMEOUT = 600
+
+
+def invalidate_invoice_dashboard() -> None:
+    """Сбросить кеш дашборда (вызывается сигналами после commit)."""
+    cache.delete(DASHBOARD_CACHE_KEY)
+
 
 def get_invoice_dashboard() -> dict:
     """
@@ -16,55 +29,67 @@ def get_invoice_dashboard() -> dict:
     Returns:
         dict с ключами: account_balances, registry_summary, by_object, by_category.
     """
-    from accounting.models import Account, AccountBalance
-
     today = date.today()
+    cached = cache.get(DASHBOARD_CACHE_KEY)
+    # Корзины реестра считаются от сегодняшней даты
+    if cached is not None and cached['date'] == today:
+        return cached['data']
 
-    # Остатки на счетах
-    accounts = Account.objects.filter(is_active=True)
+    data = _build_invoice_dashboard(today)
+    cache.set(DASHBOARD_CACHE_KEY, {'date': today, 'data': data}, DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def _build_invoice_dashboard(today: date) -> dict:
+    from accounting.models import Account, AccountBalance
+
+    # Остатки на счетах: обороты — из AccountRunningBalance,
+    # последний банковский остаток — подзапросом, всё одним запросом
+    latest_bank = AccountBalance.objects.filter(
+        account=OuterRef('pk'), source=AccountBalance.Source.BANK_TOCHKA,
+    ).order_by('-balance_date')
+    accounts = Account.objects.filter(is_active=True).select_related(
+        'running_balance',
+    ).annotate(
+        bank_balance=Subquery(latest_bank.values('balance')[:1]),
+        bank_balance_date=Subquery(latest_bank.values('balance_date')[:1]),
+    )
     account_balances = []
     for acc in accounts:
-        latest_bank_balance = (
-            AccountBalance.objects
-            .filter(account=acc, source=AccountBalance.Source.BANK_TOCHKA)
-            .order_by('-balance_date')
-            .first()
-        )
+        if hasattr(acc, 'running_balance'):
+            running = acc.running_balance
+            internal_balance = acc.initial_balance + running.income_total - running.expense_total
+        else:
+            # Строки оборотов ещё нет — построится при первом обращении
+            internal_balance = acc.get_current_balance()
         account_balances.append({
             'id': acc.id,
             'name': acc.name,
             'number': acc.number,
             'currency': acc.currency,
-            'internal_balance': str(acc.get_current_balance()),
-            'bank_balance': str(latest_bank_balance.balance) if latest_bank_balance else None,
-            'bank_balance_date': str(latest_bank_balance.balance_date) if latest_bank_balance else None,
+            'internal_balance': str(internal_balance),
+            'bank_balance': str(acc.bank_balance) if acc.bank_balance is not None else None,
+            'bank_balance_date': str(acc.bank_balance_date) if acc.bank_balance_date else None,
         })
 
-    # Сводка по реестру
+    # Сводка по реестру — одним запросом с условной агрегацией
     registry_qs = Invoice.objects.filter(status=Invoice.Status.IN_REGISTRY)
-    overdue_qs = registry_qs.filter(due_date__lt=today)
-    today_qs = registry_qs.filter(due_date=today)
-
-    week_end = today + timedelta(days=7)
-    month_end = today + timedelta(days=30)
-    week_qs = registry_qs.filter(due_date__lte=week_end)
-    month_qs = registry_qs.filter(due_date__lte=month_end)
-
-    def sum_amount(qs):
-        return qs.aggregate(total=Sum('amount_gross'))['total'] or Decimal('0')
-
-    registry_summary = {
-        'total_amount': str(sum_amount(registry_qs)),
-        'total_count': registry_qs.count(),
-        'overdue_amount': str(sum_amount(overdue_qs)),
-        'overdue_count': overdue_qs.count(),
-        'today_amount': str(sum_amount(today_qs)),
-        'today_count': today_qs.count(),
-        'this_week_amount': str(sum_amount(week_qs)),
-        'this_week_count': week_qs.count(),
-        'this_month_amount': str(sum_amount(month_qs)),
-        'this_month_count': month_qs.count(),
+    buckets = {
+        'total': Q(),
+        'overdue': Q(due_date__lt=today),
+        'today': Q(due_date=today),
+        'this_week': Q(due_date__lte=today + timedelta(days=7)),
+        'this_month': Q(due_date__lte=today + timedelta(days=30)),
     }
+    aggregates = {}
+    for name, condition in buckets.items():
+        aggregates[f'{name}_amount'] = Sum('amount_gross', filter=condition)
+        aggregates[f'{name}_count'] = Count('id', filter=condition)
+    totals = registry_qs.aggregate(**aggregates)
+    registry_summary = {}
+    for name in buckets:
+        registry_summary[f'{name}_amount'] = str(totals[f'{name}_amount'] or Decimal('0'))
+        registry_summary[f'{name}_count'] = totals[f'{name}_count']
 
     # Группировка по объектам
     by_object = list(
@@ -537,28 +537,40 @@ class InvoiceService:
         """
         Массовая загрузка счетов.
 
-        Создаёт BulkImportSession, для каждого файла создаёт
-        Invoice(RECOGNITION) и ставит Celery task.
+        Создаёт BulkImportSession и Invoice(RECOGNITION) на каждый файл
+        (одним bulk_create), распознавание запускает фоновая задача
+        start_bulk_recognition после commit — запрос не ждёт ни
+        распознавания, ни постановки задач по каждому файлу.
+
+        Запись файлов в storage остаётся в запросе намеренно: временный
+        файл upload'а живёт только до конца запроса и только в контейнере
+        backend — воркеру его не передать, не записав куда-то ещё. Storage
+        по умолчанию — FileSystemStorage на общем томе media, save()
+        переносит временный файл (file_move_safe: rename или потоковое
+        копирование чанками), без повторного чтения в память и без
+        обработки содержимого.
 
         Returns:
             (session, accepted_count)
         """
         from pathlib import Path
         from payments.models import BulkImportSession
-        from supply.tasks import recognize_invoice, finalize_bulk_import
+        from supply.tasks import start_bulk_recognition
+
+        file_field = Invoice._meta.get_field('invoice_file')
+        supported = [
+            f for f in files
+            if Path(f.name).suffix.lower() in InvoiceService.SUPPORTED_EXTENSIONS
+        ]
 
         session = BulkImportSession.objects.create(
             created_by=user,
-            total_files=len(files),
+            total_files=len(supported),
         )
 
-        accepted = 0
-        for f in files:
-            ext = Path(f.name).suffix.lower()
-            if ext not in InvoiceService.SUPPORTED_EXTENSIONS:
-                continue
-
-            invoice = Invoice.objects.create(
+        invoices = []
+        for f in supported:
+            invoice = Invoice(
                 source=Invoice.Source.BULK_IMPORT,
                 status=Invoice.Status.RECOGNITION,
                 invoice_type=Invoice.InvoiceType.SUPPLIER,
@@ -567,23 +579,18 @@ class InvoiceService:
                 estimate=estimate,
                 description=f'Массовый импорт: {f.name}',
             )
-            invoice.invoice_file.save(f.name, f, save=True)
-            recognize_invoice.delay(
-                invoice.id, auto_counterparty=True,
+            # Загруженный во временный файл upload переносится в storage
+            # без повторного чтения в память (см. docstring — почему в запросе)
+            invoice.invoice_file.name = file_field.storage.save(
+                file_field.generate_filename(invoice, f.name), f,
+                max_length=file_field.max_length,
             )
-            accepted += 1
+            invoices.append(invoice)
+        Invoice.objects.bulk_create(invoices, batch_size=500)
 
-        # Обновить total_files на реальное количество принятых
-        session.total_files = accepted
-        session.save(update_fields=['total_files'])
+        transaction.on_commit(lambda: start_bulk_recognition.delay(session.id))
 
-        # Финализация сессии с запасом по времени
-        finalize_bulk_import.apply_async(
-            args=[session.id],
-            countdown=accepted * 10 + 30,
-        )
-
-        return session, accepted
+        return session, len(invoices)
 
     # =========================================================================
     # Вспомогательные методы
@@ -867,31 +874,30 @@ class InvoiceService:
         """
         Создать Product из InvoiceItem при verify().
 
-        Для каждой позиции без product: найти/создать товар,
-        записать историю цен, категоризировать новые товары.
+        Позиции без product разрешаются пакетно (find_or_create_products),
+        затем — история цен и категоризация новых товаров.
         """
         matcher = ProductMatcher()
         new_products = []
 
-        for item in invoice.items.filter(product__isnull=True):
-            if not item.raw_name:
-                continue
-
-            product, created = matcher.find_or_create_product(
-                name=item.raw_name,
-                unit=item.unit or 'шт',
-            )
-
+        items = [
+            item for item in invoice.items.filter(product__isnull=True)
+            if item.raw_name
+        ]
+        resolved = matcher.find_or_create_products(
+            [(item.raw_name, item.unit or 'шт') for item in items],
+        )
+        for item, (product, created) in zip(items, resolved):
             if created:
                 new_products.append(product)
-
             item.product = product
-            item.save(update_fields=['product'])
+        InvoiceItem.objects.bulk_update(items, ['product'])
 
-            # История цен
+        # История цен
+        for item in items:
             if invoice.counterparty and item.price_per_unit:
                 ProductPriceHistory.objects.update_or_create(
-                    product=product,
+                    product=item.product,
                     counterparty=invoice.counterparty,
                     invoice_date=invoice.invoice_date or date.today(),
                     unit=item.unit or 'шт',
@@ -923,7 +929,11 @@ class InvoiceService:
         from django.db.models import F
         from payments.models import BulkImportSession
 
-        updates = {'processed_files': F('processed_files') + 1}
+        # updated_at — отметка прогресса для recover_stuck_recognition
+        updates = {
+            'processed_files': F('processed_files') + 1,
+            'updated_at': timezone.now(),
+        }
         if success:
             updates['successful'] = F('successful') + 1
         else:
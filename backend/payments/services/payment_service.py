@@ -168,7 +168,13 @@ class PaymentService:
         matcher = ProductMatcher()
         counterparty = payment.contract.counterparty if payment.contract else None
         
-        for item_data in items_data:
+        # Товары каталога — пакетно для всех позиций
+        resolved = matcher.find_or_create_products(
+            [(item_data['raw_name'], item_data.get('unit', 'шт')) for item_data in items_data],
+            payment=payment,
+        )
+        
+        for item_data, (product, _created) in zip(items_data, resolved):
             # Конвертируем строковые значения в Decimal
             quantity = Decimal(str(item_data['quantity']))
             price_per_unit = Decimal(str(item_data['price_per_unit']))
@@ -177,13 +183,6 @@ class PaymentService:
                 if item_data.get('vat_amount') else None
             )
             
-            # Ищем или создаём товар в каталоге
-            product, created = matcher.find_or_create_product(
-                name=item_data['raw_name'],
-                unit=item_data.get('unit', 'шт'),
-                payment=payment
-            )
-            
             # Создаём позицию платежа
             PaymentItem.objects.create(
                 payment=payment,
@@ -1,10 +1,14 @@
 """
-Signals for auto-creating internal accounts when Objects / Contracts are created.
+Signals for auto-creating internal accounts when Objects / Contracts are created,
+maintaining materialized account balances and invalidating the invoice dashboard.
 """
 import logging
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
+from accounting.services import balance_service
+
 logger = logging.getLogger(__name__)
 
 
@@ -52,3 +56,126 @@ def create_contract_internal_account(sender, instance, created, **kwargs):
             'parent': parent,
         },
     )
+
+
+# ---------------------------------------------------------------------------
+# Материализованные обороты счетов (AccountRunningBalance)
+# ---------------------------------------------------------------------------
+
+# Поля источника, от которых зависит проводка, и её построитель
+_BALANCE_SOURCES = {
+    'Invoice': (
+        ('account_id', 'status', 'paid_at', 'amount_gross'),
+        balance_service.invoice_entry,
+    ),
+    'IncomeRecord': (
+        ('account_id', 'payment_date', 'amount'),
+        balance_service.income_entry,
+    ),
+    'Payment': (
+        ('account_id', 'status', 'payment_type', 'payment_date', 'amount'),
+        balance_service.payment_entry,
+    ),
+}
+
+
+def _invalidate_dashboard():
+    from payments.services.dashboard_service import invalidate_invoice_dashboard
+    transaction.on_commit(invalidate_invoice_dashboard)
+
+
+def _balance_entry(instance):
+    fields, build = _BALANCE_SOURCES[instance.__class__.__name__]
+    return build(*(getattr(instance, f) for f in fields))
+
+
+def _touches_balance(instance, update_fields):
+    if update_fields is None:
+        return True
+    fields, _ = _BALANCE_SOURCES[instance.__class__.__name__]
+    names = set(fields) | {f[:-3] for f in fields if f.endswith('_id')}
+    return bool(names & set(update_fields))
+
+
+def _locked_entry(sender, pk):
+    """
+    Проводка источника по строке из БД под FOR UPDATE.
+
+    Блокировка держится до конца транзакции сохранения/удаления
+    (BalanceSourceMixin.save, Collector.delete) — параллельная запись той же
+    строки ждёт и читает уже новое состояние, разница не применяется дважды.
+    """
+    fields, build = _BALANCE_SOURCES[sender.__name__]
+    row = sender.objects.select_for_update().filter(pk=pk).values_list(*fields).first()
+    return build(*row) if row is not None else None
+
+
+def _stash_balance_entry(sender, instance, update_fields=None, **kwargs):
+    """Запомнить проводку источника до сохранения (из БД, не из памяти)."""
+    instance._balance_old_entry = None
+    instance._balance_skip = not _touches_balance(instance, update_fields)
+    if instance._balance_skip or instance._state.adding:
+        return
+    instance._balance_old_entry = _locked_entry(sender, instance.pk)
+
+
+def _apply_saved_entry(sender, instance, **kwargs):
+    _invalidate_dashboard()
+    if getattr(instance, '_balance_skip', False):
+        return
+    balance_service.apply_entries(
+        getattr(instance, '_balance_old_entry', None), _balance_entry(instance),
+    )
+
+
+def _stash_deleted_entry(sender, instance, **kwargs):
+    """Проводка удаляемого источника — из БД; строки уже нет — вычитать нечего."""
+    instance._balance_old_entry = _locked_entry(sender, instance.pk)
+
+
+def _apply_deleted_entry(sender, instance, **kwargs):
+    _invalidate_dashboard()
+    balance_service.apply_entries(getattr(instance, '_balance_old_entry', None), None)
+
+
+for _model in _BALANCE_SOURCES:
+    pre_save.connect(
+        _stash_balance_entry, sender=f'payments.{_model}',
+        dispatch_uid=f'balance_pre_save_{_model}',
+    )
+    post_save.connect(
+        _apply_saved_entry, sender=f'payments.{_model}',
+        dispatch_uid=f'balance_post_save_{_model}',
+    )
+    pre_delete.connect(
+        _stash_deleted_entry, sender=f'payments.{_model}',
+        dispatch_uid=f'balance_pre_delete_{_model}',
+    )
+    post_delete.connect(
+        _apply_deleted_entry, sender=f'payments.{_model}',
+        dispatch_uid=f'balance_post_delete_{_model}',
+    )
+
+
+@receiver(pre_save, sender='accounting.Account')
+def stash_account_balance_date(sender, instance, **kwargs):
+    """Запомнить balance_date до сохранения счёта."""
+    instance._old_balance_date = None
+    if not instance._state.adding:
+        instance._old_balance_date = (
+            sender.objects.filter(pk=instance.pk).values_list('balance_date', flat=True).first()
+        )
+
+
+@receiver(post_save, sender='accounting.Account')
+def rebuild_account_balance(sender, instance, created, **kwargs):
+    """Смена balance_date меняет состав учитываемых проводок — пересчёт."""
+    _invalidate_dashboard()
+    if not created and instance.balance_date != getattr(instance, '_old_balance_date', None):
+        balance_service.rebuild_running_balance(instance)
+
+
+@receiver(post_save, sender='accounting.AccountBalance')
+def invalidate_dashboard_on_bank_balance(sender, instance, **kwargs):
+    """Новый остаток из банка — в дашборде директора."""
+    _invalidate_dashboard()
@@ -21,8 +21,7 @@ class TestBulkUploadEndpoint:
             SimpleUploadedFile('invoice2.pdf', b'%PDF-1.4 dummy2', content_type='application/pdf'),
         ]
 
-        with patch('supply.tasks.recognize_invoice.delay') as mock_task, \
-             patch('supply.tasks.finalize_bulk_import.apply_async'):
+        with patch('supply.tasks.start_bulk_recognition.delay'):
             response = authenticated_client.post(
                 f'{BASE_URL}bulk-upload/',
                 {'files': files},
@@ -41,8 +40,7 @@ class TestBulkUploadEndpoint:
             SimpleUploadedFile('inv2.xlsx', b'PK\x03\x04', content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
         ]
 
-        with patch('supply.tasks.recognize_invoice.delay'), \
-             patch('supply.tasks.finalize_bulk_import.apply_async'):
+        with patch('supply.tasks.start_bulk_recognition.delay'):
             response = authenticated_client.post(
                 f'{BASE_URL}bulk-upload/',
                 {'files': files},
@@ -55,6 +53,28 @@ class TestBulkUploadEndpoint:
         assert all(i.status == Invoice.Status.RECOGNITION for i in invoices)
         assert all(i.source == Invoice.Source.BULK_IMPORT for i in invoices)
 
+    def test_bulk_upload_starts_recognition_after_commit(
+        self, authenticated_client, django_capture_on_commit_callbacks,
+    ):
+        files = [
+            SimpleUploadedFile('a.pdf', b'%PDF-a', content_type='application/pdf'),
+            SimpleUploadedFile('b.pdf', b'%PDF-b', content_type='application/pdf'),
+        ]
+
+        with patch('supply.tasks.start_bulk_recognition.delay') as mock_start, \
+             django_capture_on_commit_callbacks(execute=True):
+            response = authenticated_client.post(
+                f'{BASE_URL}bulk-upload/',
+                {'files': files},
+                format='multipart',
+            )
+
+        session_id = response.json()['session_id']
+        mock_start.assert_called_once_with(session_id)
+        invoice = Invoice.objects.filter(bulk_session_id=session_id).order_by('id').first()
+        assert invoice.invoice_file.name.startswith('invoices/')
+        assert invoice.invoice_file.read() == b'%PDF-a'
+
     def test_bulk_upload_no_files_returns_400(self, authenticated_client):
         response = authenticated_client.post(
             f'{BASE_URL}bulk-upload/',
@@ -69,8 +89,7 @@ class TestBulkUploadEndpoint:
             SimpleUploadedFile('bad.doc', b'doc content', content_type='application/msword'),
         ]
 
-        with patch('supply.tasks.recognize_invoice.delay'), \
-             patch('supply.tasks.finalize_bulk_import.apply_async'):
+        with patch('supply.tasks.start_bulk_recognition.delay'):
             response = authenticated_client.post(
                 f'{BASE_URL}bulk-upload/',
                 {'files': files},
@@ -140,3 +159,118 @@ class TestBulkSessionStatusEndpoint:
         )
         data = response.json()
         assert len(data['invoices']) == 1
+
+
+@pytest.mark.django_db
+class TestBulkRecognitionPipeline:
+    def _session_with_invoices(self, count):
+        session = BulkImportSession.objects.create(total_files=count)
+        invoices = [
+            Invoice.objects.create(
+                invoice_type=Invoice.InvoiceType.SUPPLIER,
+                status=Invoice.Status.RECOGNITION,
+                bulk_session=session,
+            )
+            for _ in range(count)
+        ]
+        return session, invoices
+
+    def test_start_builds_chord_of_bounded_lanes(self, settings):
+        from supply.tasks import start_bulk_recognition
+
+        settings.BULK_IMPORT_RECOGNITION_CONCURRENCY = 2
+        session, invoices = self._session_with_invoices(5)
+
+        with patch('celery.chord') as mock_chord:
+            start_bulk_recognition(session.id)
+
+        header = mock_chord.call_args[0][0]
+        assert len(header) == 2
+        lane_ids = [[task.args[0] for task in lane.tasks] for lane in header]
+        assert sorted(i for lane in lane_ids for i in lane) == [inv.id for inv in invoices]
+        callback = mock_chord.return_value.call_args[0][0]
+        assert callback.task == 'supply.tasks.finalize_bulk_import'
+        assert callback.args == (session.id,)
+
+    def test_finalize_fails_leftover_invoices(self):
+        from supply.tasks import finalize_bulk_import
+
+        session, invoices = self._session_with_invoices(2)
+        invoices[0].status = Invoice.Status.REVIEW
+        invoices[0].save(update_fields=['status'])
+        BulkImportSession.objects.filter(id=session.id).update(processed_files=1, successful=1)
+
+        finalize_bulk_import(session.id)
+
+        session.refresh_from_db()
+        invoices[1].refresh_from_db()
+        assert invoices[1].status == Invoice.Status.REVIEW
+        assert session.processed_files == 2
+        assert session.failed == 1
+        assert session.status == BulkImportSession.Status.COMPLETED_WITH_ERRORS
+
+    def test_finalize_skips_finished_session(self):
+        from supply.tasks import finalize_bulk_import
+
+        session, invoices = self._session_with_invoices(1)
+        BulkImportSession.objects.filter(id=session.id).update(
+            status=BulkImportSession.Status.COMPLETED,
+        )
+
+        finalize_bulk_import(session.id)
+
+        invoices[0].refresh_from_db()
+        assert invoices[0].status == Invoice.Status.RECOGNITION
+
+    def test_recover_finalizes_stalled_session(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+        from supply.tasks import recover_stuck_recognition
+
+        # Цепочка оборвалась: первый счёт распознан, второй так и не запущен,
+        # callback chord не пришёл
+        session, invoices = self._session_with_invoices(2)
+        stale = timezone.now() - timedelta(minutes=15)
+        invoices[0].status = Invoice.Status.REVIEW
+        invoices[0].save(update_fields=['status'])
+        Invoice.objects.filter(bulk_session=session).update(created_at=stale)
+        BulkImportSession.objects.filter(id=session.id).update(
+            processed_files=1, successful=1, updated_at=stale,
+        )
+
+        recover_stuck_recognition()
+
+        session.refresh_from_db()
+        invoices[1].refresh_from_db()
+        assert invoices[1].status == Invoice.Status.REVIEW
+        assert session.failed == 1
+        assert session.status == BulkImportSession.Status.COMPLETED_WITH_ERRORS
+
+    def test_recover_finalizes_session_without_pending_invoices(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+        from supply.tasks import recover_stuck_recognition
+
+        # Счета вышли из RECOGNITION, но счётчики до total_files не дошли
+        session, invoices = self._session_with_invoices(1)
+        Invoice.objects.filter(id=invoices[0].id).update(status=Invoice.Status.REVIEW)
+        BulkImportSession.objects.filter(id=session.id).update(
+            updated_at=timezone.now() - timedelta(minutes=15),
+        )
+
+        recover_stuck_recognition()
+
+        session.refresh_from_db()
+        assert session.status == BulkImportSession.Status.COMPLETED
+
+    def test_recover_keeps_progressing_session(self):
+        from supply.tasks import recover_stuck_recognition
+
+        session, _ = self._session_with_invoices(1)
+
+        recover_stuck_recognition()
+
+        session.refresh_from_db()
+        assert session.status == BulkImportSession.Status.PROCESSING
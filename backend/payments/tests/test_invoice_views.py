@@ -503,6 +503,39 @@ class TestDashboard:
         }
         assert expected_keys == set(summary.keys())
 
+    def test_dashboard_buckets_and_cache_invalidation(
+        self, settings, invoice_in_registry, counterparty, obj, account,
+        legal_entity, category, django_capture_on_commit_callbacks,
+    ):
+        from payments.services import get_invoice_dashboard
+
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        overdue = Invoice.objects.create(
+            status=Invoice.Status.IN_REGISTRY,
+            invoice_number='REG-OVERDUE',
+            due_date=date.today() - timedelta(days=1),
+            counterparty=counterparty, object=obj, account=account,
+            legal_entity=legal_entity, category=category,
+            amount_gross=Decimal('5000.00'),
+        )
+
+        summary = get_invoice_dashboard()['registry_summary']
+        assert summary['total_amount'] == '80000.00'
+        assert summary['total_count'] == 2
+        assert summary['overdue_amount'] == '5000.00'
+        assert summary['this_week_count'] == 1
+        assert summary['this_month_count'] == 2
+        assert summary['today_amount'] == '0'
+
+        # Закеширован до изменения счетов
+        Invoice.objects.filter(pk=overdue.pk).update(status=Invoice.Status.PAID)
+        assert get_invoice_dashboard()['registry_summary']['total_count'] == 2
+
+        with django_capture_on_commit_callbacks(execute=True):
+            invoice_in_registry.status = Invoice.Status.APPROVED
+            invoice_in_registry.save()
+        assert get_invoice_dashboard()['registry_summary']['total_count'] == 0
+
 
 # =============================================================================
 # Аутентификация
@@ -284,6 +284,9 @@ class PriceListCreateSerializer(serializers.ModelSerializer):
                 for work_item in work_items
             ]
             PriceListItem.objects.bulk_create(price_list_items)
+            # bulk_create не шлёт post_save — сбрасываем снапшот подбора работ явно
+            from estimates.services.work_matching.snapshot import invalidate_catalog_snapshot
+            invalidate_catalog_snapshot()
         
         return price_list
 
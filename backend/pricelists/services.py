@@ -5,10 +5,11 @@ pricelists/services.py — бизнес-логика для прайс-лист
 """
 from __future__ import annotations
 
-from io import BytesIO
+from decimal import Decimal
 
-import openpyxl
-from openpyxl.styles import Font, Alignment, Border, Side
+from openpyxl.styles import Font, Alignment
+
+from core.excel_stream import CENTER, THIN_BORDER, StreamWorkbook, iter_queryset
 
 
 # ---------------------------------------------------------------------------
@@ -55,6 +56,11 @@ def add_items_to_pricelist(price_list, work_item_ids):
         PriceListItem.objects.bulk_create(new_items)
         added.extend([wi.id for wi in new_work_items])
 
+    if added:
+        # bulk_* не шлют post_save — сбрасываем снапшот подбора работ явно
+        from estimates.services.work_matching.snapshot import invalidate_catalog_snapshot
+        invalidate_catalog_snapshot()
+
     return {'added': added, 'count': len(added)}
 
 
@@ -101,113 +107,88 @@ def export_pricelist_to_excel(price_list):
     Сформировать Excel-файл прайс-листа.
     Возвращает (bytes_content, filename).
     """
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Прайс-лист"
-
-    # Стили
-    bold_font = Font(bold=True)
-    header_font = Font(bold=True, size=14)
-    center_align = Alignment(horizontal='center', vertical='center')
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin'),
+    output, filename = export_pricelist_to_file(price_list)
+    with output:
+        return output.read(), filename
+
+
+_PRICELIST_STYLES = {
+    'title': {'font': Font(bold=True, size=14), 'alignment': CENTER},
+    'subtitle': {'alignment': CENTER},
+    'bold': {'font': Font(bold=True)},
+    'header': {'font': Font(bold=True), 'alignment': CENTER, 'border': THIN_BORDER},
+    'cell': {'border': THIN_BORDER},
+    'cell_center': {'border': THIN_BORDER, 'alignment': CENTER},
+    'cell_wrap': {
+        'border': THIN_BORDER,
+        'alignment': Alignment(horizontal='left', vertical='top', wrap_text=True),
+    },
+}
+
+
+def export_pricelist_to_file(price_list):
+    """
+    Потоковый экспорт прайс-листа (write-only, позиции — курсором).
+    Возвращает (временный файл, filename).
+    """
+    book = StreamWorkbook(_PRICELIST_STYLES)
+    sheet = book.sheet(
+        "Прайс-лист", widths=[12, 15, 40, 10, 10, 10, 10, 15, 30],
     )
 
     # Заголовок
-    ws.merge_cells('A1:I1')
-    ws['A1'] = f"Прайс-лист №{price_list.number} от {price_list.date.strftime('%d.%m.%Y')}"
-    ws['A1'].font = header_font
-    ws['A1'].alignment = center_align
+    sheet.append(
+        [f"Прайс-лист №{price_list.number} от {price_list.date.strftime('%d.%m.%Y')}"],
+        'title', merge_to=9,
+    )
 
     # Название (если есть)
     if price_list.name:
-        ws.merge_cells('A2:I2')
-        ws['A2'] = price_list.name
-        ws['A2'].alignment = center_align
+        sheet.append([price_list.name], 'subtitle', merge_to=9)
+    else:
+        sheet.skip()
+    sheet.skip()
 
     # Ставки по разрядам
-    row = 4
-    ws[f'A{row}'] = "Ставки по разрядам:"
-    ws[f'A{row}'].font = bold_font
-    row += 1
-
+    sheet.append(["Ставки по разрядам:"], 'bold')
     for grade_num in range(1, 6):
         rate = price_list.get_rate_for_grade(grade_num)
-        ws[f'A{row}'] = f"Разряд {grade_num}:"
-        ws[f'B{row}'] = f"{rate} руб/ч"
-        row += 1
+        sheet.append([f"Разряд {grade_num}:", f"{rate} руб/ч"])
 
     # Пустая строка
-    row += 1
+    sheet.skip()
 
     # Заголовки таблицы работ
-    ws[f'A{row}'] = "Работы:"
-    ws[f'A{row}'].font = bold_font
-    row += 1
-
-    headers = [
+    sheet.append(["Работы:"], 'bold')
+    sheet.append([
         'Артикул', 'Раздел', 'Наименование', 'Ед.изм.',
         'Часы', 'Разряд', 'Коэфф.', 'Стоимость', 'Комментарий',
-    ]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        cell.font = bold_font
-        cell.alignment = center_align
-        cell.border = thin_border
-
-    # Устанавливаем ширину столбцов
-    col_widths = {'A': 12, 'B': 15, 'C': 40, 'D': 10, 'E': 10, 'F': 10, 'G': 10, 'H': 15, 'I': 30}
-    for col_letter, width in col_widths.items():
-        ws.column_dimensions[col_letter].width = width
+    ], 'header')
 
-    row += 1
-
-    # Данные работ
+    # Данные работ; итог считается по ходу записи
     items_qs = price_list.items.filter(is_included=True).select_related(
         'work_item', 'work_item__section', 'work_item__grade',
     )
-    for item in items_qs:
+    total = Decimal('0')
+    for item in iter_queryset(items_qs):
         work = item.work_item
-        effective_grade = float(item.effective_grade)
-        values = [
-            work.article,
-            work.section.code,
-            work.name,
-            work.unit,
-            float(item.effective_hours),
-            effective_grade,
-            float(item.effective_coefficient),
-            float(item.calculated_cost),
-            work.comment if work.comment else '',
-        ]
-        for col, value in enumerate(values, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.border = thin_border
-            if col in (5, 6, 7, 8):
-                cell.alignment = center_align
-            elif col == 9:
-                cell.alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
-        row += 1
+        cost = item.calculated_cost
+        total += cost
+        sheet.append([
+            sheet.cell(work.article, 'cell'),
+            sheet.cell(work.section.code, 'cell'),
+            sheet.cell(work.name, 'cell'),
+            sheet.cell(work.unit, 'cell'),
+            sheet.cell(float(item.effective_hours), 'cell_center'),
+            sheet.cell(float(item.effective_grade), 'cell_center'),
+            sheet.cell(float(item.effective_coefficient), 'cell_center'),
+            sheet.cell(float(cost), 'cell_center'),
+            sheet.cell(work.comment if work.comment else '', 'cell_wrap'),
+        ])
 
     # Итого
-    total = sum(
-        item.calculated_cost
-        for item in price_list.items.filter(is_included=True)
-    )
-    row += 1
-    ws[f'G{row}'] = "ИТОГО:"
-    ws[f'G{row}'].font = bold_font
-    ws[f'H{row}'] = float(total)
-    ws[f'H{row}'].font = bold_font
-    ws.merge_cells(f'I{row}:I{row}')
-
-    # Сохраняем в bytes
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+    sheet.skip()
+    sheet.append([None, None, None, None, None, None, "ИТОГО:", float(total)], 'bold')
 
     filename = f"pricelist_{price_list.number}_{price_list.date.strftime('%Y%m%d')}.xlsx"
-    return output.read(), filename
+    return book.save(), filename
@@ -2,8 +2,8 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
 
+from core.excel_stream import xlsx_response
 from core.version_mixin import VersioningMixin
 from .models import (
     WorkerGrade, WorkSection, WorkerGradeSkills,
@@ -20,7 +20,7 @@ from .services import (
     add_items_to_pricelist,
     remove_items_from_pricelist,
     create_work_item_version,
-    export_pricelist_to_excel,
+    export_pricelist_to_file,
 )
 
 
@@ -209,14 +209,8 @@ class PriceListViewSet(viewsets.ModelViewSet):
     def export(self, request, pk=None):
         """Экспорт прайс-листа в Excel"""
         price_list = self.get_object()
-        content, filename = export_pricelist_to_excel(price_list)
-
-        response = HttpResponse(
-            content,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        output, filename = export_pricelist_to_file(price_list)
+        return xlsx_response(output, filename)
 
 
 class PriceListItemViewSet(viewsets.ModelViewSet):
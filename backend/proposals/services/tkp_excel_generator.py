@@ -3,19 +3,40 @@
 Использование:
     from proposals.services.tkp_excel_generator import TKPExcelGenerator
     buffer = TKPExcelGenerator(tkp).generate()
+    output = TKPExcelGenerator(tkp).generate_to_file()  # потоковая отдача из view
+
+Книга пишется в write-only режиме (core.excel_stream): строки смет
+читаются курсором, стили — именованные.
 """
 import logging
 from decimal import Decimal
 from io import BytesIO
 
-import openpyxl
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-from openpyxl.utils import get_column_letter
+from openpyxl.styles import Font, PatternFill
 
+from core.excel_stream import (
+    CENTER, NUM_FMT, THIN_BORDER, WRAP, StreamWorkbook, iter_queryset, to_bytesio,
+)
 from proposals.models import TechnicalProposal
 
 logger = logging.getLogger(__name__)
 
+_STYLES = {
+    'title': {'font': Font(bold=True, size=16), 'alignment': CENTER},
+    'subtitle': {'font': Font(bold=True, size=12)},
+    'subtitle_center': {'font': Font(bold=True, size=12), 'alignment': CENTER},
+    'section': {'font': Font(bold=True, size=11, color='1F4E79')},
+    'header': {
+        'font': Font(bold=True, size=10), 'alignment': CENTER, 'border': THIN_BORDER,
+        'fill': PatternFill(start_color='D6E4F0', end_color='D6E4F0', fill_type='solid'),
+    },
+    'bold': {'font': Font(bold=True)},
+    'bold_num': {'font': Font(bold=True), 'number_format': NUM_FMT},
+    'wrap': {'alignment': WRAP},
+    'cell': {'border': THIN_BORDER},
+    'num': {'border': THIN_BORDER, 'number_format': NUM_FMT},
+}
+
 
 class TKPExcelGenerator:
     """Генерация multi-sheet ТКП в Excel."""
@@ -25,56 +46,36 @@ class TKPExcelGenerator:
 
     def generate(self) -> BytesIO:
         """Генерирует полный Excel-файл ТКП."""
-        wb = openpyxl.Workbook()
+        return to_bytesio(self.generate_to_file())
 
-        self._write_cover(wb.active)
-        self._write_equipment(wb.create_sheet('Оборудование'))
-        self._write_works(wb.create_sheet('Монтажные работы'))
-        self._write_front_of_work(wb.create_sheet('Фронт работ'))
-        self._write_terms(wb.create_sheet('Условия'))
+    def generate_to_file(self):
+        """Как generate(), но возвращает временный файл (позиция — в начале)."""
+        book = StreamWorkbook(_STYLES)
 
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        return buffer
+        self._write_cover(book.sheet('ТКП', widths=[20, 40]))
+        self._write_equipment(book.sheet('Оборудование', widths=[5, 35, 15, 6, 8, 12, 14]))
+        self._write_works(book.sheet('Монтажные работы', widths=[5, 30, 25, 8, 8, 14]))
+        self._write_front_of_work(book.sheet('Фронт работ', widths=[5, 80]))
+        self._write_terms(book.sheet('Условия', widths=[30, 40]))
 
-    # ── Стили ──────────────────────────────────────────────────
+        return book.save()
 
     @staticmethod
-    def _styles():
-        return {
-            'title': Font(bold=True, size=16),
-            'subtitle': Font(bold=True, size=12),
-            'section': Font(bold=True, size=11, color='1F4E79'),
-            'header': Font(bold=True, size=10),
-            'bold': Font(bold=True),
-            'center': Alignment(horizontal='center', vertical='center'),
-            'wrap': Alignment(wrap_text=True, vertical='top'),
-            'border': Border(
-                left=Side(style='thin'), right=Side(style='thin'),
-                top=Side(style='thin'), bottom=Side(style='thin'),
-            ),
-            'num_fmt': '#,##0.00',
-            'header_fill': PatternFill(start_color='D6E4F0', end_color='D6E4F0', fill_type='solid'),
-        }
+    def _data_row(sheet, values):
+        """Строка таблицы: рамка, числа — с форматом."""
+        sheet.append([
+            sheet.cell(val, 'num' if isinstance(val, float) else 'cell')
+            for val in values
+        ])
 
     # ── Лист 1: Титульный ──────────────────────────────────────
 
-    def _write_cover(self, ws):
-        ws.title = 'ТКП'
-        s = self._styles()
-
-        ws.merge_cells('A1:F1')
-        ws['A1'] = 'ТЕХНИЧЕСКОЕ КОММЕРЧЕСКОЕ ПРЕДЛОЖЕНИЕ'
-        ws['A1'].font = s['title']
-        ws['A1'].alignment = s['center']
-
-        ws.merge_cells('A3:F3')
-        ws['A3'] = f'ТКП №{self.tkp.number}'
-        ws['A3'].font = s['subtitle']
-        ws['A3'].alignment = s['center']
+    def _write_cover(self, sheet):
+        sheet.append(['ТЕХНИЧЕСКОЕ КОММЕРЧЕСКОЕ ПРЕДЛОЖЕНИЕ'], 'title', merge_to=6)
+        sheet.skip()
+        sheet.append([f'ТКП №{self.tkp.number}'], 'subtitle_center', merge_to=6)
+        sheet.skip()
 
-        row = 5
         fields = [
             ('Дата', self.tkp.date.strftime('%d.%m.%Y') if self.tkp.date else ''),
             ('Объект', str(self.tkp.object)),
@@ -84,52 +85,29 @@ class TKPExcelGenerator:
             ('Срок действия', f'{self.tkp.validity_days} дней'),
         ]
         for label, value in fields:
-            ws.cell(row=row, column=1, value=label).font = s['bold']
-            ws.cell(row=row, column=2, value=value)
-            row += 1
-
-        if self.tkp.advance_required:
-            row += 1
-            ws.cell(row=row, column=1, value='Необходимый аванс:').font = s['bold']
-            row += 1
-            ws.cell(row=row, column=1, value=self.tkp.advance_required)
-
-        if self.tkp.work_duration:
-            row += 1
-            ws.cell(row=row, column=1, value='Сроки проведения работ:').font = s['bold']
-            row += 1
-            ws.cell(row=row, column=1, value=self.tkp.work_duration)
-
-        if self.tkp.notes:
-            row += 1
-            ws.cell(row=row, column=1, value='Примечания:').font = s['bold']
-            row += 1
-            ws.cell(row=row, column=1, value=self.tkp.notes)
-
-        ws.column_dimensions['A'].width = 20
-        ws.column_dimensions['B'].width = 40
+            sheet.append([sheet.cell(label, 'bold'), value])
+
+        blocks = [
+            ('Необходимый аванс:', self.tkp.advance_required),
+            ('Сроки проведения работ:', self.tkp.work_duration),
+            ('Примечания:', self.tkp.notes),
+        ]
+        for label, value in blocks:
+            if value:
+                sheet.skip()
+                sheet.append([label], 'bold')
+                sheet.append([value])
 
     # ── Лист 2: Оборудование ──────────────────────────────────
 
-    def _write_equipment(self, ws):
-        s = self._styles()
+    def _write_equipment(self, sheet):
         from estimates.models import EstimateItem
 
-        ws.merge_cells('A1:H1')
-        ws['A1'] = 'ОБОРУДОВАНИЕ И МАТЕРИАЛЫ'
-        ws['A1'].font = s['title']
-        ws['A1'].alignment = s['center']
-
-        headers = ['№', 'Наименование', 'Модель', 'Ед.', 'Кол-во',
-                   'Цена, ₽', 'Сумма, ₽']
-        for col, h in enumerate(headers, 1):
-            cell = ws.cell(row=3, column=col, value=h)
-            cell.font = s['header']
-            cell.alignment = s['center']
-            cell.border = s['border']
-            cell.fill = s['header_fill']
-
-        row = 4
+        sheet.append(['ОБОРУДОВАНИЕ И МАТЕРИАЛЫ'], 'title', merge_to=8)
+        sheet.skip()
+        sheet.append(['№', 'Наименование', 'Модель', 'Ед.', 'Кол-во',
+                      'Цена, ₽', 'Сумма, ₽'], 'header')
+
         grand_total = Decimal('0')
 
         for estimate in self.tkp.estimates.all():
@@ -140,14 +118,12 @@ class TKPExcelGenerator:
             current_section = None
             idx = 0
 
-            for item in items:
+            for item in iter_queryset(items):
                 # Section header
                 if item.section_id != current_section:
                     current_section = item.section_id
                     section_name = item.section.name if item.section else 'Без раздела'
-                    ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=7)
-                    ws.cell(row=row, column=1, value=section_name).font = s['section']
-                    row += 1
+                    sheet.append([section_name], 'section', merge_to=7)
 
                 idx += 1
                 qty = item.quantity or Decimal('0')
@@ -156,46 +132,26 @@ class TKPExcelGenerator:
                 total = price * qty
                 grand_total += total
 
-                values = [idx, item.name, item.model_name or '', item.unit,
-                          float(qty), float(price), float(total)]
-                for col, val in enumerate(values, 1):
-                    cell = ws.cell(row=row, column=col, value=val)
-                    cell.border = s['border']
-                    if isinstance(val, float):
-                        cell.number_format = s['num_fmt']
-                row += 1
+                self._data_row(sheet, [idx, item.name, item.model_name or '', item.unit,
+                                       float(qty), float(price), float(total)])
 
         # Grand total
-        row += 1
-        ws.cell(row=row, column=1, value='ИТОГО оборудование:').font = s['bold']
-        ws.cell(row=row, column=7, value=float(grand_total)).number_format = s['num_fmt']
-        ws.cell(row=row, column=7).font = s['bold']
-
-        widths = [5, 35, 15, 6, 8, 12, 14]
-        for i, w in enumerate(widths, 1):
-            ws.column_dimensions[get_column_letter(i)].width = w
+        sheet.skip()
+        sheet.append([
+            sheet.cell('ИТОГО оборудование:', 'bold'), None, None, None, None, None,
+            sheet.cell(float(grand_total), 'bold_num'),
+        ])
 
     # ── Лист 3: Монтажные работы ──────────────────────────────
 
-    def _write_works(self, ws):
-        s = self._styles()
+    def _write_works(self, sheet):
         from estimates.models import EstimateItem
 
-        ws.merge_cells('A1:G1')
-        ws['A1'] = 'МОНТАЖНЫЕ РАБОТЫ'
-        ws['A1'].font = s['title']
-        ws['A1'].alignment = s['center']
-
-        headers = ['№', 'Наименование оборудования', 'Работа', 'Часы',
-                   'Кол-во', 'Стоимость работ, ₽']
-        for col, h in enumerate(headers, 1):
-            cell = ws.cell(row=3, column=col, value=h)
-            cell.font = s['header']
-            cell.alignment = s['center']
-            cell.border = s['border']
-            cell.fill = s['header_fill']
-
-        row = 4
+        sheet.append(['МОНТАЖНЫЕ РАБОТЫ'], 'title', merge_to=7)
+        sheet.skip()
+        sheet.append(['№', 'Наименование оборудования', 'Работа', 'Часы',
+                      'Кол-во', 'Стоимость работ, ₽'], 'header')
+
         grand_total = Decimal('0')
         total_hours = Decimal('0')
 
@@ -206,7 +162,7 @@ class TKPExcelGenerator:
             ).select_related('work_item', 'section').order_by('section__sort_order', 'sort_order')
 
             idx = 0
-            for item in items:
+            for item in iter_queryset(items):
                 idx += 1
                 qty = item.quantity or Decimal('0')
                 work_price = item.work_sale_unit_price or item.work_unit_price or Decimal('0')
@@ -216,68 +172,46 @@ class TKPExcelGenerator:
                 grand_total += work_total
                 total_hours += hours
 
-                values = [
+                self._data_row(sheet, [
                     idx, item.name,
                     item.work_item.name if item.work_item else '',
                     float(hours),
                     float(qty), float(work_total),
-                ]
-                for col, val in enumerate(values, 1):
-                    cell = ws.cell(row=row, column=col, value=val)
-                    cell.border = s['border']
-                    if isinstance(val, float):
-                        cell.number_format = s['num_fmt']
-                row += 1
-
-        row += 1
-        ws.cell(row=row, column=1, value='ИТОГО работы:').font = s['bold']
-        ws.cell(row=row, column=4, value=float(total_hours)).font = s['bold']
-        ws.cell(row=row, column=4).number_format = s['num_fmt']
-        ws.cell(row=row, column=6, value=float(grand_total)).font = s['bold']
-        ws.cell(row=row, column=6).number_format = s['num_fmt']
-
-        widths = [5, 30, 25, 8, 8, 14]
-        for i, w in enumerate(widths, 1):
-            ws.column_dimensions[get_column_letter(i)].width = w
+                ])
+
+        sheet.skip()
+        sheet.append([
+            sheet.cell('ИТОГО работы:', 'bold'), None, None,
+            sheet.cell(float(total_hours), 'bold_num'), None,
+            sheet.cell(float(grand_total), 'bold_num'),
+        ])
 
     # ── Лист 4: Фронт работ ──────────────────────────────────
 
-    def _write_front_of_work(self, ws):
-        s = self._styles()
+    def _write_front_of_work(self, sheet):
         from proposals.models import TKPFrontOfWork
 
-        ws.merge_cells('A1:B1')
-        ws['A1'] = 'ФРОНТ РАБОТ'
-        ws['A1'].font = s['title']
-        ws['A1'].alignment = s['center']
-
-        ws.cell(row=3, column=1, value='Для выполнения работ Заказчик обеспечивает:').font = s['subtitle']
+        sheet.append(['ФРОНТ РАБОТ'], 'title', merge_to=2)
+        sheet.skip()
+        sheet.append(['Для выполнения работ Заказчик обеспечивает:'], 'subtitle')
+        sheet.skip()
 
         fow_items = TKPFrontOfWork.objects.filter(
             tkp=self.tkp,
-        ).select_related('front_of_work_item').order_by('sort_order')
-
-        row = 5
-        for idx, item in enumerate(fow_items, 1):
-            ws.cell(row=row, column=1, value=f'{idx}.').font = s['bold']
-            ws.cell(row=row, column=2, value=item.front_of_work_item.name)
-            ws.cell(row=row, column=2).alignment = s['wrap']
-            row += 1
+        ).select_related('front_item').order_by('sort_order')
 
-        ws.column_dimensions['A'].width = 5
-        ws.column_dimensions['B'].width = 80
+        for idx, item in enumerate(iter_queryset(fow_items), 1):
+            sheet.append([
+                sheet.cell(f'{idx}.', 'bold'),
+                sheet.cell(item.front_item.name, 'wrap'),
+            ])
 
     # ── Лист 5: Условия ──────────────────────────────────────
 
-    def _write_terms(self, ws):
-        s = self._styles()
-
-        ws.merge_cells('A1:B1')
-        ws['A1'] = 'УСЛОВИЯ'
-        ws['A1'].font = s['title']
-        ws['A1'].alignment = s['center']
+    def _write_terms(self, sheet):
+        sheet.append(['УСЛОВИЯ'], 'title', merge_to=2)
+        sheet.skip()
 
-        row = 3
         terms = [
             ('Срок действия предложения', f'{self.tkp.validity_days} дней с даты ТКП'),
             ('Необходимый аванс', self.tkp.advance_required or 'По согласованию'),
@@ -285,18 +219,11 @@ class TKPExcelGenerator:
         ]
 
         for label, value in terms:
-            ws.cell(row=row, column=1, value=label).font = s['bold']
-            ws.cell(row=row, column=2, value=value).alignment = s['wrap']
-            row += 1
-
-        row += 2
-        ws.cell(row=row, column=1, value='Подписи:').font = s['subtitle']
-        row += 2
-        ws.cell(row=row, column=1, value='От Исполнителя:')
-        ws.cell(row=row, column=2, value='________________________')
-        row += 2
-        ws.cell(row=row, column=1, value='От Заказчика:')
-        ws.cell(row=row, column=2, value='________________________')
-
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 40
+            sheet.append([sheet.cell(label, 'bold'), sheet.cell(value, 'wrap')])
+
+        sheet.skip(2)
+        sheet.append(['Подписи:'], 'subtitle')
+        sheet.skip()
+        sheet.append(['От Исполнителя:', '________________________'])
+        sheet.skip()
+        sheet.append(['От Заказчика:', '________________________'])
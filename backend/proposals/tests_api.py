@@ -266,6 +266,33 @@ class TechnicalProposalAPITests(BaseAPITestCase):
         self.assertEqual(self.tkp.estimates.count(), 1)
         self.assertIn('message', response.data)
     
+    def test_generate_excel(self):
+        """Тест потоковой выгрузки ТКП в Excel"""
+        from io import BytesIO
+        import openpyxl
+        from estimates.models import EstimateItem
+
+        section = EstimateSection.objects.create(estimate=self.estimate, name='Вентиляция')
+        EstimateItem.objects.create(
+            estimate=self.estimate, section=section, name='Вентилятор',
+            unit='шт', quantity=Decimal('2'), material_unit_price=Decimal('1500'),
+        )
+        self.tkp.estimates.add(self.estimate)
+
+        url = reverse('technical-proposal-generate-excel', kwargs={'pk': self.tkp.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(
+            wb.sheetnames, ['ТКП', 'Оборудование', 'Монтажные работы', 'Фронт работ', 'Условия'],
+        )
+        ws = wb['Оборудование']
+        self.assertEqual(ws['A4'].value, 'Вентиляция')
+        self.assertEqual(ws['B5'].value, 'Вентилятор')
+        self.assertEqual(ws['A7'].value, 'ИТОГО оборудование:')
+        self.assertEqual(ws['G7'].value, ws['G5'].value)
+
     def test_remove_estimates(self):
         """Тест удаления смет из ТКП"""
         self.tkp.estimates.add(self.estimate)
@@ -155,20 +155,12 @@ class TechnicalProposalViewSet(VersioningMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='generate-excel')
     def generate_excel(self, request, pk=None):
         """Скачать ТКП в формате Excel."""
-        from django.http import HttpResponse
+        from core.excel_stream import xlsx_response
         from proposals.services.tkp_excel_generator import TKPExcelGenerator
 
         tkp = self.get_object()
-        generator = TKPExcelGenerator(tkp)
-        buffer = generator.generate()
-
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        filename = f'TKP_{tkp.number}_{tkp.date or "draft"}.xlsx'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        output = TKPExcelGenerator(tkp).generate_to_file()
+        return xlsx_response(output, f'TKP_{tkp.number}_{tkp.date or "draft"}.xlsx')
 
     # Метод create_version() наследуется от VersioningMixin
 
@@ -5,8 +5,12 @@ from django.utils import timezone
 logger = logging.getLogger(__name__)
 
 
-def _fail_invoice_to_review(invoice_id: int):
-    """Переводит счёт из RECOGNITION в REVIEW при ошибке распознавания."""
+def _fail_invoice_to_review(invoice_id: int, update_session: bool = False):
+    """
+    Переводит счёт из RECOGNITION в REVIEW при ошибке распознавания.
+
+    update_session — учесть файл как ошибочный в его BulkImportSession.
+    """
     from payments.models import Invoice, InvoiceEvent
     try:
         invoice = Invoice.objects.get(id=invoice_id)
@@ -18,6 +22,12 @@ def _fail_invoice_to_review(invoice_id: int):
                 event_type=InvoiceEvent.EventType.COMMENT,
                 comment='Ошибка распознавания. Заполните данные вручную.',
             )
+            if update_session and invoice.bulk_session_id:
+                from payments.services import InvoiceService
+                InvoiceService._update_bulk_session(
+                    invoice.bulk_session, success=False,
+                    error=f'Счёт #{invoice_id}: ошибка распознавания',
+                )
     except Exception:
         logger.exception('_fail_invoice_to_review: error for invoice %s', invoice_id)
 
@@ -72,20 +82,72 @@ def recognize_invoice(
             auto_counterparty=auto_counterparty,
         )
     except RateLimitError as exc:
-        raise self.retry(exc=exc, countdown=60)
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=60)
+        # Падение задачи оборвало бы цепочку bulk-импорта — завершаем штатно
+        logger.error(
+            'recognize_invoice: rate limit retries exhausted for invoice %s', invoice_id,
+        )
+        _fail_invoice_to_review(invoice_id, update_session=True)
     except Exception:
         logger.exception(
             'recognize_invoice: error for invoice %s', invoice_id,
         )
         # Переводим в REVIEW, чтобы оператор мог заполнить вручную
-        _fail_invoice_to_review(invoice_id)
+        _fail_invoice_to_review(invoice_id, update_session=True)
+
+
+@shared_task
+def start_bulk_recognition(session_id: int):
+    """
+    Запуск распознавания файлов сессии массового импорта.
+
+    Счета делятся на BULK_IMPORT_RECOGNITION_CONCURRENCY цепочек
+    recognize_invoice — одновременно распознаётся не больше стольких файлов
+    сессии. Цепочки — заголовок chord, finalize_bulk_import — его callback:
+    финализация ровно после обработки последнего файла.
+
+    Если цепочка оборвалась (WorkerLostError, hard time limit), callback не
+    придёт — оставшиеся счета и саму сессию финализирует
+    recover_stuck_recognition.
+    """
+    from celery import chain, chord
+    from django.conf import settings
+    from payments.models import Invoice
+
+    invoice_ids = list(
+        Invoice.objects.filter(
+            bulk_session_id=session_id, status=Invoice.Status.RECOGNITION,
+        ).order_by('id').values_list('id', flat=True)
+    )
+    if not invoice_ids:
+        finalize_bulk_import.delay(session_id)
+        return
+
+    lanes = max(1, min(settings.BULK_IMPORT_RECOGNITION_CONCURRENCY, len(invoice_ids)))
+    header = [
+        chain(
+            recognize_invoice.si(invoice_id, auto_counterparty=True)
+            for invoice_id in invoice_ids[lane::lanes]
+        )
+        for lane in range(lanes)
+    ]
+    chord(header)(finalize_bulk_import.si(session_id))
+    logger.info(
+        'start_bulk_recognition: session %s, %d files in %d lanes',
+        session_id, len(invoice_ids), lanes,
+    )
 
 
 @shared_task
 def finalize_bulk_import(session_id: int):
     """
-    Проверяет, все ли файлы в сессии обработаны.
-    Если да — ставит статус COMPLETED/COMPLETED_WITH_ERRORS.
+    Финализация сессии массового импорта (callback chord из
+    start_bulk_recognition): ставит статус COMPLETED/COMPLETED_WITH_ERRORS.
+
+    Счета, оставшиеся в RECOGNITION после завершения всех задач, переводятся
+    в REVIEW и учитываются как ошибки. Уже финализированная сессия
+    (recover_stuck_recognition, счётчики) не меняется.
     """
     from payments.models import BulkImportSession, Invoice
 
@@ -96,12 +158,18 @@ def finalize_bulk_import(session_id: int):
             'finalize_bulk_import: session %s not found', session_id,
         )
         return
+    if session.status != BulkImportSession.Status.PROCESSING:
+        return
 
-    pending = session.invoices.filter(
-        status=Invoice.Status.RECOGNITION,
-    ).count()
-    if pending > 0:
-        return  # Ещё не все обработаны
+    leftover = list(
+        session.invoices.filter(
+            status=Invoice.Status.RECOGNITION,
+        ).values_list('id', flat=True)
+    )
+    for invoice_id in leftover:
+        _fail_invoice_to_review(invoice_id, update_session=True)
+    if leftover:
+        session.refresh_from_db()
 
     if session.failed > 0:
         new_status = BulkImportSession.Status.COMPLETED_WITH_ERRORS
@@ -120,14 +188,28 @@ def finalize_bulk_import(session_id: int):
 def recover_stuck_recognition():
     """
     Находит счета, застрявшие в RECOGNITION дольше 10 минут,
-    и переводит их в REVIEW.
+    и переводит их в REVIEW. Сессии массового импорта без прогресса 10 минут
+    (оборванная цепочка chord — finalize_bulk_import не придёт) финализирует.
     """
-    from payments.models import Invoice, InvoiceEvent
+    from payments.models import BulkImportSession, Invoice, InvoiceEvent
+    from payments.services import InvoiceService
 
     threshold = timezone.now() - timezone.timedelta(minutes=10)
+    # До восстановления счетов: _update_bulk_session сдвигает updated_at
+    stalled_sessions = set(
+        BulkImportSession.objects.filter(
+            status=BulkImportSession.Status.PROCESSING,
+            updated_at__lt=threshold,
+        ).values_list('id', flat=True)
+    )
+    # Счета массового импорта ждут своей очереди в цепочках chord — пока
+    # сессия продвигается, они не «застряли»
     stuck = Invoice.objects.filter(
         status=Invoice.Status.RECOGNITION,
         created_at__lt=threshold,
+    ).exclude(
+        bulk_session__status=BulkImportSession.Status.PROCESSING,
+        bulk_session__updated_at__gte=threshold,
     )
     count = 0
     for invoice in stuck:
@@ -138,12 +220,21 @@ def recover_stuck_recognition():
             event_type=InvoiceEvent.EventType.COMMENT,
             comment='Распознавание не завершилось. Заполните данные вручную.',
         )
+        if invoice.bulk_session_id:
+            InvoiceService._update_bulk_session(
+                invoice.bulk_session, success=False,
+                error=f'Счёт #{invoice.id}: распознавание не завершилось',
+            )
         count += 1
         logger.info('recover_stuck_recognition: invoice #%d → REVIEW', invoice.id)
 
     if count:
         logger.info('recover_stuck_recognition: recovered %d invoices', count)
 
+    for session_id in sorted(stalled_sessions):
+        logger.warning('recover_stuck_recognition: finalizing stalled session %s', session_id)
+        finalize_bulk_import(session_id)
+
 
 @shared_task
 def generate_recurring_invoices():
@@ -121,13 +121,14 @@ def _create_async_job(request, estimate_pk, workspace_id, file, profile):
         Estimate, pk=estimate_pk, workspace_id=workspace_id
     )
 
-    pdf_bytes = file.read()
+    # PDF уходит в storage чанками (FileField), а не bytea-колонкой — worker
+    # потом стримит его в recognition.
     job = RecognitionJob.objects.create(
         estimate=estimate,
         workspace_id=workspace_id,
         file_name=file.name,
         file_type="pdf",
-        file_blob=pdf_bytes,
+        file=file,
         profile_id=profile.id if profile else None,
         cancellation_token=secrets.token_urlsafe(32),
         created_by=request.user if request.user.is_authenticated else None,
@@ -138,7 +139,7 @@ def _create_async_job(request, estimate_pk, workspace_id, file, profile):
             "job_id": str(job.id),
             "estimate_id": str(estimate.id),
             "file_name": file.name,
-            "size_bytes": len(pdf_bytes),
+            "size_bytes": file.size,
         },
     )
     serializer = RecognitionJobSerializer(job)
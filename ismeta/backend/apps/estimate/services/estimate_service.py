@@ -273,7 +273,9 @@ class EstimateService:
         for data in items_data:
             totals = recalc_item_totals(data, section, estimate)
             data.update(totals)
-            item_id = uuid.uuid4()
+            # id можно задать заранее (stream-импорт PDF запоминает id позиций
+            # страницы, чтобы заменить её при повторном page_done).
+            item_id = data.get("id") or uuid.uuid4()
             row_id = uuid.uuid4()
             values_parts.append(
                 "(%s,%s,%s,%s,%s, %s,%s,%s,%s, %s,%s,%s, %s,%s,%s,%s, "
@@ -13,11 +13,13 @@ TD-02: pages_summary пробрасывается без изменений —
 """
 
 import logging
+import uuid
 
 from asgiref.sync import async_to_sync
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import F
 
-from apps.estimate.models import Estimate, EstimateSection
+from apps.estimate.models import Estimate, EstimateItem, EstimateSection
 from apps.estimate.services.estimate_service import EstimateService
 from apps.estimate.services.markup_service import recalc_estimate_totals
 from apps.integration.recognition_client import (
@@ -36,6 +38,10 @@ MAX_ITEM_NAME_LEN = 500
 # может эмитить section_name из full section-heading (multi-line merged),
 # что на некоторых PDF превышает 512. Truncate вместо 500-ки.
 MAX_SECTION_NAME_LEN = 500
+# Stream-импорт: предварительный sort_order позиции = page * PAGE_SORT_STRIDE + i
+# (порядок документа на время стрима); на finished finalize_page_items
+# перенумеровывает позиции подряд по (страница, позиция).
+PAGE_SORT_STRIDE = 1000
 
 
 class PDFParseError(Exception):
@@ -100,98 +106,187 @@ def apply_parsed_items(
     """
     estimate = Estimate.objects.get(id=estimate_id, workspace_id=workspace_id)
 
-    sections_map: dict[str, EstimateSection] = {}
-    sort_order = 0
-    created = 0
+    with transaction.atomic():
+        item_ids, sections = _create_items(estimate, workspace_id, parsed_items)
+        recalc_estimate_totals(estimate_id, workspace_id)
+
+    return {
+        "created": len(item_ids),
+        "sections": sections,
+    }
+
+
+def apply_page_items(
+    estimate_id: str,
+    workspace_id: str,
+    page: int,
+    parsed_items: list[dict],
+    *,
+    replace_item_ids: list[str] | None = None,
+) -> list[str]:
+    """Stream-импорт одной страницы (async recognition, X-Stream-Pages).
+
+    Позиции страницы получают предварительный sort_order
+    `page * PAGE_SORT_STRIDE + i` — порядок документа при любом порядке
+    прихода страниц; итоговый порядок и агрегаты сметы — в
+    finalize_page_items. replace_item_ids — позиции прежней версии этой
+    страницы, снимаются (soft delete) в той же транзакции. Возвращает id
+    созданных позиций.
+    """
+    estimate = Estimate.objects.get(id=estimate_id, workspace_id=workspace_id)
 
     with transaction.atomic():
-        batches: dict[str, list[dict]] = {}
+        if replace_item_ids:
+            EstimateItem.objects.filter(
+                estimate=estimate, id__in=replace_item_ids
+            ).update(is_deleted=True, version=F("version") + 1)
+        item_ids, _ = _create_items(
+            estimate,
+            workspace_id,
+            parsed_items,
+            sort_base=page * PAGE_SORT_STRIDE,
+            section_sort_base=EstimateSection.objects.filter(estimate=estimate).count(),
+        )
 
-        for item in parsed_items:
-            section_name = (
-                item.get("section_name") or item.get("section") or "Импорт PDF"
-            )
-            # QA заход 1/10 5th-replay: section_name может прийти слишком
-            # длинным (merged section-heading multi-line) — truncate.
-            if len(section_name) > MAX_SECTION_NAME_LEN:
-                logger.warning(
-                    "pdf_import: section_name truncated from %d to %d chars: %r...",
-                    len(section_name),
-                    MAX_SECTION_NAME_LEN,
-                    section_name[:80],
-                )
-                section_name = section_name[:MAX_SECTION_NAME_LEN]
-
-            if section_name not in sections_map:
-                sec, _ = EstimateSection.objects.get_or_create(
-                    estimate=estimate,
-                    workspace_id=workspace_id,
-                    name=section_name,
-                    defaults={"sort_order": len(sections_map)},
-                )
-                sections_map[section_name] = sec
-
-            section = sections_map[section_name]
-            sort_order += 1
-
-            name = str(item.get("name", "")).strip()
-            if not name:
-                continue
-
-            if len(name) > MAX_ITEM_NAME_LEN:
-                logger.warning(
-                    "pdf_import: item name truncated from %d to %d chars (page=%s): %r...",
-                    len(name),
-                    MAX_ITEM_NAME_LEN,
-                    item.get("page_number"),
-                    name[:80],
+    return item_ids
+
+
+def finalize_page_items(
+    estimate_id: str, workspace_id: str, page_item_ids: dict[int, list[str]]
+) -> None:
+    """Завершение stream-импорта: sort_order позиций подряд по (страница,
+    позиция на странице) — как у apply_parsed_items, без пересечений при
+    любом числе позиций на странице; агрегаты сметы — один раз на импорт.
+    """
+    item_ids = [
+        item_id for page in sorted(page_item_ids) for item_id in page_item_ids[page]
+    ]
+    with transaction.atomic():
+        if item_ids:
+            with connection.cursor() as cur:
+                cur.execute(
+                    "UPDATE estimate_item AS ei"
+                    " SET sort_order = v.sort_order, version = ei.version + 1,"
+                    " updated_at = NOW()"
+                    " FROM unnest(%s::uuid[], %s::int[]) AS v(id, sort_order)"
+                    " WHERE ei.id = v.id AND ei.estimate_id = %s AND ei.workspace_id = %s",
+                    [item_ids, list(range(1, len(item_ids) + 1)), estimate_id, workspace_id],
                 )
-                name = name[:MAX_ITEM_NAME_LEN]
-
-            # EstimateItem не имеет отдельных model_name/brand полей — пробрасываем
-            # их в tech_specs JSON (frontend редактор читает tech_specs для показа
-            # модели/бренда рядом с наименованием).
-            tech_specs: dict = dict(item.get("tech_specs") or {}) if isinstance(
-                item.get("tech_specs"), dict
-            ) else {}
-            if item.get("model_name"):
-                tech_specs["model_name"] = item["model_name"]
-            if item.get("brand"):
-                tech_specs["brand"] = item["brand"]
-            # E15.05 it2 (R22): отдельное поле manufacturer («Завод-изготовитель»
-            # / «Производитель»). В отличие от brand (торговая марка) —
-            # указывает конкретного поставщика (ООО «КОРФ», АО «ДКС»).
-            if item.get("manufacturer"):
-                tech_specs["manufacturer"] = item["manufacturer"]
-            if item.get("page_number"):
-                tech_specs.setdefault("source_page", item["page_number"])
-            # E15.04: колонка «Примечание» и system prefix приходят от
-            # Recognition новыми полями — складываем в tech_specs JSON
-            # (frontend UI-04 уже умеет читать tech_specs.comments / system).
-            if item.get("comments"):
-                tech_specs["comments"] = item["comments"]
-
-            data = {
-                "name": name,
-                "unit": item.get("unit", "шт"),
-                "quantity": item.get("quantity", 1),
-                # Recognition /parse/spec не возвращает цены — оставляем 0.
-                "equipment_price": item.get("equipment_price", 0),
-                "material_price": item.get("material_price", 0),
-                "work_price": 0,
-                "sort_order": sort_order,
-                "tech_specs": tech_specs,
-            }
-
-            batches.setdefault(str(section.id), []).append(data)
-
-        for sec_id, batch in batches.items():
-            sec = EstimateSection.objects.get(id=sec_id)
-            created += EstimateService.bulk_create_items(sec, estimate, workspace_id, batch)
+        recalc_estimate_totals(estimate_id, workspace_id)
 
+
+def discard_page_items(estimate_id: str, workspace_id: str, item_ids: list[str]) -> int:
+    """Снять (soft delete) позиции stream-импорта незавершённого job'а.
+
+    Возвращает число снятых позиций.
+    """
+    if not item_ids:
+        return 0
+    with transaction.atomic():
+        discarded = EstimateItem.objects.filter(
+            estimate_id=estimate_id, workspace_id=workspace_id, id__in=item_ids
+        ).update(is_deleted=True, version=F("version") + 1)
         recalc_estimate_totals(estimate_id, workspace_id)
+    return discarded
+
+
+def _create_items(
+    estimate: Estimate,
+    workspace_id: str,
+    parsed_items: list[dict],
+    *,
+    sort_base: int = 0,
+    section_sort_base: int = 0,
+) -> tuple[list[str], int]:
+    """Секции + bulk INSERT позиций. Возвращает (id созданных позиций, число секций)."""
+    sections_map: dict[str, EstimateSection] = {}
+    sort_order = sort_base
+    item_ids: list[str] = []
+    batches: dict[str, list[dict]] = {}
 
-    return {
-        "created": created,
-        "sections": len(sections_map),
-    }
+    for item in parsed_items:
+        section_name = (
+            item.get("section_name") or item.get("section") or "Импорт PDF"
+        )
+        # QA заход 1/10 5th-replay: section_name может прийти слишком
+        # длинным (merged section-heading multi-line) — truncate.
+        if len(section_name) > MAX_SECTION_NAME_LEN:
+            logger.warning(
+                "pdf_import: section_name truncated from %d to %d chars: %r...",
+                len(section_name),
+                MAX_SECTION_NAME_LEN,
+                section_name[:80],
+            )
+            section_name = section_name[:MAX_SECTION_NAME_LEN]
+
+        if section_name not in sections_map:
+            sec, _ = EstimateSection.objects.get_or_create(
+                estimate=estimate,
+                workspace_id=workspace_id,
+                name=section_name,
+                defaults={"sort_order": section_sort_base + len(sections_map)},
+            )
+            sections_map[section_name] = sec
+
+        section = sections_map[section_name]
+        sort_order += 1
+
+        name = str(item.get("name", "")).strip()
+        if not name:
+            continue
+
+        if len(name) > MAX_ITEM_NAME_LEN:
+            logger.warning(
+                "pdf_import: item name truncated from %d to %d chars (page=%s): %r...",
+                len(name),
+                MAX_ITEM_NAME_LEN,
+                item.get("page_number"),
+                name[:80],
+            )
+            name = name[:MAX_ITEM_NAME_LEN]
+
+        # EstimateItem не имеет отдельных model_name/brand полей — пробрасываем
+        # их в tech_specs JSON (frontend редактор читает tech_specs для показа
+        # модели/бренда рядом с наименованием).
+        tech_specs: dict = dict(item.get("tech_specs") or {}) if isinstance(
+            item.get("tech_specs"), dict
+        ) else {}
+        if item.get("model_name"):
+            tech_specs["model_name"] = item["model_name"]
+        if item.get("brand"):
+            tech_specs["brand"] = item["brand"]
+        # E15.05 it2 (R22): отдельное поле manufacturer («Завод-изготовитель»
+        # / «Производитель»). В отличие от brand (торговая марка) —
+        # указывает конкретного поставщика (ООО «КОРФ», АО «ДКС»).
+        if item.get("manufacturer"):
+            tech_specs["manufacturer"] = item["manufacturer"]
+        if item.get("page_number"):
+            tech_specs.setdefault("source_page", item["page_number"])
+        # E15.04: колонка «Примечание» и system prefix приходят от
+        # Recognition новыми полями — складываем в tech_specs JSON
+        # (frontend UI-04 уже умеет читать tech_specs.comments / system).
+        if item.get("comments"):
+            tech_specs["comments"] = item["comments"]
+
+        item_id = str(uuid.uuid4())
+        item_ids.append(item_id)
+        data = {
+            "id": item_id,
+            "name": name,
+            "unit": item.get("unit", "шт"),
+            "quantity": item.get("quantity", 1),
+            # Recognition /parse/spec не возвращает цены — оставляем 0.
+            "equipment_price": item.get("equipment_price", 0),
+            "material_price": item.get("material_price", 0),
+            "work_price": 0,
+            "sort_order": sort_order,
+            "tech_specs": tech_specs,
+        }
+
+        batches.setdefault(str(section.id), []).append(data)
+
+    for sec_id, batch in batches.items():
+        sec = EstimateSection.objects.get(id=sec_id)
+        EstimateService.bulk_create_items(sec, estimate, workspace_id, batch)
+
+    return item_ids, len(sections_map)
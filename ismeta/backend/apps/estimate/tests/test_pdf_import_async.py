@@ -34,7 +34,8 @@ SPEC_OK_SYNC = {
 
 
 @pytest.fixture(autouse=True)
-def _settings(settings):
+def _settings(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
     settings.RECOGNITION_URL = RECOGNITION_URL
     settings.RECOGNITION_API_KEY = "test-key"
 
@@ -87,8 +88,9 @@ class TestImportPdfAsync:
         job = jobs.first()
         assert job.status == "queued"
         assert job.cancellation_token  # генерится на стороне backend'а
-        # PDF blob сохранён для воркера
-        assert bytes(job.file_blob) == b"%PDF-1.4 fake"
+        # PDF сохранён в storage для воркера
+        with job.file.open("rb") as f:
+            assert f.read() == b"%PDF-1.4 fake"
 
     def test_async_explicit_true(self, client, ws, estimate):
         pdf = SimpleUploadedFile("e.pdf", b"%PDF", content_type="application/pdf")
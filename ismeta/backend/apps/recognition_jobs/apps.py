@@ -5,3 +5,6 @@ class RecognitionJobsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.recognition_jobs"
     verbose_name = "Recognition Jobs"
+
+    def ready(self) -> None:
+        from . import signals  # noqa: F401
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition_jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recognitionjob',
+            name='page_seqs',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
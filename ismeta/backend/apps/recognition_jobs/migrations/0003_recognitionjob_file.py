@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition_jobs', '0002_recognitionjob_page_seqs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recognitionjob',
+            name='file',
+            field=models.FileField(blank=True, default='', upload_to='recognition_jobs/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='recognitionjob',
+            name='file_blob',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+    ]
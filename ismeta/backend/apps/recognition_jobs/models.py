@@ -1,14 +1,15 @@
 """RecognitionJob — фоновая задача распознавания PDF (E19-2).
 
 Жизненный цикл:
-1. import_pdf endpoint создаёт RecognitionJob со статусом `queued` + сырыми
-   байтами PDF в `file_blob`.
-2. Worker (apps.recognition_jobs.worker) забирает job через
-   select_for_update(skip_locked) → переводит в `running` → POST'ит на
-   recognition `/v1/parse/spec/async` с callback URL.
+1. import_pdf endpoint создаёт RecognitionJob со статусом `queued`; PDF
+   кладётся в storage (`file`), в БД — только путь.
+2. Worker (apps.recognition_jobs.worker) забирает пачку jobs одним
+   UPDATE … FOR UPDATE SKIP LOCKED → `running` → стримит PDF из storage
+   POST'ом на recognition `/v1/parse/spec/async` с callback URL.
 3. Recognition шлёт callbacks `started` / `page_done` / `finished` / `failed`
-   / `cancelled` на наш callback endpoint, который обновляет поля и в
-   `finished` создаёт `EstimateItem`'ы.
+   / `cancelled` на наш callback endpoint. Worker запрашивает stream-режим:
+   `EstimateItem`'ы страницы создаются сразу в `page_done` (идемпотентно по
+   seq), `finished` только сверяет `page_seqs` и закрывает job.
 
 E18 (LLM-профили) ещё не сделан — `profile_id` сейчас IntegerField без FK.
 После E18-2 будет миграция: `profile_id` → ForeignKey(LLMProfile, SET_NULL).
@@ -53,7 +54,10 @@ class RecognitionJob(models.Model):
     )
     file_name = models.CharField(max_length=255)
     file_type = models.CharField(max_length=20, default="pdf")
-    file_blob = models.BinaryField()
+    # PDF в storage (MEDIA_ROOT): worker стримит его в recognition, не
+    # поднимая в память. file_blob — legacy (jobs до переноса в storage).
+    file = models.FileField(upload_to="recognition_jobs/%Y/%m/", blank=True, default="")
+    file_blob = models.BinaryField(blank=True, default=b"")
 
     # E18 (LLM-профили) ещё не запущен — пока IntegerField без FK constraint.
     # После E18-2 будет миграция → ForeignKey(LLMProfile, SET_NULL).
@@ -78,6 +82,11 @@ class RecognitionJob(models.Model):
     # Результат apply_parsed_items: id созданных EstimateItem'ов / sections.
     apply_result = models.JSONField(default=dict, blank=True)
 
+    # Stream-режим (X-Stream-Pages): {"<page>": {"seq": N, "item_ids": [...]}} —
+    # последний применённый seq страницы и id её EstimateItem'ов. page_done
+    # со seq ≤ применённого игнорируется, с бо́льшим — заменяет страницу.
+    page_seqs = models.JSONField(default=dict, blank=True)
+
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         null=True,
@@ -1,8 +1,8 @@
 """DRF serializers для RecognitionJob (E19-2).
 
-`items` и `file_blob` НЕ включаются в list-сериализацию: items могут быть
-тяжёлыми (тысячи позиций) и нужны только для apply_parsed_items, который
-вызывается прямо в callback handler. file_blob — это сырой PDF, который
+`items` и `file`/`file_blob` НЕ включаются в list-сериализацию: items могут
+быть тяжёлыми (тысячи позиций) и нужны только для apply_parsed_items, который
+вызывается прямо в callback handler. file — это сырой PDF, который
 не нужен фронту никогда.
 """
 
@@ -0,0 +1,21 @@
+"""Сигналы RecognitionJob: PDF в storage удаляется вместе с job'ом."""
+
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import RecognitionJob
+
+
+@receiver(post_delete, sender=RecognitionJob)
+def delete_job_file(sender, instance: RecognitionJob, **kwargs) -> None:
+    """Удалить PDF job'а из storage (и при каскаде от Estimate / Workspace).
+
+    После commit — откат удаления не должен оставлять job без файла.
+    """
+    if not instance.file:
+        return
+    storage, name = instance.file.storage, instance.file.name
+    transaction.on_commit(lambda: storage.delete(name))
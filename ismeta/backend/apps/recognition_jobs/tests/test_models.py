@@ -2,10 +2,12 @@
 
 from __future__ import annotations
 
+import os
 from datetime import timedelta
 
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
 from django.utils import timezone
 
 from apps.estimate.models import Estimate
@@ -82,3 +84,44 @@ class TestRecognitionJobModel:
         index_fields = {tuple(idx.fields) for idx in meta.indexes}
         assert ("status", "created_at") in index_fields
         assert ("estimate", "created_at") in index_fields
+
+
+@pytest.mark.django_db
+class TestRecognitionJobFileCleanup:
+    @pytest.fixture(autouse=True)
+    def _media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+
+    def _job_with_file(self, ws, estimate):
+        job = RecognitionJob(estimate=estimate, workspace=ws, file_name="spec.pdf")
+        job.file.save("spec.pdf", ContentFile(b"%PDF-1.4 fake"), save=False)
+        job.save()
+        return job
+
+    def test_job_delete_removes_file(
+        self, ws, estimate, django_capture_on_commit_callbacks
+    ):
+        job = self._job_with_file(ws, estimate)
+        path = job.file.path
+        with django_capture_on_commit_callbacks(execute=True):
+            job.delete()
+        assert not os.path.exists(path)
+
+    def test_estimate_delete_removes_job_files(
+        self, ws, estimate, django_capture_on_commit_callbacks
+    ):
+        job = self._job_with_file(ws, estimate)
+        path = job.file.path
+        with django_capture_on_commit_callbacks(execute=True):
+            estimate.delete()
+        assert not RecognitionJob.objects.filter(pk=job.pk).exists()
+        assert not os.path.exists(path)
+
+    def test_file_kept_until_commit(
+        self, ws, estimate, django_capture_on_commit_callbacks
+    ):
+        job = self._job_with_file(ws, estimate)
+        with django_capture_on_commit_callbacks(execute=False) as callbacks:
+            job.delete()
+        assert len(callbacks) == 1
+        assert os.path.exists(job.file.path)
@@ -315,6 +315,33 @@ class TestCallback:
         assert resp.status_code == 200
         assert resp.data.get("ignored") == "already_terminal"
 
+    def test_llm_headers_resupplied_for_active_job(self, anon_client, job):
+        headers = {"X-LLM-API-Key": "sk-profile", "X-LLM-Extract-Model": "m"}
+        with patch(
+            "apps.recognition_jobs.views._build_llm_headers_for_jobs",
+            return_value={job.id: headers},
+        ):
+            resp = anon_client.post(
+                self.URL.format(id=job.id),
+                data={"event": "llm_headers"},
+                format="json",
+                HTTP_X_CALLBACK_TOKEN=job.cancellation_token,
+            )
+        assert resp.status_code == 200
+        assert resp.data == {"llm_headers": headers}
+
+    def test_llm_headers_not_supplied_for_terminal_job(self, anon_client, job):
+        job.status = "done"
+        job.save(update_fields=["status"])
+        resp = anon_client.post(
+            self.URL.format(id=job.id),
+            data={"event": "llm_headers"},
+            format="json",
+            HTTP_X_CALLBACK_TOKEN=job.cancellation_token,
+        )
+        assert resp.status_code == 200
+        assert "llm_headers" not in resp.data
+
     def test_callback_unknown_event_400(self, anon_client, job):
         resp = anon_client.post(
             self.URL.format(id=job.id),
@@ -332,3 +359,176 @@ class TestCallback:
             HTTP_X_CALLBACK_TOKEN="x",
         )
         assert resp.status_code == 404
+
+
+@pytest.mark.django_db
+class TestStreamedCallback:
+    """X-Stream-Pages: items страницы создаются в page_done, идемпотентно по seq."""
+
+    URL = "/api/v1/recognition-jobs/{id}/callback/"
+
+    def _post(self, client, job, data):
+        return client.post(
+            self.URL.format(id=job.id),
+            data=data,
+            format="json",
+            HTTP_X_CALLBACK_TOKEN=job.cancellation_token,
+        )
+
+    def _page(self, page, seq, names, section="Вентиляция"):
+        return {
+            "event": "page_done",
+            "page": page,
+            "seq": seq,
+            "items": [
+                {"name": n, "unit": "шт", "quantity": 1, "section_name": section,
+                 "page_number": page}
+                for n in names
+            ],
+        }
+
+    def test_page_done_creates_items_immediately(self, anon_client, estimate, job):
+        resp = self._post(anon_client, job, self._page(2, 1, ["Клапан"]))
+        assert resp.status_code == 200
+        resp = self._post(anon_client, job, self._page(1, 2, ["Вентилятор", "Решётка"]))
+        assert resp.status_code == 200
+
+        job.refresh_from_db()
+        assert job.items == []
+        assert job.items_count == 3
+        assert job.pages_done == 2
+        names = list(
+            EstimateItem.objects.filter(estimate=estimate)
+            .order_by("sort_order")
+            .values_list("name", flat=True)
+        )
+        # Порядок документа, а не порядок прихода callbacks.
+        assert names == ["Вентилятор", "Решётка", "Клапан"]
+
+    def test_duplicate_seq_ignored(self, anon_client, estimate, job):
+        self._post(anon_client, job, self._page(1, 1, ["Вентилятор"]))
+        resp = self._post(anon_client, job, self._page(1, 1, ["Вентилятор"]))
+        assert resp.data.get("ignored") == "stale_seq"
+        assert EstimateItem.objects.filter(estimate=estimate).count() == 1
+
+    def test_newer_seq_replaces_page(self, anon_client, estimate, job):
+        self._post(anon_client, job, self._page(1, 1, ["Воздуховод", "ф100"]))
+        self._post(anon_client, job, self._page(1, 3, ["Воздуховод ф100"]))
+        # Опоздавший старый seq не возвращает прежнюю версию.
+        resp = self._post(anon_client, job, self._page(1, 2, ["Старое"]))
+        assert resp.data.get("ignored") == "stale_seq"
+
+        job.refresh_from_db()
+        assert job.items_count == 1
+        assert list(
+            EstimateItem.objects.filter(estimate=estimate).values_list("name", flat=True)
+        ) == ["Воздуховод ф100"]
+
+    def _finished(self, page_seqs):
+        return {
+            "event": "finished",
+            "status": "done",
+            "items": [],
+            "items_streamed": True,
+            "items_count": 2,
+            "page_seqs": page_seqs,
+            "pages_stats": {"total": 2, "processed": 2, "skipped": 0, "error": 0},
+            "pages_summary": [],
+            "errors": [],
+            "llm_costs": {"total_usd": 0.05},
+        }
+
+    def test_finished_streamed_does_not_reapply(self, anon_client, estimate, job):
+        self._post(anon_client, job, self._page(1, 1, ["Вентилятор"]))
+        self._post(anon_client, job, self._page(2, 2, ["Клапан"]))
+        resp = self._post(anon_client, job, self._finished({"1": 1, "2": 2}))
+        assert resp.status_code == 200
+
+        job.refresh_from_db()
+        assert job.status == "done"
+        assert job.apply_result == {"created": 2, "streamed": True}
+        assert job.llm_costs == {"total_usd": 0.05}
+        assert EstimateItem.objects.filter(estimate=estimate).count() == 2
+
+    def test_finished_streamed_renumbers_in_document_order(
+        self, anon_client, estimate, job, monkeypatch
+    ):
+        # Страница длиннее шага предварительного sort_order — до finished
+        # позиции страниц пересекаются, после — идут подряд по документу.
+        monkeypatch.setattr(
+            "apps.estimate.services.pdf_import_service.PAGE_SORT_STRIDE", 2
+        )
+        self._post(anon_client, job, self._page(2, 1, ["Клапан"]))
+        self._post(anon_client, job, self._page(1, 2, ["A", "B", "C"]))
+        self._post(anon_client, job, self._finished({"1": 2, "2": 1}))
+
+        job.refresh_from_db()
+        assert job.status == "done"
+        rows = list(
+            EstimateItem.objects.filter(estimate=estimate)
+            .order_by("sort_order")
+            .values_list("name", "sort_order")
+        )
+        assert rows == [("A", 1), ("B", 2), ("C", 3), ("Клапан", 4)]
+
+    def test_totals_recalculated_once_per_import(self, anon_client, estimate, job):
+        with patch(
+            "apps.estimate.services.pdf_import_service.recalc_estimate_totals"
+        ) as recalc:
+            self._post(anon_client, job, self._page(1, 1, ["Вентилятор"]))
+            self._post(anon_client, job, self._page(2, 2, ["Клапан"]))
+            assert recalc.call_count == 0
+            self._post(anon_client, job, self._finished({"1": 1, "2": 2}))
+        assert recalc.call_count == 1
+
+    def test_finished_streamed_missing_page_fails(self, anon_client, estimate, job):
+        self._post(anon_client, job, self._page(1, 1, ["Вентилятор"]))
+        self._post(anon_client, job, self._finished({"1": 1, "2": 2}))
+
+        job.refresh_from_db()
+        assert job.status == "failed"
+        assert "[2]" in job.error_message
+        # Неполный импорт не остаётся в смете.
+        assert job.items_count == 0
+        assert job.apply_result == {"created": 0, "streamed": True, "discarded": 1}
+        assert not EstimateItem.objects.filter(estimate=estimate).exists()
+
+    def test_failed_discards_streamed_items(self, anon_client, estimate, job):
+        self._post(anon_client, job, self._page(1, 1, ["Вентилятор"]))
+        self._post(anon_client, job, self._page(2, 2, ["Клапан"]))
+        resp = self._post(anon_client, job, {"event": "failed", "error": "LLM down"})
+        assert resp.status_code == 200
+
+        job.refresh_from_db()
+        assert job.status == "failed"
+        assert job.error_message == "LLM down"
+        assert job.apply_result["discarded"] == 2
+        assert not EstimateItem.objects.filter(estimate=estimate).exists()
+        # Опоздавшая страница после failed позиций не создаёт.
+        resp = self._post(anon_client, job, self._page(3, 3, ["Решётка"]))
+        assert resp.data.get("ignored") == "already_terminal"
+        assert not EstimateItem.objects.filter(estimate=estimate).exists()
+
+    def test_cancelled_discards_streamed_items(self, anon_client, estimate, job):
+        self._post(anon_client, job, self._page(1, 1, ["Вентилятор", "Решётка"]))
+        resp = self._post(anon_client, job, {"event": "cancelled"})
+        assert resp.status_code == 200
+
+        job.refresh_from_db()
+        assert job.status == "cancelled"
+        assert job.items_count == 0
+        assert not EstimateItem.objects.filter(estimate=estimate).exists()
+
+    def test_cancel_action_discards_streamed_items(
+        self, anon_client, client, ws, estimate, job
+    ):
+        self._post(anon_client, job, self._page(1, 1, ["Вентилятор"]))
+        RecognitionJob.objects.filter(pk=job.pk).update(status="running")
+        with patch("apps.recognition_jobs.views.httpx.Client"):
+            resp = client.post(
+                f"/api/v1/recognition-jobs/{job.id}/cancel/",
+                **{WS_HEADER: str(ws.id)},
+            )
+        assert resp.status_code == 200
+        assert resp.data["status"] == "cancelled"
+        assert not EstimateItem.objects.filter(estimate=estimate).exists()
@@ -1,4 +1,4 @@
-"""Тесты воркера: атомарный pick + dispatch."""
+"""Тесты воркера: атомарный claim пачки + dispatch."""
 
 from __future__ import annotations
 
@@ -7,6 +7,7 @@ from unittest.mock import patch
 
 import httpx
 import pytest
+from django.core.files.base import ContentFile
 
 from apps.estimate.models import Estimate
 from apps.recognition_jobs import worker as worker_module
@@ -15,7 +16,8 @@ from apps.workspace.models import Workspace
 
 
 @pytest.fixture(autouse=True)
-def _settings(settings):
+def _settings(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
     settings.RECOGNITION_URL = "http://recognition:8003"
     settings.RECOGNITION_API_KEY = "test-key"
     settings.BACKEND_INTERNAL_URL = "http://ismeta-backend:8000"
@@ -37,12 +39,12 @@ def estimate(ws):
     )
 
 
-def _job(ws, estimate, **overrides):
+def _job(ws, estimate, content=b"%PDF-1.4", **overrides):
     defaults = {
         "estimate": estimate,
         "workspace": ws,
         "file_name": "x.pdf",
-        "file_blob": b"%PDF-1.4",
+        "file": ContentFile(content, name="x.pdf"),
         "cancellation_token": "t",
     }
     defaults.update(overrides)
@@ -50,26 +52,60 @@ def _job(ws, estimate, **overrides):
 
 
 @pytest.mark.django_db
-class TestPickNextQueuedJob:
-    def test_picks_oldest_queued(self, ws, estimate):
+class TestClaimQueuedJobs:
+    def test_claims_oldest_queued_first(self, ws, estimate):
         old = _job(ws, estimate, file_name="old.pdf")
-        _job(ws, estimate, file_name="new.pdf")
-        picked = worker_module._pick_next_queued_job()
-        assert picked is not None
-        assert picked.id == old.id
+        new = _job(ws, estimate, file_name="new.pdf")
+        claimed = worker_module._claim_queued_jobs(1)
+        assert [j.id for j in claimed] == [old.id]
         old.refresh_from_db()
+        new.refresh_from_db()
         assert old.status == "running"
         assert old.started_at is not None
+        assert new.status == "queued"
+
+    def test_claims_batch_in_created_order(self, ws, estimate):
+        jobs = [_job(ws, estimate, file_name=f"{i}.pdf") for i in range(3)]
+        claimed = worker_module._claim_queued_jobs(5)
+        assert [j.id for j in claimed] == [j.id for j in jobs]
+        assert all(j.status == "running" for j in claimed)
+        assert worker_module._claim_queued_jobs(5) == []
 
     def test_skips_non_queued(self, ws, estimate):
         _job(ws, estimate, status="done")
         _job(ws, estimate, status="running")
-        picked = worker_module._pick_next_queued_job()
-        assert picked is None
+        assert worker_module._claim_queued_jobs(5) == []
+
+    def test_returns_empty_when_no_slots(self, ws, estimate):
+        _job(ws, estimate)
+        assert worker_module._claim_queued_jobs(0) == []
+
+
+@pytest.mark.django_db
+class TestBuildLlmHeadersForJobs:
+    def test_jobs_without_profile_get_empty_headers(self, ws, estimate):
+        a = _job(ws, estimate)
+        b = _job(ws, estimate)
+        headers = worker_module._build_llm_headers_for_jobs([a, b])
+        assert headers == {a.id: {}, b.id: {}}
+
+    def test_missing_profile_gets_empty_headers(self, ws, estimate):
+        job = _job(ws, estimate)
+        job.profile_id = 999_999
+        assert worker_module._build_llm_headers_for_jobs([job]) == {job.id: {}}
 
-    def test_returns_none_when_empty(self):
-        picked = worker_module._pick_next_queued_job()
-        assert picked is None
+
+@pytest.mark.django_db
+class TestOpenJobFile:
+    def test_opens_file_from_storage(self, ws, estimate):
+        job = _job(ws, estimate, content=b"%PDF-1.4 storage")
+        with worker_module._open_job_file(job) as f:
+            assert f.read() == b"%PDF-1.4 storage"
+
+    def test_legacy_blob_fallback(self, ws, estimate):
+        job = _job(ws, estimate, file="", file_blob=b"%PDF-1.4 legacy")
+        with worker_module._open_job_file(job) as f:
+            assert f.read() == b"%PDF-1.4 legacy"
 
 
 class _FakeAsyncResp:
@@ -79,23 +115,16 @@ class _FakeAsyncResp:
 
 
 class _FakeAsyncClient:
-    """httpx.AsyncClient mock — записывает headers и files."""
-
-    instances: list[_FakeAsyncClient] = []
+    """httpx.AsyncClient mock — записывает headers и содержимое files."""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, status_code: int = 202):
         self.posts: list[tuple[str, dict, dict]] = []
-        self.status_code = 202
-        _FakeAsyncClient.instances.append(self)
-
-    async def __aenter__(self):
-        return self
-
-    async def __aexit__(self, *args):
-        return None
+        self.status_code = status_code
 
     async def post(self, url, headers=None, files=None):
-        self.posts.append((url, headers or {}, files or {}))
+        # Файл закрывается после POST — читаем содержимое сразу.
+        read = {k: (v[0], v[1].read(), v[2]) for k, v in (files or {}).items()}
+        self.posts.append((url, headers or {}, read))
         return _FakeAsyncResp(self.status_code)
 
 
@@ -103,54 +132,39 @@ class _FakeAsyncClient:
 class TestPostToRecognition:
     """Unit-тесты чистой http-функции (без DB-side-effect'ов)."""
 
-    def setup_method(self):
-        _FakeAsyncClient.instances.clear()
-
     def test_post_includes_callback_headers_and_file(self, ws, estimate):
-        job = _job(ws, estimate)
-        with patch.object(worker_module.httpx, "AsyncClient", _FakeAsyncClient):
-            status_code, _body = asyncio.run(worker_module._post_to_recognition(job))
+        job = _job(ws, estimate, content=b"%PDF-1.4 body")
+        client = _FakeAsyncClient()
+        status_code, _body = asyncio.run(
+            worker_module._post_to_recognition(job, client, {"X-LLM-Model": "m"})
+        )
         assert status_code == 202
-        url, headers, files = _FakeAsyncClient.instances[0].posts[0]
+        url, headers, files = client.posts[0]
         assert url == "http://recognition:8003/v1/parse/spec/async"
         assert headers["X-API-Key"] == "test-key"
         assert headers["X-Job-Id"] == str(job.id)
         assert headers["X-Callback-Token"] == "t"
+        assert headers["X-Stream-Pages"] == "true"
         assert headers["X-Callback-URL"] == (
             f"http://ismeta-backend:8000/api/v1/recognition-jobs/{job.id}/callback/"
         )
-        assert "file" in files
+        assert headers["X-LLM-Model"] == "m"
+        assert files["file"] == ("x.pdf", b"%PDF-1.4 body", "application/pdf")
 
     def test_post_returns_status_code_on_non_202(self, ws, estimate):
         job = _job(ws, estimate)
-
-        class _Client(_FakeAsyncClient):
-            def __init__(self, *a, **kw):
-                super().__init__(*a, **kw)
-                self.status_code = 500
-
-        with patch.object(worker_module.httpx, "AsyncClient", _Client):
-            status_code, _body = asyncio.run(worker_module._post_to_recognition(job))
+        client = _FakeAsyncClient(status_code=500)
+        status_code, _body = asyncio.run(worker_module._post_to_recognition(job, client))
         assert status_code == 500
 
     def test_post_returns_none_on_transport_error(self, ws, estimate):
         job = _job(ws, estimate)
 
         class _Boom:
-            def __init__(self, *a, **kw):
-                pass
-
-            async def __aenter__(self):
-                return self
-
-            async def __aexit__(self, *a):
-                return None
-
             async def post(self, *a, **kw):
                 raise httpx.ConnectError("boom")
 
-        with patch.object(worker_module.httpx, "AsyncClient", _Boom):
-            status_code, body = asyncio.run(worker_module._post_to_recognition(job))
+        status_code, body = asyncio.run(worker_module._post_to_recognition(job, _Boom()))
         assert status_code is None
         assert "boom" in body
 
@@ -170,13 +184,45 @@ class TestMarkFailed:
 async def test_run_worker_stops_on_event_when_idle():
     """run_worker корректно завершается по stop_event даже когда очередь пуста.
 
-    Этот тест НЕ использует БД (mock'аем _pick_next_queued_job в None).
+    Этот тест НЕ использует БД (mock'аем _claim_with_headers в []).
     Полноценный integration «pick + dispatch» проверяется через curl-демо
     (см. apps/recognition_jobs/README.md).
     """
     stop = asyncio.Event()
-    with patch.object(worker_module, "_pick_next_queued_job", return_value=None):
+    with patch.object(worker_module, "_claim_with_headers", return_value=[]):
         worker_task = asyncio.create_task(worker_module.run_worker(stop))
         await asyncio.sleep(0.05)
         stop.set()
         await asyncio.wait_for(worker_task, timeout=2.0)
+
+
+@pytest.mark.asyncio
+async def test_run_worker_claims_only_free_slots():
+    """Пачка claim'а не превышает свободные слоты RECOGNITION_MAX_PARALLEL_JOBS."""
+    stop = asyncio.Event()
+    limits: list[int] = []
+    release = asyncio.Event()
+
+    def _claim(limit):
+        limits.append(limit)
+        if len(limits) == 1:
+            return [(object(), {}), (object(), {})]
+        return []
+
+    async def _dispatch(job, client, llm_headers):
+        await release.wait()
+
+    with (
+        patch.object(worker_module, "_claim_with_headers", side_effect=_claim),
+        patch.object(worker_module, "_dispatch_job", side_effect=_dispatch),
+    ):
+        worker_task = asyncio.create_task(worker_module.run_worker(stop))
+        await asyncio.sleep(0.05)
+        # Оба слота заняты — новых claim'ов нет.
+        assert limits == [2]
+        release.set()
+        await asyncio.sleep(0.05)
+        stop.set()
+        await asyncio.wait_for(worker_task, timeout=2.0)
+    assert limits[0] == 2
+    assert all(limit == 2 for limit in limits[1:])
@@ -4,7 +4,8 @@ Endpoints:
 - GET    /api/v1/recognition-jobs/          — список (фильтры status/estimate_id).
 - GET    /api/v1/recognition-jobs/{id}/     — details.
 - POST   /api/v1/recognition-jobs/{id}/cancel/   — отмена (running → POST на recognition).
-- POST   /api/v1/recognition-jobs/{id}/callback/ — приём callback'ов от recognition.
+- POST   /api/v1/recognition-jobs/{id}/callback/ — приём callback'ов от recognition
+  (и выдача X-LLM-* профиля при resume job'а — event=llm_headers).
 
 Создание job'а — через `apps/estimate/pdf_views.py::import_pdf?async=true`,
 не через POST на этот ViewSet (PDF blob кладётся вместе с FK на Estimate).
@@ -17,6 +18,7 @@ from hmac import compare_digest
 
 import httpx
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
@@ -27,6 +29,7 @@ from rest_framework.response import Response
 
 from .models import RecognitionJob
 from .serializers import RecognitionJobSerializer
+from .worker import _build_llm_headers_for_jobs
 
 logger = logging.getLogger(__name__)
 
@@ -97,9 +100,7 @@ class RecognitionJobViewSet(viewsets.ReadOnlyModelViewSet):
                     "recognition cancel failed",
                     extra={"job_id": str(job.id), "error": str(exc)},
                 )
-        job.status = RecognitionJob.STATUS_CANCELLED
-        job.completed_at = timezone.now()
-        job.save(update_fields=["status", "completed_at"])
+        job = self._close_unfinished(job, RecognitionJob.STATUS_CANCELLED)
         return Response({"id": str(job.id), "status": job.status})
 
     @action(
@@ -113,6 +114,9 @@ class RecognitionJobViewSet(viewsets.ReadOnlyModelViewSet):
     def callback(self, request: Request, pk: str | None = None) -> Response:
         """Recognition присылает события: started / page_done / finished / failed / cancelled.
 
+        llm_headers — запрос X-LLM-* профиля job'а: recognition не хранит
+        ключ на диске и после рестарта получает его заново перед resume.
+
         Auth: X-Callback-Token (constant-time comparison c job.cancellation_token).
 
         Workspace filter намеренно НЕ применяется — recognition не знает
@@ -147,6 +151,9 @@ class RecognitionJobViewSet(viewsets.ReadOnlyModelViewSet):
         if job.is_terminal and event != "started":
             return Response({"ok": True, "ignored": "already_terminal"})
 
+        if event == "llm_headers":
+            headers = _build_llm_headers_for_jobs([job])[job.id]
+            return Response({"llm_headers": headers})
         if event == "started":
             update_fields: list[str] = []
             if job.status != RecognitionJob.STATUS_RUNNING:
@@ -166,6 +173,8 @@ class RecognitionJobViewSet(viewsets.ReadOnlyModelViewSet):
                     pass
             if update_fields:
                 job.save(update_fields=update_fields)
+        elif event == "page_done" and request.data.get("seq") is not None:
+            return self._apply_streamed_page(job, request.data)
         elif event == "page_done":
             page_items = request.data.get("items") or []
             existing = job.items or []
@@ -177,16 +186,13 @@ class RecognitionJobViewSet(viewsets.ReadOnlyModelViewSet):
         elif event == "finished":
             self._finalize_finished(job, request.data)
         elif event == "failed":
-            job.status = RecognitionJob.STATUS_FAILED
-            job.completed_at = timezone.now()
-            job.error_message = str(request.data.get("error", ""))[:8000]
-            job.save(
-                update_fields=["status", "completed_at", "error_message"]
+            self._close_unfinished(
+                job,
+                RecognitionJob.STATUS_FAILED,
+                str(request.data.get("error", "")),
             )
         elif event == "cancelled":
-            job.status = RecognitionJob.STATUS_CANCELLED
-            job.completed_at = timezone.now()
-            job.save(update_fields=["status", "completed_at"])
+            self._close_unfinished(job, RecognitionJob.STATUS_CANCELLED)
         else:
             return Response(
                 {"detail": f"unknown event {event!r}"},
@@ -194,6 +200,142 @@ class RecognitionJobViewSet(viewsets.ReadOnlyModelViewSet):
             )
         return Response({"ok": True})
 
+    @staticmethod
+    def _apply_streamed_page(job: RecognitionJob, payload: dict) -> Response:
+        """page_done в stream-режиме: создать EstimateItem'ы страницы сразу.
+
+        Идемпотентно по (page, seq): повтор/опоздавший callback со seq ≤
+        применённого игнорируется, бо́льший seq заменяет позиции страницы
+        (recognition досылает страницы, изменённые cross-page merge'ем).
+        Callbacks приходят параллельно — сериализуем через select_for_update.
+        """
+        from apps.estimate.services.pdf_import_service import apply_page_items
+
+        try:
+            page = int(payload.get("page"))
+            seq = int(payload.get("seq"))
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "page/seq must be int"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        page_items = payload.get("items") or []
+
+        with transaction.atomic():
+            job = RecognitionJob.objects.select_for_update().get(pk=job.pk)
+            if job.is_terminal:
+                return Response({"ok": True, "ignored": "already_terminal"})
+            page_seqs = job.page_seqs or {}
+            applied = page_seqs.get(str(page)) or {}
+            if seq <= applied.get("seq", 0):
+                return Response({"ok": True, "ignored": "stale_seq"})
+            item_ids = apply_page_items(
+                str(job.estimate_id),
+                str(job.workspace_id),
+                page,
+                page_items,
+                replace_item_ids=applied.get("item_ids") or None,
+            )
+            page_seqs[str(page)] = {"seq": seq, "item_ids": item_ids}
+            job.page_seqs = page_seqs
+            job.items_count = (
+                (job.items_count or 0) - len(applied.get("item_ids") or []) + len(item_ids)
+            )
+            job.pages_done = max(job.pages_done or 0, len(page_seqs))
+            job.save(update_fields=["page_seqs", "items_count", "pages_done"])
+        return Response({"ok": True})
+
+    @staticmethod
+    def _discard_streamed_items(job: RecognitionJob) -> None:
+        """Снять позиции, созданные page_done'ами job'а (job не дошёл до done).
+
+        Смета не остаётся с частью страниц; page_seqs сохраняются для
+        диагностики, apply_result фиксирует число снятых позиций.
+        Вызывается под select_for_update job'а.
+        """
+        from apps.estimate.services.pdf_import_service import discard_page_items
+
+        item_ids = [
+            item_id
+            for applied in (job.page_seqs or {}).values()
+            for item_id in applied.get("item_ids") or []
+        ]
+        if not item_ids:
+            return
+        discarded = discard_page_items(
+            str(job.estimate_id), str(job.workspace_id), item_ids
+        )
+        job.items_count = 0
+        job.apply_result = {"created": 0, "streamed": True, "discarded": discarded}
+
+    @staticmethod
+    def _close_unfinished(
+        job: RecognitionJob, final_status: str, error_message: str | None = None
+    ) -> RecognitionJob:
+        """Перевести job в failed/cancelled, сняв его stream-позиции из сметы.
+
+        Сериализуется с page_done через select_for_update: опоздавшая
+        страница увидит terminal-статус и не создаст позиций.
+        """
+        with transaction.atomic():
+            job = RecognitionJob.objects.select_for_update().get(pk=job.pk)
+            if job.is_terminal:
+                return job
+            RecognitionJobViewSet._discard_streamed_items(job)
+            job.status = final_status
+            job.completed_at = timezone.now()
+            if error_message is not None:
+                job.error_message = error_message[:8000]
+            job.save()
+        return job
+
+    @staticmethod
+    def _finalize_streamed(job: RecognitionJob, payload: dict) -> None:
+        """finished в stream-режиме: items уже в смете, сверяем page_seqs.
+
+        Recognition не ретраит callbacks: если какой-то page_done не дошёл
+        (seq страницы у нас меньше финального) — позиции неполные, job → failed,
+        уже созданные позиции снимаются. Иначе позиции перенумеровываются в
+        порядке документа и агрегаты сметы пересчитываются один раз.
+        """
+        from apps.estimate.services.pdf_import_service import finalize_page_items
+
+        with transaction.atomic():
+            job = RecognitionJob.objects.select_for_update().get(pk=job.pk)
+            if job.is_terminal:
+                return
+            applied = job.page_seqs or {}
+            expected = payload.get("page_seqs") or {}
+            missing = sorted(
+                int(page)
+                for page, seq in expected.items()
+                if (applied.get(str(page)) or {}).get("seq", 0) < int(seq)
+            )
+            pages_stats = payload.get("pages_stats") or {}
+            job.pages_total = pages_stats.get("total")
+            if pages_stats.get("processed") is not None:
+                job.pages_done = max(job.pages_done or 0, pages_stats.get("processed", 0))
+            job.pages_summary = payload.get("pages_summary") or []
+            job.llm_costs = payload.get("llm_costs") or {}
+            job.apply_result = {"created": job.items_count, "streamed": True}
+            if missing:
+                RecognitionJobViewSet._discard_streamed_items(job)
+                job.status = RecognitionJob.STATUS_FAILED
+                job.error_message = f"page_done не доставлен для страниц: {missing}"[:8000]
+            else:
+                finalize_page_items(
+                    str(job.estimate_id),
+                    str(job.workspace_id),
+                    {
+                        int(page): page_applied.get("item_ids") or []
+                        for page, page_applied in applied.items()
+                    },
+                )
+                job.status = RecognitionJob.STATUS_DONE
+                job.error_message = ""
+            job.completed_at = timezone.now()
+            job.save()
+
     @staticmethod
     def _finalize_finished(job: RecognitionJob, payload: dict) -> None:
         """finished — финальный snapshot от recognition: items, pages_stats,
@@ -202,6 +344,13 @@ class RecognitionJobViewSet(viewsets.ReadOnlyModelViewSet):
         """
         from apps.estimate.services.pdf_import_service import apply_parsed_items
 
+        if payload.get("items_streamed"):
+            RecognitionJobViewSet._finalize_streamed(job, payload)
+            job.refresh_from_db()
+            if job.status == RecognitionJob.STATUS_DONE:
+                RecognitionJobViewSet._create_import_log(job, job.items_count)
+            return
+
         items = payload.get("items") or []
         pages_stats = payload.get("pages_stats") or {}
         job.items = items
@@ -233,31 +382,34 @@ class RecognitionJobViewSet(viewsets.ReadOnlyModelViewSet):
 
         # E18-2: ImportLog после успешного apply (status=done).
         # Пишем только при успехе — failed apply не должен порождать
-        # «успешный» лог cost'а. Ошибки создания лога не должны ломать job.
+        # «успешный» лог cost'а.
         if job.status == RecognitionJob.STATUS_DONE:
-            try:
-                from apps.llm_profiles.models import ImportLog
-
-                total_usd = (
-                    job.llm_costs.get("total_usd")
-                    if isinstance(job.llm_costs, dict)
-                    else None
-                )
-                ImportLog.objects.create(
-                    estimate_id=job.estimate_id,
-                    file_type=job.file_type or "pdf",
-                    file_name=job.file_name or "",
-                    profile_id=job.profile_id,
-                    cost_usd=total_usd,
-                    items_created=len(items),
-                    pages_processed=job.pages_done or 0,
-                    llm_metadata=job.llm_costs or {},
-                    created_by=job.created_by,
-                )
-            except Exception as exc:  # noqa: BLE001
-                logger.warning(
-                    "recognition_jobs import_log create failed",
-                    extra={"job_id": str(job.id), "error": str(exc)},
-                )
+            RecognitionJobViewSet._create_import_log(job, len(items))
 
+    @staticmethod
+    def _create_import_log(job: RecognitionJob, items_created: int) -> None:
+        """Ошибки создания лога не должны ломать job."""
+        try:
+            from apps.llm_profiles.models import ImportLog
 
+            total_usd = (
+                job.llm_costs.get("total_usd")
+                if isinstance(job.llm_costs, dict)
+                else None
+            )
+            ImportLog.objects.create(
+                estimate_id=job.estimate_id,
+                file_type=job.file_type or "pdf",
+                file_name=job.file_name or "",
+                profile_id=job.profile_id,
+                cost_usd=total_usd,
+                items_created=items_created,
+                pages_processed=job.pages_done or 0,
+                llm_metadata=job.llm_costs or {},
+                created_by=job.created_by,
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(
+                "recognition_jobs import_log create failed",
+                extra={"job_id": str(job.id), "error": str(exc)},
+            )
@@ -3,28 +3,35 @@
 Запускается отдельным sidecar-контейнером:
     python manage.py recognition_worker
 
-Полит таблицу на queued jobs, забирает атомарно через
-SELECT ... FOR UPDATE SKIP LOCKED, переводит в running и POST'ит на
-recognition `/v1/parse/spec/async`. Дальше recognition присылает callbacks
-на наш `/api/v1/recognition-jobs/{id}/callback/` — обновляет status и в
-финале создаёт EstimateItem'ы.
-
-Параллелизм ограничен `RECOGNITION_MAX_PARALLEL_JOBS` через asyncio.Semaphore.
-Воркер не ждёт finish'а recognition — после POST на /async он сразу
-освобождается и может взять следующий job (recognition сам параллелит).
-Семафор тут как safeguard от лавинного запуска dispatch-задач если очередь
-большая, а recognition отвечает медленно.
+Полит таблицу на queued jobs и забирает свободные слоты пачкой — одним
+UPDATE … WHERE id IN (SELECT … FOR UPDATE SKIP LOCKED) RETURNING, сразу
+переводя их в running, — и POST'ит каждый на recognition
+`/v1/parse/spec/async`. Дальше recognition присылает callbacks на наш
+`/api/v1/recognition-jobs/{id}/callback/` — обновляет status и в финале
+создаёт EstimateItem'ы.
+
+Параллелизм ограничен `RECOGNITION_MAX_PARALLEL_JOBS`: job'ов берётся не
+больше, чем свободных слотов. Воркер не ждёт finish'а recognition — после
+POST на /async слот освобождается (recognition сам параллелит).
+
+Все POST'ы идут через один долгоживущий httpx.AsyncClient (keep-alive
+пул, HTTP/1.1 — recognition слушает plain http, h2c httpx не умеет).
+PDF стримится из storage (`RecognitionJob.file`) чанками multipart'а —
+память воркера не растёт с размером очереди.
+LLMProfile'ы пачки читаются одним запросом.
 """
 
 from __future__ import annotations
 
 import asyncio
+import io
 import logging
+from typing import IO
 
 import httpx
 from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db import transaction
+from django.db import connection
 from django.utils import timezone
 
 from .models import RecognitionJob
@@ -32,26 +39,49 @@ from .models import RecognitionJob
 logger = logging.getLogger(__name__)
 
 
-def _pick_next_queued_job() -> RecognitionJob | None:
-    """Атомарно берёт самый старый queued job + переводит в running.
+_CLAIM_SQL = """
+    UPDATE {table} SET status = %s, started_at = %s
+    WHERE id IN (
+        SELECT id FROM {table}
+        WHERE status = %s
+        ORDER BY created_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id
+"""
+
+# Тяжёлые поля, которые dispatch'у не нужны.
+_DISPATCH_DEFER = ("file_blob", "items", "pages_summary", "page_seqs", "apply_result")
+
+
+def _claim_queued_jobs(limit: int) -> list[RecognitionJob]:
+    """Атомарно берёт до `limit` самых старых queued jobs + переводит в running.
 
-    SELECT FOR UPDATE SKIP LOCKED гарантирует что параллельные worker'ы
-    не возьмут один и тот же job (для случая если решим масштабировать
-    до multiple воркеров; пока 1 воркер).
+    Один statement: SKIP LOCKED гарантирует что параллельные worker'ы
+    не возьмут один и тот же job, а UPDATE … RETURNING не оставляет окна
+    между выборкой и сменой статуса.
     """
-    with transaction.atomic():
-        job = (
-            RecognitionJob.objects.select_for_update(skip_locked=True)
-            .filter(status=RecognitionJob.STATUS_QUEUED)
-            .order_by("created_at")
-            .first()
+    if limit <= 0:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _CLAIM_SQL.format(table=connection.ops.quote_name(RecognitionJob._meta.db_table)),
+            [
+                RecognitionJob.STATUS_RUNNING,
+                timezone.now(),
+                RecognitionJob.STATUS_QUEUED,
+                limit,
+            ],
         )
-        if job is None:
-            return None
-        job.status = RecognitionJob.STATUS_RUNNING
-        job.started_at = timezone.now()
-        job.save(update_fields=["status", "started_at"])
-        return job
+        ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return []
+    return list(
+        RecognitionJob.objects.filter(id__in=ids)
+        .defer(*_DISPATCH_DEFER)
+        .order_by("created_at")
+    )
 
 
 def _mark_failed(job_id, message: str) -> None:
@@ -63,35 +93,78 @@ def _mark_failed(job_id, message: str) -> None:
     )
 
 
-def _build_llm_headers_for_job(job: RecognitionJob) -> dict[str, str]:
-    """E18-2: lookup LLMProfile по job.profile_id и построить X-LLM-* headers.
+def _build_llm_headers_for_jobs(jobs: list[RecognitionJob]) -> dict:
+    """E18-2: X-LLM-* headers для пачки jobs — LLMProfile'ы одним запросом.
 
-    Если profile_id пуст или профиль удалён — возвращаем пустой dict
-    (recognition использует свои env-defaults).
+    Возвращает {job.id: headers}. Если profile_id пуст или профиль удалён —
+    пустой dict (recognition использует свои env-defaults).
     """
-    if not job.profile_id:
-        return {}
     from apps.llm_profiles.models import LLMProfile
     from apps.llm_profiles.proxy import build_llm_headers
 
-    profile = LLMProfile.objects.filter(id=job.profile_id).first()
-    if not profile:
-        logger.warning(
-            "recognition_jobs profile_not_found",
-            extra={"job_id": str(job.id), "profile_id": job.profile_id},
-        )
-        return {}
-    return build_llm_headers(profile)
+    profile_ids = {job.profile_id for job in jobs if job.profile_id}
+    profiles = LLMProfile.objects.in_bulk(profile_ids) if profile_ids else {}
+    headers: dict = {}
+    for job in jobs:
+        if not job.profile_id:
+            headers[job.id] = {}
+            continue
+        profile = profiles.get(job.profile_id)
+        if not profile:
+            logger.warning(
+                "recognition_jobs profile_not_found",
+                extra={"job_id": str(job.id), "profile_id": job.profile_id},
+            )
+            headers[job.id] = {}
+            continue
+        headers[job.id] = build_llm_headers(profile)
+    return headers
+
+
+def _claim_with_headers(limit: int) -> list[tuple[RecognitionJob, dict[str, str]]]:
+    """Claim пачки + headers её профилей (один sync_to_async hop на пачку)."""
+    jobs = _claim_queued_jobs(limit)
+    if not jobs:
+        return []
+    headers = _build_llm_headers_for_jobs(jobs)
+    return [(job, headers[job.id]) for job in jobs]
 
 
-async def _post_to_recognition(job: RecognitionJob) -> tuple[int | None, str]:
+def _open_job_file(job: RecognitionJob) -> IO[bytes]:
+    """PDF job'а как file-like: из storage, для legacy jobs — из file_blob."""
+    if job.file:
+        return job.file.storage.open(job.file.name, "rb")
+    blob = (
+        RecognitionJob.objects.filter(pk=job.pk)
+        .values_list("file_blob", flat=True)
+        .first()
+    )
+    return io.BytesIO(bytes(blob or b""))
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Долгоживущий клиент воркера: keep-alive пул на RECOGNITION_MAX_PARALLEL_JOBS."""
+    parallel = max(1, settings.RECOGNITION_MAX_PARALLEL_JOBS)
+    return httpx.AsyncClient(
+        timeout=60.0,
+        limits=httpx.Limits(
+            max_connections=parallel, max_keepalive_connections=parallel
+        ),
+    )
+
+
+async def _post_to_recognition(
+    job: RecognitionJob,
+    client: httpx.AsyncClient,
+    llm_headers: dict[str, str] | None = None,
+) -> tuple[int | None, str]:
     """Чистый HTTP-call на recognition /v1/parse/spec/async.
 
     Возвращает (status_code, body|error). status_code=None при transport error.
-    Без DB-операций — чтобы можно было тестировать unit'ом без транзакций.
+    Из БД/storage только читается PDF — чтобы можно было тестировать unit'ом
+    без транзакций.
 
-    E18-2: если у job есть profile_id — пробрасываем X-LLM-* headers
-    (api_key расшифровывается из LLMProfile.api_key_encrypted).
+    E18-2: llm_headers — X-LLM-* профиля job'а (см. _build_llm_headers_for_jobs).
     """
     callback_url = (
         f"{settings.BACKEND_INTERNAL_URL.rstrip('/')}"
@@ -102,34 +175,39 @@ async def _post_to_recognition(job: RecognitionJob) -> tuple[int | None, str]:
         "X-Callback-URL": callback_url,
         "X-Job-Id": str(job.id),
         "X-Callback-Token": job.cancellation_token,
+        # Items приходят постранично в page_done (seq), finished — без items.
+        "X-Stream-Pages": "true",
     }
-    llm_headers = await sync_to_async(_build_llm_headers_for_job)(job)
-    headers.update(llm_headers)
-    files = {
-        "file": (
-            job.file_name,
-            bytes(job.file_blob),
-            "application/pdf",
-        )
-    }
+    headers.update(llm_headers or {})
     url = f"{settings.RECOGNITION_URL.rstrip('/')}/v1/parse/spec/async"
+    try:
+        pdf = await sync_to_async(_open_job_file)(job)
+    except (OSError, ValueError) as exc:
+        return None, f"pdf unavailable: {exc}"
     try:
         # Только handshake POST — recognition отвечает 202 моментально.
         # Долгий парсинг идёт у них в background, к нам приходит через callbacks.
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(url, headers=headers, files=files)
+        # multipart читает файл чанками — PDF целиком в память не поднимается.
+        files = {"file": (job.file_name, pdf, "application/pdf")}
+        resp = await client.post(url, headers=headers, files=files)
     except httpx.HTTPError as exc:
         return None, f"recognition unreachable: {exc}"
+    finally:
+        pdf.close()
     return resp.status_code, resp.text
 
 
-async def _dispatch_job(job: RecognitionJob) -> None:
+async def _dispatch_job(
+    job: RecognitionJob,
+    client: httpx.AsyncClient,
+    llm_headers: dict[str, str] | None = None,
+) -> None:
     """POST на recognition /v1/parse/spec/async.
 
     Если recognition вернул ≠ 202 или не доступен — переводим job в failed
     сразу (callback не придёт, иначе job залипнет в running навсегда).
     """
-    status_code, body = await _post_to_recognition(job)
+    status_code, body = await _post_to_recognition(job, client, llm_headers)
     if status_code is None:
         logger.exception(
             "recognition_jobs dispatch transport error",
@@ -157,20 +235,14 @@ async def _dispatch_job(job: RecognitionJob) -> None:
     )
 
 
-async def _run_with_semaphore(
-    job: RecognitionJob, sema: asyncio.Semaphore
-) -> None:
-    async with sema:
-        await _dispatch_job(job)
-
-
 async def run_worker(stop_event: asyncio.Event | None = None) -> None:
     """Главный loop воркера.
 
-    Пулит RecognitionJob.queued → dispatch → ждёт. `stop_event` нужен только
-    для тестов (graceful shutdown).
+    Claim пачки queued (не больше свободных слотов) → dispatch → ждёт.
+    Все слоты заняты — ждёт завершения любого dispatch'а, а не poll-интервал.
+    `stop_event` нужен только для тестов (graceful shutdown).
     """
-    sema = asyncio.Semaphore(settings.RECOGNITION_MAX_PARALLEL_JOBS)
+    max_parallel = max(1, settings.RECOGNITION_MAX_PARALLEL_JOBS)
     poll_interval = settings.RECOGNITION_WORKER_POLL_INTERVAL
     # Держим strong-ref на dispatch-task'и, иначе GC может убить их раньше
     # завершения (см. asyncio.create_task docs / RUF006).
@@ -178,26 +250,42 @@ async def run_worker(stop_event: asyncio.Event | None = None) -> None:
     logger.info(
         "recognition_jobs worker started",
         extra={
-            "max_parallel": settings.RECOGNITION_MAX_PARALLEL_JOBS,
+            "max_parallel": max_parallel,
             "poll_interval": poll_interval,
         },
     )
-    while True:
-        if stop_event is not None and stop_event.is_set():
-            logger.info("recognition_jobs worker stopped by event")
-            return
-        job = await sync_to_async(_pick_next_queued_job)()
-        if job is None:
-            try:
-                if stop_event is not None:
-                    await asyncio.wait_for(stop_event.wait(), timeout=poll_interval)
+    async with create_http_client() as client:
+        try:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    logger.info("recognition_jobs worker stopped by event")
                     return
-                else:
-                    await asyncio.sleep(poll_interval)
-            except TimeoutError:
-                continue
-            continue
-        # Запускаем dispatch в фоновую таску — не блокируем pick loop.
-        task = asyncio.create_task(_run_with_semaphore(job, sema))
-        pending.add(task)
-        task.add_done_callback(pending.discard)
+                free = max_parallel - len(pending)
+                if free <= 0:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                claimed = await sync_to_async(_claim_with_headers)(free)
+                if not claimed:
+                    try:
+                        if stop_event is not None:
+                            await asyncio.wait_for(
+                                stop_event.wait(), timeout=poll_interval
+                            )
+                            return
+                        else:
+                            await asyncio.sleep(poll_interval)
+                    except TimeoutError:
+                        continue
+                    continue
+                # Запускаем dispatch в фоновые таски — не блокируем claim loop.
+                for job, llm_headers in claimed:
+                    task = asyncio.create_task(
+                        _dispatch_job(job, client, llm_headers)
+                    )
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+        finally:
+            # Клиент закрывается после выхода из loop — даём handshake'ам
+            # уже взятых jobs завершиться.
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
@@ -1,16 +1,24 @@
 """GET /v1/healthz — per specs/15-recognition-api.md §4."""
 
+from typing import Any
+
 from fastapi import APIRouter, Request
 
+from ..services import docling_pool, llm_throttle
+
 router = APIRouter()
 
 
 @router.get("/v1/healthz")
-async def healthz(request: Request) -> dict[str, str]:
+async def healthz(request: Request) -> dict[str, Any]:
     app = request.app
     provider_name = getattr(app.state, "provider_name", "unknown")
     return {
         "status": "ok",
         "version": app.version,
         "provider": provider_name,
+        # Очередь LLM-слотов по классам: queue_depth / in_flight / wait.
+        "llm_throttle": llm_throttle.snapshot(),
+        # Прогрев Docling converter'ов: state и время загрузки моделей.
+        "docling": docling_pool.snapshot(),
     }
@@ -1,11 +1,14 @@
 """POST /v1/parse/{spec,invoice,quote} — PDF parsing endpoints."""
 
 import asyncio
+import hashlib
+import json
 import logging
 import os
 import re
 import time
 import uuid
+from pathlib import Path
 from typing import Any, cast
 
 import fitz
@@ -16,13 +19,13 @@ from pydantic import BaseModel
 
 from ..auth import verify_api_key
 from ..config import settings
-from ..deps import get_provider
+from ..deps import get_provider, llm_headers, provider_from_headers
 from ..providers.base import BaseLLMProvider
 from ..schemas.invoice import InvoiceParseResponse
 from ..schemas.probe import ProbeResponse
 from ..schemas.quote import QuoteParseResponse
-from ..schemas.spec import SpecParseResponse
-from ..services import job_registry
+from ..schemas.spec import SpecItem, SpecParseResponse
+from ..services import job_registry, job_store, llm_throttle, parse_cache
 from ..services.invoice_parser import InvoiceParser
 from ..services.pdf_text import TEXT_LAYER_MIN_CHARS_PER_PAGE
 from ..services.progress_emitter import ProgressEmitter
@@ -125,6 +128,34 @@ async def _run_with_timeout(
         raise ParseFailedError(detail=str(e)) from e
 
 
+async def _run_cached(
+    kind: str,
+    response_cls: type[BaseModel],
+    parser: Any,
+    provider: BaseLLMProvider,
+    content: bytes,
+    filename: str,
+) -> BaseModel:
+    """Content-addressed кэш поверх `_run_with_timeout` (см. parse_cache).
+
+    Hit — готовый ответ без Docling/Camelot/LLM; miss — парсим и сохраняем
+    (только status=done без errors). Sync-запрос — interactive-класс
+    llm_throttle: его LLM-вызовы обгоняют очередь async bulk job'ов.
+    """
+    cache_key = parse_cache.document_key(kind, content, provider)
+    cached = await parse_cache.load_response(cache_key, response_cls)
+    if cached is not None:
+        logger.info(
+            f"{kind}_parse cache hit",
+            extra={"doc_filename": filename, "cache_key": cache_key},
+        )
+        return cached
+    with llm_throttle.priority_context(llm_throttle.PRIORITY_INTERACTIVE, uuid.uuid4().hex):
+        result = await _run_with_timeout(parser, content, filename, f"{kind}_parse")
+    await parse_cache.store_response(cache_key, result)
+    return result
+
+
 def _log_done(kind: str, filename: str, result: BaseModel) -> None:
     data = result.model_dump()
     logger.info(
@@ -261,7 +292,9 @@ async def parse_spec(
     progress = _build_progress_emitter(x_job_id)
     parser = SpecParser(provider, progress=progress)
     try:
-        result = await _run_with_timeout(parser, content, filename, "spec_parse")
+        result = await _run_cached(
+            "spec", SpecParseResponse, parser, provider, content, filename
+        )
     finally:
         # E18-1: provider per-request — закрываем httpx pool после ответа.
         await provider.aclose()
@@ -280,7 +313,9 @@ async def parse_invoice(
     _archive_pdf(content, filename)
     parser = InvoiceParser(provider)
     try:
-        result = await _run_with_timeout(parser, content, filename, "invoice_parse")
+        result = await _run_cached(
+            "invoice", InvoiceParseResponse, parser, provider, content, filename
+        )
     finally:
         await provider.aclose()
     assert isinstance(result, InvoiceParseResponse)
@@ -298,7 +333,9 @@ async def parse_quote(
     _archive_pdf(content, filename)
     parser = QuoteParser(provider)
     try:
-        result = await _run_with_timeout(parser, content, filename, "quote_parse")
+        result = await _run_cached(
+            "quote", QuoteParseResponse, parser, provider, content, filename
+        )
     finally:
         await provider.aclose()
     assert isinstance(result, QuoteParseResponse)
@@ -317,6 +354,14 @@ async def parse_quote(
 #               + llm_costs (заполняется E18 позже; пока пусто).
 # - failed:     исключение в парсинге; payload — {error, code}.
 # - cancelled:  получен сигнал отмены через /v1/parse/spec/cancel/{job_id}.
+#
+# Stream-режим (header `X-Stream-Pages: true`): page_done несёт монотонный
+# `seq`, items страницы — в форме SpecItem, backend вставляет их сразу.
+# После парсинга страницы, чей финальный состав отличается от отправленного
+# (cross-page merge, multimodal retry, section из Phase 5) или чей page_done не
+# доставлен, переотправляются page_done с новым seq — он заменяет страницу
+# целиком. finished приходит без items: `items_streamed=true` +
+# `page_seqs` {page: последний seq} для сверки на стороне backend'а.
 
 class _AsyncAcceptedResponse(BaseModel):
     status: str
@@ -338,6 +383,7 @@ async def parse_spec_async(
     x_callback_url: str = Header(..., alias="X-Callback-URL"),
     x_job_id: str = Header("", alias="X-Job-Id"),
     x_callback_token: str = Header("", alias="X-Callback-Token"),
+    x_stream_pages: bool = Header(False, alias="X-Stream-Pages"),
     _auth: None = Depends(verify_api_key),
     provider: BaseLLMProvider = Depends(get_provider),
 ) -> _AsyncAcceptedResponse:
@@ -354,6 +400,8 @@ async def parse_spec_async(
       генерит uuid4. Возвращается клиенту в ответе.
     - X-Callback-Token: shared-secret который кладётся в каждый callback
       как `X-Callback-Token` header (опционально).
+    - X-Stream-Pages: true — stream-режим: items только в page_done (с seq),
+      finished без items (см. протокол выше).
 
     E18 интеграция (X-LLM-* override) — отложена до E18-1; здесь используем
     singleton provider из app.state как и sync endpoint.
@@ -371,6 +419,16 @@ async def parse_spec_async(
             "callback_url": x_callback_url,
         },
     )
+    # Durable checkpoint: после рестарта job продолжится (resume_interrupted_jobs).
+    await job_store.create(
+        job_id,
+        content,
+        filename=filename,
+        callback_url=x_callback_url,
+        callback_token=x_callback_token,
+        stream_pages=x_stream_pages,
+        llm_headers=llm_headers(request),
+    )
 
     task = asyncio.create_task(
         _run_async_spec_job(
@@ -380,6 +438,7 @@ async def parse_spec_async(
             callback_url=x_callback_url,
             callback_token=x_callback_token,
             provider=provider,
+            stream_pages=x_stream_pages,
         )
     )
     await job_registry.register(job_id, task)
@@ -417,6 +476,25 @@ def _make_callback_client() -> httpx.AsyncClient:
     return httpx.AsyncClient(timeout=settings.async_callback_timeout)
 
 
+def _page_digest(items: list[dict]) -> str:
+    """Digest состава страницы без sort_order/page_number (их назначает
+    backend / знает из `page`) — для сверки streamed vs финал."""
+    rows = [
+        SpecItem.model_validate(it).model_dump(exclude={"sort_order", "page_number"})
+        for it in items
+    ]
+    return hashlib.sha256(
+        json.dumps(rows, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def _items_by_page(result: SpecParseResponse) -> dict[int, list[dict]]:
+    pages: dict[int, list[dict]] = {}
+    for it in result.items:
+        pages.setdefault(it.page_number, []).append(it.model_dump())
+    return pages
+
+
 async def _run_async_spec_job(
     *,
     job_id: str,
@@ -425,20 +503,38 @@ async def _run_async_spec_job(
     callback_url: str,
     callback_token: str,
     provider: BaseLLMProvider,
+    stream_pages: bool = False,
+    resumed: bool = False,
 ) -> None:
-    """Background-обёртка над SpecParser. Шлёт callbacks по progress + final."""
+    """Background-обёртка над SpecParser. Шлёт callbacks по progress + final.
+
+    `resumed=True` — продолжение job'а из job_store после рестарта: started
+    не шлём повторно, seq продолжается, страницы с тем же составом, что уже
+    доставлены, не переотправляются.
+    """
     progress = _build_progress_emitter(job_id)
     parser = SpecParser(provider, progress=progress)
     partial_count = 0
-
-    async def send_callback(event: str, payload: dict[str, Any]) -> None:
+    # Stream-режим: seq последнего page_done и digest доставленного состава
+    # по страницам (только digest — items страницы в памяти не держим).
+    seq = 0
+    page_seqs: dict[int, int] = {}
+    delivered: dict[int, str] = {}
+    if resumed:
+        for page, stored in (await job_store.pages(job_id)).items():
+            page_seqs[page] = stored.seq
+            delivered[page] = stored.digest
+        seq = max(page_seqs.values(), default=0)
+
+    async def send_callback(event: str, payload: dict[str, Any]) -> bool:
         body = {"job_id": job_id, "event": event, **payload}
         headers = {"Content-Type": "application/json"}
         if callback_token:
             headers["X-Callback-Token"] = callback_token
         try:
             async with _make_callback_client() as client:
-                await client.post(callback_url, headers=headers, json=body)
+                resp = await client.post(callback_url, headers=headers, json=body)
+            return resp.is_success
         except Exception as e:
             # ТЗ: НЕ ретраим callbacks — backend получит timeout/connection-
             # reset на свои health-check'и через polling и переведёт job в
@@ -452,18 +548,60 @@ async def _run_async_spec_job(
                     "error": str(e),
                 },
             )
+            return False
+
+    async def send_page(page_1based: int, items: list[dict]) -> None:
+        nonlocal seq
+        seq += 1
+        page_seqs[page_1based] = seq
+        payload = {
+            "page": page_1based,
+            "seq": seq,
+            "items": items,
+            "partial_count": partial_count,
+        }
+        # digest считаем до await: callbacks одной страницы могут
+        # пересечься, актуален последний seq.
+        digest = _page_digest(items)
+        delivered.pop(page_1based, None)
+        if await send_callback("page_done", payload) and page_seqs[page_1based] == payload["seq"]:
+            delivered[page_1based] = digest
+            await job_store.record_page(job_id, page_1based, payload["seq"], digest, items)
 
     async def on_page_done(page_1based: int, items: list[dict]) -> None:
         nonlocal partial_count
         partial_count += len(items)
-        await send_callback(
+        digest = _page_digest(items)
+        if delivered.get(page_1based) == digest:
+            return  # resume: страница уже доставлена до рестарта
+        if stream_pages:
+            await send_page(page_1based, items)
+            return
+        delivered[page_1based] = digest
+        if await send_callback(
             "page_done",
             {
                 "page": page_1based,
                 "items": items,
                 "partial_count": partial_count,
             },
-        )
+        ):
+            await job_store.record_page(job_id, page_1based, 0, digest, items)
+
+    async def reconcile_pages(result: SpecParseResponse) -> None:
+        """Досылает страницы, чей финальный состав ≠ доставленному."""
+        nonlocal partial_count
+        final_pages = _items_by_page(result)
+        partial_count = len(result.items)
+        for page in sorted(final_pages):
+            items = final_pages[page]
+            if delivered.get(page) != _page_digest(items):
+                await send_page(page, items)
+        # Страница была отправлена, но в финале её items ушли (merge в
+        # предыдущую) — пустой page_done снимает её на backend'е.
+        for page in sorted(set(page_seqs) - set(final_pages)):
+            if delivered.get(page) != _page_digest([]):
+                await send_page(page, [])
 
     try:
         # TD-07: посчитать pages_total ДО парсинга и передать в started callback.
@@ -479,29 +617,53 @@ async def _run_async_spec_job(
             # просто отправим started без total (фолбэк на «?»).
             pages_total = 0
 
-        await send_callback(
-            "started",
-            {"filename": filename, "pages_total": pages_total},
-        )
-        result = await parser.parse(
-            pdf_bytes,
-            filename=filename,
-            on_page_done=on_page_done,
-        )
+        if not resumed:
+            await send_callback(
+                "started",
+                {"filename": filename, "pages_total": pages_total},
+            )
+        # Cache hit → сразу finished (page_done не шлём: backend берёт
+        # финальный snapshot items из finished; в stream-режиме страницы
+        # дошлёт reconcile_pages).
+        cache_key = parse_cache.document_key("spec", pdf_bytes, provider)
+        cached = await parse_cache.load_response(cache_key, SpecParseResponse)
+        if cached is not None:
+            logger.info(
+                "spec_parse_async cache hit",
+                extra={"job_id": job_id, "cache_key": cache_key},
+            )
+            result = cached
+        else:
+            with (
+                llm_throttle.priority_context(llm_throttle.PRIORITY_BULK, job_id),
+                job_store.checkpoint_context(job_id),
+            ):
+                result = await parser.parse(
+                    pdf_bytes,
+                    filename=filename,
+                    on_page_done=on_page_done,
+                )
+            await parse_cache.store_response(cache_key, result)
         # E18-1: llm_costs построены в SpecParser._finalize по
         # provider.usage_log. Backend (E19 RecognitionJob.llm_costs JSONB)
         # сохраняет payload как есть.
-        await send_callback(
-            "finished",
-            {
-                "status": result.status,
-                "items": [it.model_dump() for it in result.items],
-                "pages_stats": result.pages_stats.model_dump(),
-                "pages_summary": [p.model_dump() for p in result.pages_summary],
-                "errors": result.errors,
-                "llm_costs": result.llm_costs.model_dump(),
-            },
-        )
+        finished: dict[str, Any] = {
+            "status": result.status,
+            "pages_stats": result.pages_stats.model_dump(),
+            "pages_summary": [p.model_dump() for p in result.pages_summary],
+            "errors": result.errors,
+            "llm_costs": result.llm_costs.model_dump(),
+        }
+        if stream_pages:
+            await reconcile_pages(result)
+            finished["items"] = []
+            finished["items_streamed"] = True
+            finished["items_count"] = len(result.items)
+            finished["page_seqs"] = {str(p): s for p, s in page_seqs.items()}
+        else:
+            finished["items"] = [it.model_dump() for it in result.items]
+        await send_callback("finished", finished)
+        await job_store.finish(job_id)
         logger.info(
             "spec_parse_async finished",
             extra={
@@ -511,8 +673,14 @@ async def _run_async_spec_job(
             },
         )
     except asyncio.CancelledError:
+        if job_store.get_store() is not None and not job_registry.cancel_requested(job_id):
+            # Shutdown процесса, а не отмена пользователем — job остаётся в
+            # store и продолжится на следующем старте.
+            logger.info("spec_parse_async interrupted, will resume", extra={"job_id": job_id})
+            raise
         logger.info("spec_parse_async cancelled", extra={"job_id": job_id})
         await send_callback("cancelled", {})
+        await job_store.finish(job_id)
         raise
     except LLMUnavailableError as e:
         logger.warning(
@@ -523,6 +691,7 @@ async def _run_async_spec_job(
             "failed",
             {"error": str(e), "code": "llm_unavailable"},
         )
+        await job_store.finish(job_id)
     except Exception as e:
         logger.exception(
             "spec_parse_async failed", extra={"job_id": job_id}
@@ -531,6 +700,7 @@ async def _run_async_spec_job(
             "failed",
             {"error": str(e), "code": "internal_error"},
         )
+        await job_store.finish(job_id)
     finally:
         # E18-1: provider per-request — фоновая задача владеет lifecycle.
         try:
@@ -538,3 +708,111 @@ async def _run_async_spec_job(
         except Exception:  # pragma: no cover — defensive
             pass
         await job_registry.cleanup(job_id)
+
+
+async def _refetch_llm_headers(job: job_store.StoredJob) -> dict[str, str] | None:
+    """X-LLM-* headers job'а заново от backend'а (callback `llm_headers`).
+
+    Секреты (X-LLM-API-Key) в job_store не пишутся — backend строит headers
+    из LLM-профиля job'а. None — backend недоступен или не отдал headers.
+    """
+    headers = {"Content-Type": "application/json"}
+    if job.callback_token:
+        headers["X-Callback-Token"] = job.callback_token
+    try:
+        async with _make_callback_client() as client:
+            resp = await client.post(
+                job.callback_url,
+                headers=headers,
+                json={"job_id": job.job_id, "event": "llm_headers"},
+            )
+        llm_headers = resp.json().get("llm_headers") if resp.is_success else None
+    except Exception as e:
+        logger.warning(
+            "callback failed",
+            extra={"job_id": job.job_id, "event": "llm_headers", "error": str(e)},
+        )
+        return None
+    if not isinstance(llm_headers, dict):
+        return None
+    return {str(k).lower(): str(v) for k, v in llm_headers.items()}
+
+
+async def resume_interrupted_jobs() -> int:
+    """Старт процесса: продолжить async jobs, прерванные рестартом.
+
+    Job, исчерпавший `job_resume_max_attempts` (падает сам процесс на нём),
+    потерявший PDF или не получивший у backend'а снятые секреты LLM
+    (`_refetch_llm_headers`), завершается `failed` callback'ом. Возвращает
+    число продолженных job'ов.
+    """
+    resumed = 0
+    for job in await job_store.running_jobs():
+        error = "job interrupted by restart and cannot be resumed"
+        pdf_bytes = None
+        llm_headers: dict[str, str] | None = job.llm_headers
+        if job.resumes < settings.job_resume_max_attempts:
+            if job.secrets_stripped:
+                fetched = await _refetch_llm_headers(job)
+                if fetched is None:
+                    error = "job interrupted by restart: LLM credentials could not be re-fetched"
+                    llm_headers = None
+                else:
+                    llm_headers = {**job.llm_headers, **fetched}
+            if llm_headers is not None:
+                try:
+                    pdf_bytes = await run_in_threadpool(Path(job.pdf_path).read_bytes)
+                except OSError:
+                    pdf_bytes = None
+        if pdf_bytes is None or llm_headers is None:
+            logger.warning(
+                "spec_parse_async resume abandoned",
+                extra={
+                    "job_id": job.job_id,
+                    "resumes": job.resumes,
+                    "secrets_stripped": job.secrets_stripped,
+                },
+            )
+            headers = {"Content-Type": "application/json"}
+            if job.callback_token:
+                headers["X-Callback-Token"] = job.callback_token
+            try:
+                async with _make_callback_client() as client:
+                    await client.post(
+                        job.callback_url,
+                        headers=headers,
+                        json={
+                            "job_id": job.job_id,
+                            "event": "failed",
+                            "error": error,
+                            "code": "internal_error",
+                        },
+                    )
+            except Exception as e:
+                logger.warning(
+                    "callback failed",
+                    extra={"job_id": job.job_id, "event": "failed", "error": str(e)},
+                )
+            await job_store.finish(job.job_id)
+            continue
+
+        await job_store.mark_resumed(job.job_id)
+        logger.info(
+            "spec_parse_async resumed",
+            extra={"job_id": job.job_id, "resumes": job.resumes + 1},
+        )
+        task = asyncio.create_task(
+            _run_async_spec_job(
+                job_id=job.job_id,
+                pdf_bytes=pdf_bytes,
+                filename=job.filename,
+                callback_url=job.callback_url,
+                callback_token=job.callback_token,
+                provider=provider_from_headers(llm_headers),
+                stream_pages=job.stream_pages,
+                resumed=True,
+            )
+        )
+        await job_registry.register(job.job_id, task)
+        resumed += 1
+    return resumed
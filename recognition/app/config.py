@@ -35,12 +35,23 @@ class Settings(BaseSettings):
     # быстрого rollback в случае проблем).
     llm_normalize_enabled: bool = True
     llm_normalize_max_tokens: int = 6000  # достаточно для ~30 items/стр в JSON
+    # Пакетная нормализация: соседние страницы с rows уходят одним запросом
+    # (instructions-блок и легенда колонок не повторяются на каждую
+    # разреженную страницу). Пакет ограничен оценкой токенов ВХОДА, суммой
+    # rows (ответ должен влезть в llm_normalize_max_tokens) и числом
+    # страниц. llm_normalize_batch_tokens=0 — по странице на запрос.
+    llm_normalize_batch_tokens: int = 3000
+    llm_normalize_batch_max_rows: int = 24
+    llm_normalize_batch_max_pages: int = 8
     # TD-17: IBM Docling extract path (97.9% cell accuracy, Apache 2.0).
     # При flag=true PDF идёт через DocumentConverter, table cells → TableRow
     # via adapter. При pdf_docling_bypass_llm=true normalize_via_llm
     # пропускается полностью (pure path, без LLM costs/noise).
     pdf_extract_via_docling: bool = False
     pdf_docling_bypass_llm: bool = False
+    # Прогретые DocumentConverter'ы (docling_pool) живут в отдельном
+    # worker-процессе; false — в процессе сервиса (dev / тесты).
+    pdf_docling_worker_process: bool = True
     # TD-17a: Synthetic header injection. Перед page-by-page split копируем
     # верхнюю часть page 0 (header_height_pt в pt) поверх каждой continuation
     # page. Каждая страница расширяется на header_height_pt и оригинальный
@@ -106,10 +117,33 @@ class Settings(BaseSettings):
     # без global cap получаем 2 × 6 = 12 одновременных calls и упираемся в
     # rate-limit DeepSeek/OpenAI. 4 — безопасный default, поднимаем через .env.
     llm_global_concurrency: int = 4
+    # Weighted fair queue поверх global cap (llm_throttle): при конкуренции
+    # sync-запросы (invoice/quote/spec) получают N слотов на 1 слот async
+    # spec job'а — мелкий интерактивный парс не ждёт 200-страничный bulk.
+    llm_interactive_weight: int = 8
     # E19-1: timeout на POST callback'а recognition → backend. Recognition не
     # ретраит: если backend упал — лог warning, parse продолжается.
     async_callback_timeout: float = 10.0
+    # Per-page text-layer extraction (column-aware Phase 1 и TD-17 hybrid
+    # fallback) в ProcessPoolExecutor — span-bucketing держит GIL, threadpool
+    # не параллелит. 0 = os.cpu_count(), 1 = in-process без пула. Документы
+    # короче parallel_min_pages идут in-process (pickling bytes дороже).
+    pdf_extract_workers: int = 0
+    pdf_extract_parallel_min_pages: int = 4
     dpi: int = 200
+    # Рендер страниц для Vision/multimodal (services/pdf_render.py). Adaptive
+    # DPI: самый мелкий шрифт text layer'а ≈ render_target_font_px пикселей
+    # (ЕСКД-штамп 8pt → полный dpi), но не ниже render_min_dpi; сканы — dpi.
+    # Длинная сторона ≤ render_max_side_px (0 — без лимита). Формат png|jpeg|webp
+    # применяется, если провайдер его принимает; иначе png. Кэш рендеров —
+    # per-document LRU, лимит в МБ (0 — выключен).
+    render_adaptive_dpi: bool = True
+    render_min_dpi: int = 150
+    render_target_font_px: int = 22
+    render_max_side_px: int = 4096
+    render_image_format: str = "png"
+    render_image_quality: int = 85
+    render_cache_max_mb: int = 64
     max_page_retries: int = 2
     port: int = 8003
     # F8-01: путь внутри контейнера, в который копируется каждый загруженный
@@ -117,6 +151,16 @@ class Settings(BaseSettings):
     # как volume `./storage/ismeta-uploads:/uploads:rw`, чтобы держать архив
     # принятых документов отдельно от стейтлесс-сервиса.
     pdf_storage_path: str = ""
+    # Content-addressed кэш результатов /v1/parse/* и per-page LLM-нормализации
+    # (services/parse_cache.py). "" — выключен. Disk LRU, лимит в МБ.
+    parse_cache_dir: str = ""
+    parse_cache_max_mb: int = 1024
+    # Durable store async spec job'ов (services/job_store.py): SQLite-файл,
+    # рядом каталог job_pdfs/. "" — выключен (in-memory, как до него). Running
+    # jobs после рестарта продолжаются с checkpoint'а; job, пережавший больше
+    # job_resume_max_attempts рестартов, завершается failed.
+    job_store_path: str = ""
+    job_resume_max_attempts: int = 3
     # F8-Sprint4: live-progress writer в Redis. Recognition emit'ит state
     # `recognition:progress:<job_id>` с TTL=progress_ttl_seconds после каждой
     # фазы парсинга. Backend /progress endpoint мерджит БД + Redis live state.
@@ -26,17 +26,22 @@ Master spec: ismeta/specs/16-llm-profiles.md.
 
 from __future__ import annotations
 
+from collections.abc import Mapping
+
 from fastapi import Request
+from starlette.datastructures import Headers
 
 from .config import settings
 from .providers.base import BaseLLMProvider
 from .providers.openai_vision import OpenAIVisionProvider
 
+LLM_HEADER_PREFIX = "x-llm-"
+
 
-def _bool_header(request: Request, header: str, default: bool) -> bool:
+def _bool_header(headers: Mapping[str, str], header: str, default: bool) -> bool:
     """Парсер boolean-header'а: "true"/"1" → True, "false"/"0" → False,
     отсутствие/мусор → default. Регистронезависимо."""
-    raw = request.headers.get(header)
+    raw = headers.get(header)
     if raw is None:
         return default
     val = raw.strip().lower()
@@ -55,24 +60,37 @@ def get_provider(request: Request) -> BaseLLMProvider:
     `await provider.aclose()` после использования (httpx.AsyncClient
     держит TCP/TLS соединения).
     """
-    base_url = request.headers.get("X-LLM-Base-URL") or settings.openai_api_base
-    api_key = request.headers.get("X-LLM-API-Key") or settings.llm_api_key
+    return provider_from_headers(request.headers)
+
+
+def llm_headers(request: Request) -> dict[str, str]:
+    """X-LLM-* headers запроса — для resume в job_store (секреты он не пишет)."""
+    return {
+        k: v for k, v in request.headers.items() if k.lower().startswith(LLM_HEADER_PREFIX)
+    }
+
+
+def provider_from_headers(raw_headers: Mapping[str, str]) -> BaseLLMProvider:
+    """Провайдер по X-LLM-* headers (запрос или сохранённые в job_store)."""
+    headers = Headers(headers=dict(raw_headers))
+    base_url = headers.get("X-LLM-Base-URL") or settings.openai_api_base
+    api_key = headers.get("X-LLM-API-Key") or settings.llm_api_key
     extract_model = (
-        request.headers.get("X-LLM-Extract-Model") or settings.llm_extract_model
+        headers.get("X-LLM-Extract-Model") or settings.llm_extract_model
     )
     multimodal_model = (
-        request.headers.get("X-LLM-Multimodal-Model") or settings.llm_multimodal_model
+        headers.get("X-LLM-Multimodal-Model") or settings.llm_multimodal_model
     )
     classify_model = (
-        request.headers.get("X-LLM-Classify-Model") or settings.llm_classify_model
+        headers.get("X-LLM-Classify-Model") or settings.llm_classify_model
     )
     vision_counter = _bool_header(
-        request,
+        headers,
         "X-LLM-Vision-Counter-Enabled",
         settings.llm_vision_counter_enabled,
     )
     multimodal_retry = _bool_header(
-        request,
+        headers,
         "X-LLM-Multimodal-Retry-Enabled",
         settings.llm_multimodal_retry_enabled,
     )
@@ -7,10 +7,14 @@ from fastapi import FastAPI
 
 from .api.errors import register_error_handlers
 from .api.health import router as health_router
+from .api.parse import resume_interrupted_jobs
 from .api.parse import router as parse_router
 from .config import settings
 from .logging_setup import configure_logging
 from .middleware import request_id_middleware
+from .services import docling_pool
+from .services.job_store import close_store as close_job_store
+from .services.page_extract import shutdown_pool as shutdown_page_extract_pool
 
 
 @asynccontextmanager
@@ -20,7 +24,15 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     # `app.deps.get_provider`. Прогрев connection pool потерян (как и сам pool
     # между запросами); компромисс ради override через X-LLM-* headers.
     app.state.provider_name = f"openai-{settings.llm_model}"
+    # Async jobs, прерванные прошлым рестартом, продолжаются из job_store.
+    await resume_interrupted_jobs()
+    # TD-17: модели Docling грузятся в фоне сразу, а не на первом документе.
+    if settings.pdf_extract_via_docling:
+        docling_pool.start_warmup()
     yield
+    shutdown_page_extract_pool()
+    docling_pool.shutdown_pool()
+    close_job_store()
 
 
 app = FastAPI(
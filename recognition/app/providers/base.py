@@ -3,6 +3,8 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 
+from ..services.pdf_render import resolve_image_format
+
 
 @dataclass
 class TextCompletion:
@@ -42,6 +44,10 @@ class UsageEntry:
 
 
 class BaseLLMProvider(ABC):
+    # Форматы картинок, которые провайдер принимает в vision/multimodal
+    # (см. services/pdf_render). По умолчанию только PNG.
+    image_formats: tuple[str, ...] = ("png",)
+
     def __init__(self) -> None:
         # E18-1: usage_log — list of UsageEntry, per-request lifecycle.
         # Provider создаётся в `app/deps.get_provider` per-request, поэтому
@@ -66,6 +72,11 @@ class BaseLLMProvider(ABC):
             )
         )
 
+    @property
+    def image_format(self) -> str:
+        """Формат рендера страниц для этого провайдера."""
+        return resolve_image_format(self.image_formats)
+
     @abstractmethod
     async def vision_complete(self, image_b64: str, prompt: str) -> str:
         """Send image + prompt to LLM Vision, return text response."""
@@ -23,6 +23,8 @@ import httpx
 
 from ..api.errors import LLMUnavailableError
 from ..config import settings
+from ..services import job_store, llm_throttle
+from ..services.pdf_render import image_mime_type
 from .base import BaseLLMProvider, TextCompletion
 
 logger = logging.getLogger(__name__)
@@ -96,6 +98,8 @@ def _apply_thinking_mode(payload: dict) -> None:
 
 
 class OpenAIVisionProvider(BaseLLMProvider):
+    image_formats = ("png", "jpeg", "webp")
+
     def __init__(
         self,
         api_key: str | None = None,
@@ -257,7 +261,7 @@ class OpenAIVisionProvider(BaseLLMProvider):
                         {"type": "text", "text": prompt},
                         {
                             "type": "image_url",
-                            "image_url": {"url": f"data:image/png;base64,{image_b64}"},
+                            "image_url": {"url": f"data:{image_mime_type(image_b64)};base64,{image_b64}"},
                         },
                     ],
                 }
@@ -310,7 +314,7 @@ class OpenAIVisionProvider(BaseLLMProvider):
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{image_b64}",
+                            "url": f"data:{image_mime_type(image_b64)};base64,{image_b64}",
                             "detail": "high",
                         },
                     },
@@ -354,16 +358,21 @@ class OpenAIVisionProvider(BaseLLMProvider):
         недостаточно для OpenAI minute-window 429. Теперь 6 attempts с
         respect Retry-After header + exponential base 3s (3/9/27s max).
 
-        E19-1: каждый исходящий HTTP-call гейтится глобальным семафором
-        (`llm_throttle.get_global_semaphore`). Это process-level cap на
-        суммарные concurrent calls по ВСЕМ running async-job'ам — поверх
-        per-job `llm_max_concurrency`.
-        """
-        from ..services.llm_throttle import get_global_semaphore
+        E19-1: каждый исходящий HTTP-call гейтится глобальным слотом
+        (`llm_throttle.slot`) — process-level cap на суммарные concurrent
+        calls по ВСЕМ running job'ам поверх per-job `llm_max_concurrency`;
+        очередь — weighted fair по классу приоритета и owner'у.
 
-        sema = await get_global_semaphore()
-        async with sema:
-            return await self._post_with_retry_unguarded(payload)
+        Внутри async job'а с job_store — ответ берётся из checkpoint'а (resume
+        после рестарта) либо сохраняется в него.
+        """
+        cached = await job_store.load_llm_response(payload)
+        if cached is not None:
+            return cached
+        async with llm_throttle.slot():
+            data = await self._post_with_retry_unguarded(payload)
+        await job_store.save_llm_response(payload, data)
+        return data
 
     async def _post_with_retry_unguarded(self, payload: dict) -> dict:
         headers = {
@@ -392,8 +401,14 @@ class OpenAIVisionProvider(BaseLLMProvider):
                 last_exc = httpx.HTTPStatusError(
                     f"status {resp.status_code}", request=resp.request, response=resp
                 )
+                # 429 + Retry-After: окно rate-limit'а общее для всех job'ов —
+                # throttle перестаёт выдавать слоты, retry ждёт конца окна.
+                if resp.status_code == 429 and resp.headers.get("Retry-After"):
+                    llm_throttle.note_rate_limited(
+                        _parse_retry_after(resp.headers.get("Retry-After"))
+                    )
                 if attempt < 2:
-                    await asyncio.sleep(2 ** attempt)
+                    await asyncio.sleep(max(2 ** attempt, llm_throttle.cooldown_remaining()))
                     continue
                 retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
                 raise LLMUnavailableError(
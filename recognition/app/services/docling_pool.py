@@ -0,0 +1,209 @@
+"""Пул прогретых Docling DocumentConverter'ов (TD-17).
+
+Сборка `DocumentConverter` с TableFormer ACCURATE + DocLayNet и загрузка
+весов занимают десятки секунд — раньше это происходило на каждый документ.
+Здесь converter'ы (text и forced-OCR для сканов) создаются один раз на
+процесс и переиспользуются; на документ остаётся только inference.
+
+Конвертация идёт в выделенном worker-процессе (spawn, max_workers=1):
+PyTorch-inference держит GIL и CPU, event loop сервиса не страдает.
+Worker прогревается на старте сервиса (`start_warmup` из lifespan при
+`pdf_extract_via_docling`) или при первом документе. Время прогрева —
+в /v1/healthz (`snapshot`).
+
+Модуль импортируется в worker'е (spawn) — docling тянем лениво.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+from ..config import settings
+from .pdf_text import TableRow, docling_tables
+
+logger = logging.getLogger(__name__)
+
+ColumnRanges = dict[str, tuple[float, float]]
+
+# Converter'ы текущего процесса (worker'а или сервиса): ocr → converter.
+_CONVERTERS: dict[bool, Any] = {}
+_WARMUP_SECONDS: dict[str, float] = {}
+_CONVERTERS_LOCK = threading.Lock()
+# Один converter не рассчитан на параллельные convert() — in-process путь
+# сериализуем; в worker'е max_workers=1 и так даёт по одному документу.
+_CONVERT_LOCK = threading.Lock()
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+# Состояние прогрева для healthz (в процессе сервиса).
+_STATUS: dict[str, Any] = {"state": "cold", "warmup_seconds": {}, "error": ""}
+_STATUS_LOCK = threading.Lock()
+
+
+def build_converter(ocr: bool) -> Any:
+    """DocumentConverter для PDF: TableFormer ACCURATE, OCR — для сканов."""
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import (
+        PdfPipelineOptions,
+        TableFormerMode,
+        TableStructureOptions,
+    )
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+
+    # TD-17: ACCURATE даёт более точный structure recovery (медленнее но
+    # качественнее). Для ЕСКД-таблиц с многоуровневой нумерацией и тонкими
+    # grid lines accurate mode критичен.
+    pipe_opts = PdfPipelineOptions()
+    pipe_opts.do_table_structure = True
+    pipe_opts.table_structure_options = TableStructureOptions(
+        mode=TableFormerMode.ACCURATE,
+        do_cell_matching=True,
+    )
+    if ocr:
+        # TD-17 Spec-7 fix: force OCR на отсканированных PDF.
+        try:
+            from docling.datamodel.pipeline_options import RapidOcrOptions
+            pipe_opts.do_ocr = True
+            pipe_opts.ocr_options = RapidOcrOptions(
+                force_full_page_ocr=True, lang=["ru"]
+            )
+            pipe_opts.images_scale = 2.0
+        except Exception:
+            pass
+    converter = DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=pipe_opts)
+        }
+    )
+    # Веса грузятся при инициализации pipeline — делаем это сейчас, а не
+    # на первом документе.
+    initialize = getattr(converter, "initialize_pipeline", None)
+    if initialize is not None:
+        initialize(InputFormat.PDF)
+    return converter
+
+
+def get_converter(ocr: bool) -> Any:
+    """Converter процесса (создаётся при первом обращении)."""
+    converter = _CONVERTERS.get(ocr)
+    if converter is not None:
+        return converter
+    with _CONVERTERS_LOCK:
+        if ocr not in _CONVERTERS:
+            started = time.monotonic()
+            _CONVERTERS[ocr] = build_converter(ocr)
+            _WARMUP_SECONDS["ocr" if ocr else "text"] = round(time.monotonic() - started, 2)
+        return _CONVERTERS[ocr]
+
+
+def warmup() -> dict[str, float]:
+    """Построить оба converter'а; {kind: секунды загрузки}."""
+    get_converter(False)
+    get_converter(True)
+    return dict(_WARMUP_SECONDS)
+
+
+def convert_in_process(pdf_bytes: bytes) -> tuple[dict[int, list[TableRow]], ColumnRanges]:
+    """Конвертация converter'ами текущего процесса (тело worker'а)."""
+    with _CONVERT_LOCK:
+        return docling_tables(pdf_bytes, get_converter)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _POOL
+
+
+def shutdown_pool() -> None:
+    """Остановить worker-процесс (lifespan shutdown / тесты)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=True, cancel_futures=True)
+        _POOL = None
+    with _STATUS_LOCK:
+        if settings.pdf_docling_worker_process:
+            _STATUS.update(state="cold", warmup_seconds={}, error="")
+
+
+def _set_status(**kwargs: Any) -> None:
+    with _STATUS_LOCK:
+        _STATUS.update(kwargs)
+
+
+def _on_warmup_done(future: Future) -> None:
+    try:
+        seconds = future.result()
+    except ImportError:
+        _set_status(state="unavailable", error="docling not installed")
+    except Exception as e:
+        logger.warning("docling warmup failed: %s", e)
+        _set_status(state="error", error=str(e))
+    else:
+        logger.info("docling converters warm", extra={"warmup_seconds": seconds})
+        _set_status(state="ready", warmup_seconds=seconds, error="")
+
+
+def start_warmup() -> None:
+    """Прогреть converter'ы в фоне (не блокирует старт сервиса)."""
+    with _STATUS_LOCK:
+        if _STATUS["state"] in ("warming", "ready"):
+            return
+        _STATUS.update(state="warming", error="")
+    if settings.pdf_docling_worker_process:
+        _get_pool().submit(warmup).add_done_callback(_on_warmup_done)
+        return
+    future: Future = Future()
+
+    def _run() -> None:
+        try:
+            future.set_result(warmup())
+        except BaseException as e:  # noqa: BLE001 - состояние уходит в healthz
+            future.set_exception(e)
+
+    future.add_done_callback(_on_warmup_done)
+    threading.Thread(target=_run, name="docling-warmup", daemon=True).start()
+
+
+def convert(pdf_bytes: bytes) -> tuple[dict[int, list[TableRow]], ColumnRanges]:
+    """(rows по страницам, column x-ranges) для PDF.
+
+    Блокирующий вызов — из async-кода через run_in_threadpool. Если
+    worker-процесс упал (OOM на больших сканах), пул пересоздаётся при
+    следующем документе, текущий идёт in-process.
+    """
+    if not settings.pdf_docling_worker_process:
+        start_warmup()
+        return convert_in_process(pdf_bytes)
+    start_warmup()
+    try:
+        return _get_pool().submit(convert_in_process, pdf_bytes).result()
+    except BrokenProcessPool:
+        logger.warning("docling worker died, falling back to in-process conversion")
+        shutdown_pool()
+        return convert_in_process(pdf_bytes)
+
+
+def snapshot() -> dict[str, Any]:
+    """Состояние прогрева для /v1/healthz."""
+    with _STATUS_LOCK:
+        return {
+            "enabled": bool(settings.pdf_extract_via_docling),
+            "worker_process": bool(settings.pdf_docling_worker_process),
+            "state": _STATUS["state"],
+            "warmup_seconds": dict(_STATUS["warmup_seconds"]),
+            "error": _STATUS["error"],
+        }
@@ -219,7 +219,9 @@ class InvoiceParser:
 
         # Pre-render page 1 PNG для возможного multimodal retry.
         try:
-            page_b64 = await run_in_threadpool(render_page_to_b64, doc, 0)
+            page_b64 = await run_in_threadpool(
+                render_page_to_b64, doc, 0, self.provider.image_format
+            )
         except Exception:  # pragma: no cover - defensive
             page_b64 = None
 
@@ -392,7 +394,9 @@ class InvoiceParser:
         phase1: NormalizedInvoicePage,
     ) -> tuple[int, NormalizedInvoicePage | None]:
         try:
-            img_b64 = await run_in_threadpool(render_page_to_b64, doc, page_num)
+            img_b64 = await run_in_threadpool(
+                render_page_to_b64, doc, page_num, self.provider.image_format
+            )
         except Exception as e:  # pragma: no cover
             logger.warning(
                 "invoice multimodal render failed",
@@ -469,7 +473,9 @@ class InvoiceParser:
     ) -> None:
         state = self.state
         try:
-            page_b64 = await run_in_threadpool(render_page_to_b64, doc, page_num)
+            page_b64 = await run_in_threadpool(
+                render_page_to_b64, doc, page_num, self.provider.image_format
+            )
 
             classification = await self._classify_page(page_b64, page_num)
             page_type = classification.get("type")
@@ -4,10 +4,11 @@
 `POST /v1/parse/spec/async` + cancel-endpoint'ом. Synchronous endpoint
 (`/v1/parse/spec`) registry не трогает.
 
-Известный лимит MVP: registry in-memory. При рестарте recognition все
-running jobs теряются (asyncio.Task убивается вместе с loop'ом). Backend
-получит timeout/connection-reset на свои callbacks и переведёт jobs в
-`failed`. Persistence — отдельная задача за пределами E19.
+Registry in-memory: при рестарте recognition Task'и умирают вместе с
+loop'ом. Durable состояние (параметры job'а, доставленные страницы, ответы
+LLM) — в `job_store`; на старте running jobs перезапускаются оттуда.
+`cancel_requested` отличает отмену пользователем (→ `cancelled` callback)
+от отмены Task'а при остановке процесса (job остаётся для resume).
 """
 
 from __future__ import annotations
@@ -18,6 +19,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 _JOBS: dict[str, asyncio.Task[object]] = {}
+_CANCEL_REQUESTED: set[str] = set()
 _LOCK = asyncio.Lock()
 
 
@@ -38,13 +40,19 @@ async def cancel(job_id: str) -> bool:
         if task.done():
             logger.info("cancel: job already done", extra={"job_id": job_id})
             return False
+        _CANCEL_REQUESTED.add(job_id)
         task.cancel()
         return True
 
 
+def cancel_requested(job_id: str) -> bool:
+    return job_id in _CANCEL_REQUESTED
+
+
 async def cleanup(job_id: str) -> None:
     async with _LOCK:
         _JOBS.pop(job_id, None)
+        _CANCEL_REQUESTED.discard(job_id)
 
 
 async def active_count() -> int:
@@ -0,0 +1,322 @@
+"""Durable store async parse job'ов с page-level checkpoint'ами (SQLite).
+
+`job_registry` держит только asyncio.Task — рестарт/деплой recognition
+убивал все running jobs вместе с десятками минут LLM-работы, ISMeta
+перезапускал документ целиком. Здесь (при `job_store_path` ≠ "") каждый
+job пишется в SQLite рядом с копией PDF:
+
+- jobs — параметры запуска (callback URL/token, stream-режим, X-LLM-*
+  headers для пересоздания провайдера), статус, последний seq page_done.
+- pages — доставленные page_done: items страницы, seq, digest.
+- llm_calls — ответ upstream на каждый LLM-запрос job'а, ключ — SHA-256
+  payload'а (`OpenAIVisionProvider._post_with_retry`). Пайплайн
+  детерминирован (seed, temperature=0, одинаковые входы) — при resume
+  парсер идёт заново, но уже выполненные LLM-вызовы отдаются из
+  checkpoint'а без сети и без $, usage пересчитывается из сохранённых ответов.
+
+На старте (`main.lifespan` → `parse.resume_interrupted_jobs`) running jobs
+продолжаются; page_done страниц, уже доставленных backend'у с тем же
+составом, повторно не шлются. Terminal job удаляется из store вместе с PDF.
+
+Секреты LLM (`SECRET_HEADERS`, X-LLM-API-Key) на диск не пишутся — у job'а
+остаётся флаг `secrets_stripped`, и перед resume headers заново запрашиваются
+у backend'а callback'ом `llm_headers` (ISMeta строит их из LLM-профиля job'а).
+Файл содержит callback token — volume должен быть приватным, как и
+`pdf_storage_path`.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+STATUS_RUNNING = "running"
+
+# X-LLM-* headers, которые не сохраняются (starlette отдаёт имена в lower-case).
+SECRET_HEADERS = frozenset({"x-llm-api-key"})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    pdf_path TEXT NOT NULL,
+    callback_url TEXT NOT NULL,
+    callback_token TEXT NOT NULL,
+    stream_pages INTEGER NOT NULL,
+    llm_headers TEXT NOT NULL,
+    secrets_stripped INTEGER NOT NULL DEFAULT 0,
+    last_seq INTEGER NOT NULL DEFAULT 0,
+    resumes INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    job_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    items TEXT NOT NULL,
+    PRIMARY KEY (job_id, page)
+);
+CREATE TABLE IF NOT EXISTS llm_calls (
+    job_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    response TEXT NOT NULL,
+    PRIMARY KEY (job_id, key)
+);
+"""
+
+_checkpoint_job: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "job_store_checkpoint", default=None
+)
+
+
+@dataclass
+class StoredJob:
+    job_id: str
+    filename: str
+    pdf_path: str
+    callback_url: str
+    callback_token: str
+    stream_pages: bool
+    llm_headers: dict[str, str]
+    secrets_stripped: bool
+    last_seq: int
+    resumes: int
+
+
+@dataclass
+class StoredPage:
+    seq: int
+    digest: str
+
+
+class JobStore:
+    """SQLite (WAL) + каталог с PDF. Один connection на процесс под lock'ом —
+    записи мелкие, вызываются из threadpool."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.pdf_dir = path.parent / "job_pdfs"
+        self.pdf_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def create(
+        self,
+        job_id: str,
+        pdf_bytes: bytes,
+        *,
+        filename: str,
+        callback_url: str,
+        callback_token: str,
+        stream_pages: bool,
+        llm_headers: dict[str, str],
+    ) -> None:
+        stored_headers = {
+            k: v for k, v in llm_headers.items() if k.lower() not in SECRET_HEADERS
+        }
+        # Снятые секреты при resume запрашиваются у backend'а заново.
+        secrets_stripped = len(stored_headers) != len(llm_headers)
+        path = self.pdf_dir / f"{hashlib.sha256(job_id.encode()).hexdigest()}.pdf"
+        path.write_bytes(pdf_bytes)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM llm_calls WHERE job_id = ?", (job_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, status, filename, pdf_path, callback_url,"
+                " callback_token, stream_pages, llm_headers, secrets_stripped, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id, STATUS_RUNNING, filename, str(path), callback_url,
+                    callback_token, int(stream_pages), json.dumps(stored_headers),
+                    int(secrets_stripped), now, now,
+                ),
+            )
+
+    def running_jobs(self) -> list[StoredJob]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, filename, pdf_path, callback_url, callback_token,"
+                " stream_pages, llm_headers, secrets_stripped, last_seq, resumes FROM jobs"
+                " WHERE status = ? ORDER BY created_at",
+                (STATUS_RUNNING,),
+            ).fetchall()
+        return [
+            StoredJob(
+                job_id=r[0], filename=r[1], pdf_path=r[2], callback_url=r[3],
+                callback_token=r[4], stream_pages=bool(r[5]),
+                llm_headers=json.loads(r[6]), secrets_stripped=bool(r[7]), last_seq=r[8],
+                resumes=r[9],
+            )
+            for r in rows
+        ]
+
+    def mark_resumed(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET resumes = resumes + 1, updated_at = ? WHERE job_id = ?",
+                (time.time(), job_id),
+            )
+
+    def record_page(self, job_id: str, page: int, seq: int, digest: str, items: list[dict]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (job_id, page, seq, digest, items)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (job_id, page, seq, digest, json.dumps(items, ensure_ascii=False)),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET last_seq = MAX(last_seq, ?), updated_at = ? WHERE job_id = ?",
+                (seq, time.time(), job_id),
+            )
+
+    def pages(self, job_id: str) -> dict[int, StoredPage]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page, seq, digest FROM pages WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return {r[0]: StoredPage(seq=r[1], digest=r[2]) for r in rows}
+
+    def load_llm(self, job_id: str, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_calls WHERE job_id = ? AND key = ?", (job_id, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_llm(self, job_id: str, key: str, response: dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_calls (job_id, key, response) VALUES (?, ?, ?)",
+                (job_id, key, json.dumps(response, ensure_ascii=False)),
+            )
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pdf_path FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM pages WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM llm_calls WHERE job_id = ?", (job_id,))
+        if row and row[0]:
+            Path(row[0]).unlink(missing_ok=True)
+
+
+_store: JobStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> JobStore | None:
+    """Store по текущим settings; None если `job_store_path` пуст."""
+    global _store
+    if not settings.job_store_path:
+        return None
+    path = Path(settings.job_store_path)
+    with _store_lock:
+        if _store is None or _store.path != path:
+            if _store is not None:
+                _store.close()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _store = JobStore(path)
+        return _store
+
+
+def close_store() -> None:
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = None
+
+
+async def _call(method: str, *args: Any, **kwargs: Any) -> Any:
+    """Вызов метода store в threadpool; ошибки диска не валят парсинг."""
+    store = get_store()
+    if store is None:
+        return None
+    try:
+        return await run_in_threadpool(getattr(store, method), *args, **kwargs)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("job_store %s failed", method, extra={"error": str(e)})
+        return None
+
+
+async def create(job_id: str, pdf_bytes: bytes, **kwargs: Any) -> None:
+    await _call("create", job_id, pdf_bytes, **kwargs)
+
+
+async def record_page(job_id: str, page: int, seq: int, digest: str, items: list[dict]) -> None:
+    await _call("record_page", job_id, page, seq, digest, items)
+
+
+async def running_jobs() -> list[StoredJob]:
+    return await _call("running_jobs") or []
+
+
+async def mark_resumed(job_id: str) -> None:
+    await _call("mark_resumed", job_id)
+
+
+async def pages(job_id: str) -> dict[int, StoredPage]:
+    return await _call("pages", job_id) or {}
+
+
+async def finish(job_id: str) -> None:
+    await _call("delete", job_id)
+
+
+@contextmanager
+def checkpoint_context(job_id: str) -> Iterator[None]:
+    """LLM-вызовы внутри блока пишутся в checkpoint job'а / читаются из него."""
+    token = _checkpoint_job.set(job_id)
+    try:
+        yield
+    finally:
+        _checkpoint_job.reset(token)
+
+
+def _payload_key(payload: dict[str, Any]) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode()
+    ).hexdigest()
+
+
+async def load_llm_response(payload: dict[str, Any]) -> dict[str, Any] | None:
+    job_id = _checkpoint_job.get()
+    if job_id is None or get_store() is None:
+        return None
+    return await _call("load_llm", job_id, _payload_key(payload))
+
+
+async def save_llm_response(payload: dict[str, Any], response: dict[str, Any]) -> None:
+    job_id = _checkpoint_job.get()
+    if job_id is None or get_store() is None:
+        return
+    await _call("save_llm", job_id, _payload_key(payload), response)
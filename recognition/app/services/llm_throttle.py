@@ -1,65 +1,269 @@
-"""Process-level LLM concurrency throttle (E19-1).
+"""Process-level LLM concurrency throttle (E19-1) — weighted fair queue.
 
-Один глобальный `asyncio.Semaphore` на ВСЕ одновременные исходящие
-LLM-запросы из recognition. Отличается от `SpecParser`-локального
-семафора (`llm_max_concurrency`) — тот ограничивает параллелизм
-*внутри одного парса*. Глобальный — суммарный потолок по всем
-running async-job'ам.
+Один глобальный пул слотов на ВСЕ одновременные исходящие LLM-запросы из
+recognition. Отличается от `SpecParser`-локального семафора
+(`llm_max_concurrency`) — тот ограничивает параллелизм *внутри одного
+парса*. Глобальный — суммарный потолок по всем running job'ам.
 
-С двумя параллельными jobs без global cap получаем
-2 × `llm_max_concurrency` одновременных calls, что упирается в rate-
-limit OpenAI/DeepSeek даже на tier-1.
+Раньше это был plain `asyncio.Semaphore` (FIFO): 200-страничный async job
+ставил в очередь десятки запросов, и 2-страничный sync invoice ждал их все.
+Теперь слоты раздаёт `FairScheduler`:
 
-Используется в `OpenAIVisionProvider._post_with_retry` — внешний gate
-вокруг каждого исходящего HTTP-call'а к LLM. Перенастройка размера
-бассейна в runtime — через `set_capacity` (тесты).
+- Классы приоритета: `interactive` (sync /v1/parse/{spec,invoice,quote}) и
+  `bulk` (async spec). Между классами — weighted stride scheduling: при
+  конкуренции interactive получает `llm_interactive_weight` слотов на один
+  bulk; bulk не голодает.
+- Внутри класса — round-robin по owner'ам (job_id / id запроса): два bulk
+  job'а делят слоты поровну независимо от глубины очереди каждого.
+- 429 с `Retry-After` (`OpenAIVisionProvider._post_with_retry`) → глобальный
+  cooldown: новые слоты не выдаются до конца окна rate-limit'а.
+
+Класс и owner задаются через `priority_context` (contextvar — наследуется
+задачами `asyncio.gather`/`create_task` внутри парса). Метрики по классам
+(`snapshot`) — на /v1/healthz. Перенастройка ёмкости в runtime —
+`set_capacity` (тесты).
 """
 
 from __future__ import annotations
 
 import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any
 
 from ..config import settings
 
-_LOCK = asyncio.Lock()
-_GLOBAL_SEMA: asyncio.Semaphore | None = None
-_CAPACITY: int = 0
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+
+# Верхняя граница cooldown'а от Retry-After: кривой header не должен
+# заморозить сервис надолго.
+MAX_COOLDOWN_SECONDS = 60.0
+
+_WAIT_WINDOW = 256
+
+_Waiter = tuple[asyncio.Future[None], float]
+
+_priority: contextvars.ContextVar[tuple[str, str]] = contextvars.ContextVar(
+    "llm_priority", default=(PRIORITY_INTERACTIVE, "")
+)
+
+
+@contextmanager
+def priority_context(priority: str, owner: str) -> Iterator[None]:
+    """Все LLM-вызовы внутри блока идут в очередь класса `priority` от `owner`."""
+    token = _priority.set((priority, owner))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass
+class _ClassStats:
+    in_flight: int = 0
+    granted: int = 0
+    wait_max: float = 0.0
+    waits: deque[float] = field(default_factory=lambda: deque(maxlen=_WAIT_WINDOW))
+
+
+class FairScheduler:
+    """Слоты с weighted fair queue по классам и round-robin по owner'ам."""
+
+    def __init__(self, capacity: int, weights: dict[str, int]) -> None:
+        self.capacity = max(1, int(capacity))
+        self._weights = {cls: max(1, int(w)) for cls, w in weights.items()}
+        self._in_flight = 0
+        # class → owner → FIFO (future, время постановки); OrderedDict —
+        # порядок round-robin по owner'ам.
+        self._queues: dict[str, OrderedDict[str, deque[_Waiter]]] = {
+            cls: OrderedDict() for cls in self._weights
+        }
+        self._pass = dict.fromkeys(self._weights, 0.0)
+        self._vtime = 0.0
+        self._stats = {cls: _ClassStats() for cls in self._weights}
+        self._cooldown_until = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+
+    def _waiting(self, cls: str) -> int:
+        return sum(len(q) for q in self._queues[cls].values())
+
+    def _has_waiters(self) -> bool:
+        return any(self._queues[cls] for cls in self._queues)
+
+    def cooldown_remaining(self) -> float:
+        return max(0.0, self._cooldown_until - time.monotonic())
+
+    def _grant(self, cls: str, waited: float) -> None:
+        self._in_flight += 1
+        st = self._stats[cls]
+        st.in_flight += 1
+        st.granted += 1
+        st.waits.append(waited)
+        st.wait_max = max(st.wait_max, waited)
+
+    async def acquire(self, priority: str, owner: str) -> None:
+        cls = priority if priority in self._queues else PRIORITY_INTERACTIVE
+        if (
+            self._in_flight < self.capacity
+            and not self._has_waiters()
+            and not self.cooldown_remaining()
+        ):
+            self._grant(cls, 0.0)
+            return
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future[None] = loop.create_future()
+        queues = self._queues[cls]
+        if not queues:
+            # Класс только что стал активным — не даём ему «накопленный»
+            # приоритет за время простоя.
+            self._pass[cls] = max(self._pass[cls], self._vtime)
+        queues.setdefault(owner, deque()).append((fut, time.monotonic()))
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Слот выдан, но waiter отменён до пробуждения — вернуть.
+                self.release(cls)
+            else:
+                self._discard(cls, owner, fut)
+            raise
+
+    def _discard(self, cls: str, owner: str, fut: asyncio.Future[None]) -> None:
+        queue = self._queues[cls].get(owner)
+        if queue is None:
+            return
+        for waiter in queue:
+            if waiter[0] is fut:
+                queue.remove(waiter)
+                break
+        if not queue:
+            del self._queues[cls][owner]
+
+    def release(self, priority: str) -> None:
+        cls = priority if priority in self._queues else PRIORITY_INTERACTIVE
+        self._in_flight -= 1
+        self._stats[cls].in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.capacity and self._has_waiters():
+            remaining = self.cooldown_remaining()
+            if remaining:
+                if self._timer is None:
+                    loop = asyncio.get_running_loop()
+                    self._timer = loop.call_later(remaining, self._on_cooldown_end)
+                return
+            cls = min(
+                (c for c in self._queues if self._queues[c]),
+                key=lambda c: self._pass[c],
+            )
+            self._vtime = self._pass[cls]
+            self._pass[cls] += 1.0 / self._weights[cls]
+            owners = self._queues[cls]
+            owner, queue = next(iter(owners.items()))
+            fut, enqueued = queue.popleft()
+            if queue:
+                owners.move_to_end(owner)
+            else:
+                del owners[owner]
+            if fut.done():  # waiter отменён, пока стоял в очереди
+                continue
+            self._grant(cls, time.monotonic() - enqueued)
+            fut.set_result(None)
+
+    def _on_cooldown_end(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def note_rate_limited(self, retry_after: float) -> None:
+        """429 от upstream: не выдавать новые слоты `retry_after` секунд."""
+        seconds = min(max(0.0, float(retry_after)), MAX_COOLDOWN_SECONDS)
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        classes: dict[str, Any] = {}
+        for cls, st in self._stats.items():
+            waits = sorted(st.waits)
+            p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+            avg = sum(waits) / len(waits) if waits else 0.0
+            classes[cls] = {
+                "queue_depth": self._waiting(cls),
+                "in_flight": st.in_flight,
+                "granted": st.granted,
+                "wait_avg_ms": round(avg * 1000, 1),
+                "wait_p95_ms": round(p95 * 1000, 1),
+                "wait_max_ms": round(st.wait_max * 1000, 1),
+            }
+        return {
+            "capacity": self.capacity,
+            "in_flight": self._in_flight,
+            "cooldown_seconds": round(self.cooldown_remaining(), 1),
+            "classes": classes,
+        }
+
+
+_SCHEDULER: FairScheduler | None = None
+
+
+def _make_scheduler(capacity: int) -> FairScheduler:
+    return FairScheduler(
+        capacity,
+        {
+            PRIORITY_INTERACTIVE: settings.llm_interactive_weight,
+            PRIORITY_BULK: 1,
+        },
+    )
+
+
+def get_scheduler() -> FairScheduler:
+    """Лениво создаёт scheduler с ёмкостью settings.llm_global_concurrency."""
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        _SCHEDULER = _make_scheduler(int(settings.llm_global_concurrency))
+    return _SCHEDULER
+
+
+@asynccontextmanager
+async def slot() -> AsyncIterator[None]:
+    """Один исходящий LLM-call. Класс/owner — из `priority_context`."""
+    priority, owner = _priority.get()
+    scheduler = get_scheduler()
+    await scheduler.acquire(priority, owner)
+    try:
+        yield
+    finally:
+        scheduler.release(priority)
+
 
+def note_rate_limited(retry_after: float) -> None:
+    get_scheduler().note_rate_limited(retry_after)
 
-def _make_semaphore(capacity: int) -> asyncio.Semaphore:
-    return asyncio.Semaphore(max(1, capacity))
 
+def cooldown_remaining() -> float:
+    return get_scheduler().cooldown_remaining()
 
-async def get_global_semaphore() -> asyncio.Semaphore:
-    """Лениво создаёт глобальный семафор с ёмкостью settings.llm_global_concurrency.
 
-    Создание — внутри running event loop'а, чтобы избежать привязки к
-    "default" loop'у при импорте модуля (в тестах FastAPI каждый
-    TestClient-запрос крутится на своём loop'е).
-    """
-    global _GLOBAL_SEMA, _CAPACITY
-    async with _LOCK:
-        if _GLOBAL_SEMA is None:
-            _CAPACITY = int(settings.llm_global_concurrency)
-            _GLOBAL_SEMA = _make_semaphore(_CAPACITY)
-        return _GLOBAL_SEMA
+def snapshot() -> dict[str, Any]:
+    return get_scheduler().snapshot()
 
 
 async def set_capacity(capacity: int) -> None:
-    """Test-only: пересоздать семафор с новой ёмкостью."""
-    global _GLOBAL_SEMA, _CAPACITY
-    async with _LOCK:
-        _CAPACITY = int(capacity)
-        _GLOBAL_SEMA = _make_semaphore(_CAPACITY)
+    """Test-only: пересоздать scheduler с новой ёмкостью."""
+    global _SCHEDULER
+    _SCHEDULER = _make_scheduler(int(capacity))
 
 
 def get_capacity() -> int:
-    return _CAPACITY
+    return _SCHEDULER.capacity if _SCHEDULER is not None else 0
 
 
 async def reset_for_tests() -> None:
-    """Сбросить состояние между тестами (создание на новом event loop'е)."""
-    global _GLOBAL_SEMA, _CAPACITY
-    async with _LOCK:
-        _GLOBAL_SEMA = None
-        _CAPACITY = 0
+    """Сбросить состояние между тестами (новые futures на новом event loop'е)."""
+    global _SCHEDULER
+    _SCHEDULER = None
@@ -0,0 +1,192 @@
+"""Per-page text-layer extraction в пуле процессов.
+
+`extract_structured_rows`, `extract_with_explicit_columns` и PyMuPDF
+`find_tables` — чистый CPU (span-bucketing, column detection) и держат GIL,
+поэтому `run_in_threadpool` не даёт параллелизма: 60-страничная спецификация
+шла на одном ядре. Здесь страницы делятся на срезы, каждый worker-процесс
+открывает PDF bytes через fitz ОДИН раз и обрабатывает свой срез.
+
+Пул — module-level singleton (spawn, без fork из процесса с потоками
+uvicorn/anyio), создаётся лениво при первом многостраничном документе.
+Маленькие документы (< `pdf_extract_parallel_min_pages`) и
+`pdf_extract_workers=1` идут in-process через threadpool — pickling PDF
+bytes в worker'ы дороже самой экстракции.
+
+Модуль импортируется в worker'ах (spawn) — тяжёлое (spec_parser) тянем лениво.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Literal
+
+import fitz
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from .pdf_text import (
+    TEXT_LAYER_MIN_CHARS_PER_PAGE,
+    TableRow,
+    extract_structured_rows,
+    extract_with_explicit_columns,
+    has_usable_text_layer,
+)
+
+logger = logging.getLogger(__name__)
+
+# "structured" — column-aware путь: только `extract_structured_rows`.
+# "hybrid" — TD-17 fallback для страниц без Docling qty: explicit columns
+# (из Docling page 1) → PyMuPDF find_tables → legacy span-based.
+ExtractMode = Literal["structured", "hybrid"]
+
+ColumnRanges = dict[str, tuple[float, float]]
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_WORKERS: int = 0
+_POOL_LOCK = threading.Lock()
+
+
+@dataclass
+class PageRows:
+    """Результат экстракции одной страницы.
+
+    rows=None — у страницы нет usable text layer (вызывающий код уходит
+    в Vision/skip). error — текст исключения, rows при этом [].
+    """
+
+    rows: list[TableRow] | None
+    error: str = ""
+
+
+def resolve_workers() -> int:
+    """`pdf_extract_workers`: 0 → все ядра, N → N процессов, 1 → без пула."""
+    configured = int(settings.pdf_extract_workers)
+    if configured > 0:
+        return configured
+    return os.cpu_count() or 1
+
+
+def _extract_hybrid(page: fitz.Page, page_no: int, col_ranges: ColumnRanges | None) -> list[TableRow]:
+    # Lazy: spec_parser тянет FastAPI, worker'у он нужен только в hybrid-режиме.
+    from .spec_parser import _extract_rows_via_pymupdf_tables
+
+    rows: list[TableRow] = []
+    if col_ranges:
+        rows = extract_with_explicit_columns(page, col_ranges)
+    if not rows:
+        rows = _extract_rows_via_pymupdf_tables(page, page_no)
+    if not rows:
+        rows = extract_structured_rows(page)
+    return rows
+
+
+def _extract_slice(
+    pdf_bytes: bytes,
+    page_nums: list[int],
+    mode: ExtractMode,
+    col_ranges: ColumnRanges | None,
+    text_check_only: frozenset[int],
+) -> dict[int, PageRows]:
+    """Worker: открыть PDF один раз и извлечь rows для среза страниц (0-based)."""
+    out: dict[int, PageRows] = {}
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        for page_num in page_nums:
+            try:
+                page = doc[page_num]
+                if not has_usable_text_layer(page, min_chars=TEXT_LAYER_MIN_CHARS_PER_PAGE):
+                    out[page_num] = PageRows(rows=None)
+                elif page_num in text_check_only:
+                    out[page_num] = PageRows(rows=[])
+                elif mode == "hybrid":
+                    out[page_num] = PageRows(rows=_extract_hybrid(page, page_num + 1, col_ranges))
+                else:
+                    out[page_num] = PageRows(rows=extract_structured_rows(page))
+            except Exception as e:  # pragma: no cover - защита от fitz-exceptions
+                out[page_num] = PageRows(rows=[], error=str(e))
+    finally:
+        doc.close()
+    return out
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def shutdown_pool() -> None:
+    """Остановить worker-процессы (lifespan shutdown / тесты)."""
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=True, cancel_futures=True)
+        _POOL = None
+        _POOL_WORKERS = 0
+
+
+async def extract_pages(
+    pdf_bytes: bytes,
+    page_nums: list[int],
+    *,
+    mode: ExtractMode = "structured",
+    col_ranges: ColumnRanges | None = None,
+    text_check_only: frozenset[int] = frozenset(),
+) -> dict[int, PageRows]:
+    """Извлечь rows для `page_nums` (0-based) параллельно по процессам.
+
+    text_check_only — страницы, для которых нужна только проверка text layer
+    (rows уже есть из другого источника, например Camelot).
+    """
+    if not page_nums:
+        return {}
+    pool_size = resolve_workers()
+    workers = min(pool_size, len(page_nums))
+    if workers <= 1 or len(page_nums) < settings.pdf_extract_parallel_min_pages:
+        return await run_in_threadpool(
+            _extract_slice, pdf_bytes, page_nums, mode, col_ranges, text_check_only
+        )
+
+    # Round-robin срезы: тяжёлые страницы (плотные таблицы) обычно идут
+    # подряд — чередование выравнивает нагрузку между процессами.
+    slices = [page_nums[i::workers] for i in range(workers)]
+    loop = asyncio.get_running_loop()
+    try:
+        pool = _get_pool(pool_size)
+        parts = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    pool, _extract_slice, pdf_bytes, s, mode, col_ranges, text_check_only
+                )
+                for s in slices
+            )
+        )
+    except BrokenProcessPool:
+        logger.warning(
+            "page_extract pool broken → in-process fallback",
+            extra={"pages": len(page_nums), "workers": workers},
+        )
+        shutdown_pool()
+        return await run_in_threadpool(
+            _extract_slice, pdf_bytes, page_nums, mode, col_ranges, text_check_only
+        )
+
+    merged: dict[int, PageRows] = {}
+    for part in parts:
+        merged.update(part)
+    return merged
@@ -0,0 +1,294 @@
+"""Content-addressed кэш результатов парсинга (disk LRU).
+
+Один и тот же PDF регулярно приходит повторно (ISMeta recognition_jobs,
+ERP invoice recognition) — без кэша каждый раз заново Docling + Camelot + LLM.
+
+Два уровня:
+
+1. Документ: ключ = SHA-256(PDF bytes) + вид парсера + значимые settings +
+   модели/флаги провайдера + fingerprint кода пайплайна. Значение — готовый
+   `SpecParseResponse` / `InvoiceParseResponse` / `QuoteParseResponse`.
+   Кэшируются только чистые результаты (status=done, без errors).
+2. Страница: сырой ответ LLM-нормализации, ключ = модель + system prompt +
+   user input (markdown rows страницы + section/sticky контекст) + параметры
+   сэмплинга. Частично изменённый документ переиспользует неизменные страницы.
+
+Prompt versions: промпты живут inline в модулях services/, поэтому в ключ
+документа идёт fingerprint исходников services/providers/schemas — любая
+правка промпта или логики инвалидирует кэш без ручного bump'а версии.
+
+Хранилище — файлы `<parse_cache_dir>/<namespace>/<kk>/<key>`, запись атомарная
+(tmp + os.replace), LRU по mtime (touch на hit). Eviction — до 90% от
+`parse_cache_max_mb`, проверка амортизирована по объёму записей. Пустой
+`parse_cache_dir` = кэш выключен. Ошибки диска не валят parse — только warning.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from ..config import settings
+from ..schemas.spec import LLMCosts
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_DOCUMENT = "document"
+NAMESPACE_NORMALIZE = "normalize"
+
+# Settings, не влияющие на содержимое результата (секреты, инфраструктура,
+# параллелизм, таймауты — partial-результаты в кэш не попадают).
+_SETTINGS_EXCLUDE = frozenset({
+    "recognition_api_key",
+    "llm_api_key",
+    "openai_api_key",
+    "log_level",
+    "max_file_size_mb",
+    "parse_timeout_seconds",
+    "llm_max_concurrency",
+    "llm_global_concurrency",
+    "llm_interactive_weight",
+    "async_callback_timeout",
+    "port",
+    "pdf_storage_path",
+    "redis_url",
+    "progress_ttl_seconds",
+    "progress_emitter_enabled",
+    "pdf_extract_workers",
+    "pdf_extract_parallel_min_pages",
+    "parse_cache_dir",
+    "parse_cache_max_mb",
+    "job_store_path",
+    "job_resume_max_attempts",
+    "render_cache_max_mb",
+})
+
+_PROVIDER_ATTRS = (
+    "api_base",
+    "model",
+    "extract_model",
+    "multimodal_model",
+    "classify_model",
+    "vision_counter_enabled",
+    "multimodal_retry_enabled",
+)
+
+_FINGERPRINT_DIRS = ("services", "providers", "schemas")
+
+_code_fingerprint: str | None = None
+
+
+def code_fingerprint() -> str:
+    """SHA-256 исходников пайплайна (промпты + логика). Считается один раз."""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        app_dir = Path(__file__).resolve().parent.parent
+        h = hashlib.sha256()
+        for sub in _FINGERPRINT_DIRS:
+            for path in sorted((app_dir / sub).glob("*.py")):
+                h.update(path.name.encode())
+                h.update(path.read_bytes())
+        _code_fingerprint = h.hexdigest()
+    return _code_fingerprint
+
+
+def _provider_fingerprint(provider: object) -> dict[str, Any]:
+    fp: dict[str, Any] = {"type": type(provider).__name__}
+    for attr in _PROVIDER_ATTRS:
+        fp[attr] = getattr(provider, attr, None)
+    return fp
+
+
+def _sha256_json(payload: dict[str, Any]) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode()
+    ).hexdigest()
+
+
+def document_key(kind: str, pdf_bytes: bytes, provider: object) -> str:
+    return _sha256_json({
+        "kind": kind,
+        "pdf_sha256": hashlib.sha256(pdf_bytes).hexdigest(),
+        "settings": settings.model_dump(exclude=set(_SETTINGS_EXCLUDE)),
+        "provider": _provider_fingerprint(provider),
+        "code": code_fingerprint(),
+    })
+
+
+def normalize_key(
+    provider: object, system_prompt: str, user_input: str, max_tokens: int | None
+) -> str:
+    return _sha256_json({
+        "model": getattr(provider, "extract_model", None),
+        "api_base": getattr(provider, "api_base", None),
+        "provider": type(provider).__name__,
+        "system_prompt": hashlib.sha256(system_prompt.encode()).hexdigest(),
+        "user_input": user_input,
+        "max_tokens": max_tokens,
+        "thinking": (settings.llm_thinking_mode, settings.llm_thinking_effort),
+        "sampling": (settings.llm_seed, settings.llm_top_p),
+    })
+
+
+class DiskLRUCache:
+    """Size-bounded LRU поверх файловой системы. Потокобезопасен в процессе;
+    несколько uvicorn-worker'ов на одном volume безопасны за счёт атомарной
+    записи (eviction может удалить чужой файл — это просто miss)."""
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._written_since_check = max_bytes  # первый put → полная проверка
+
+    def _path(self, namespace: str, key: str) -> Path:
+        return self.root / namespace / key[:2] / key
+
+    def get(self, namespace: str, key: str) -> bytes | None:
+        path = self._path(namespace, key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # LRU: hit поднимает mtime
+        except OSError:
+            pass
+        return data
+
+    def put(self, namespace: str, key: str, data: bytes) -> None:
+        path = self._path(namespace, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._written_since_check += len(data)
+            if self._written_since_check < self.max_bytes // 20:
+                return
+            self._written_since_check = 0
+        self.evict()
+
+    def evict(self) -> None:
+        """Удалить самые давние (по mtime) файлы, пока объём > 90% лимита."""
+        entries: list[tuple[float, int, Path]] = []
+        total = 0
+        for path in self.root.glob("*/*/*"):
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        entries.sort(key=lambda e: e[0])
+        removed = 0
+        for _mtime, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        logger.info(
+            "parse_cache evicted",
+            extra={"removed": removed, "size_bytes": total, "max_bytes": self.max_bytes},
+        )
+
+
+_cache: DiskLRUCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> DiskLRUCache | None:
+    """Кэш по текущим settings; None если `parse_cache_dir` пуст."""
+    global _cache
+    if not settings.parse_cache_dir:
+        return None
+    root = Path(settings.parse_cache_dir)
+    max_bytes = int(settings.parse_cache_max_mb) * 1024 * 1024
+    with _cache_lock:
+        if _cache is None or _cache.root != root or _cache.max_bytes != max_bytes:
+            _cache = DiskLRUCache(root, max_bytes)
+        return _cache
+
+
+def _safe_get(namespace: str, key: str) -> bytes | None:
+    cache = get_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(namespace, key)
+    except OSError as e:
+        logger.warning("parse_cache read failed", extra={"namespace": namespace, "error": str(e)})
+        return None
+
+
+def _safe_put(namespace: str, key: str, data: bytes) -> None:
+    cache = get_cache()
+    if cache is None:
+        return
+    try:
+        cache.put(namespace, key, data)
+    except OSError as e:
+        logger.warning("parse_cache write failed", extra={"namespace": namespace, "error": str(e)})
+
+
+async def load_response[ResponseT: BaseModel](
+    key: str, model_cls: type[ResponseT]
+) -> ResponseT | None:
+    """Готовый ответ из кэша. llm_costs обнуляются — этот запрос LLM не вызывал."""
+    if get_cache() is None:
+        return None
+    raw = await run_in_threadpool(_safe_get, NAMESPACE_DOCUMENT, key)
+    if raw is None:
+        return None
+    try:
+        result = model_cls.model_validate_json(raw)
+    except ValueError as e:
+        logger.warning("parse_cache entry invalid", extra={"key": key, "error": str(e)})
+        return None
+    if hasattr(result, "llm_costs"):
+        result.llm_costs = LLMCosts()
+    return result
+
+
+async def store_response(key: str, result: BaseModel) -> None:
+    """Сохранить только чистый результат (done, без errors)."""
+    if get_cache() is None:
+        return
+    if getattr(result, "status", "") != "done" or getattr(result, "errors", None):
+        return
+    await run_in_threadpool(
+        _safe_put, NAMESPACE_DOCUMENT, key, result.model_dump_json().encode()
+    )
+
+
+async def load_normalized(key: str) -> str | None:
+    if get_cache() is None:
+        return None
+    raw = await run_in_threadpool(_safe_get, NAMESPACE_NORMALIZE, key)
+    return raw.decode() if raw is not None else None
+
+
+async def store_normalized(key: str, content: str) -> None:
+    if get_cache() is None:
+        return
+    await run_in_threadpool(_safe_put, NAMESPACE_NORMALIZE, key, content.encode())
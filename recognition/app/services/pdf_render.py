@@ -1,16 +1,192 @@
-"""PDF rendering via PyMuPDF — page → base64 PNG."""
+"""PDF rendering via PyMuPDF — page → base64 image.
+
+Одна и та же страница рендерится несколько раз за парс (classify, extract,
+vision_counter, TD-17g Vision-интервенция, multimodal retry). Поэтому:
+
+- Per-document LRU-кэш (page, dpi, format) → base64, ограничен по памяти
+  (`render_cache_max_mb`). Живёт на самом `fitz.Document` — закрыли документ,
+  кэш ушёл вместе с ним.
+- Adaptive DPI (`render_adaptive_dpi`): DPI подбирается так, чтобы самый мелкий
+  шрифт text layer'а получил ~`render_target_font_px` пикселей по высоте, но не
+  ниже `render_min_dpi` и не выше `settings.dpi`; сканы (без text layer) — полный
+  `settings.dpi`. Длинная сторона ограничена `render_max_side_px` (листы A1/A2).
+- Формат: PNG по умолчанию; JPEG/WebP (`render_image_format`) — только если
+  провайдер их принимает (`BaseLLMProvider.image_formats`). WebP — через
+  Pillow; без него — JPEG.
+"""
+
+from __future__ import annotations
 
 import base64
+import io
+import threading
+from collections import OrderedDict
 
 import fitz
 
 from ..config import settings
+from .pdf_text import page_text_dict
+
+FORMAT_PNG = "png"
+FORMAT_JPEG = "jpeg"
+FORMAT_WEBP = "webp"
+IMAGE_FORMATS = (FORMAT_PNG, FORMAT_JPEG, FORMAT_WEBP)
+
+# Span'ы короче — номера позиций, одиночные символы штампа; по ним DPI не
+# поднимаем.
+_MIN_SPAN_CHARS = 2
+
+_CACHE_ATTR = "_ismeta_render_cache"
+_CACHE_INIT_LOCK = threading.Lock()
+# fitz.Document не thread-safe: параллельные рендеры страниц одного документа
+# (run_in_threadpool из gather) сериализуются на его lock'е, кодирование
+# pixmap'а в PNG/JPEG/WebP идёт уже без него.
+_DOC_LOCK_ATTR = "_ismeta_render_lock"
+
+
+class RenderCache:
+    """LRU (page, dpi, format) → base64 с лимитом по суммарному размеру."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[tuple[int, int, str], str] = OrderedDict()
+        self._dpi: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[int, int, str]) -> str | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple[int, int, str], value: str) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def page_dpi(self, page_num: int) -> int | None:
+        return self._dpi.get(page_num)
+
+    def set_page_dpi(self, page_num: int, dpi: int) -> None:
+        self._dpi[page_num] = dpi
+
+
+def get_render_cache(doc: fitz.Document) -> RenderCache | None:
+    """Кэш документа (создаётся при первом рендере); None — кэш выключен."""
+    if settings.render_cache_max_mb <= 0:
+        return None
+    cache = getattr(doc, _CACHE_ATTR, None)
+    if cache is None:
+        with _CACHE_INIT_LOCK:
+            cache = getattr(doc, _CACHE_ATTR, None)
+            if cache is None:
+                cache = RenderCache(settings.render_cache_max_mb * 1024 * 1024)
+                setattr(doc, _CACHE_ATTR, cache)
+    return cache
+
+
+def _doc_lock(doc: fitz.Document) -> threading.Lock:
+    lock = getattr(doc, _DOC_LOCK_ATTR, None)
+    if lock is None:
+        with _CACHE_INIT_LOCK:
+            lock = getattr(doc, _DOC_LOCK_ATTR, None)
+            if lock is None:
+                lock = threading.Lock()
+                setattr(doc, _DOC_LOCK_ATTR, lock)
+    return lock
+
+
+def choose_dpi(page: fitz.Page) -> int:
+    """DPI страницы по размеру листа и мелкости шрифта text layer'а."""
+    dpi = settings.dpi
+    if settings.render_adaptive_dpi:
+        sizes = [
+            span["size"]
+            for block in page_text_dict(page)["blocks"]
+            for line in block.get("lines", ())
+            for span in line["spans"]
+            if len(span["text"].strip()) >= _MIN_SPAN_CHARS and span["size"] > 0
+        ]
+        if sizes:
+            needed = settings.render_target_font_px * 72 / min(sizes)
+            dpi = int(min(settings.dpi, max(settings.render_min_dpi, needed)))
+    long_side_pt = max(page.rect.width, page.rect.height)
+    if settings.render_max_side_px > 0 and long_side_pt > 0:
+        dpi = min(dpi, int(settings.render_max_side_px * 72 / long_side_pt))
+    return max(1, dpi)
+
+
+def _encode(pix: fitz.Pixmap, image_format: str) -> bytes:
+    if image_format == FORMAT_WEBP:
+        try:
+            from PIL import Image
+        except ImportError:
+            image_format = FORMAT_JPEG
+        else:
+            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            buf = io.BytesIO()
+            img.save(buf, format="WEBP", quality=settings.render_image_quality)
+            return buf.getvalue()
+    if image_format == FORMAT_JPEG:
+        return pix.tobytes("jpeg", jpg_quality=settings.render_image_quality)
+    return pix.tobytes("png")
+
+
+def resolve_image_format(accepted: tuple[str, ...]) -> str:
+    """`render_image_format`, если провайдер его принимает, иначе PNG."""
+    fmt = settings.render_image_format
+    return fmt if fmt in IMAGE_FORMATS and fmt in accepted else FORMAT_PNG
+
+
+def render_page_to_b64(
+    doc: fitz.Document, page_num: int, image_format: str = FORMAT_PNG
+) -> str:
+    """Render single PDF page to base64-encoded image (PNG/JPEG/WebP)."""
+    if image_format not in IMAGE_FORMATS:
+        image_format = FORMAT_PNG
+    cache = get_render_cache(doc)
+    lock = _doc_lock(doc)
+    page = None
+    dpi = cache.page_dpi(page_num) if cache is not None else None
+    if dpi is None:
+        with lock:
+            page = doc[page_num]
+            dpi = choose_dpi(page)
+        if cache is not None:
+            cache.set_page_dpi(page_num, dpi)
+    key = (page_num, dpi, image_format)
+    if cache is not None and (cached := cache.get(key)) is not None:
+        return cached
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    with lock:
+        if page is None:
+            page = doc[page_num]
+        pix = page.get_pixmap(matrix=mat, alpha=False)
+    encoded = base64.b64encode(_encode(pix, image_format)).decode()
+    if cache is not None:
+        cache.put(key, encoded)
+    return encoded
 
 
-def render_page_to_b64(doc: fitz.Document, page_num: int) -> str:
-    """Render single PDF page to base64-encoded PNG."""
-    page = doc[page_num]
-    mat = fitz.Matrix(settings.dpi / 72, settings.dpi / 72)
-    pix = page.get_pixmap(matrix=mat)
-    png_bytes = pix.tobytes("png")
-    return base64.b64encode(png_bytes).decode()
+def image_mime_type(image_b64: str) -> str:
+    """MIME по сигнатуре base64 (для data: URL в провайдере)."""
+    if image_b64.startswith("/9j/"):
+        return "image/jpeg"
+    if image_b64.startswith("UklGR"):
+        return "image/webp"
+    return "image/png"
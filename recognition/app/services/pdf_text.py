@@ -18,6 +18,7 @@
 """
 
 import re
+from collections.abc import Callable
 from dataclasses import dataclass, field
 from io import BytesIO
 from typing import Any
@@ -306,7 +307,7 @@ def extract_lines(page: object) -> list[str]:
     таблиц даёт ячейки построчно. Экзотические раскладки (нестандартный порядок)
     пока не поддерживаем — это покроет Vision fallback.
     """
-    text: str = page.get_text()  # type: ignore[attr-defined]
+    text = page_text(page)
     return [ln.strip() for ln in text.split("\n") if ln.strip()]
 
 
@@ -419,8 +420,7 @@ def has_usable_text_layer(
     page: object, min_chars: int = TEXT_LAYER_MIN_CHARS_PER_PAGE
 ) -> bool:
     """True если у страницы есть достаточный text layer для парсинга без LLM."""
-    text: str = page.get_text()  # type: ignore[attr-defined]
-    return len(text.strip()) >= min_chars
+    return len(page_text(page).strip()) >= min_chars
 
 
 # ---------------------------------------------------------------------------
@@ -691,8 +691,17 @@ def _derotate_span(bb: tuple[float, float, float, float], matrix: Any) -> tuple[
 
 def _collect_spans(page: object) -> list[_Span]:
     """Собрать все непустые span'ы страницы в display-space с метаданными."""
-    data = page.get_text("dict")  # type: ignore[attr-defined]
-    matrix = page.rotation_matrix  # type: ignore[attr-defined]
+    cache = PageTextCache.for_page(page)
+    if cache is not None:
+        return list(cache.spans(page.number))  # type: ignore[attr-defined]
+    return _spans_from_dict(
+        page.get_text("dict"),  # type: ignore[attr-defined]
+        page.rotation_matrix,  # type: ignore[attr-defined]
+    )
+
+
+def _spans_from_dict(data: dict, matrix: Any) -> list[_Span]:
+    """Span'ы из `get_text("dict")` страницы, derotated через rotation_matrix."""
     out: list[_Span] = []
     for block in data.get("blocks", ()):
         if block.get("type", 0) != 0:
@@ -720,6 +729,93 @@ def _collect_spans(page: object) -> list[_Span]:
     return out
 
 
+class PageTextCache:
+    """Text layer документа, извлечённый один раз на страницу.
+
+    Один разбор спецификации читает одни и те же страницы многократно:
+    проверка text layer, header keywords, span'ы для колонок, детекция
+    скана перед Docling, Vision-триггеры. Кэш живёт на самом
+    `fitz.Document` (`PageTextCache.of(doc)`), значения извлекаются лениво.
+    Документ при этом не должен меняться — для read-only разбора так и есть.
+    """
+
+    _ATTR = "_page_text_cache"
+
+    def __init__(self, doc: Any) -> None:
+        self.doc = doc
+        self._text: dict[int, str] = {}
+        self._dict: dict[int, dict] = {}
+        self._spans: dict[int, list[_Span]] = {}
+
+    @classmethod
+    def of(cls, doc: Any) -> "PageTextCache":
+        """Кэш документа (создаётся при первом обращении)."""
+        cache = getattr(doc, cls._ATTR, None)
+        if cache is None:
+            cache = cls(doc)
+            setattr(doc, cls._ATTR, cache)
+        return cache
+
+    @classmethod
+    def for_page(cls, page: object) -> "PageTextCache | None":
+        """Кэш документа страницы; None для не-fitz страниц (тестовые mock'и)."""
+        import pymupdf as fitz
+
+        if not isinstance(page, fitz.Page) or page.parent is None:
+            return None
+        return cls.of(page.parent)
+
+    def text(self, page_num: int) -> str:
+        """`page.get_text("text")` (0-based page_num)."""
+        text = self._text.get(page_num)
+        if text is None:
+            text = self._text[page_num] = self.doc[page_num].get_text("text") or ""
+        return text
+
+    def text_dict(self, page_num: int) -> dict:
+        """`page.get_text("dict")` без image-блоков (их никто не читает)."""
+        data = self._dict.get(page_num)
+        if data is None:
+            import pymupdf as fitz
+
+            flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+            data = self._dict[page_num] = self.doc[page_num].get_text("dict", flags=flags)
+        return data
+
+    def spans(self, page_num: int) -> list[_Span]:
+        """Derotated span'ы страницы (см. `_collect_spans`). Не мутировать."""
+        spans = self._spans.get(page_num)
+        if spans is None:
+            spans = self._spans[page_num] = _spans_from_dict(
+                self.text_dict(page_num), self.doc[page_num].rotation_matrix
+            )
+        return spans
+
+    def total_chars(self) -> int:
+        """Сумма символов text layer по всем страницам."""
+        return sum(len(self.text(pn)) for pn in range(len(self.doc)))
+
+    def avg_chars(self) -> float:
+        """Среднее символов на страницу (детекция сканов)."""
+        return self.total_chars() / max(len(self.doc), 1)
+
+
+def page_text(page: object) -> str:
+    """`page.get_text()` через кэш документа страницы."""
+    cache = PageTextCache.for_page(page)
+    if cache is None:
+        return page.get_text()  # type: ignore[attr-defined]
+    return cache.text(page.number)  # type: ignore[attr-defined]
+
+
+def page_text_dict(page: object) -> dict:
+    """`page.get_text("dict")` (без image-блоков) через кэш документа."""
+    cache = PageTextCache.for_page(page)
+    if cache is None:
+        return page.get_text("dict")  # type: ignore[attr-defined]
+    return cache.text_dict(page.number)  # type: ignore[attr-defined]
+
+
 def _bucket_by_y(spans: list[_Span], tolerance: float = _ROW_Y_TOLERANCE) -> list[list[_Span]]:
     """Сгруппировать span'ы в визуальные row'ы по display_y (±tolerance)."""
     buckets: list[list[_Span]] = []
@@ -1108,8 +1204,7 @@ def _page_has_header_keywords(
     fullpage check достаточен.
     """
     try:
-        page = src_doc[page_idx]
-        text = page.get_text("text") or ""
+        text = PageTextCache.of(src_doc).text(page_idx)
         matches = sum(1 for kw in _HEADER_DETECT_KEYWORDS if kw in text)
         return matches >= min_matches
     except Exception:
@@ -1117,7 +1212,7 @@ def _page_has_header_keywords(
 
 
 def _inject_header_overlay(
-    pdf_bytes: bytes, header_height_pt: float = 110.0
+    pdf_bytes: bytes, header_height_pt: float = 110.0, src_doc: Any = None
 ) -> bytes:
     """TD-17a: copy header (top header_height_pt of page 0) ТОЛЬКО на continuation pages БЕЗ собственного header.
 
@@ -1133,15 +1228,22 @@ def _inject_header_overlay(
     header page 0 в верх (Spec-9 multi-page без header).
 
     Page 0 не модифицируется. Возвращает новый PDF bytes;
-    при ошибке возвращает оригинальные bytes.
+    при ошибке возвращает оригинальные bytes. src_doc — уже открытый
+    документ тех же pdf_bytes (его text cache переиспользуется; закрывает
+    вызывающий).
     """
     try:
         import pymupdf as fitz
         import logging as _logging
         _log = _logging.getLogger(__name__)
-        src = fitz.open(stream=pdf_bytes, filetype="pdf")
+        src = src_doc if src_doc is not None else fitz.open(stream=pdf_bytes, filetype="pdf")
+
+        def _close_src() -> None:
+            if src is not src_doc:
+                src.close()
+
         if len(src) < 2:
-            src.close()
+            _close_src()
             return pdf_bytes
 
         # TD-17a v3: skip injection on scanned PDFs (Spec-7).
@@ -1151,10 +1253,9 @@ def _inject_header_overlay(
         # шум в OCR layer и отсутствие текстового header не помогает.
         # Pre-scan avg chars per page; если scanned — skip injection.
         try:
-            total_chars = sum(len(p.get_text("text")) for p in src)
-            avg_chars = total_chars / max(len(src), 1)
+            avg_chars = PageTextCache.of(src).avg_chars()
             if avg_chars < 200:
-                src.close()
+                _close_src()
                 _log.info(
                     f"TD-17a v3: skip injection — scanned PDF "
                     f"(avg_chars={avg_chars:.1f})"
@@ -1213,7 +1314,7 @@ def _inject_header_overlay(
         buf = BytesIO()
         out_doc.save(buf)
         out_doc.close()
-        src.close()
+        _close_src()
         _log.info(
             f"TD-17a v2: injected={injected_count}, "
             f"skipped(already-has-header)={skipped_count}, "
@@ -1424,31 +1525,47 @@ def extract_via_docling(pdf_bytes: bytes) -> dict[int, list[TableRow]]:
     скачиваемых весов ~1.2 GB при первом запуске, затем cached.
 
     Возвращает {} если Docling упал или не нашёл tables.
+
+    Сама конвертация — в docling_pool: прогретые DocumentConverter'ы
+    (text / OCR) переиспользуются между документами, по умолчанию в
+    отдельном worker-процессе.
+    """
+    from .docling_pool import convert
+
+    global _LAST_DOCLING_COLUMN_RANGES
+    out, column_ranges = convert(pdf_bytes)
+    _LAST_DOCLING_COLUMN_RANGES = column_ranges
+    return out
+
+
+def docling_tables(
+    pdf_bytes: bytes,
+    get_converter: Callable[[bool], Any],
+) -> tuple[dict[int, list[TableRow]], dict[str, tuple[float, float]]]:
+    """Тело extract_via_docling: (rows по страницам, column x-ranges).
+
+    get_converter(ocr) — готовый DocumentConverter из docling_pool
+    (ocr=True — force_full_page_ocr для сканов). Column ranges
+    возвращаются явно: функция выполняется в worker-процессе, где
+    module-level _LAST_DOCLING_COLUMN_RANGES вызывающему не виден.
     """
     try:
         import pymupdf as _fitz
-        from docling.datamodel.base_models import DocumentStream, InputFormat
-        from docling.datamodel.pipeline_options import (
-            PdfPipelineOptions,
-            TableFormerMode,
-            TableStructureOptions,
-        )
-        from docling.document_converter import DocumentConverter, PdfFormatOption
+        from docling.datamodel.base_models import DocumentStream
         import logging as _logging
         _log = _logging.getLogger(__name__)
     except ImportError:
-        return {}
+        return {}, {}
 
     # TD-17: detect scanned PDFs (text layer < threshold) → force_full_page_ocr.
     # Spec-7 (rotation 270, scanned image PDF) имеет text layer 205 chars total —
     # Docling default OCR находит только footer fragments.
+    # PDF открывается один раз: подсчёт символов и page split — по одному doc.
+    src_doc = None
     is_scanned = False
     try:
-        _doc = _fitz.open(stream=pdf_bytes, filetype="pdf")
-        total_chars = sum(len(p.get_text("text")) for p in _doc)
-        avg_chars = total_chars / max(len(_doc), 1)
-        is_scanned = avg_chars < 200
-        _doc.close()
+        src_doc = _fitz.open(stream=pdf_bytes, filetype="pdf")
+        is_scanned = PageTextCache.of(src_doc).avg_chars() < 200
     except Exception:
         pass
 
@@ -1462,38 +1579,23 @@ def extract_via_docling(pdf_bytes: bytes) -> dict[int, list[TableRow]]:
             header_h = float(
                 getattr(_settings, "pdf_docling_header_height_pt", 110.0)
             )
-            pdf_bytes = _inject_header_overlay(pdf_bytes, header_h)
+            injected = _inject_header_overlay(pdf_bytes, header_h, src_doc)
+            if injected is not pdf_bytes:
+                pdf_bytes = injected
+                if src_doc is not None:
+                    src_doc.close()
+                src_doc = _fitz.open(stream=pdf_bytes, filetype="pdf")
     except Exception as _e:
         _log.warning(f"TD-17a inject_header wrapper failed: {_e}")
 
-    # TD-17: TableFormerMode.ACCURATE даёт более точный structure recovery
-    # (медленнее но качественнее). Для ЕСКД-таблиц с многоуровневой нумерацией
-    # и тонкими grid lines accurate mode критичен.
+    # TD-17: TableFormerMode.ACCURATE (structure recovery для ЕСКД-таблиц) —
+    # опции converter'ов см. docling_pool.build_converter.
     try:
-        pipe_opts = PdfPipelineOptions()
-        pipe_opts.do_table_structure = True
-        pipe_opts.table_structure_options = TableStructureOptions(
-            mode=TableFormerMode.ACCURATE,
-            do_cell_matching=True,
-        )
-        if is_scanned:
-            # TD-17 Spec-7 fix: force OCR на отсканированных PDF.
-            try:
-                from docling.datamodel.pipeline_options import RapidOcrOptions
-                pipe_opts.do_ocr = True
-                pipe_opts.ocr_options = RapidOcrOptions(
-                    force_full_page_ocr=True, lang=["ru"]
-                )
-                pipe_opts.images_scale = 2.0
-            except Exception:
-                pass
-        converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(pipeline_options=pipe_opts)
-            }
-        )
+        converter = get_converter(is_scanned)
     except Exception:
-        return {}
+        if src_doc is not None:
+            src_doc.close()
+        return {}, {}
 
     # TD-17 page-by-page: Docling детектит tables только на pages с явным
     # header (Spec-9: 1/20, Spec-8: 2/14). Многостраничные таблицы без
@@ -1501,7 +1603,8 @@ def extract_via_docling(pdf_bytes: bytes) -> dict[int, list[TableRow]]:
     # PDFs → Docling каждую отдельно → каждая видится как complete table.
     pages_pdfs: list[bytes] = []
     try:
-        src_doc = _fitz.open(stream=pdf_bytes, filetype="pdf")
+        if src_doc is None:
+            src_doc = _fitz.open(stream=pdf_bytes, filetype="pdf")
         for pi in range(len(src_doc)):
             single = _fitz.open()
             single.insert_pdf(src_doc, from_page=pi, to_page=pi)
@@ -1517,7 +1620,7 @@ def extract_via_docling(pdf_bytes: bytes) -> dict[int, list[TableRow]]:
             source = DocumentStream(name="doc.pdf", stream=BytesIO(pdf_bytes))
             result = converter.convert(source)
         except Exception:
-            return {}
+            return {}, {}
 
     out_per_page: list[Any] = []  # results per page (или None если упало)
     if pages_pdfs:
@@ -1532,9 +1635,7 @@ def extract_via_docling(pdf_bytes: bytes) -> dict[int, list[TableRow]]:
                 _log.warning(f"TD-17 docling page {pi+1} failed: {e}")
                 out_per_page.append(None)
 
-    # Reset cache before this run.
-    global _LAST_DOCLING_COLUMN_RANGES
-    _LAST_DOCLING_COLUMN_RANGES = {}
+    column_ranges: dict[str, tuple[float, float]] = {}
 
     out: dict[int, list[TableRow]] = {}
     # GOST col-numbers fallback (ГОСТ 21.110): row[1] = «1, 2, ..., 9» nums.
@@ -1567,7 +1668,7 @@ def extract_via_docling(pdf_bytes: bytes) -> dict[int, list[TableRow]]:
         try:
             docs_iter.append((None, result.document))  # type: ignore[name-defined]
         except NameError:
-            return {}
+            return {}, {}
 
     for page_no_override, pdoc in docs_iter:
         for table in pdoc.tables:
@@ -1666,7 +1767,7 @@ def extract_via_docling(pdf_bytes: bytes) -> dict[int, list[TableRow]]:
                         pass
 
                 if len(new_ranges) >= 3:
-                    _LAST_DOCLING_COLUMN_RANGES = new_ranges
+                    column_ranges = new_ranges
 
             rows_for_page = out.setdefault(page_no, [])
             # На multi-page tables (когда наследовали header) row[0] —
@@ -1719,7 +1820,7 @@ def extract_via_docling(pdf_bytes: bytes) -> dict[int, list[TableRow]]:
                         is_section_heading=is_section_heading,
                     )
                 )
-    return out
+    return out, column_ranges
 
 
 def extract_with_explicit_columns(
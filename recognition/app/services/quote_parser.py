@@ -3,12 +3,14 @@
 Контракт: specs/15-recognition-api.md §3.
 """
 
+import asyncio
 import logging
 from dataclasses import dataclass, field
 
 import fitz
 from fastapi.concurrency import run_in_threadpool
 
+from ..config import settings
 from ..providers.base import BaseLLMProvider
 from ..schemas.quote import QuoteItem, QuoteMeta, QuoteParseResponse, QuoteSupplier
 from ._common import dedupe_by_key, determine_status, pages_stats, vision_json
@@ -71,6 +73,18 @@ quote_meta:
 """
 
 
+@dataclass
+class _PageOutcome:
+    """Результат одной страницы; в state сводится по порядку страниц."""
+
+    skipped: bool = False
+    supplier: QuoteSupplier | None = None
+    quote_meta: QuoteMeta | None = None
+    header_error: str = ""
+    items: list[QuoteItem] = field(default_factory=list)
+    error: str = ""
+
+
 @dataclass
 class _QuoteParseState:
     pages_total: int = 0
@@ -82,14 +96,26 @@ class _QuoteParseState:
     quote_meta: QuoteMeta = field(default_factory=QuoteMeta)
     supplier_extracted: bool = False
     sort_order: int = 0
+    pages: dict[int, _PageOutcome] = field(default_factory=dict)
 
 
 class QuoteParser:
-    """Async PDF quote (КП) parser."""
+    """Async PDF quote (КП) parser.
+
+    Страницы обрабатываются параллельно (`asyncio.gather`), не больше
+    `llm_max_concurrency` одновременно — как в SpecParser, чтобы на больших
+    КП не держать в памяти base64 всех страниц сразу. Рендер — в
+    threadpool, classify/extract — под глобальным `llm_throttle`. Итог
+    сводится детерминированно по порядку страниц (`_merge_pages`) — как при
+    последовательном проходе.
+    """
 
     def __init__(self, provider: BaseLLMProvider) -> None:
         self.provider = provider
         self.state = _QuoteParseState()
+        # Страницы, с которых уже извлечён supplier: header более поздних
+        # страниц не запрашиваем (при merge он всё равно не применится).
+        self._header_pages: set[int] = set()
 
     async def parse(self, pdf_bytes: bytes, filename: str = "quote.pdf") -> QuoteParseResponse:
         state = self.state
@@ -101,16 +127,23 @@ class QuoteParser:
                 extra={"doc_filename": filename, "pages_total": state.pages_total},
             )
 
-            for page_num in range(state.pages_total):
-                await self._process_page(doc, page_num)
+            page_sema = asyncio.Semaphore(settings.llm_max_concurrency)
+
+            async def run_one(page_num: int) -> None:
+                async with page_sema:
+                    state.pages[page_num] = await self._process_page(doc, page_num)
+
+            await asyncio.gather(*(run_one(pn) for pn in range(state.pages_total)))
         finally:
             doc.close()
 
+        self._merge_pages()
         state.items = self._deduplicate(state.items)
         return self._finalize()
 
     def build_partial(self) -> QuoteParseResponse:
         state = self.state
+        self._merge_pages()
         return QuoteParseResponse(
             status="partial",
             items=self._deduplicate(list(state.items)),
@@ -125,25 +158,26 @@ class QuoteParser:
             ),
         )
 
-    async def _process_page(self, doc: fitz.Document, page_num: int) -> None:
-        state = self.state
+    async def _process_page(self, doc: fitz.Document, page_num: int) -> _PageOutcome:
+        outcome = _PageOutcome()
         try:
-            page_b64 = await run_in_threadpool(render_page_to_b64, doc, page_num)
+            page_b64 = await run_in_threadpool(
+                render_page_to_b64, doc, page_num, self.provider.image_format
+            )
 
             classification = await self._classify_page(page_b64, page_num)
             page_type = classification.get("type")
 
             if page_type == "other":
-                state.pages_skipped += 1
-                return
+                outcome.skipped = True
+                return outcome
 
-            if page_type == "header" and not state.supplier_extracted:
-                await self._extract_header(page_b64, page_num)
+            if page_type == "header" and not any(pn < page_num for pn in self._header_pages):
+                await self._extract_header(page_b64, page_num, outcome)
 
             items = await self._extract_items(page_b64, page_num)
             for item_data in items:
-                state.sort_order += 1
-                state.items.append(
+                outcome.items.append(
                     QuoteItem(
                         name=str(item_data.get("name", "")).strip(),
                         model_name=str(item_data.get("model_name", "")),
@@ -157,17 +191,52 @@ class QuoteParser:
                         lead_time_days=_as_int_or_none(item_data.get("lead_time_days")),
                         warranty_months=_as_int_or_none(item_data.get("warranty_months")),
                         page_number=page_num + 1,
-                        sort_order=state.sort_order,
                     )
                 )
-            state.pages_processed += 1
 
         except Exception as e:
-            error_msg = f"Page {page_num + 1}: {e}"
             logger.warning(
                 "quote_parse page error", extra={"page": page_num + 1, "error": str(e)}
             )
-            state.errors.append(error_msg)
+            outcome.error = f"Page {page_num + 1}: {e}"
+        return outcome
+
+    def _merge_pages(self) -> None:
+        """Свести готовые страницы в state по порядку страниц.
+
+        Header применяется с первой header-страницы, давшей supplier; позиции
+        нумеруются сквозным sort_order. Пересобирается с нуля — безопасно
+        звать повторно (build_partial, затем parse).
+        """
+        state = self.state
+        state.items = []
+        state.errors = []
+        state.pages_processed = 0
+        state.pages_skipped = 0
+        state.supplier = QuoteSupplier()
+        state.quote_meta = QuoteMeta()
+        state.supplier_extracted = False
+        state.sort_order = 0
+        for page_num in sorted(state.pages):
+            outcome = state.pages[page_num]
+            if outcome.skipped:
+                state.pages_skipped += 1
+                continue
+            if not state.supplier_extracted:
+                if outcome.header_error:
+                    state.errors.append(outcome.header_error)
+                if outcome.quote_meta is not None:
+                    state.quote_meta = outcome.quote_meta
+                if outcome.supplier is not None:
+                    state.supplier = outcome.supplier
+                    state.supplier_extracted = True
+            for item in outcome.items:
+                state.sort_order += 1
+                state.items.append(item.model_copy(update={"sort_order": state.sort_order}))
+            if outcome.error:
+                state.errors.append(outcome.error)
+            else:
+                state.pages_processed += 1
 
     async def _classify_page(self, image_b64: str, page_num: int) -> dict:
         try:
@@ -190,8 +259,9 @@ class QuoteParser:
         items = data.get("items", [])
         return list(items) if isinstance(items, list) else []
 
-    async def _extract_header(self, image_b64: str, page_num: int) -> None:
-        state = self.state
+    async def _extract_header(
+        self, image_b64: str, page_num: int, outcome: _PageOutcome
+    ) -> None:
         try:
             data = await vision_json(
                 self.provider,
@@ -200,19 +270,18 @@ class QuoteParser:
                 log_ctx=f"quote_header_p{page_num+1}",
             )
         except ValueError as e:
-            state.errors.append(f"Page {page_num + 1} header: {e}")
+            outcome.header_error = f"Page {page_num + 1} header: {e}"
             return
-
         supplier = data.get("supplier") or {}
         meta = data.get("quote_meta") or {}
         if isinstance(supplier, dict):
-            state.supplier = QuoteSupplier(
+            outcome.supplier = QuoteSupplier(
                 name=str(supplier.get("name", "")),
                 inn=str(supplier.get("inn", "")),
             )
-            state.supplier_extracted = True
+            self._header_pages.add(page_num)
         if isinstance(meta, dict):
-            state.quote_meta = QuoteMeta(
+            outcome.quote_meta = QuoteMeta(
                 number=str(meta.get("number", "")),
                 date=str(meta.get("date", "")),
                 valid_until=str(meta.get("valid_until", "")),
@@ -15,6 +15,9 @@
 Один LLM-call на страницу: gpt-4o (E15.05 it2 — был gpt-4o-mini), temperature=0,
 response_format=json. E15.05 it2 — conditional multimodal retry при низком
 confidence score (см. `normalize_via_llm_multimodal` + `compute_confidence`).
+Разреженные соседние страницы пакуются в один call
+(`plan_normalize_batches` + `normalize_batch_via_llm`) — ответ
+раскладывается обратно в NormalizedPage по страницам.
 """
 
 from __future__ import annotations
@@ -24,7 +27,9 @@ import logging
 import re
 from dataclasses import asdict, dataclass, field
 
+from ..config import settings
 from ..providers.base import BaseLLMProvider, TextCompletion
+from . import parse_cache
 from ._common import _strip_markdown_fence
 from .pdf_text import TableRow
 
@@ -79,6 +84,19 @@ class NormalizedPage:
     # expected_count работает на тех же bbox, что и парсинг → «видит» только
     # то что успел распарсить → хвостовые потери не детектирует.
     expected_count_vision: int = 0
+    # LLM-вызовов на страницу: в пакете вызов (и его токены) числится за
+    # первой страницей, остальные — 0.
+    llm_calls: int = 1
+
+
+@dataclass
+class NormalizeRequest:
+    """Страница для пакетной нормализации: rows + section/sticky перед ней."""
+
+    page_number: int  # 1-based
+    rows: list[TableRow]
+    current_section: str = ""
+    sticky_parent_name: str = ""
 
 
 NORMALIZE_PROMPT_TEMPLATE = """Ты обрабатываешь страницу проектной спецификации ОВиК/ЭОМ (форма 1а ГОСТ 21.110).
@@ -567,19 +585,12 @@ async def normalize_via_llm(
             items=[], new_section=current_section, new_sticky=sticky_parent_name
         )
 
-    # TD-09 (Class Q): убираем sub-row column numbers «1|2|3|...|9» до LLM,
-    # чтобы он не трактовал её как item (повторилось на Spec-5 pages 11/16).
-    filtered_rows = [r for r in rows if not _is_column_numbers_row(r)]
     # TD-11B: markdown-таблица вместо JSON для лучшей читаемости LLM.
-    rows_payload = _rows_to_markdown_table(filtered_rows)
-    user_input = _build_user_input(current_section, sticky_parent_name, rows_payload)
-
-    # TD-01: INSTRUCTIONS_BLOCK → system (кэшируется), per-call ВХОД → user.
-    completion: TextCompletion = await provider.text_complete(
-        user_input,
-        max_tokens=max_tokens,
-        temperature=0.0,
-        system_prompt=NORMALIZE_INSTRUCTIONS_BLOCK,
+    user_input = _build_user_input(
+        current_section, sticky_parent_name, _rows_payload(rows)
+    )
+    completion, cache_key, cached = await _complete_normalize(
+        provider, user_input, max_tokens
     )
     raw = completion.content
 
@@ -592,6 +603,66 @@ async def normalize_via_llm(
         )
         raise LLMNormalizationError(f"page {page_number}: invalid JSON") from e
 
+    page = _page_from_data(
+        data,
+        page_number=page_number,
+        rows=rows,
+        current_section=current_section,
+        sticky_parent_name=sticky_parent_name,
+    )
+
+    if not cached:
+        await parse_cache.store_normalized(cache_key, raw)
+
+    page.prompt_tokens = completion.prompt_tokens
+    page.completion_tokens = completion.completion_tokens
+    page.cached_tokens = completion.cached_tokens
+    page.raw_response = raw
+    return page
+
+
+def _rows_payload(rows: list[TableRow]) -> str:
+    """Markdown-таблица rows для ВХОДА.
+
+    TD-09 (Class Q): sub-row column numbers «1|2|3|...|9» убираем до LLM,
+    чтобы он не трактовал её как item (повторилось на Spec-5 pages 11/16).
+    """
+    return _rows_to_markdown_table([r for r in rows if not _is_column_numbers_row(r)])
+
+
+async def _complete_normalize(
+    provider: BaseLLMProvider, user_input: str, max_tokens: int | None
+) -> tuple[TextCompletion, str, bool]:
+    """text_complete с per-input кэшем (parse_cache): (completion, ключ, из кэша ли).
+
+    Тот же ВХОД (страница или пакет с тем же контекстом section/sticky) →
+    сырой ответ LLM без повторного call'а.
+    """
+    cache_key = parse_cache.normalize_key(
+        provider, NORMALIZE_INSTRUCTIONS_BLOCK, user_input, max_tokens
+    )
+    cached_raw = await parse_cache.load_normalized(cache_key)
+    if cached_raw is not None:
+        return TextCompletion(content=cached_raw), cache_key, True
+    # TD-01: INSTRUCTIONS_BLOCK → system (кэшируется), per-call ВХОД → user.
+    completion = await provider.text_complete(
+        user_input,
+        max_tokens=max_tokens,
+        temperature=0.0,
+        system_prompt=NORMALIZE_INSTRUCTIONS_BLOCK,
+    )
+    return completion, cache_key, False
+
+
+def _page_from_data(
+    data: object,
+    *,
+    page_number: int,
+    rows: list[TableRow],
+    current_section: str,
+    sticky_parent_name: str,
+) -> NormalizedPage:
+    """JSON-ответ по одной странице → NormalizedPage (без токенов/raw)."""
     if not isinstance(data, dict):
         raise LLMNormalizationError(f"page {page_number}: expected JSON object, got {type(data).__name__}")
 
@@ -648,15 +719,190 @@ async def normalize_via_llm(
         items=items,
         new_section=new_section,
         new_sticky=new_sticky,
-        prompt_tokens=completion.prompt_tokens,
-        completion_tokens=completion.completion_tokens,
-        cached_tokens=completion.cached_tokens,
-        raw_response=raw,
         warnings=warnings,
         expected_count=expected_count,
     )
 
 
+# ---------------------------------------------------------------------------
+# Пакетная нормализация нескольких страниц одним call'ом
+# ---------------------------------------------------------------------------
+
+# Кириллица в BPE-токенизаторах gpt-4o/DeepSeek — ~3 символа на токен; для
+# планирования пакета точность не нужна.
+_CHARS_PER_TOKEN = 3
+
+_BATCH_INPUT_HEADER = """ПАКЕТ: ниже НЕСКОЛЬКО страниц одной спецификации, каждая в своём блоке
+«=== СТРАНИЦА N ===» со своим ВХОДОМ. Обработай КАЖДУЮ страницу отдельно по
+тем же правилам, как если бы она пришла одна:
+- current_section и sticky_parent_name у каждой страницы СВОИ (указаны в её
+  блоке) — не переноси секцию/sticky с предыдущей страницы пакета;
+- row_index / source_row_index — в пределах своей страницы;
+- позиции страницы — только из rows её блока.
+
+Ответь строго JSON:
+{"pages": [{"page": N, "new_section": ..., "new_sticky": ..., "expected_count": ..., "items": [...]}, ...]}
+— по объекту на каждую страницу пакета в том же порядке; поля объекта —
+как в ответе на одну страницу.
+"""
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def _page_input(request: NormalizeRequest) -> str:
+    return _build_user_input(
+        request.current_section,
+        request.sticky_parent_name,
+        _rows_payload(request.rows),
+    )
+
+
+def _build_batch_user_input(requests: list[NormalizeRequest]) -> str:
+    blocks = [_BATCH_INPUT_HEADER]
+    for request in requests:
+        blocks.append(f"=== СТРАНИЦА {request.page_number} ===\n{_page_input(request)}")
+    return "\n".join(blocks)
+
+
+def plan_normalize_batches(
+    requests: list[NormalizeRequest],
+    *,
+    token_budget: int | None = None,
+    max_rows: int | None = None,
+    max_pages: int | None = None,
+) -> list[list[NormalizeRequest]]:
+    """Разбить страницы (в порядке следования) на пакеты для normalize_batch_via_llm.
+
+    Страница добавляется к текущему пакету, пока оценка токенов ВХОДА,
+    сумма rows и число страниц укладываются в лимиты (по умолчанию —
+    llm_normalize_batch_*). Плотная страница идёт одна.
+    """
+    if token_budget is None:
+        token_budget = settings.llm_normalize_batch_tokens
+    if max_rows is None:
+        max_rows = settings.llm_normalize_batch_max_rows
+    if max_pages is None:
+        max_pages = settings.llm_normalize_batch_max_pages
+    if token_budget <= 0 or max_pages <= 1:
+        return [[r] for r in requests]
+
+    batches: list[list[NormalizeRequest]] = []
+    current: list[NormalizeRequest] = []
+    tokens = rows = 0
+    for request in requests:
+        page_tokens = _estimate_tokens(_page_input(request))
+        page_rows = len(request.rows)
+        if current and (
+            tokens + page_tokens > token_budget
+            or rows + page_rows > max_rows
+            or len(current) >= max_pages
+        ):
+            batches.append(current)
+            current = []
+            tokens = rows = 0
+        current.append(request)
+        tokens += page_tokens
+        rows += page_rows
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _normalize_single(
+    provider: BaseLLMProvider, request: NormalizeRequest, max_tokens: int | None
+) -> NormalizedPage | LLMNormalizationError:
+    try:
+        return await normalize_via_llm(
+            provider,
+            request.rows,
+            page_number=request.page_number,
+            current_section=request.current_section,
+            sticky_parent_name=request.sticky_parent_name,
+            max_tokens=max_tokens,
+        )
+    except LLMNormalizationError as e:
+        return e
+
+
+async def normalize_batch_via_llm(
+    provider: BaseLLMProvider,
+    requests: list[NormalizeRequest],
+    *,
+    max_tokens: int | None = None,
+) -> list[NormalizedPage | LLMNormalizationError]:
+    """Нормализовать пакет страниц одним LLM-call'ом.
+
+    Результат — по элементу на страницу в порядке `requests`: NormalizedPage
+    или LLMNormalizationError (как у normalize_via_llm). Страницы, которых
+    нет в ответе (или весь ответ невалиден), догоняются отдельными
+    normalize_via_llm. NotImplementedError провайдера пробрасывается.
+    """
+    if len(requests) == 1:
+        return [await _normalize_single(provider, requests[0], max_tokens)]
+
+    user_input = _build_batch_user_input(requests)
+    completion, cache_key, cached = await _complete_normalize(
+        provider, user_input, max_tokens
+    )
+    raw = completion.content
+    page_numbers = [r.page_number for r in requests]
+
+    by_page: dict[int, object] = {}
+    try:
+        data = json.loads(_strip_markdown_fence(raw))
+    except json.JSONDecodeError as e:
+        logger.warning(
+            "llm batch normalize JSON parse error",
+            extra={"pages": page_numbers, "error": str(e), "raw_head": raw[:200]},
+        )
+    else:
+        pages_raw = data.get("pages") if isinstance(data, dict) else None
+        for entry in pages_raw if isinstance(pages_raw, list) else ():
+            if not isinstance(entry, dict):
+                continue
+            try:
+                by_page.setdefault(int(entry.get("page")), entry)
+            except (TypeError, ValueError):
+                continue
+        if by_page and not cached:
+            await parse_cache.store_normalized(cache_key, raw)
+
+    results: list[NormalizedPage | LLMNormalizationError] = []
+    for request in requests:
+        entry = by_page.get(request.page_number)
+        page: NormalizedPage | LLMNormalizationError
+        try:
+            if entry is None:
+                raise LLMNormalizationError(f"page {request.page_number}: missing in batch")
+            page = _page_from_data(
+                entry,
+                page_number=request.page_number,
+                rows=request.rows,
+                current_section=request.current_section,
+                sticky_parent_name=request.sticky_parent_name,
+            )
+            page.raw_response = json.dumps(entry, ensure_ascii=False)
+            page.llm_calls = 0
+        except LLMNormalizationError as e:
+            logger.warning(
+                "llm batch normalize page fallback",
+                extra={"page": request.page_number, "error": str(e)},
+            )
+            page = await _normalize_single(provider, request, max_tokens)
+        results.append(page)
+
+    # Сам пакетный call и его токены — за первой нормализованной страницей.
+    first = next((p for p in results if isinstance(p, NormalizedPage)), None)
+    if first is not None:
+        first.llm_calls += 1
+        first.prompt_tokens += completion.prompt_tokens
+        first.completion_tokens += completion.completion_tokens
+        first.cached_tokens += completion.cached_tokens
+    return results
+
+
 def _parse_source_row_index(entry: dict) -> int | None:
     """E15-06 it2: row_index исходной bbox-row. None если LLM не указал или
     поставил -1/невалидное значение.
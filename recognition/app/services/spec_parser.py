@@ -13,7 +13,7 @@ import json
 import logging
 import re
 from collections.abc import Awaitable, Callable
-from dataclasses import asdict, dataclass, field
+from dataclasses import dataclass, field
 from typing import Any
 
 import fitz
@@ -23,10 +23,12 @@ from ..config import settings
 from ..providers.base import BaseLLMProvider
 from ..schemas.spec import PagesStats, PageSummary, SpecItem, SpecParseResponse
 from ._common import _strip_markdown_fence
+from .page_extract import extract_pages
 from .pdf_render import render_page_to_b64
 from .pdf_text import (
     _VARIANT_RE,
     TEXT_LAYER_MIN_CHARS_PER_PAGE,
+    PageTextCache,
     TableRow,
     extract_structured_rows,
     has_usable_text_layer,
@@ -38,9 +40,12 @@ from .spec_normalizer import (
     LLMNormalizationError,
     NormalizedItem,
     NormalizedPage,
+    NormalizeRequest,
     compute_confidence,
+    normalize_batch_via_llm,
     normalize_via_llm,
     normalize_via_llm_multimodal,
+    plan_normalize_batches,
 )
 from .spec_postprocess import (
     _looks_like_continuation,
@@ -98,9 +103,10 @@ logger = logging.getLogger(__name__)
 
 # E19-1: per-page progress callback. Вызывается после post-process данной
 # страницы, но ДО cross-page continuation merge. Cross-page изменения
-# last item доедут в финальном `finished` callback на async-роуте.
+# last item доедут в финальном `finished` callback на async-роуте (или
+# повторным page_done при stream-режиме).
 # Сигнатура: (page_1based, items_dicts) → Awaitable[None]. items —
-# уже готовые dict'ы (asdict от NormalizedItem) для JSON-сериализации.
+# уже готовые dict'ы в форме SpecItem (model_dump) для JSON-сериализации.
 PageDoneCallback = Callable[[int, list[dict]], Awaitable[None]]
 
 
@@ -231,12 +237,7 @@ class SpecParser:
             # TD-17a-pure: Docling extract без LLM. Items строятся напрямую
             # из cells, минуя normalize_via_llm (нулевые $-затраты, 0 noise).
             if settings.pdf_extract_via_docling and settings.pdf_docling_bypass_llm:
-                from .pdf_text import (
-                    TEXT_LAYER_MIN_CHARS_PER_PAGE,
-                    extract_structured_rows,
-                    extract_via_docling,
-                    has_usable_text_layer,
-                )
+                from .pdf_text import extract_via_docling
                 # TD-17e: hybrid Docling + Camelot. Docling primary
                 # (точнее на single-page tables — Spec-1, 2, 3, 6, 7, 8, 11),
                 # Camelot per-page fallback (Spec-9 multi-page без header
@@ -332,10 +333,7 @@ class SpecParser:
                 # 2. PyMuPDF page.find_tables (lines) — для PDFs где
                 #    grid явно нарисована.
                 # 3. Legacy span-based extract_structured_rows — last resort.
-                from .pdf_text import (
-                    extract_with_explicit_columns,
-                    get_last_docling_column_ranges,
-                )
+                from .pdf_text import get_last_docling_column_ranges
                 docling_col_ranges = get_last_docling_column_ranges()
                 # TD-17e: collect pages where Docling returned no parseable
                 # qty. Validate via parse_quantity — garbage in qty cell
@@ -383,61 +381,55 @@ class SpecParser:
                         },
                     )
 
-                for page_num in range(state.pages_total):
+                # Steps 1-3 — CPU-bound, по процессам (page_extract).
+                # Страницы с qty из Camelot — только проверка text layer.
+                fallback_pages = [
+                    pn for pn in range(state.pages_total)
+                    if not _has_real_qty(docling_rows_by_page.get(pn + 1) or [])
+                ]
+                camelot_ready = frozenset(
+                    pn for pn in fallback_pages
+                    if any(
+                        (r.cells.get("qty") or "").strip()
+                        for r in camelot_rows.get(pn + 1) or []
+                    )
+                )
+                extracted = await extract_pages(
+                    pdf_bytes,
+                    fallback_pages,
+                    mode="hybrid",
+                    col_ranges=docling_col_ranges or None,
+                    text_check_only=camelot_ready,
+                )
+                for page_num in fallback_pages:
                     # Trigger hybrid fallback если:
                     # - Docling вернул empty rows для этой страницы;
                     # - rows есть но НИ В ОДНОЙ нет parseable qty
                     #   (mapping broken, garbage в qty cell).
-                    existing = docling_rows_by_page.get(page_num + 1) or []
-                    if _has_real_qty(existing):
+                    page_rows = extracted.get(page_num)
+                    if page_rows is None or page_rows.rows is None:
                         continue
-                    try:
-                        page = doc[page_num]
-                        if not has_usable_text_layer(
-                            page, min_chars=TEXT_LAYER_MIN_CHARS_PER_PAGE
-                        ):
-                            continue
-                        rows = []
-                        # Step 0 (TD-17e): Camelot lattice — для multi-page
-                        # без header (Spec-9). Lattice использует grid-lines.
-                        camelot_page_rows = camelot_rows.get(page_num + 1) or []
-                        if camelot_page_rows:
-                            camelot_has_qty = any(
-                                (r.cells.get("qty") or "").strip()
-                                for r in camelot_page_rows
-                            )
-                            if camelot_has_qty:
-                                rows = camelot_page_rows
-                        # Step 1: explicit columns from Docling page 1.
-                        if not rows and docling_col_ranges:
-                            rows = await run_in_threadpool(
-                                extract_with_explicit_columns,
-                                page,
-                                docling_col_ranges,
-                            )
-                        # Step 2: PyMuPDF find_tables.
-                        if not rows:
-                            rows = await run_in_threadpool(
-                                _extract_rows_via_pymupdf_tables, page,
-                                page_num + 1,
-                            )
-                        # Step 3: legacy span-based.
-                        if not rows:
-                            rows = await run_in_threadpool(
-                                extract_structured_rows, page
-                            )
-                        # Use new rows ONLY if it has qty (better than existing).
-                        rows_has_qty = any(
-                            (r.cells.get("qty") or "").strip() for r in rows
-                        )
-                        if rows and rows_has_qty:
-                            docling_rows_by_page[page_num + 1] = rows
-                            missing_pages.append(page_num + 1)
-                    except Exception as e:
+                    if page_rows.error:
                         logger.warning(
                             "TD-17 hybrid fallback failed",
-                            extra={"page": page_num + 1, "error": str(e)},
+                            extra={"page": page_num + 1, "error": page_rows.error},
                         )
+                        continue
+                    # Step 0 (TD-17e): Camelot lattice — для multi-page
+                    # без header (Spec-9). Lattice использует grid-lines.
+                    # Steps 1-3: explicit columns from Docling page 1 →
+                    # PyMuPDF find_tables → legacy span-based.
+                    if page_num in camelot_ready:
+                        rows = camelot_rows[page_num + 1]
+                    else:
+                        rows = page_rows.rows
+                    # Use new rows ONLY if it has qty (better than existing).
+                    rows_has_qty = any(
+                        (r.cells.get("qty") or "").strip() for r in rows
+                    )
+                    if rows and rows_has_qty:
+                        docling_rows_by_page[page_num + 1] = rows
+                        missing_pages.append(page_num + 1)
                 if docling_empty and missing_pages:
                     logger.info(
                         "TD-17 docling empty (rotation issue?) → full legacy fallback",
@@ -534,24 +526,27 @@ class SpecParser:
                     },
                 )
 
+        # Span-based extract — CPU-bound, по процессам (page_extract).
+        extract_nums = [
+            pn for pn in range(state.pages_total)
+            if not (settings.pdf_extract_via_docling and (pn + 1) in docling_rows_by_page)
+        ]
+        extracted = await extract_pages(getattr(self, "_pdf_bytes", b""), extract_nums)
         for page_num in range(state.pages_total):
             # TD-17: при наличии Docling rows для страницы — приоритетный путь.
             if settings.pdf_extract_via_docling and (page_num + 1) in docling_rows_by_page:
                 pages_rows.append(docling_rows_by_page[page_num + 1])
                 continue
-            try:
-                page = doc[page_num]
-                if not has_usable_text_layer(page, min_chars=TEXT_LAYER_MIN_CHARS_PER_PAGE):
-                    pages_rows.append([])
-                    continue
-                rows: list[TableRow] = await run_in_threadpool(extract_structured_rows, page)
-                pages_rows.append(rows)
-            except Exception as e:  # pragma: no cover - защита от fitz-exceptions
+            page_rows = extracted.get(page_num)
+            if page_rows is None or page_rows.rows is None:
+                pages_rows.append([])
+                continue
+            if page_rows.error:  # pragma: no cover - защита от fitz-exceptions
                 logger.warning(
                     "extract_structured_rows failed",
-                    extra={"page": page_num + 1, "error": str(e)},
+                    extra={"page": page_num + 1, "error": page_rows.error},
                 )
-                pages_rows.append([])
+            pages_rows.append(page_rows.rows)
 
         # Фаза 1b — cross-page continuation (spec-2 заход 2/10, Класс C).
         # Rows в НАЧАЛЕ страницы N > 0 с пустыми pos+qty+model+unit+brand
@@ -688,43 +683,47 @@ class SpecParser:
             eta_seconds=max(1, state.pages_total * 5),
         )
 
-        async def run_one(
-            page_num: int, rows: list[TableRow], section: str, sticky: str
-        ) -> tuple[int, Any]:
-            if not rows:
-                return page_num, None
+        async def run_batch(
+            batch: list[NormalizeRequest],
+        ) -> list[tuple[int, Any]]:
+            # Соседние разреженные страницы — одним LLM-call'ом
+            # (plan_normalize_batches); section/sticky у каждой свои.
             async with llm_sema:
                 try:
-                    norm = await normalize_via_llm(
+                    norms = await normalize_batch_via_llm(
                         self.provider,
-                        rows,
-                        page_number=page_num + 1,
-                        current_section=section,
-                        sticky_parent_name=sticky,
+                        batch,
                         max_tokens=settings.llm_normalize_max_tokens,
                     )
                 except NotImplementedError:
-                    return page_num, "no_text_complete"
-                except LLMNormalizationError as e:
+                    return [(req.page_number - 1, "no_text_complete") for req in batch]
+            results: list[tuple[int, Any]] = []
+            for req, norm in zip(batch, norms, strict=True):
+                page_num = req.page_number - 1
+                if isinstance(norm, LLMNormalizationError):
                     logger.warning(
                         "llm normalize failed",
-                        extra={"page": page_num + 1, "error": str(e)},
+                        extra={"page": page_num + 1, "error": str(norm)},
                     )
-                    return page_num, None
-            # E19 hotfix: inline post-process + fire_page_done СРАЗУ после LLM
-            # ответа, до возврата из run_one. Раньше post-process делался в
-            # Phase 5 после gather всех страниц — на 87-страничном PDF это
-            # значит page_done callbacks стреляли волной через 5 часов вместо
-            # инкрементального прогресса. Теперь fire стреляет per-page как
-            # только LLM ответил для этой страницы.
-            #
-            # Если страница попадёт под Phase 4 multimodal retry, retry
-            # запишет новый norm в final_by_page — Phase 5 переобрабатывает
-            # его (set _inline_processed_pages не содержит этот page).
-            self._apply_postprocess(norm, rows=rows, initial_sticky=sticky)
-            await self._fire_page_done(page_num + 1, norm.items)
-            self._inline_processed_pages.add(page_num)
-            return page_num, norm
+                    results.append((page_num, None))
+                    continue
+                # E19 hotfix: inline post-process + fire_page_done СРАЗУ после LLM
+                # ответа, до возврата из run_batch. Раньше post-process делался в
+                # Phase 5 после gather всех страниц — на 87-страничном PDF это
+                # значит page_done callbacks стреляли волной через 5 часов вместо
+                # инкрементального прогресса. Теперь fire стреляет per-page как
+                # только LLM ответил для этой страницы.
+                #
+                # Если страница попадёт под Phase 4 multimodal retry, retry
+                # запишет новый norm в final_by_page — Phase 5 переобрабатывает
+                # его (set _inline_processed_pages не содержит этот page).
+                self._apply_postprocess(
+                    norm, rows=req.rows, initial_sticky=req.sticky_parent_name
+                )
+                await self._fire_page_done(page_num + 1, norm.items)
+                self._inline_processed_pages.add(page_num)
+                results.append((page_num, norm))
+            return results
 
         async def run_vision_counter_gated(page_num: int) -> int:
             async with llm_sema:
@@ -741,12 +740,19 @@ class SpecParser:
                     doc, page_num, rows, norm, sticky_ctx
                 )
 
-        tasks = [
-            run_one(pn, rows, section, sticky)
+        batches = plan_normalize_batches([
+            NormalizeRequest(
+                page_number=pn + 1,
+                rows=rows,
+                current_section=section,
+                sticky_parent_name=sticky,
+            )
             for pn, (rows, (section, sticky)) in enumerate(
                 zip(pages_rows, stickies, strict=True)
             )
-        ]
+            if rows
+        ])
+        tasks = [run_batch(batch) for batch in batches]
 
         # E15-06 it2 (#52/#9) — vision-based safety-net. Параллельно с text-
         # normalize запускаем cheap vision-call per page: LLM считает позиции
@@ -766,7 +772,11 @@ class SpecParser:
                     run_vision_counter_gated(page_num)
                 )
 
-        outcomes = await _asyncio.gather(*tasks)
+        outcomes = [
+            outcome
+            for batch_outcomes in await _asyncio.gather(*tasks)
+            for outcome in batch_outcomes
+        ]
 
         vision_counts: dict[int, int] = {}
         if vision_enabled and vision_count_jobs:
@@ -796,7 +806,7 @@ class SpecParser:
             if norm is None:
                 continue
             phase1_by_page[page_num] = norm
-            state.llm_calls += 1
+            state.llm_calls += norm.llm_calls
             state.llm_prompt_tokens += norm.prompt_tokens
             state.llm_completion_tokens += norm.completion_tokens
             state.llm_cached_tokens += norm.cached_tokens
@@ -986,7 +996,9 @@ class SpecParser:
     ) -> tuple[int, NormalizedPage | None]:
         """Выполнить Phase 2: render page → base64 PNG → multimodal normalize."""
         try:
-            img_b64 = await run_in_threadpool(render_page_to_b64, doc, page_num)
+            img_b64 = await run_in_threadpool(
+                render_page_to_b64, doc, page_num, self.provider.image_format
+            )
         except Exception as e:  # pragma: no cover
             logger.warning(
                 "multimodal render failed",
@@ -1215,12 +1227,23 @@ class SpecParser:
         if self._on_page_done is None:
             return
         try:
+            # NormalizedItem → SpecItem-форма (как в finished): backend в
+            # stream-режиме вставляет позиции страницы сразу. Секция — только
+            # per-item (page-level контекст известен лишь в Phase 5), sort_order
+            # backend назначает сам.
             payload: list[dict] = []
             for it in items:
                 if isinstance(it, SpecItem):
                     payload.append(it.model_dump())
                 else:
-                    payload.append(asdict(it))
+                    payload.append(
+                        _spec_item_from_normalized(
+                            it,
+                            section=it.section_name,
+                            page_number=page_1based,
+                            sort_order=0,
+                        ).model_dump()
+                    )
             await self._on_page_done(page_1based, payload)
         except asyncio.CancelledError:
             raise
@@ -1265,7 +1288,9 @@ class SpecParser:
                 return
 
             # Vision fallback — для сканов/битого text layer.
-            page_b64 = await run_in_threadpool(render_page_to_b64, doc, page_num)
+            page_b64 = await run_in_threadpool(
+                render_page_to_b64, doc, page_num, self.provider.image_format
+            )
 
             classification = await self._classify_page(page_b64, page_num)
             if classification.get("section_name"):
@@ -1452,7 +1477,9 @@ class SpecParser:
         При любой ошибке возвращает 0 (safety-net не триггерит retry).
         """
         try:
-            img_b64 = await run_in_threadpool(render_page_to_b64, doc, page_num)
+            img_b64 = await run_in_threadpool(
+                render_page_to_b64, doc, page_num, self.provider.image_format
+            )
         except Exception as e:  # pragma: no cover
             logger.warning(
                 "vision_counter render failed",
@@ -1473,7 +1500,6 @@ class SpecParser:
         """
         state = self.state
         for item_data in normalized.items:
-            final_name = _merge_system_prefix(item_data)
             state.sort_order += 1
             section = (
                 item_data.section_name
@@ -1481,16 +1507,9 @@ class SpecParser:
                 or state.current_section
             )
             state.items.append(
-                SpecItem(
-                    name=final_name[:500],
-                    model_name=item_data.model_name,
-                    brand=item_data.brand,
-                    manufacturer=item_data.manufacturer,
-                    unit=item_data.unit or "шт",
-                    quantity=item_data.quantity,
-                    tech_specs="",  # comments теперь отдельное поле
-                    comments=item_data.comments,
-                    section_name=section,
+                _spec_item_from_normalized(
+                    item_data,
+                    section=section,
                     page_number=page_num + 1,
                     sort_order=state.sort_order,
                 )
@@ -1532,10 +1551,11 @@ class SpecParser:
         # PDF-level scanned detection: avg chars/page across ВСЕХ
         # страниц. Если pdf scanned — все pages в Vision (даже если
         # одна имеет footer text > threshold).
+        text_cache = PageTextCache.of(doc)
         pdf_total_chars = 0
         for _pn in range(self.state.pages_total):
             try:
-                pdf_total_chars += len(doc[_pn].get_text("text") or "")
+                pdf_total_chars += len(text_cache.text(_pn))
             except Exception:
                 pass
         pdf_avg_chars = (
@@ -1547,10 +1567,9 @@ class SpecParser:
         intervened_pages: list[dict] = []
         for page_num in range(self.state.pages_total):
             try:
-                page = doc[page_num]
+                page_text = text_cache.text(page_num)
             except Exception:
                 continue
-            page_text = page.get_text("text") or ""
 
             # Trigger A: scanned PDF (PDF-level avg < threshold).
             is_scanned = pdf_is_scanned
@@ -1606,7 +1625,7 @@ class SpecParser:
 
             try:
                 image_b64 = await run_in_threadpool(
-                    render_page_to_b64, doc, page_num
+                    render_page_to_b64, doc, page_num, self.provider.image_format
                 )
                 items_dicts = await self._extract_items(
                     image_b64, page_num
@@ -1817,6 +1836,24 @@ def _apply_vision_sticky(raw_name: str, sticky: str) -> str:
     return raw_name
 
 
+def _spec_item_from_normalized(
+    item: NormalizedItem, *, section: str, page_number: int, sort_order: int
+) -> SpecItem:
+    return SpecItem(
+        name=_merge_system_prefix(item)[:500],
+        model_name=item.model_name,
+        brand=item.brand,
+        manufacturer=item.manufacturer,
+        unit=item.unit or "шт",
+        quantity=item.quantity,
+        tech_specs="",  # comments теперь отдельное поле
+        comments=item.comments,
+        section_name=section,
+        page_number=page_number,
+        sort_order=sort_order,
+    )
+
+
 def _merge_system_prefix(item: NormalizedItem) -> str:
     """Склейка system_prefix с name через `-` (R7 в TЗ E15.04).
 
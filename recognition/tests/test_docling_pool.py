@@ -0,0 +1,82 @@
+"""Пул Docling converter'ов (docling_pool).
+
+Контракт: converter каждого вида строится один раз на процесс и
+переиспользуется; время прогрева видно в healthz. Сам docling в тестах не
+нужен — build_converter подменяется.
+"""
+
+import threading
+
+import pytest
+
+from app.services import docling_pool
+
+
+@pytest.fixture()
+def fake_build(monkeypatch):
+    built: list[bool] = []
+
+    def _build(ocr):
+        built.append(ocr)
+        return f"converter-{'ocr' if ocr else 'text'}"
+
+    monkeypatch.setattr(docling_pool, "build_converter", _build)
+    monkeypatch.setattr(docling_pool, "_CONVERTERS", {})
+    monkeypatch.setattr(docling_pool, "_WARMUP_SECONDS", {})
+    monkeypatch.setattr(docling_pool.settings, "pdf_docling_worker_process", False)
+    monkeypatch.setattr(
+        docling_pool, "_STATUS", {"state": "cold", "warmup_seconds": {}, "error": ""}
+    )
+    return built
+
+
+def test_converters_built_once_per_kind(fake_build, monkeypatch):
+    seen = []
+
+    def _tables(pdf_bytes, get_converter):
+        seen.append(get_converter(pdf_bytes == b"scan"))
+        return {1: []}, {"qty": (1.0, 2.0)}
+
+    monkeypatch.setattr(docling_pool, "docling_tables", _tables)
+
+    for pdf in (b"text", b"scan", b"text", b"scan"):
+        out, ranges = docling_pool.convert_in_process(pdf)
+        assert out == {1: []}
+        assert ranges == {"qty": (1.0, 2.0)}
+
+    assert sorted(fake_build) == [False, True]
+    assert seen == ["converter-text", "converter-ocr"] * 2
+
+
+def test_warmup_reports_seconds_in_snapshot(fake_build):
+    done = threading.Event()
+    original = docling_pool._on_warmup_done
+
+    def _done(future):
+        original(future)
+        done.set()
+
+    docling_pool._on_warmup_done = _done
+    try:
+        docling_pool.start_warmup()
+        assert done.wait(5)
+    finally:
+        docling_pool._on_warmup_done = original
+
+    snap = docling_pool.snapshot()
+    assert snap["state"] == "ready"
+    assert set(snap["warmup_seconds"]) == {"text", "ocr"}
+    # Повторный старт прогрева не перестраивает converter'ы
+    docling_pool.start_warmup()
+    assert sorted(fake_build) == [False, True]
+
+
+def test_extract_via_docling_publishes_column_ranges(monkeypatch):
+    from app.services import pdf_text
+
+    monkeypatch.setattr(
+        docling_pool, "convert", lambda pdf_bytes: ({2: []}, {"name": (10.0, 90.0)})
+    )
+
+    assert pdf_text.extract_via_docling(b"%PDF") == {2: []}
+    assert pdf_text.get_last_docling_column_ranges() == {"name": (10.0, 90.0)}
@@ -13,3 +13,17 @@ def test_healthz(client):
 def test_healthz_no_auth_required(client):
     resp = client.get("/v1/healthz")
     assert resp.status_code == 200
+
+
+def test_healthz_exposes_llm_throttle_metrics(client):
+    body = client.get("/v1/healthz").json()
+    throttle = body["llm_throttle"]
+    assert throttle["capacity"] >= 1
+    assert set(throttle["classes"]) == {"interactive", "bulk"}
+    assert {"queue_depth", "wait_p95_ms"} <= set(throttle["classes"]["bulk"])
+
+
+def test_healthz_exposes_docling_warmup(client):
+    docling = client.get("/v1/healthz").json()["docling"]
+    assert docling["state"] in {"cold", "warming", "ready", "unavailable", "error"}
+    assert isinstance(docling["warmup_seconds"], dict)
@@ -0,0 +1,317 @@
+"""Durable job store: checkpoint LLM-ответов и resume async jobs после рестарта."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.api import parse as parse_api
+from app.providers.openai_vision import OpenAIVisionProvider
+from app.schemas.spec import PagesStats, SpecItem, SpecParseResponse
+from app.services import job_registry, job_store, spec_parser
+
+PDF_BYTES = b"%PDF-1.4\n%fake-content-for-tests\n"
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> job_store.JobStore:
+    monkeypatch.setattr(job_store.settings, "job_store_path", str(tmp_path / "jobs.sqlite3"))
+    s = job_store.get_store()
+    assert s is not None
+    yield s
+    job_store.close_store()
+
+
+@pytest.fixture
+def callback_replies() -> dict[str, dict[str, Any]]:
+    """Тело ответа backend'а по event'у callback'а (по умолчанию {"ok": True})."""
+    return {}
+
+
+@pytest.fixture
+def captured_callbacks(
+    monkeypatch: pytest.MonkeyPatch, callback_replies: dict[str, dict[str, Any]]
+) -> list[dict[str, Any]]:
+    events: list[dict[str, Any]] = []
+
+    class _FakeResponse:
+        status_code = 200
+        is_success = True
+
+        def __init__(self, body: dict[str, Any]) -> None:
+            self._body = body
+
+        def json(self) -> dict[str, Any]:
+            return self._body
+
+    class _FakeAsyncClient:
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            pass
+
+        async def __aenter__(self) -> _FakeAsyncClient:
+            return self
+
+        async def __aexit__(self, *args: Any) -> None:
+            return None
+
+        async def post(self, url: str, json: dict[str, Any] | None = None, headers: Any = None) -> _FakeResponse:
+            events.append(json or {})
+            return _FakeResponse(callback_replies.get((json or {}).get("event", ""), {"ok": True}))
+
+    monkeypatch.setattr("app.api.parse._make_callback_client", _FakeAsyncClient)
+    return events
+
+
+def _create(store: job_store.JobStore, job_id: str, *, stream_pages: bool = True) -> None:
+    store.create(
+        job_id,
+        PDF_BYTES,
+        filename="spec.pdf",
+        callback_url="http://callback.example.test/cb",
+        callback_token="tok",
+        stream_pages=stream_pages,
+        llm_headers={"x-llm-model": "gpt-test"},
+    )
+
+
+def _two_page_parse(calls: list[int]) -> Any:
+    async def fake_parse(
+        self: Any, pdf_bytes: bytes, filename: str = "x.pdf", *, on_page_done: Any = None
+    ) -> SpecParseResponse:
+        calls.append(1)
+        await on_page_done(1, [{"name": "ItemA", "quantity": 1}])
+        await on_page_done(2, [{"name": "ItemB", "quantity": 2}])
+        return SpecParseResponse(
+            status="done",
+            items=[
+                SpecItem(name="ItemA", quantity=1, page_number=1, sort_order=1),
+                SpecItem(name="ItemB", quantity=2, page_number=2, sort_order=2),
+            ],
+            pages_stats=PagesStats(total=2, processed=2),
+        )
+
+    return fake_parse
+
+
+async def _drain() -> None:
+    async with job_registry._LOCK:
+        tasks = list(job_registry._JOBS.values())
+    for task in tasks:
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+def test_store_roundtrip(store: job_store.JobStore) -> None:
+    _create(store, "job-1")
+    store.record_page("job-1", 1, 3, "d1", [{"name": "A"}])
+    store.save_llm("job-1", "k", {"choices": []})
+
+    [job] = store.running_jobs()
+    assert job.job_id == "job-1"
+    assert job.stream_pages is True
+    assert job.llm_headers == {"x-llm-model": "gpt-test"}
+    assert job.last_seq == 3
+    assert Path(job.pdf_path).read_bytes() == PDF_BYTES
+    assert store.pages("job-1")[1].digest == "d1"
+    assert store.load_llm("job-1", "k") == {"choices": []}
+
+    store.delete("job-1")
+    assert store.running_jobs() == []
+    assert store.load_llm("job-1", "k") is None
+    assert not Path(job.pdf_path).exists()
+
+
+@pytest.mark.asyncio
+async def test_provider_replays_llm_response_from_checkpoint(
+    store: job_store.JobStore, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _create(store, "job-llm")
+    calls: list[dict] = []
+
+    async def fake_post(self: Any, payload: dict) -> dict:
+        calls.append(payload)
+        return {"choices": [{"message": {"content": "{}"}}]}
+
+    monkeypatch.setattr(OpenAIVisionProvider, "_post_with_retry_unguarded", fake_post)
+    provider = OpenAIVisionProvider(api_key="sk-test")
+    payload = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    try:
+        # Вне checkpoint_context — ни чтения, ни записи.
+        await provider._post_with_retry(payload)
+        with job_store.checkpoint_context("job-llm"):
+            first = await provider._post_with_retry(payload)
+            second = await provider._post_with_retry(payload)
+    finally:
+        await provider.aclose()
+
+    assert first == second
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_resume_skips_delivered_pages_and_continues_seq(
+    store: job_store.JobStore,
+    captured_callbacks: list[dict[str, Any]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _create(store, "job-r")
+    page1 = [{"name": "ItemA", "quantity": 1}]
+    store.record_page("job-r", 1, 1, parse_api._page_digest(page1), page1)
+    parse_calls: list[int] = []
+    monkeypatch.setattr(spec_parser.SpecParser, "parse", _two_page_parse(parse_calls))
+
+    assert await parse_api.resume_interrupted_jobs() == 1
+    await _drain()
+
+    events = [e["event"] for e in captured_callbacks]
+    assert "started" not in events
+    pages = [(e["page"], e["seq"]) for e in captured_callbacks if e["event"] == "page_done"]
+    assert pages == [(2, 2)]
+    finished = captured_callbacks[-1]
+    assert finished["event"] == "finished"
+    assert finished["page_seqs"] == {"1": 1, "2": 2}
+    assert store.running_jobs() == []
+
+
+@pytest.mark.asyncio
+async def test_resume_gives_up_after_max_attempts(
+    store: job_store.JobStore,
+    captured_callbacks: list[dict[str, Any]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(parse_api.settings, "job_resume_max_attempts", 1)
+    _create(store, "job-crashy")
+    store.mark_resumed("job-crashy")
+
+    assert await parse_api.resume_interrupted_jobs() == 0
+
+    assert [e["event"] for e in captured_callbacks] == ["failed"]
+    assert store.running_jobs() == []
+
+
+def test_api_key_not_persisted(store: job_store.JobStore) -> None:
+    store.create(
+        "job-key",
+        PDF_BYTES,
+        filename="spec.pdf",
+        callback_url="http://callback.example.test/cb",
+        callback_token="tok",
+        stream_pages=True,
+        llm_headers={"x-llm-model": "gpt-test", "x-llm-api-key": "sk-secret"},
+    )
+
+    [job] = store.running_jobs()
+    assert job.llm_headers == {"x-llm-model": "gpt-test"}
+    assert job.secrets_stripped is True
+    assert Path(job.pdf_path).read_bytes() == PDF_BYTES
+    for db_file in store.path.parent.glob(f"{store.path.name}*"):
+        assert b"sk-secret" not in db_file.read_bytes()
+
+
+def _create_with_key(store: job_store.JobStore, job_id: str) -> None:
+    store.create(
+        job_id,
+        PDF_BYTES,
+        filename="spec.pdf",
+        callback_url="http://callback.example.test/cb",
+        callback_token="tok",
+        stream_pages=True,
+        llm_headers={"x-llm-extract-model": "m-test", "x-llm-api-key": "sk-secret"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_resume_refetches_request_api_key(
+    store: job_store.JobStore,
+    captured_callbacks: list[dict[str, Any]],
+    callback_replies: dict[str, dict[str, Any]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _create_with_key(store, "job-key")
+    callback_replies["llm_headers"] = {"llm_headers": {"X-LLM-API-Key": "sk-profile"}}
+    providers: list[dict[str, str]] = []
+    real_provider_from_headers = parse_api.provider_from_headers
+
+    def spy_provider(headers: dict[str, str]) -> Any:
+        providers.append(dict(headers))
+        return real_provider_from_headers(headers)
+
+    monkeypatch.setattr(parse_api, "provider_from_headers", spy_provider)
+    monkeypatch.setattr(spec_parser.SpecParser, "parse", _two_page_parse([]))
+
+    assert await parse_api.resume_interrupted_jobs() == 1
+    await _drain()
+
+    assert captured_callbacks[0]["event"] == "llm_headers"
+    assert providers == [{"x-llm-extract-model": "m-test", "x-llm-api-key": "sk-profile"}]
+    assert captured_callbacks[-1]["event"] == "finished"
+    assert store.running_jobs() == []
+
+
+@pytest.mark.asyncio
+async def test_resume_fails_job_when_llm_headers_not_resupplied(
+    store: job_store.JobStore,
+    captured_callbacks: list[dict[str, Any]],
+) -> None:
+    _create_with_key(store, "job-key")
+
+    assert await parse_api.resume_interrupted_jobs() == 0
+
+    assert [e["event"] for e in captured_callbacks] == ["llm_headers", "failed"]
+    assert "could not be re-fetched" in captured_callbacks[-1]["error"]
+    assert store.running_jobs() == []
+
+
+@pytest.mark.asyncio
+async def test_shutdown_keeps_job_user_cancel_finishes(
+    store: job_store.JobStore,
+    captured_callbacks: list[dict[str, Any]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    started = asyncio.Event()
+
+    async def hanging_parse(self: Any, *args: Any, **kwargs: Any) -> SpecParseResponse:
+        started.set()
+        await asyncio.sleep(60)
+        raise AssertionError("unreachable")
+
+    monkeypatch.setattr(spec_parser.SpecParser, "parse", hanging_parse)
+
+    async def run(job_id: str) -> asyncio.Task[None]:
+        _create(store, job_id, stream_pages=False)
+        started.clear()
+        task = asyncio.create_task(
+            parse_api._run_async_spec_job(
+                job_id=job_id,
+                pdf_bytes=PDF_BYTES,
+                filename="spec.pdf",
+                callback_url="http://callback.example.test/cb",
+                callback_token="",
+                provider=OpenAIVisionProvider(api_key="sk-test"),
+            )
+        )
+        await job_registry.register(job_id, task)
+        await started.wait()
+        return task
+
+    # Shutdown: task отменён event loop'ом, не через /cancel.
+    task = await run("job-shutdown")
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert "cancelled" not in [e["event"] for e in captured_callbacks]
+    assert [j.job_id for j in store.running_jobs()] == ["job-shutdown"]
+
+    # Отмена пользователем — cancelled callback, job удалён из store.
+    store.delete("job-shutdown")
+    task = await run("job-user")
+    assert await job_registry.cancel("job-user")
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert captured_callbacks[-1]["event"] == "cancelled"
+    assert store.running_jobs() == []
@@ -51,16 +51,16 @@ class TestBoolHeader:
         req = _fake_request({"X-Test": raw})
         # default = противоположность ожидаемого, чтобы убедиться что parser
         # действительно прочитал header а не вернул default.
-        assert _bool_header(req, "X-Test", not expected) is expected
+        assert _bool_header(req.headers, "X-Test", not expected) is expected
 
     def test_missing_header_returns_default(self) -> None:
         req = _fake_request({})
-        assert _bool_header(req, "X-Test", True) is True
-        assert _bool_header(req, "X-Test", False) is False
+        assert _bool_header(req.headers, "X-Test", True) is True
+        assert _bool_header(req.headers, "X-Test", False) is False
 
     def test_garbage_returns_default(self) -> None:
         req = _fake_request({"X-Test": "maybe"})
-        assert _bool_header(req, "X-Test", True) is True
+        assert _bool_header(req.headers, "X-Test", True) is True
 
 
 class TestGetProviderDefaults:
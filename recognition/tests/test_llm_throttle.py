@@ -1,9 +1,10 @@
-"""Tests for E19-1: process-level LLM concurrency semaphore."""
+"""Tests for E19-1: process-level LLM throttle (weighted fair queue)."""
 
 from __future__ import annotations
 
 import asyncio
 
+import httpx
 import pytest
 
 from app.services import llm_throttle
@@ -22,25 +23,24 @@ async def _reset_throttle() -> None:
 async def test_lazy_creation_uses_settings_default() -> None:
     from app.config import settings
 
-    sema = await llm_throttle.get_global_semaphore()
-    assert isinstance(sema, asyncio.Semaphore)
+    scheduler = llm_throttle.get_scheduler()
+    assert isinstance(scheduler, llm_throttle.FairScheduler)
     assert llm_throttle.get_capacity() == settings.llm_global_concurrency
 
 
 @pytest.mark.asyncio
-async def test_set_capacity_recreates_semaphore() -> None:
-    sema_a = await llm_throttle.get_global_semaphore()
+async def test_set_capacity_recreates_scheduler() -> None:
+    sched_a = llm_throttle.get_scheduler()
     await llm_throttle.set_capacity(7)
-    sema_b = await llm_throttle.get_global_semaphore()
-    assert sema_a is not sema_b
+    sched_b = llm_throttle.get_scheduler()
+    assert sched_a is not sched_b
     assert llm_throttle.get_capacity() == 7
 
 
 @pytest.mark.asyncio
-async def test_semaphore_caps_concurrent_holders() -> None:
-    """capacity=2 → не более двух одновременных acquire'ов; третий ждёт."""
+async def test_slot_caps_concurrent_holders() -> None:
+    """capacity=2 → не более двух одновременных слотов; остальные ждут."""
     await llm_throttle.set_capacity(2)
-    sema = await llm_throttle.get_global_semaphore()
 
     in_flight = 0
     peak = 0
@@ -49,7 +49,7 @@ async def test_semaphore_caps_concurrent_holders() -> None:
 
     async def worker(idx: int) -> None:
         nonlocal in_flight, peak
-        async with sema:
+        async with llm_throttle.slot():
             in_flight += 1
             peak = max(peak, in_flight)
             if idx == 1:
@@ -58,23 +58,140 @@ async def test_semaphore_caps_concurrent_holders() -> None:
             in_flight -= 1
 
     tasks = [asyncio.create_task(worker(i)) for i in range(5)]
-    # Дождаться что первые два «вошли», и проверить что больше двух
-    # параллельно не работает.
     await started.wait()
     await asyncio.sleep(0.05)
     assert peak == 2
+    assert llm_throttle.snapshot()["classes"]["interactive"]["queue_depth"] == 3
 
     release.set()
     await asyncio.gather(*tasks)
     assert peak == 2  # больше не выросло после release
+    assert llm_throttle.snapshot()["in_flight"] == 0
 
 
 @pytest.mark.asyncio
-async def test_returns_same_semaphore_across_calls() -> None:
-    """Без set_capacity — лениво созданный семафор шарится между вызовами."""
-    s1 = await llm_throttle.get_global_semaphore()
-    s2 = await llm_throttle.get_global_semaphore()
-    assert s1 is s2
+async def test_returns_same_scheduler_across_calls() -> None:
+    """Без set_capacity — лениво созданный scheduler шарится между вызовами."""
+    assert llm_throttle.get_scheduler() is llm_throttle.get_scheduler()
+
+
+async def _run_calls(calls: list[tuple[str, str, int]], order: list[str]) -> None:
+    """calls: (class, owner, count); каждый call держит слот 10ms."""
+    gate = asyncio.Event()
+
+    async def one(priority: str, owner: str) -> None:
+        with llm_throttle.priority_context(priority, owner):
+            await gate.wait()
+            async with llm_throttle.slot():
+                order.append(owner)
+                await asyncio.sleep(0.01)
+
+    tasks = [
+        asyncio.create_task(one(priority, owner))
+        for priority, owner, count in calls
+        for _ in range(count)
+    ]
+    gate.set()
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_interactive_overtakes_bulk_queue(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Sync-запрос, пришедший за 20 bulk-вызовами, получает слот сразу
+    после освобождения, а не в конце очереди."""
+    monkeypatch.setattr(llm_throttle.settings, "llm_interactive_weight", 8)
+    await llm_throttle.set_capacity(1)
+    order: list[str] = []
+
+    async def bulk() -> None:
+        await _run_calls([(llm_throttle.PRIORITY_BULK, "job-big", 20)], order)
+
+    bulk_task = asyncio.create_task(bulk())
+    await asyncio.sleep(0.015)
+    await _run_calls([(llm_throttle.PRIORITY_INTERACTIVE, "invoice", 2)], order)
+    await bulk_task
+
+    first_invoice = order.index("invoice")
+    assert first_invoice <= 3
+    assert order[first_invoice + 1] == "invoice"
+    stats = llm_throttle.snapshot()["classes"]
+    assert stats["bulk"]["granted"] == 20
+    assert stats["interactive"]["granted"] == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_not_starved_by_interactive(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(llm_throttle.settings, "llm_interactive_weight", 3)
+    await llm_throttle.set_capacity(1)
+    order: list[str] = []
+    await _run_calls(
+        [
+            (llm_throttle.PRIORITY_INTERACTIVE, "sync", 12),
+            (llm_throttle.PRIORITY_BULK, "job", 4),
+        ],
+        order,
+    )
+    # Weight 3: bulk получает слот примерно каждый 4-й раз, а не после всех sync.
+    assert order.index("job") <= 4
+    assert order[:8].count("job") == 2
+
+
+@pytest.mark.asyncio
+async def test_round_robin_between_bulk_jobs() -> None:
+    await llm_throttle.set_capacity(1)
+    order: list[str] = []
+    await _run_calls(
+        [
+            (llm_throttle.PRIORITY_BULK, "job-a", 6),
+            (llm_throttle.PRIORITY_BULK, "job-b", 2),
+        ],
+        order,
+    )
+    # Первый job-a берёт свободный слот, дальше очередь чередует owner'ов:
+    # job-b не ждёт, пока job-a выберет свои 6 вызовов.
+    assert order[:5] == ["job-a", "job-a", "job-b", "job-a", "job-b"]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_cooldown_pauses_grants() -> None:
+    await llm_throttle.set_capacity(2)
+    llm_throttle.note_rate_limited(0.2)
+    assert llm_throttle.cooldown_remaining() > 0
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    async with llm_throttle.slot():
+        waited = loop.time() - started
+    assert waited >= 0.15
+    assert llm_throttle.snapshot()["classes"]["interactive"]["wait_max_ms"] >= 150
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue() -> None:
+    await llm_throttle.set_capacity(1)
+    release = asyncio.Event()
+
+    async def holder() -> None:
+        async with llm_throttle.slot():
+            await release.wait()
+
+    async def waiter() -> None:
+        async with llm_throttle.slot():
+            pass
+
+    h = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    w = asyncio.create_task(waiter())
+    await asyncio.sleep(0.01)
+    assert llm_throttle.snapshot()["classes"]["interactive"]["queue_depth"] == 1
+    w.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await w
+    assert llm_throttle.snapshot()["classes"]["interactive"]["queue_depth"] == 0
+    release.set()
+    await h
+    async with llm_throttle.slot():
+        assert llm_throttle.snapshot()["in_flight"] == 1
 
 
 @pytest.mark.asyncio
@@ -114,3 +231,37 @@ async def test_provider_uses_global_throttle(monkeypatch: pytest.MonkeyPatch) ->
         await provider.aclose()
 
     assert peak == 1
+
+
+@pytest.mark.asyncio
+async def test_provider_429_sets_cooldown(monkeypatch: pytest.MonkeyPatch) -> None:
+    """429 + Retry-After → throttle cooldown; retry ждёт конец окна."""
+    from app.providers.openai_vision import OpenAIVisionProvider
+
+    sleeps: list[float] = []
+
+    async def fake_sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "7"}, request=httpx.Request("POST", "http://x")),
+        httpx.Response(
+            200,
+            json={"choices": [{"message": {"content": "{}"}}], "usage": {}},
+            request=httpx.Request("POST", "http://x"),
+        ),
+    ]
+
+    async def fake_post(*args: object, **kwargs: object) -> httpx.Response:
+        return responses.pop(0)
+
+    provider = OpenAIVisionProvider(api_key="sk-test", model="gpt-4o-mini")
+    monkeypatch.setattr(provider._client, "post", fake_post)
+    monkeypatch.setattr("app.providers.openai_vision.asyncio.sleep", fake_sleep)
+    try:
+        await provider._post_with_retry({"model": "x"})
+    finally:
+        await provider.aclose()
+
+    assert 6 < llm_throttle.cooldown_remaining() <= 7
+    assert len(sleeps) == 1 and 6 < sleeps[0] <= 7
@@ -15,9 +15,12 @@ from app.services.spec_normalizer import (
     LLMNormalizationError,
     NormalizedItem,
     NormalizedPage,
+    NormalizeRequest,
     compute_confidence,
+    normalize_batch_via_llm,
     normalize_via_llm,
     normalize_via_llm_multimodal,
+    plan_normalize_batches,
 )
 
 
@@ -624,3 +627,110 @@ async def test_expected_count_negative_falls_back():
     rows = [_row(0, {"name": "Item"})]
     page = await normalize_via_llm(provider, rows, page_number=1)
     assert page.expected_count == 1
+
+
+# --- Пакетная нормализация нескольких страниц --------------------------------
+
+
+class _QueueProvider(BaseLLMProvider):
+    """text_complete отдаёт ответы по очереди и запоминает ВХОДЫ."""
+
+    def __init__(self, responses: list[str]):
+        self._responses = list(responses)
+        self.prompts: list[str] = []
+
+    async def vision_complete(self, image_b64, prompt):  # noqa: ARG002
+        raise AssertionError("vision не должен вызываться в normalize-тестах")
+
+    async def text_complete(self, prompt, *, max_tokens=None, temperature=0.0, system_prompt=None):  # noqa: ARG002
+        self.prompts.append(prompt)
+        return TextCompletion(
+            content=self._responses.pop(0), prompt_tokens=300, completion_tokens=90
+        )
+
+
+def _request(page: int, n_rows: int, section: str = "", sticky: str = "") -> NormalizeRequest:
+    rows = [_row(i, {"name": f"Позиция {page}.{i}", "qty": "1"}) for i in range(n_rows)]
+    return NormalizeRequest(
+        page_number=page, rows=rows, current_section=section, sticky_parent_name=sticky
+    )
+
+
+def test_plan_batches_packs_sparse_pages_within_limits():
+    requests = [_request(1, 3), _request(2, 4), _request(3, 30), _request(4, 2), _request(5, 2)]
+    batches = plan_normalize_batches(requests, token_budget=10_000, max_rows=10, max_pages=8)
+    assert [[r.page_number for r in b] for b in batches] == [[1, 2], [3], [4, 5]]
+
+    by_pages = plan_normalize_batches(requests, token_budget=10_000, max_rows=100, max_pages=2)
+    assert [[r.page_number for r in b] for b in by_pages] == [[1, 2], [3, 4], [5]]
+
+    disabled = plan_normalize_batches(requests, token_budget=0)
+    assert [len(b) for b in disabled] == [1, 1, 1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_batch_splits_response_back_into_pages():
+    resp = json.dumps(
+        {
+            "pages": [
+                {
+                    "page": 2,
+                    "new_section": "Вентиляция",
+                    "new_sticky": "Клапан",
+                    "expected_count": 1,
+                    "items": [{"name": "Клапан КЛОП", "quantity": 2, "source_row_index": 0}],
+                },
+                {
+                    "page": 1,
+                    "new_section": "Отопление",
+                    "new_sticky": "",
+                    "items": [{"name": "Радиатор", "quantity": 5}],
+                },
+            ]
+        }
+    )
+    provider = _QueueProvider([resp])
+    requests = [
+        _request(1, 1, section="Отопление", sticky="Радиатор"),
+        _request(2, 1, section="Вентиляция", sticky="Клапан"),
+    ]
+    pages = await normalize_batch_via_llm(provider, requests)
+
+    assert len(provider.prompts) == 1
+    prompt = provider.prompts[0]
+    assert "=== СТРАНИЦА 1 ===" in prompt and "=== СТРАНИЦА 2 ===" in prompt
+    # Контекст каждой страницы — свой.
+    assert prompt.index('"Радиатор"') < prompt.index("=== СТРАНИЦА 2 ===") < prompt.index('"Клапан"')
+
+    first, second = pages
+    assert isinstance(first, NormalizedPage) and isinstance(second, NormalizedPage)
+    assert [i.name for i in first.items] == ["Радиатор"]
+    assert first.new_section == "Отопление"
+    assert [i.name for i in second.items] == ["Клапан КЛОП"]
+    assert second.new_sticky == "Клапан"
+    # Один call — за первой страницей.
+    assert (first.llm_calls, second.llm_calls) == (1, 0)
+    assert (first.prompt_tokens, second.prompt_tokens) == (300, 0)
+
+
+@pytest.mark.asyncio
+async def test_batch_missing_page_falls_back_to_single_call():
+    batch_resp = json.dumps(
+        {"pages": [{"page": 1, "items": [{"name": "Радиатор", "quantity": 1}]}]}
+    )
+    single_resp = json.dumps({"new_section": "", "new_sticky": "", "items": [{"name": "Клапан"}]})
+    provider = _QueueProvider([batch_resp, single_resp])
+    pages = await normalize_batch_via_llm(provider, [_request(1, 1), _request(2, 1)])
+
+    assert len(provider.prompts) == 2
+    assert "=== СТРАНИЦА" not in provider.prompts[1]
+    assert [p.items[0].name for p in pages] == ["Радиатор", "Клапан"]
+    assert [p.llm_calls for p in pages] == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_batch_invalid_json_yields_per_page_errors_after_fallback():
+    provider = _QueueProvider(["not-a-json", "nope", "nope"])
+    pages = await normalize_batch_via_llm(provider, [_request(1, 1), _request(2, 1)])
+    assert len(provider.prompts) == 3
+    assert all(isinstance(p, LLMNormalizationError) for p in pages)
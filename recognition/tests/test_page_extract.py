@@ -0,0 +1,124 @@
+"""Per-page extraction в пуле процессов (page_extract).
+
+Контракт: пул даёт ровно тот же результат, что in-process путь, — порядок
+страниц, rows=None для страниц без text layer. Benchmark (pages/sec на
+golden PDF) — под маркером golden, в обычный прогон не входит.
+"""
+
+import time
+from pathlib import Path
+
+import fitz
+import pytest
+
+from app.services import page_extract
+from app.services.page_extract import extract_pages
+
+GOLDEN_DIR = (
+    Path(__file__).resolve().parent.parent.parent / "ismeta" / "tests" / "fixtures" / "golden"
+)
+
+
+def _make_table_pdf(pages: int, blank: tuple[int, ...] = ()) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=1190, height=842)
+        if i in blank:
+            continue
+        y = 80.0
+        for x, text in ((82.0, "Pos."), (392.0, "Naimenovanie i tehnicheskaya"),
+                        (665.0, "Tip, marka,"), (937.0, "Ed."), (985.0, "Kolichestvo")):
+            page.insert_text((x, y), text, fontsize=9)
+        for r in range(12):
+            y += 18.0
+            for x, text in ((82.0, f"P{i}.{r}"), (200.0, f"Ventilator {i}-{r}"),
+                            (665.0, f"WNK-{100 + r}"), (937.0, "sht"), (985.0, str(r + 1))):
+                page.insert_text((x, y), text, fontsize=9)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+
+@pytest.fixture()
+def pool_settings(monkeypatch):
+    monkeypatch.setattr(page_extract.settings, "pdf_extract_workers", 2)
+    monkeypatch.setattr(page_extract.settings, "pdf_extract_parallel_min_pages", 2)
+    yield
+    page_extract.shutdown_pool()
+
+
+def _as_plain(result):
+    return {
+        pn: (None if pr.rows is None else [(r.page_number, r.cells) for r in pr.rows], pr.error)
+        for pn, pr in result.items()
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["structured", "hybrid"])
+async def test_pool_matches_in_process(pool_settings, mode):
+    pdf = _make_table_pdf(5, blank=(3,))
+    pages = list(range(5))
+
+    parallel = await extract_pages(pdf, pages, mode=mode)
+    sequential = page_extract._extract_slice(pdf, pages, mode, None, frozenset())
+
+    assert page_extract._POOL is not None
+    assert sorted(parallel) == pages
+    assert _as_plain(parallel) == _as_plain(sequential)
+    assert parallel[3].rows is None
+    assert all(parallel[pn].rows for pn in (0, 1, 2, 4))
+
+
+@pytest.mark.asyncio
+async def test_text_check_only_skips_extraction(pool_settings):
+    pdf = _make_table_pdf(4, blank=(1,))
+    result = await extract_pages(pdf, [0, 1, 2, 3], text_check_only=frozenset({1, 2}))
+    assert result[1].rows is None  # text layer проверяется всё равно
+    assert result[2].rows == []
+    assert result[0].rows and result[3].rows
+
+
+@pytest.mark.asyncio
+async def test_small_document_stays_in_process(monkeypatch):
+    monkeypatch.setattr(page_extract.settings, "pdf_extract_workers", 4)
+    monkeypatch.setattr(page_extract.settings, "pdf_extract_parallel_min_pages", 4)
+    page_extract.shutdown_pool()
+    result = await extract_pages(_make_table_pdf(2), [0, 1])
+    assert page_extract._POOL is None
+    assert sorted(result) == [0, 1]
+
+
+@pytest.mark.golden
+@pytest.mark.asyncio
+async def test_benchmark_pages_per_sec(monkeypatch, capsys):
+    """pages/sec на golden PDF: in-process vs пул (все ядра)."""
+    pdfs = sorted(GOLDEN_DIR.glob("spec-*.pdf"))
+    if not pdfs:
+        pytest.skip(f"golden PDF не найдены: {GOLDEN_DIR}")
+    monkeypatch.setattr(page_extract.settings, "pdf_extract_parallel_min_pages", 2)
+    try:
+        for path in pdfs:
+            pdf = path.read_bytes()
+            with fitz.open(stream=pdf, filetype="pdf") as doc:
+                pages = list(range(len(doc)))
+
+            started = time.perf_counter()
+            sequential = page_extract._extract_slice(pdf, pages, "structured", None, frozenset())
+            seq_time = time.perf_counter() - started
+
+            monkeypatch.setattr(page_extract.settings, "pdf_extract_workers", 0)
+            await extract_pages(pdf, pages)  # прогрев пула (spawn)
+            started = time.perf_counter()
+            parallel = await extract_pages(pdf, pages)
+            par_time = time.perf_counter() - started
+
+            assert _as_plain(parallel) == _as_plain(sequential)
+            with capsys.disabled():
+                print(
+                    f"\n{path.name}: {len(pages)} стр., "
+                    f"in-process {len(pages) / seq_time:.1f} pages/sec, "
+                    f"pool×{page_extract.resolve_workers()} {len(pages) / par_time:.1f} pages/sec"
+                )
+    finally:
+        page_extract.shutdown_pool()
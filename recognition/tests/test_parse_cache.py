@@ -0,0 +1,155 @@
+"""Content-addressed кэш /v1/parse/* и per-page LLM-нормализации (parse_cache)."""
+
+import io
+import json
+import os
+import time
+
+import pytest
+
+from app.deps import get_provider
+from app.main import app
+from app.providers.base import BaseLLMProvider, TextCompletion
+from app.services import parse_cache
+from app.services.parse_cache import DiskLRUCache
+from app.services.pdf_text import TableRow
+from app.services.spec_normalizer import normalize_via_llm
+from tests.test_parse_spec import MockProvider, _make_real_pdf
+
+
+@pytest.fixture()
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_cache.settings, "parse_cache_dir", str(tmp_path))
+    return tmp_path
+
+
+class _CountingProvider(MockProvider):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    async def vision_complete(self, image_b64: str, prompt: str) -> str:
+        self.calls += 1
+        return await super().vision_complete(image_b64, prompt)
+
+    async def aclose(self) -> None:
+        return None
+
+
+def _post_spec(client, auth_headers, pdf: bytes):
+    return client.post(
+        "/v1/parse/spec",
+        files={"file": ("spec.pdf", io.BytesIO(pdf), "application/pdf")},
+        headers=auth_headers,
+    )
+
+
+class TestDiskLRUCache:
+    def test_put_get_roundtrip(self, tmp_path):
+        cache = DiskLRUCache(tmp_path, max_bytes=1024 * 1024)
+        assert cache.get("document", "ab" * 32) is None
+        cache.put("document", "ab" * 32, b"payload")
+        assert cache.get("document", "ab" * 32) == b"payload"
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = DiskLRUCache(tmp_path, max_bytes=1024 * 1024)
+        keys = [f"{i:02d}" + "0" * 62 for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.put("document", key, b"x" * 100)
+            path = tmp_path / "document" / key[:2] / key
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        cache.get("document", keys[0])  # key0 свежий, key1 самый давний
+        cache.max_bytes = 250
+        cache.evict()
+        assert cache.get("document", keys[1]) is None
+        assert cache.get("document", keys[0]) == b"x" * 100
+        assert cache.get("document", keys[2]) == b"x" * 100
+
+
+class TestDocumentCache:
+    def test_disabled_by_default(self, client, auth_headers):
+        assert parse_cache.get_cache() is None
+        provider = _CountingProvider()
+        app.dependency_overrides[get_provider] = lambda: provider
+        pdf = _make_real_pdf(1)
+        _post_spec(client, auth_headers, pdf)
+        first_calls = provider.calls
+        _post_spec(client, auth_headers, pdf)
+        assert provider.calls == 2 * first_calls
+
+    def test_repeat_upload_served_from_cache(self, client, auth_headers, cache_dir):
+        provider = _CountingProvider()
+        app.dependency_overrides[get_provider] = lambda: provider
+        pdf = _make_real_pdf(2)
+
+        first = _post_spec(client, auth_headers, pdf)
+        assert first.status_code == 200
+        calls_after_first = provider.calls
+        assert calls_after_first > 0
+
+        second = _post_spec(client, auth_headers, pdf)
+        assert second.status_code == 200
+        assert provider.calls == calls_after_first
+        assert second.json()["items"] == first.json()["items"]
+        assert second.json()["llm_costs"]["total_usd"] == 0.0
+
+        # Другой PDF — другой ключ.
+        _post_spec(client, auth_headers, _make_real_pdf(3))
+        assert provider.calls > calls_after_first
+
+    def test_model_change_misses(self, cache_dir):
+        pdf = _make_real_pdf(1)
+        a = type("P", (), {"extract_model": "gpt-4o"})()
+        b = type("P", (), {"extract_model": "deepseek-chat"})()
+        assert parse_cache.document_key("spec", pdf, a) != parse_cache.document_key("spec", pdf, b)
+        assert parse_cache.document_key("spec", pdf, a) != parse_cache.document_key(
+            "invoice", pdf, a
+        )
+
+    def test_failed_parse_not_cached(self, client, auth_headers, cache_dir):
+        provider = _CountingProvider(extract_response="this is not json")
+        app.dependency_overrides[get_provider] = lambda: provider
+        pdf = _make_real_pdf(1)
+        assert _post_spec(client, auth_headers, pdf).json()["status"] != "done"
+        calls = provider.calls
+        _post_spec(client, auth_headers, pdf)
+        assert provider.calls == 2 * calls
+
+
+class _TextProvider(BaseLLMProvider):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    async def vision_complete(self, image_b64, prompt):  # noqa: ARG002
+        raise AssertionError("vision не ожидается")
+
+    async def text_complete(self, prompt, *, max_tokens=None, temperature=0.0, system_prompt=None):  # noqa: ARG002
+        self.calls += 1
+        return TextCompletion(
+            content=json.dumps({"items": [{"name": "Вентилятор", "quantity": 2}]}),
+            prompt_tokens=100,
+            completion_tokens=20,
+        )
+
+
+def _rows(name: str) -> list[TableRow]:
+    return [TableRow(page_number=1, y_mid=100.0, row_index=0, cells={"name": name, "qty": "2"})]
+
+
+@pytest.mark.asyncio
+async def test_normalize_page_cache(cache_dir):
+    provider = _TextProvider()
+
+    first = await normalize_via_llm(provider, _rows("Вентилятор"), page_number=1)
+    again = await normalize_via_llm(provider, _rows("Вентилятор"), page_number=1)
+    assert provider.calls == 1
+    assert again.items == first.items
+    assert again.prompt_tokens == 0
+
+    # Изменилась страница или sticky-контекст — новый LLM call.
+    await normalize_via_llm(provider, _rows("Клапан"), page_number=1)
+    await normalize_via_llm(
+        provider, _rows("Вентилятор"), page_number=1, sticky_parent_name="Решётка"
+    )
+    assert provider.calls == 3
@@ -1,11 +1,13 @@
 """Tests for POST /v1/parse/quote + QuoteParser unit (per specs §3)."""
 
+import asyncio
 import io
 import json
 
 import fitz
 import pytest
 
+from app.config import settings
 from app.deps import get_provider
 from app.main import app
 from app.providers.base import BaseLLMProvider
@@ -64,6 +66,7 @@ class QuoteMockProvider(BaseLLMProvider):
         self._fail_on_call = fail_on_call
         self._fail_items_from_call = fail_items_from_call
         self._calls = 0
+        self._items_calls = 0
 
     async def vision_complete(self, image_b64: str, prompt: str) -> str:  # noqa: ARG002
         self._calls += 1
@@ -73,7 +76,12 @@ class QuoteMockProvider(BaseLLMProvider):
             return json.dumps({"type": "header"})
         if "Извлеки реквизиты" in prompt:
             return self._header
-        if self._fail_items_from_call is not None and self._calls >= self._fail_items_from_call:
+        # Страницы идут параллельно — считаем только items-вызовы.
+        self._items_calls += 1
+        if (
+            self._fail_items_from_call is not None
+            and self._items_calls >= self._fail_items_from_call
+        ):
             raise ValueError("mock LLM items failure")
         return self._items
 
@@ -101,7 +109,7 @@ class TestQuoteParserUnit:
 
     @pytest.mark.asyncio
     async def test_partial_on_items_error(self):
-        parser = QuoteParser(QuoteMockProvider(fail_items_from_call=5))
+        parser = QuoteParser(QuoteMockProvider(fail_items_from_call=2))
         result = await parser.parse(_make_real_pdf(2), "quote.pdf")
         assert result.status == "partial"
         assert result.items
@@ -150,6 +158,55 @@ class TestQuoteParserUnit:
         assert result.supplier.name == "ИП Иванов"
         assert result.supplier.inn == ""
 
+    @pytest.mark.asyncio
+    async def test_pages_overlap_and_merge_in_page_order(self):
+        """Страницы идут параллельно; позиции — в порядке страниц, header — с первой."""
+        in_flight = 0
+        peak = 0
+
+        class SlowFirstPagesParser(QuoteParser):
+            async def _extract_items(self, image_b64: str, page_num: int) -> list[dict]:
+                nonlocal in_flight, peak
+                in_flight += 1
+                peak = max(peak, in_flight)
+                # Первые страницы отвечают последними.
+                await asyncio.sleep(0.01 * (5 - page_num))
+                in_flight -= 1
+                return [{"name": f"Позиция {page_num + 1}", "quantity": 1}]
+
+        parser = SlowFirstPagesParser(QuoteMockProvider())
+        result = await parser.parse(_make_real_pdf(5), "quote.pdf")
+
+        assert peak > 1
+        assert [i.name for i in result.items] == [f"Позиция {n}" for n in range(1, 6)]
+        assert [i.sort_order for i in result.items] == [1, 2, 3, 4, 5]
+        assert [i.page_number for i in result.items] == [1, 2, 3, 4, 5]
+        assert result.supplier.name == "ООО Климат-Трейд"
+        assert result.pages_stats.processed == 5
+
+    @pytest.mark.asyncio
+    async def test_page_fanout_bounded_by_llm_max_concurrency(self, monkeypatch):
+        """Одновременно в работе не больше llm_max_concurrency страниц."""
+        monkeypatch.setattr(settings, "llm_max_concurrency", 2)
+        in_flight = 0
+        peak = 0
+
+        class CountingParser(QuoteParser):
+            async def _process_page(self, doc, page_num):
+                nonlocal in_flight, peak
+                in_flight += 1
+                peak = max(peak, in_flight)
+                try:
+                    return await super()._process_page(doc, page_num)
+                finally:
+                    in_flight -= 1
+
+        parser = CountingParser(QuoteMockProvider())
+        result = await parser.parse(_make_real_pdf(6), "quote.pdf")
+
+        assert peak == 2
+        assert result.pages_stats.processed == 6
+
 
 class TestQuoteEndpoint:
     def test_non_pdf_415(self, client, auth_headers):
@@ -36,6 +36,7 @@ def captured_callbacks(monkeypatch: pytest.MonkeyPatch) -> list[dict[str, Any]]:
 
     class _FakeResponse:
         status_code = 200
+        is_success = True
 
         def raise_for_status(self) -> None:
             return None
@@ -403,6 +404,56 @@ async def test_async_callback_failure_does_not_break_parse(
     assert len(attempts) == 3
 
 
+@pytest.mark.asyncio
+async def test_stream_pages_reconciles_and_omits_finished_items(
+    monkeypatch: pytest.MonkeyPatch,
+    captured_callbacks: list[dict[str, Any]],
+    provider_override: Any,  # noqa: ARG001
+) -> None:
+    """X-Stream-Pages: page_done с seq; страницы, чей финал отличается от
+    отправленного, досылаются новым seq; finished — без items."""
+
+    async def fake_parse(
+        self: Any, pdf_bytes: bytes, filename: str = "x.pdf", *, on_page_done: Any = None
+    ) -> SpecParseResponse:
+        await on_page_done(1, [SpecItem(name="A", section_name="ОВ", page_number=1).model_dump()])
+        await on_page_done(2, [{"name": "B", "section_name": ""}])
+        await on_page_done(3, [{"name": "хвост"}])
+        return SpecParseResponse(
+            status="done",
+            items=[
+                SpecItem(name="A", section_name="ОВ", page_number=1, sort_order=1),
+                # Phase 5: секция унаследована, хвост страницы 3 склеен сюда.
+                SpecItem(name="B хвост", section_name="ОВ", page_number=2, sort_order=2),
+            ],
+            pages_stats=PagesStats(total=3, processed=3),
+        )
+
+    monkeypatch.setattr(spec_parser.SpecParser, "parse", fake_parse)
+
+    transport = ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/v1/parse/spec/async",
+            files=_post_files(),
+            headers={**_headers("job-stream"), "X-Stream-Pages": "true"},
+        )
+    assert resp.status_code == 202
+    await _drain_jobs()
+
+    page_done = [e["json"] for e in captured_callbacks if e["json"]["event"] == "page_done"]
+    assert [(p["page"], p["seq"]) for p in page_done] == [(1, 1), (2, 2), (3, 3), (2, 4), (3, 5)]
+    assert page_done[3]["items"][0]["name"] == "B хвост"
+    assert page_done[4]["items"] == []
+
+    finished = captured_callbacks[-1]["json"]
+    assert finished["event"] == "finished"
+    assert finished["items"] == []
+    assert finished["items_streamed"] is True
+    assert finished["items_count"] == 2
+    assert finished["page_seqs"] == {"1": 1, "2": 4, "3": 5}
+
+
 @pytest.mark.asyncio
 async def test_sync_endpoint_unchanged_no_callback(
     monkeypatch: pytest.MonkeyPatch,
@@ -0,0 +1,101 @@
+"""pdf_render: per-document кэш рендеров, adaptive DPI, JPEG/WebP."""
+
+from __future__ import annotations
+
+import base64
+from typing import Any
+
+import fitz
+import pytest
+
+from app.providers.base import BaseLLMProvider
+from app.providers.openai_vision import OpenAIVisionProvider
+from app.services import pdf_render
+from app.services.pdf_render import RenderCache, choose_dpi, render_page_to_b64
+
+
+def _doc(font_sizes: list[float], width: float = 595, height: float = 842) -> fitz.Document:
+    doc = fitz.open()
+    for size in font_sizes:
+        page = doc.new_page(width=width, height=height)
+        if size:
+            page.insert_text((72, 144), "Воздуховод 250x150", fontsize=size, fontname="helv")
+    return doc
+
+
+def test_choose_dpi_by_font_size_and_page_size() -> None:
+    doc = _doc([12, 6, 0])
+    assert choose_dpi(doc[0]) == 150  # крупный шрифт → render_min_dpi
+    assert choose_dpi(doc[1]) == 200  # 6pt → упор в settings.dpi
+    assert choose_dpi(doc[2]) == 200  # без text layer — как скан
+
+    a0 = _doc([0], width=2384, height=3370)
+    assert choose_dpi(a0[0]) == int(4096 * 72 / 3370)
+
+
+def test_choose_dpi_adaptive_off(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pdf_render.settings, "render_adaptive_dpi", False)
+    assert choose_dpi(_doc([12])[0]) == 200
+
+
+def test_render_cache_hits_skip_rasterization(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[Any] = []
+    original = fitz.Page.get_pixmap
+
+    def counting(self: fitz.Page, *args: Any, **kwargs: Any) -> fitz.Pixmap:
+        calls.append(self.number)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(fitz.Page, "get_pixmap", counting)
+    doc = _doc([10, 10])
+
+    first = render_page_to_b64(doc, 0)
+    assert render_page_to_b64(doc, 0) == first
+    render_page_to_b64(doc, 1)
+    render_page_to_b64(doc, 0, "jpeg")
+
+    assert calls == [0, 1, 0]
+    cache = pdf_render.get_render_cache(doc)
+    assert cache is not None and cache.hits == 1
+
+
+def test_render_cache_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pdf_render.settings, "render_cache_max_mb", 0)
+    doc = _doc([10])
+    render_page_to_b64(doc, 0)
+    assert pdf_render.get_render_cache(doc) is None
+
+
+def test_render_cache_memory_bound() -> None:
+    cache = RenderCache(max_bytes=10)
+    cache.put((0, 200, "png"), "aaaa")
+    cache.put((1, 200, "png"), "bbbb")
+    assert cache.get((0, 200, "png")) == "aaaa"  # 0 — самый свежий
+    cache.put((2, 200, "png"), "cccc")
+    assert cache.get((1, 200, "png")) is None
+    assert cache.size == 8
+    cache.put((3, 200, "png"), "x" * 11)  # больше лимита — не кладём
+    assert cache.get((3, 200, "png")) is None
+
+
+def test_jpeg_output_and_mime() -> None:
+    doc = _doc([10])
+    png = render_page_to_b64(doc, 0)
+    jpeg = render_page_to_b64(doc, 0, "jpeg")
+    assert base64.b64decode(png).startswith(b"\x89PNG")
+    assert base64.b64decode(jpeg).startswith(b"\xff\xd8")
+    assert pdf_render.image_mime_type(png) == "image/png"
+    assert pdf_render.image_mime_type(jpeg) == "image/jpeg"
+    assert pdf_render.image_mime_type("UklGRiQAAABXRUJQ") == "image/webp"
+
+
+def test_provider_image_format(monkeypatch: pytest.MonkeyPatch) -> None:
+    class _PngOnly(BaseLLMProvider):
+        async def vision_complete(self, image_b64: str, prompt: str) -> str:  # noqa: ARG002
+            return "{}"
+
+    monkeypatch.setattr(pdf_render.settings, "render_image_format", "jpeg")
+    assert _PngOnly().image_format == "png"
+    assert OpenAIVisionProvider(api_key="sk-test").image_format == "jpeg"
+    monkeypatch.setattr(pdf_render.settings, "render_image_format", "gif")
+    assert OpenAIVisionProvider(api_key="sk-test").image_format == "png"
@@ -6,6 +6,9 @@ import fitz
 
 from app.services.pdf_text import (
     UNITS,
+    PageTextCache,
+    _collect_spans,
+    _spans_from_dict,
     extract_lines,
     extract_structured_rows,
     has_usable_text_layer,
@@ -1464,3 +1467,51 @@ class TestLooksLikeSectionHeading:
 
         assert not _looks_like_section_heading({}, [])
         assert not _looks_like_section_heading({"name": ""}, [])
+
+
+class TestPageTextCache:
+    """Text layer страницы извлекается один раз на документ."""
+
+    def test_extractors_share_one_extraction_per_mode(self, monkeypatch):
+        doc, page = _build_synthetic_page(
+            [
+                [(82.0, "Pos."), (392.0, "Naimenovanie i tehnicheskaya"),
+                 (665.0, "Tip, marka,"), (937.0, "Ed."), (985.0, "Kolichestvo")],
+                [(82.0, "VD1"), (200.0, "Ventilator"), (665.0, "WNK-100"),
+                 (937.0, "sht"), (985.0, "5")],
+            ]
+        )
+        calls: list[str] = []
+        original = fitz.Page.get_text
+
+        def counting_get_text(self, option="text", **kwargs):
+            calls.append(option)
+            return original(self, option, **kwargs)
+
+        monkeypatch.setattr(fitz.Page, "get_text", counting_get_text)
+        try:
+            first = extract_structured_rows(page)
+            assert extract_structured_rows(doc[0]) == first
+            assert has_usable_text_layer(page, min_chars=10)
+            assert "VD1" in extract_lines(doc[0])
+            assert PageTextCache.of(doc).avg_chars() > 0
+            assert sorted(calls) == ["dict", "text"]
+        finally:
+            doc.close()
+
+    def test_cached_spans_match_direct_extraction(self):
+        doc, page = _build_synthetic_page(
+            [[(82.0, "P1"), (200.0, "Name long"), (665.0, "MODEL-1")]],
+            rotation=90,
+        )
+        try:
+            direct = _spans_from_dict(page.get_text("dict"), page.rotation_matrix)
+            assert _collect_spans(page) == direct
+            assert PageTextCache.of(doc).text(0) == page.get_text()
+        finally:
+            doc.close()
+
+    def test_fake_pages_bypass_cache(self):
+        page = _make_page_with_lines(["Строка 1"])
+        assert PageTextCache.for_page(page) is None
+        assert extract_lines(page) == ["Строка 1"]